@@ -1,11 +1,16 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
-import re
 import os
+import sys
+import analise_incremental
+from armazenamento_colunar import carregar_captura, AUSENTE_INT
+from relogio_arduino import EstimadorRelogio
+from renderizacao import Serie, renderizar
 
-# Regex para extrair todos os componentes importantes
-arduino_regex = re.compile(r'ID: (\d+) \| Timestamp: (\d+) \| RadioLatency: (\d+) ms')
+# Modo incremental (analise_incremental.py): guarda um checkpoint com os agregados e
+# na próxima execução processa só as linhas acrescentadas à captura, sem os gráficos.
+# Também ativado por --incremental (--reiniciar descarta o checkpoint)
+MODO_INCREMENTAL = False
 
 def analisar_timestamps_arduino(arquivo_csv):
     """
@@ -15,101 +20,106 @@ def analisar_timestamps_arduino(arquivo_csv):
         print(f"Arquivo {arquivo_csv} não encontrado")
         return
         
-    df = pd.read_csv(arquivo_csv)
+    # Extrair só as colunas necessárias (da pasta colunar, se existir)
+    dados = carregar_captura(arquivo_csv, ['id', 'timestamp', 'radio_latency', 'rx'])
+    validos = ((dados['id'] != AUSENTE_INT) & (dados['timestamp'] != AUSENTE_INT)
+               & ~np.isnan(dados['radio_latency']))
+    ids = dados['id'][validos]
+    timestamps = dados['timestamp'][validos]
+    latencias = dados['radio_latency'][validos].astype(np.int64)
+    timestamps_sistema = dados['rx'][validos]
     
-    # Extrair dados
-    ids = []
-    timestamps = []
-    latencias = []
-    timestamps_sistema = []
-    
-    for index, row in df.iterrows():
-        if 'valor' in df.columns:
-            match = arduino_regex.search(str(row['valor']))
-            if match:
-                id_num, timestamp, radio_latency = match.groups()
-                ids.append(int(id_num))
-                timestamps.append(int(timestamp))
-                latencias.append(int(radio_latency))
-                timestamps_sistema.append(float(row['timestamp']))
-    
-    if not ids:
+    if not len(ids):
         print("Nenhum dado encontrado para análise")
         return
         
     # Verificar se há overflow no cálculo de latência
-    overflow_count = 0
-    for latencia in latencias:
-        if latencia > 4000000000:  # Próximo a 2^32
-            overflow_count += 1
+    overflow = latencias > 4000000000  # Próximo a 2^32
+    overflow_count = int(overflow.sum())
     
     print(f"\nAnálise de Timestamps do Arduino:")
     print(f"Total de amostras: {len(ids)}")
-    print(f"IDs: Min={min(ids)}, Max={max(ids)}")
-    print(f"Timestamps Arduino: Min={min(timestamps)}, Max={max(timestamps)}")
-    print(f"Latências reportadas: Min={min(latencias)}, Max={max(latencias)}")
+    print(f"IDs: Min={ids.min()}, Max={ids.max()}")
+    print(f"Timestamps Arduino: Min={timestamps.min()}, Max={timestamps.max()}")
+    print(f"Latências reportadas: Min={latencias.min()}, Max={latencias.max()}")
     print(f"Número de prováveis overflows: {overflow_count} ({overflow_count/len(latencias)*100:.2f}%)")
     
-    # Calcular diferenças entre timestamps consecutivos (Arduino)
-    diferenca_arduino = []
-    for i in range(1, len(timestamps)):
-        diferenca_arduino.append(timestamps[i] - timestamps[i-1])
+    # Diferenças entre timestamps consecutivos (Arduino e sistema, em ms)
+    diferenca_arduino = np.diff(timestamps)
+    diferenca_sistema = np.diff(timestamps_sistema) * 1000
     
-    # Calcular diferenças entre timestamps consecutivos (sistema)
-    diferenca_sistema = []
-    for i in range(1, len(timestamps_sistema)):
-        diferenca_sistema.append((timestamps_sistema[i] - timestamps_sistema[i-1]) * 1000)  # converter para ms
+    # Latências corrigidas: overflow corrigido usando complemento de 2^32
+    latencias_corrigidas = np.where(overflow, np.abs(latencias - (1 << 32)), latencias)
     
-    # Calcular latências corrigidas
-    latencias_corrigidas = []
-    for latencia in latencias:
-        if latencia > 4000000000:
-            # Corrigir overflow usando complemento de 2^32
-            latencia_corrigida = abs(latencia - (1 << 32))
-            latencias_corrigidas.append(latencia_corrigida)
-        else:
-            latencias_corrigidas.append(latencia)
+    # Gráficos: em janela, ou salvos sem bloquear com --sem-janela
+    renderizar([(figura_timestamps, (
+        Serie(ids, timestamps),
+        Serie(ids[1:], diferenca_arduino),
+        Serie(ids[1:], diferenca_sistema),
+        Serie(ids, latencias_corrigidas),
+    ), 'analise_timestamps_arduino.png')])
     
-    # Criar figura
-    plt.figure(figsize=(12, 12))
+    print("\nLatências corrigidas:")
+    print(f"Mínimo: {latencias_corrigidas.min()} ms")
+    print(f"Máximo: {latencias_corrigidas.max()} ms")
+    print(f"Média: {np.mean(latencias_corrigidas):.2f} ms")
+    print(f"Mediana: {np.median(latencias_corrigidas):.2f} ms")
+    
+    # Atraso até a estação (chegada - timestamp do Arduino), com o offset e a deriva
+    # do relógio do Arduino estimados ao longo da captura (relogio_arduino.py)
+    relogio = EstimadorRelogio()
+    atrasos = relogio.latencias(timestamps, timestamps_sistema * 1000)
+    print("\nRelógio do Arduino:")
+    print(f"Deriva estimada: {relogio.descrever_deriva()} | Reinícios detectados: {relogio.reinicios}")
+    print(f"Atraso até a estação (acima do mínimo): Média={atrasos.mean():.2f} ms, "
+          f"p99={np.percentile(atrasos, 99):.2f} ms, Máx={atrasos.max():.2f} ms")
+    
+    return latencias_corrigidas.tolist()
+
+def figura_timestamps(timestamps, intervalo_arduino, intervalo_sistema, latencias_corrigidas):
+    """Timestamps, intervalos entre mensagens e latências corrigidas por ID (séries reduzidas)"""
+    figura, (ax_timestamps, ax_intervalos, ax_latencias) = plt.subplots(3, 1, figsize=(12, 12))
     
     # Gráfico de timestamps do Arduino
-    plt.subplot(3, 1, 1)
-    plt.plot(ids, timestamps, 'b-', marker='o')
-    plt.title('Timestamps do Arduino')
-    plt.xlabel('ID da mensagem')
-    plt.ylabel('Timestamp (ms)')
-    plt.grid(True)
+    timestamps.plotar(ax_timestamps, 'b-', marker='o')
+    ax_timestamps.set_title('Timestamps do Arduino')
+    ax_timestamps.set_xlabel('ID da mensagem')
+    ax_timestamps.set_ylabel('Timestamp (ms)')
+    ax_timestamps.grid(True)
     
     # Gráfico de intervalos entre mensagens
-    plt.subplot(3, 1, 2)
-    plt.plot(ids[1:], diferenca_arduino, 'g-', marker='o', label='Arduino')
-    plt.plot(ids[1:], diferenca_sistema[:len(diferenca_arduino)], 'r-', marker='x', label='Sistema')
-    plt.title('Intervalo entre Mensagens Consecutivas')
-    plt.xlabel('ID da mensagem')
-    plt.ylabel('Intervalo (ms)')
-    plt.legend()
-    plt.grid(True)
+    intervalo_arduino.plotar(ax_intervalos, 'g-', marker='o', label='Arduino')
+    intervalo_sistema.plotar(ax_intervalos, 'r-', marker='x', label='Sistema')
+    ax_intervalos.set_title('Intervalo entre Mensagens Consecutivas')
+    ax_intervalos.set_xlabel('ID da mensagem')
+    ax_intervalos.set_ylabel('Intervalo (ms)')
+    ax_intervalos.legend()
+    ax_intervalos.grid(True)
     
     # Gráfico de latências
-    plt.subplot(3, 1, 3)
-    plt.plot(ids, latencias_corrigidas, 'r-', marker='o')
-    plt.title('Latências Corrigidas')
-    plt.xlabel('ID da mensagem')
-    plt.ylabel('Latência (ms)')
-    plt.grid(True)
-    
-    plt.tight_layout()
-    plt.savefig('analise_timestamps_arduino.png')
-    plt.show()
+    latencias_corrigidas.plotar(ax_latencias, 'r-', marker='o')
+    ax_latencias.set_title('Latências Corrigidas')
+    ax_latencias.set_xlabel('ID da mensagem')
+    ax_latencias.set_ylabel('Latência (ms)')
+    ax_latencias.grid(True)
     
-    print("\nLatências corrigidas:")
-    print(f"Mínimo: {min(latencias_corrigidas)} ms")
-    print(f"Máximo: {max(latencias_corrigidas)} ms")
-    print(f"Média: {np.mean(latencias_corrigidas):.2f} ms")
-    print(f"Mediana: {np.median(latencias_corrigidas):.2f} ms")
-    
-    return latencias_corrigidas
+    figura.tight_layout()
+    return figura
+
+def analisar_timestamps_incremental(arquivo_csv, reiniciar=False):
+    """Relatório de analisar_timestamps_arduino atualizado só com as linhas novas da captura"""
+    if not os.path.exists(arquivo_csv):
+        print(f"Arquivo {arquivo_csv} não encontrado")
+        return
+    checkpoint = analise_incremental.arquivo_checkpoint(arquivo_csv, 'timestamps')
+    if reiniciar and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    resumo = analise_incremental.resumo_timestamps_incremental(arquivo_csv, checkpoint)
+    analise_incremental.imprimir_resumo_timestamps(resumo)
+    return resumo
 
 if __name__ == "__main__":
-    analisar_timestamps_arduino('dados_radio.csv')
+    if MODO_INCREMENTAL or '--incremental' in sys.argv:
+        analisar_timestamps_incremental('dados_radio.csv', '--reiniciar' in sys.argv)
+    else:
+        analisar_timestamps_arduino('dados_radio.csv')
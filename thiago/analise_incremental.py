@@ -0,0 +1,407 @@
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from analise_streaming import FAIXA_MQTT, FAIXA_RADIO, latencias_validas, resumir
+from armazenamento_colunar import AUSENTE_INT, listar_segmentos, pasta_colunar, tem_colunar
+from deteccao_encoding import detectar_encoding
+from estatisticas_online import EstatisticaOnline, imprimir_resumo
+from extracao_latencias import LIMITE_OVERFLOW, blocos_captura, blocos_colunares, bloco_de_dataframe
+
+# Análise incremental de capturas que continuam crescendo durante a campanha.
+#
+# Cada análise guarda um checkpoint (JSON ao lado da captura) com, por arquivo, a
+# posição já processada (byte e linha no CSV, ou segmentos da pasta colunar) e os
+# agregados parciais que podem ser combinados: contagens, mínimos/máximos, momentos
+# e t-digests (estatisticas_online.py) e o último ID/timestamp visto. Rodar de novo
+# lê só o que foi acrescentado depois da posição salva, então atualizar o relatório
+# custa o tempo dos dados novos.
+#
+# A posição de um CSV só avança até a última linha completa (uma linha ainda sendo
+# gravada fica para a próxima vez). Se o arquivo encolheu ou foi recriado (o começo
+# ou os bytes antes da posição salva mudaram), a análise recomeça do zero.
+# Os quantis combinados são os do t-digest, então podem diferir levemente dos de uma
+# passada única; contagens, mínimos, máximos e médias são os mesmos.
+#
+# As latências que ainda não têm par no outro arquivo (latência total, pareada pela
+# posição) ficam em um .npz ao lado do checkpoint, no máximo MAXIMO_PENDENTES por
+# arquivo. Acima disso as mais antigas são descartadas e as posições correspondentes
+# do outro arquivo são puladas quando chegarem, então o pareamento continua alinhado
+# e o custo de cada execução não cresce com o desencontro entre as capturas.
+#
+# Usado por compara_latencia_corrigido.py e analisa_timestamp_arduino.py com
+# MODO_INCREMENTAL = True ou --incremental.
+#
+# Uso direto:
+#   python analise_incremental.py dados_radio.csv dados_mqtt_dashboard.csv
+#   python analise_incremental.py --timestamps dados_radio.csv
+
+VERSAO_CHECKPOINT = 2
+# Bytes lidos por vez do fim de um CSV
+BYTES_BLOCO = 32 << 20
+# Bytes do começo e de antes da posição salva usados para reconhecer o mesmo arquivo
+BYTES_ASSINATURA = 4096
+# Latências sem par guardadas por arquivo entre as execuções (as mais antigas são descartadas)
+MAXIMO_PENDENTES = 100000
+
+
+def arquivo_checkpoint(arquivo_csv, analise):
+    """Checkpoint de uma análise ao lado da captura (dados_radio.csv -> dados_radio.<analise>.checkpoint.json)."""
+    return os.path.splitext(arquivo_csv)[0] + f'.{analise}.checkpoint.json'
+
+
+def carregar_checkpoint(caminho, analise, arquivos):
+    """Estado salvo de 'analise' para esses arquivos, ou None (sem checkpoint, outra versão ou outros arquivos)."""
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            estado = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (estado.get('versao') != VERSAO_CHECKPOINT or estado.get('analise') != analise
+            or estado.get('arquivos') != [os.path.abspath(arquivo) for arquivo in arquivos]):
+        return None
+    return estado
+
+
+def salvar_checkpoint(caminho, analise, arquivos, estado):
+    """Grava o checkpoint em um arquivo temporário renomeado no final (nunca fica pela metade)."""
+    estado = dict(estado, versao=VERSAO_CHECKPOINT, analise=analise,
+                  arquivos=[os.path.abspath(arquivo) for arquivo in arquivos])
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(estado, f)
+    os.replace(temporario, caminho)
+
+
+def arquivo_pendentes(checkpoint):
+    """Arquivo binário com as latências sem par ao lado do checkpoint (.checkpoint.json -> .pendentes.npz)."""
+    return os.path.splitext(checkpoint)[0] + '.pendentes.npz'
+
+
+def carregar_pendentes(caminho, tamanhos):
+    """Latências sem par salvas, ou None se o arquivo faltar ou não bater com os tamanhos do checkpoint."""
+    try:
+        with np.load(caminho) as dados:
+            pendentes = {chave: dados[chave] for chave in tamanhos}
+    except (OSError, ValueError, KeyError):
+        return None
+    if any(len(pendentes[chave]) != tamanho for chave, tamanho in tamanhos.items()):
+        return None
+    return pendentes
+
+
+def salvar_pendentes(caminho, pendentes):
+    temporario = caminho + '.tmp'
+    with open(temporario, 'wb') as f:
+        np.savez(f, **pendentes)
+    os.replace(temporario, caminho)
+
+
+def _assinatura(f, inicio, fim):
+    f.seek(inicio)
+    return hashlib.sha1(f.read(fim - inicio)).hexdigest()
+
+
+class CapturaIncremental:
+    """
+    Leitura de uma captura a partir da posição salva em um checkpoint.
+
+    'posicao' é o dicionário guardado no checkpoint (None para ler do começo). Se ele
+    não vale mais para o arquivo atual, a leitura recomeça do zero e 'reiniciada' fica
+    True, para quem chama descartar os agregados. Depois de consumir novos_blocos(),
+    'posicao' aponta para o fim do que foi lido e 'linhas_novas' conta as linhas lidas.
+    """
+
+    def __init__(self, arquivo_csv, posicao=None):
+        self.arquivo = arquivo_csv
+        self.linhas_novas = 0
+        self.reiniciada = False
+        if posicao is not None and not self._valida(posicao):
+            posicao = None
+            self.reiniciada = True
+        self.posicao = posicao
+
+    def reiniciar(self):
+        """Descarta a posição salva (outro arquivo da mesma análise recomeçou)."""
+        if self.posicao is not None:
+            self.reiniciada = True
+        self.posicao = None
+
+    @property
+    def linhas(self):
+        return self.posicao['linhas'] if self.posicao else 0
+
+    def _valida(self, posicao):
+        if posicao.get('origem') == 'colunar':
+            if not tem_colunar(self.arquivo):
+                return False
+            segmentos = listar_segmentos(pasta_colunar(self.arquivo))
+            lidos = posicao['segmentos']
+            return len(segmentos) >= lidos and (not lidos or segmentos[lidos - 1] == posicao['ultimo_segmento'])
+        if tem_colunar(self.arquivo) or not os.path.exists(self.arquivo):
+            return False
+        fim = posicao['bytes']
+        if os.path.getsize(self.arquivo) < fim:
+            return False
+        with open(self.arquivo, 'rb') as f:
+            return (_assinatura(f, 0, min(fim, BYTES_ASSINATURA)) == posicao['inicio']
+                    and _assinatura(f, max(0, fim - BYTES_ASSINATURA), fim) == posicao['fim'])
+
+    def novos_blocos(self, extras=()):
+        """Blocos (como extracao_latencias.blocos_captura) com as linhas depois da posição salva."""
+        if tem_colunar(self.arquivo):
+            yield from self._blocos_colunares(extras)
+        elif os.path.exists(self.arquivo):
+            yield from self._blocos_csv(extras)
+
+    def _blocos_colunares(self, extras):
+        pasta = pasta_colunar(self.arquivo)
+        lidos = self.posicao['segmentos'] if self.posicao else 0
+        segmentos = listar_segmentos(pasta)[lidos:]
+        linhas = self.linhas
+        for segmento in segmentos:
+            for bloco in blocos_colunares(pasta, extras=extras, segmentos=[segmento]):
+                linhas += len(bloco['rx'])
+                self.linhas_novas += len(bloco['rx'])
+                yield bloco
+            lidos += 1
+            self.posicao = {'origem': 'colunar', 'segmentos': lidos, 'ultimo_segmento': segmento, 'linhas': linhas}
+
+    def _blocos_csv(self, extras):
+        encoding, erros = detectar_encoding(self.arquivo)
+        if encoding.startswith('utf-16'):
+            # Sem como cortar em bytes de fim de linha: lê tudo e não guarda posição
+            for bloco in blocos_captura(self.arquivo, extras=extras):
+                self.linhas_novas += len(bloco['rx'])
+                yield bloco
+            self.posicao = None
+            return
+        with open(self.arquivo, 'rb') as f:
+            if self.posicao is None:
+                primeira = f.readline()
+                if not primeira.endswith(b'\n'):
+                    return
+                cabecalho = next(csv.reader([primeira.decode(encoding, erros).strip('\r\n')]))
+                linhas, inicio = 0, f.tell()
+            else:
+                cabecalho, linhas, inicio = self.posicao['cabecalho'], self.posicao['linhas'], self.posicao['bytes']
+            f.seek(inicio)
+            resto = b''
+            while True:
+                dados = f.read(BYTES_BLOCO)
+                if not dados:
+                    break
+                dados = resto + dados
+                corte = dados.rfind(b'\n') + 1
+                completas, resto = dados[:corte], dados[corte:]
+                if not completas:
+                    continue
+                df = pd.read_csv(io.BytesIO(completas), header=None, names=cabecalho,
+                                 encoding=encoding, encoding_errors=erros, skip_blank_lines=True)
+                inicio += len(completas)
+                linhas += len(df)
+                self.linhas_novas += len(df)
+                if len(df):
+                    yield bloco_de_dataframe(df, extras)
+            self.posicao = {
+                'origem': 'csv', 'bytes': inicio, 'linhas': linhas, 'cabecalho': cabecalho,
+                'inicio': _assinatura(f, 0, min(inicio, BYTES_ASSINATURA)),
+                'fim': _assinatura(f, max(0, inicio - BYTES_ASSINATURA), inicio),
+            }
+
+
+def _informar(captura):
+    origem = 'do começo' if captura.reiniciada or captura.linhas == captura.linhas_novas else 'novas'
+    print(f"{captura.arquivo}: {captura.linhas_novas} linhas {origem} ({captura.linhas} no total)")
+
+
+def estatisticas_latencias_incremental(arquivo_radio, arquivo_mqtt, checkpoint=None):
+    """
+    analise_streaming.estatisticas_latencias processando só o que foi acrescentado
+    às capturas desde o último checkpoint. Os valores que ainda não têm par no outro
+    arquivo (para a latência total, pareada pela posição) ficam em arquivo_pendentes,
+    limitados a MAXIMO_PENDENTES por arquivo.
+    """
+    checkpoint = checkpoint or arquivo_checkpoint(arquivo_radio, 'latencias')
+    arquivos = [arquivo_radio, arquivo_mqtt]
+    salvo = carregar_checkpoint(checkpoint, 'latencias', arquivos)
+    pendentes = carregar_pendentes(arquivo_pendentes(checkpoint), salvo['pendentes']) if salvo else None
+    posicoes = salvo['posicoes'] if salvo else [None, None]
+    radio, mqtt = (CapturaIncremental(arquivo, posicao) for arquivo, posicao in zip(arquivos, posicoes))
+    if pendentes is None or radio.posicao is None or mqtt.posicao is None:
+        # O pareamento depende dos dois arquivos: se um recomeça, os dois recomeçam
+        radio.reiniciar()
+        mqtt.reiniciar()
+        estatisticas = {chave: EstatisticaOnline() for chave in ('radio', 'mqtt', 'total')}
+        pendentes = {'radio': np.empty(0), 'mqtt': np.empty(0)}
+        pular = {'radio': 0, 'mqtt': 0}
+    else:
+        estatisticas = {chave: EstatisticaOnline.de_estado(estado) for chave, estado in salvo['estatisticas'].items()}
+        pular = salvo['pular']
+
+    novos = {}
+    for chave, captura, coluna, faixa in (('radio', radio, 'radio_latency', FAIXA_RADIO),
+                                          ('mqtt', mqtt, 'mqtt_latency', FAIXA_MQTT)):
+        partes = [pendentes[chave]]
+        for bloco in captura.novos_blocos():
+            valores = latencias_validas(bloco, coluna, faixa)
+            estatisticas[chave].atualizar(valores)
+            partes.append(valores)
+        valores = np.concatenate(partes)
+        # Posições cujo par já foi descartado por exceder MAXIMO_PENDENTES
+        descartados = min(pular[chave], len(valores))
+        pular[chave] -= descartados
+        novos[chave] = valores[descartados:]
+        _informar(captura)
+
+    n = min(len(novos['radio']), len(novos['mqtt']))
+    estatisticas['total'].atualizar(novos['radio'][:n] + novos['mqtt'][:n])
+    restantes = {chave: valores[n:] for chave, valores in novos.items()}
+    for chave, outra in (('radio', 'mqtt'), ('mqtt', 'radio')):
+        excesso = len(restantes[chave]) - MAXIMO_PENDENTES
+        if excesso > 0:
+            restantes[chave] = restantes[chave][excesso:]
+            pular[outra] += excesso
+    # Pendentes antes do checkpoint: se a gravação parar no meio, os tamanhos não batem e tudo recomeça
+    salvar_pendentes(arquivo_pendentes(checkpoint), restantes)
+    salvar_checkpoint(checkpoint, 'latencias', arquivos, {
+        'posicoes': [radio.posicao, mqtt.posicao],
+        'estatisticas': {chave: est.estado() for chave, est in estatisticas.items()},
+        'pendentes': {chave: len(valores) for chave, valores in restantes.items()},
+        'pular': pular,
+    })
+    return estatisticas
+
+
+class ResumoTimestamps:
+    """
+    Agregados de analisa_timestamp_arduino.py que podem ser atualizados bloco a bloco:
+    contagens e faixas de ID, timestamp e latência, overflows, as latências corrigidas
+    e os intervalos entre mensagens consecutivas (Arduino e sistema, em ms). A última
+    mensagem vista fica guardada para o intervalo que atravessa dois blocos.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.overflows = 0
+        self.faixas = {}
+        self.ultima = None
+        self.corrigidas = EstatisticaOnline()
+        self.intervalo_arduino = EstatisticaOnline()
+        self.intervalo_sistema = EstatisticaOnline()
+
+    def atualizar(self, bloco):
+        validos = ((bloco['id'] != AUSENTE_INT) & (bloco['timestamp'] != AUSENTE_INT)
+                   & ~np.isnan(bloco['radio_bruta']))
+        if not validos.any():
+            return
+        ids, timestamps = bloco['id'][validos], bloco['timestamp'][validos]
+        brutas, rx = bloco['radio_bruta'][validos], bloco['rx'][validos]
+        for nome, valores in (('id', ids), ('timestamp', timestamps), ('latencia', brutas)):
+            minimo, maximo = int(valores.min()), int(valores.max())
+            if nome in self.faixas:
+                minimo, maximo = min(minimo, self.faixas[nome][0]), max(maximo, self.faixas[nome][1])
+            self.faixas[nome] = [minimo, maximo]
+        self.n += len(ids)
+        self.overflows += int((brutas > LIMITE_OVERFLOW).sum())
+        self.corrigidas.atualizar(bloco['radio_latency'][validos])
+        if self.ultima is not None:
+            timestamps_anteriores = np.r_[self.ultima['timestamp'], timestamps]
+            rx_anteriores = np.r_[self.ultima['rx'], rx]
+        else:
+            timestamps_anteriores, rx_anteriores = timestamps, rx
+        self.intervalo_arduino.atualizar(np.diff(timestamps_anteriores))
+        self.intervalo_sistema.atualizar(np.diff(rx_anteriores) * 1000)
+        self.ultima = {'id': int(ids[-1]), 'timestamp': int(timestamps[-1]), 'rx': float(rx[-1])}
+
+    def combinar(self, outro):
+        """Junta o resumo de outra captura (os intervalos entre as duas não são contados)."""
+        self.n += outro.n
+        self.overflows += outro.overflows
+        for nome, (minimo, maximo) in outro.faixas.items():
+            if nome in self.faixas:
+                minimo, maximo = min(minimo, self.faixas[nome][0]), max(maximo, self.faixas[nome][1])
+            self.faixas[nome] = [minimo, maximo]
+        self.corrigidas.combinar(outro.corrigidas)
+        self.intervalo_arduino.combinar(outro.intervalo_arduino)
+        self.intervalo_sistema.combinar(outro.intervalo_sistema)
+
+    def estado(self):
+        return {
+            'n': self.n, 'overflows': self.overflows, 'faixas': self.faixas, 'ultima': self.ultima,
+            'corrigidas': self.corrigidas.estado(),
+            'intervalo_arduino': self.intervalo_arduino.estado(),
+            'intervalo_sistema': self.intervalo_sistema.estado(),
+        }
+
+    @classmethod
+    def de_estado(cls, estado):
+        resumo = cls()
+        resumo.n = estado['n']
+        resumo.overflows = estado['overflows']
+        resumo.faixas = estado['faixas']
+        resumo.ultima = estado['ultima']
+        for nome in ('corrigidas', 'intervalo_arduino', 'intervalo_sistema'):
+            setattr(resumo, nome, EstatisticaOnline.de_estado(estado[nome]))
+        return resumo
+
+
+def resumo_timestamps_incremental(arquivo_csv, checkpoint=None):
+    """ResumoTimestamps de uma captura, processando só as linhas novas desde o último checkpoint."""
+    checkpoint = checkpoint or arquivo_checkpoint(arquivo_csv, 'timestamps')
+    salvo = carregar_checkpoint(checkpoint, 'timestamps', [arquivo_csv])
+    captura = CapturaIncremental(arquivo_csv, salvo['posicoes'][0] if salvo else None)
+    resumo = ResumoTimestamps.de_estado(salvo['resumo']) if salvo and captura.posicao else ResumoTimestamps()
+    for bloco in captura.novos_blocos(extras=('id', 'timestamp', 'radio_bruta')):
+        resumo.atualizar(bloco)
+    _informar(captura)
+    salvar_checkpoint(checkpoint, 'timestamps', [arquivo_csv],
+                      {'posicoes': [captura.posicao], 'resumo': resumo.estado()})
+    return resumo
+
+
+def imprimir_resumo_timestamps(resumo):
+    """Mesmo relatório de analisar_timestamps_arduino, sem os gráficos."""
+    if not resumo.n:
+        print("Nenhum dado encontrado para análise")
+        return
+    faixas = resumo.faixas
+    print("\nAnálise de Timestamps do Arduino:")
+    print(f"Total de amostras: {resumo.n}")
+    print(f"IDs: Min={faixas['id'][0]}, Max={faixas['id'][1]}")
+    print(f"Timestamps Arduino: Min={faixas['timestamp'][0]}, Max={faixas['timestamp'][1]}")
+    print(f"Latências reportadas: Min={faixas['latencia'][0]}, Max={faixas['latencia'][1]}")
+    print(f"Número de prováveis overflows: {resumo.overflows} ({resumo.overflows / resumo.n * 100:.2f}%)")
+    if resumo.intervalo_arduino.n:
+        imprimir_resumo('Intervalo entre mensagens (Arduino)', resumo.intervalo_arduino.resumo())
+        imprimir_resumo('Intervalo entre mensagens (Sistema)', resumo.intervalo_sistema.resumo())
+    imprimir_resumo('Latências corrigidas', resumo.corrigidas.resumo())
+
+
+if __name__ == '__main__':
+    argumentos = argparse.ArgumentParser()
+    argumentos.add_argument('arquivos', nargs='+', help='rádio e MQTT (ou só a captura do rádio com --timestamps)')
+    argumentos.add_argument('--timestamps', action='store_true', help='análise de analisa_timestamp_arduino.py')
+    argumentos.add_argument('--checkpoint', help='arquivo do checkpoint (padrão: ao lado da captura)')
+    argumentos.add_argument('--reiniciar', action='store_true', help='descarta o checkpoint e processa tudo de novo')
+    opcoes = argumentos.parse_args()
+
+    analise = 'timestamps' if opcoes.timestamps else 'latencias'
+    if len(opcoes.arquivos) != (1 if opcoes.timestamps else 2):
+        argumentos.error('use um arquivo com --timestamps, senão o do rádio e o do MQTT')
+    checkpoint = opcoes.checkpoint or arquivo_checkpoint(opcoes.arquivos[0], analise)
+    if opcoes.reiniciar and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    inicio = time.perf_counter()
+    if opcoes.timestamps:
+        imprimir_resumo_timestamps(resumo_timestamps_incremental(opcoes.arquivos[0], checkpoint))
+    else:
+        resumir(estatisticas_latencias_incremental(*opcoes.arquivos, checkpoint))
+    print(f"\nTempo: {time.perf_counter() - inicio:.1f} s")
@@ -0,0 +1,264 @@
+import argparse
+import contextlib
+import csv
+import glob
+import io
+import math
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from analise_incremental import ResumoTimestamps, imprimir_resumo_timestamps
+from analise_streaming import estatisticas_blocos
+from estatisticas_online import EstatisticaOnline, imprimir_resumo
+from extracao_latencias import blocos_captura, carregar_chegadas
+from juncao_fontes import Fonte, juntar_fontes
+
+# Análise em lote de uma campanha: várias sessões (uma pasta por lançamento, com os
+# mesmos nomes de arquivo que os scripts usam) analisadas em paralelo, uma sessão por
+# processo (ProcessPoolExecutor, um por núcleo).
+#
+# Cada sessão calcula, lendo cada captura uma vez:
+#   - latências rádio/MQTT/total (as estatísticas de compara_latencia_corrigido.py)
+#   - perda e atraso de cada fonte MQTT em relação ao rádio (juncao_fontes.py)
+#   - o resumo de timestamps de analisa_timestamp_arduino.py
+# e devolve os agregados serializáveis (estatisticas_online.py). A campanha combina
+# os agregados das sessões, então os números da campanha são os de todas as amostras
+# juntas e não a média das médias. O resultado é uma tabela CSV com uma linha por
+# sessão e um resumo no terminal.
+#
+# Uso:
+#   python analise_lote.py campanha/                 (cada subpasta é uma sessão)
+#   python analise_lote.py 'campanha/lancamento_*' --saida campanha.csv --processos 4
+
+# Arquivos de uma sessão, na ordem de preferência de cada papel
+ARQUIVOS_RADIO = ['dados_radio_corrigido.csv', 'dados_radio.csv']
+ARQUIVOS_LATENCIA_MQTT = ['dados_mqtt_dashboard.csv', 'dados_mqtt.csv']
+# Fontes MQTT comparadas com o rádio para perda e atraso
+FONTES_MQTT = {
+    'dashboard': 'dados_mqtt_dashboard.csv',
+    'mqtt': 'dados_mqtt.csv',
+    'local': 'dados_mqtt_local.csv',
+    'nuvem': 'dados_mqtt_nuvem.csv',
+}
+ARQUIVO_SAIDA = 'campanha.csv'
+
+
+def _primeiro_existente(pasta, nomes):
+    for nome in nomes:
+        caminho = os.path.join(pasta, nome)
+        if os.path.exists(caminho):
+            return caminho
+    return None
+
+
+def _e_sessao(pasta):
+    return _primeiro_existente(pasta, ARQUIVOS_RADIO + list(FONTES_MQTT.values())) is not None
+
+
+def encontrar_sessoes(padroes):
+    """
+    Pastas de sessão a partir de pastas ou padrões glob: uma pasta com capturas é uma
+    sessão; uma pasta sem capturas contribui com as subpastas que são sessões.
+    """
+    sessoes = []
+    for padrao in padroes:
+        for caminho in sorted(glob.glob(padrao)):
+            if not os.path.isdir(caminho):
+                continue
+            if _e_sessao(caminho):
+                sessoes.append(caminho)
+            else:
+                sessoes.extend(os.path.join(caminho, nome) for nome in sorted(os.listdir(caminho))
+                               if os.path.isdir(os.path.join(caminho, nome)) and _e_sessao(os.path.join(caminho, nome)))
+    # Sem repetir a mesma sessão vinda de dois padrões
+    return list(dict.fromkeys(os.path.normpath(sessao) for sessao in sessoes))
+
+
+def _coletando(blocos, ids, rx, acao=None):
+    """Repassa os blocos guardando id e rx (para a junção) e chamando 'acao' em cada um."""
+    for bloco in blocos:
+        ids.append(bloco['id'])
+        rx.append(bloco['rx'])
+        if acao is not None:
+            acao(bloco)
+        yield bloco
+
+
+def _fonte(nome, ids, rx):
+    return Fonte(nome, np.concatenate(ids) if ids else [], np.concatenate(rx) if rx else [])
+
+
+def analisar_sessao(pasta):
+    """
+    Analisa uma sessão. Retorna um dicionário serializável com os agregados (estado()
+    das estatísticas online), as contagens de perda por fonte e o erro, se houve.
+    A saída dos scripts chamados fica num buffer, para os processos não se misturarem no terminal.
+    """
+    inicio = time.perf_counter()
+    resultado = {'sessao': pasta, 'erro': None}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            resultado.update(_analisar_sessao(pasta))
+    except Exception:
+        resultado['erro'] = traceback.format_exc(limit=3).strip().splitlines()[-1]
+    resultado['tempo'] = time.perf_counter() - inicio
+    return resultado
+
+
+def _analisar_sessao(pasta):
+    arquivo_radio = _primeiro_existente(pasta, ARQUIVOS_RADIO)
+    arquivo_mqtt = _primeiro_existente(pasta, ARQUIVOS_LATENCIA_MQTT)
+    timestamps = ResumoTimestamps()
+    ids_radio, rx_radio, ids_mqtt, rx_mqtt = [], [], [], []
+
+    # Rádio e MQTT lidos uma vez cada: os mesmos blocos alimentam as latências, o resumo
+    # de timestamps e as colunas id/rx da junção
+    blocos_radio = (_coletando(blocos_captura(arquivo_radio, extras=('id', 'timestamp', 'radio_bruta')),
+                               ids_radio, rx_radio, timestamps.atualizar) if arquivo_radio else iter(()))
+    blocos_mqtt = (_coletando(blocos_captura(arquivo_mqtt, extras=('id',)), ids_mqtt, rx_mqtt)
+                   if arquivo_mqtt else iter(()))
+    estatisticas = estatisticas_blocos(blocos_radio, blocos_mqtt)
+
+    fontes = [_fonte('radio', ids_radio, rx_radio)]
+    for nome, arquivo in FONTES_MQTT.items():
+        caminho = os.path.join(pasta, arquivo)
+        if caminho == arquivo_mqtt:
+            fontes.append(_fonte(nome, ids_mqtt, rx_mqtt))
+        elif os.path.exists(caminho):
+            chegadas = carregar_chegadas(caminho)
+            fontes.append(Fonte(nome, chegadas['id'], chegadas['rx']))
+    tabela = juntar_fontes(fontes)
+    perdas = {}
+    enviadas = int(tabela.presente('radio').sum())
+    for nome in tabela.fontes[1:]:
+        _, deltas = tabela.delta('radio', nome)
+        atraso = EstatisticaOnline()
+        atraso.atualizar(deltas * 1000)
+        perdas[nome] = {'enviadas': enviadas, 'comuns': len(deltas), 'atraso': atraso.estado()}
+
+    return {
+        'arquivos': {'radio': arquivo_radio, 'mqtt': arquivo_mqtt},
+        'estatisticas': {chave: est.estado() for chave, est in estatisticas.items()},
+        'perdas': perdas,
+        'timestamps': timestamps.estado(),
+    }
+
+
+def analisar_campanha(sessoes, processos=None):
+    """Analisa as sessões em paralelo. Retorna os resultados na ordem das sessões."""
+    resultados = {}
+    if processos == 1 or len(sessoes) <= 1:
+        for sessao in sessoes:
+            resultados[sessao] = analisar_sessao(sessao)
+            _informar(resultados[sessao], len(resultados), len(sessoes))
+    else:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            futuros = {executor.submit(analisar_sessao, sessao): sessao for sessao in sessoes}
+            for futuro in as_completed(futuros):
+                resultados[futuros[futuro]] = futuro.result()
+                _informar(resultados[futuros[futuro]], len(resultados), len(sessoes))
+    return [resultados[sessao] for sessao in sessoes]
+
+
+def _informar(resultado, feitas, total):
+    situacao = f"ERRO: {resultado['erro']}" if resultado['erro'] else f"{resultado['tempo']:.1f} s"
+    print(f"[{feitas}/{total}] {resultado['sessao']}: {situacao}")
+
+
+def _valor(resumo, chave):
+    return '' if not resumo['n'] or math.isnan(resumo[chave]) else round(resumo[chave], 3)
+
+
+def linha_tabela(resultado):
+    """Linha da tabela da campanha para uma sessão."""
+    linha = {'sessao': resultado['sessao'], 'erro': resultado['erro'] or ''}
+    if resultado['erro']:
+        return linha
+    for chave, estado in resultado['estatisticas'].items():
+        resumo = EstatisticaOnline.de_estado(estado).resumo()
+        linha[f'{chave}_n'] = resumo['n']
+        for medida in ('avg', 'median', 'p95', 'p99'):
+            linha[f'{chave}_{medida}'] = _valor(resumo, medida)
+    for nome, perda in resultado['perdas'].items():
+        linha[f'perda_{nome}'] = (round(1 - perda['comuns'] / perda['enviadas'], 4) if perda['enviadas'] else '')
+        linha[f'atraso_{nome}_median'] = _valor(EstatisticaOnline.de_estado(perda['atraso']).resumo(), 'median')
+    timestamps = ResumoTimestamps.de_estado(resultado['timestamps'])
+    linha['amostras_arduino'] = timestamps.n
+    linha['overflows'] = timestamps.overflows
+    linha['intervalo_arduino_avg'] = _valor(timestamps.intervalo_arduino.resumo(), 'avg')
+    return linha
+
+
+def salvar_tabela(resultados, arquivo_csv):
+    linhas = [linha_tabela(resultado) for resultado in resultados]
+    todas = list(dict.fromkeys(coluna for linha in linhas for coluna in linha))
+    # Perdas depois das latências e antes dos timestamps, 'erro' por último (as fontes
+    # MQTT variam de sessão para sessão)
+    perdas = [coluna for coluna in todas if coluna.startswith(('perda_', 'atraso_'))]
+    colunas = [coluna for coluna in todas if coluna not in perdas and coluna != 'erro']
+    posicao = colunas.index('amostras_arduino') if 'amostras_arduino' in colunas else len(colunas)
+    colunas[posicao:posicao] = perdas
+    colunas.append('erro')
+    with open(arquivo_csv, 'w', newline='', encoding='utf-8') as f:
+        escritor = csv.DictWriter(f, fieldnames=colunas)
+        escritor.writeheader()
+        escritor.writerows(linhas)
+
+
+def combinar_campanha(resultados):
+    """Junta os agregados das sessões sem erro: (estatísticas, perdas, resumo de timestamps)."""
+    estatisticas = {chave: EstatisticaOnline() for chave in ('radio', 'mqtt', 'total')}
+    perdas = {}
+    timestamps = ResumoTimestamps()
+    for resultado in resultados:
+        if resultado['erro']:
+            continue
+        for chave, estado in resultado['estatisticas'].items():
+            estatisticas[chave].combinar(EstatisticaOnline.de_estado(estado))
+        for nome, perda in resultado['perdas'].items():
+            total = perdas.setdefault(nome, {'enviadas': 0, 'comuns': 0, 'atraso': EstatisticaOnline()})
+            total['enviadas'] += perda['enviadas']
+            total['comuns'] += perda['comuns']
+            total['atraso'].combinar(EstatisticaOnline.de_estado(perda['atraso']))
+        timestamps.combinar(ResumoTimestamps.de_estado(resultado['timestamps']))
+    return estatisticas, perdas, timestamps
+
+
+def imprimir_campanha(resultados):
+    estatisticas, perdas, timestamps = combinar_campanha(resultados)
+    validas = sum(1 for resultado in resultados if not resultado['erro'])
+    print(f"\nCampanha: {validas} de {len(resultados)} sessões analisadas")
+    titulos = {'radio': 'Latência Rádio', 'mqtt': 'Latência MQTT', 'total': 'Latência Total (Rádio + MQTT)'}
+    for chave, estatistica in estatisticas.items():
+        if estatistica.n:
+            imprimir_resumo(f'{titulos[chave]} (campanha)', estatistica.resumo())
+    for nome, perda in perdas.items():
+        if perda['enviadas']:
+            print(f"\nPerda rádio -> {nome}: {(1 - perda['comuns'] / perda['enviadas']) * 100:.2f}% "
+                  f"({perda['enviadas'] - perda['comuns']} de {perda['enviadas']} mensagens)")
+        if perda['atraso'].n:
+            imprimir_resumo(f'Atraso {nome} - rádio (campanha)', perda['atraso'].resumo())
+    imprimir_resumo_timestamps(timestamps)
+
+
+if __name__ == '__main__':
+    argumentos = argparse.ArgumentParser()
+    argumentos.add_argument('sessoes', nargs='+', help='pastas de sessão, pastas de campanha ou padrões glob')
+    argumentos.add_argument('--processos', type=int, default=os.cpu_count(), help='processos em paralelo')
+    argumentos.add_argument('--saida', default=ARQUIVO_SAIDA, help='tabela CSV com uma linha por sessão')
+    opcoes = argumentos.parse_args()
+
+    sessoes = encontrar_sessoes(opcoes.sessoes)
+    if not sessoes:
+        raise SystemExit("Nenhuma sessão encontrada")
+    inicio = time.perf_counter()
+    print(f"{len(sessoes)} sessões, {min(opcoes.processos, len(sessoes))} processos")
+    resultados = analisar_campanha(sessoes, opcoes.processos)
+    salvar_tabela(resultados, opcoes.saida)
+    imprimir_campanha(resultados)
+    print(f"\nTabela: {opcoes.saida}")
+    print(f"Tempo: {time.perf_counter() - inicio:.1f} s")
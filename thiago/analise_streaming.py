@@ -0,0 +1,176 @@
+import argparse
+import os
+import time
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from estatisticas_online import EstatisticaOnline, imprimir_resumo
+from extracao_latencias import TAMANHO_BLOCO, blocos_captura, filtrar_faixa
+from juncao_fontes import imprimir_pareamento, parear_latencias_mqtt
+
+# Modo streaming das análises de latência: lê as capturas em blocos (pasta colunar
+# ou read_csv com chunksize) e mantém só estatísticas online (estatisticas_online.py),
+# então capturas de vários GB são resumidas com memória limitada. Não há gráfico de
+# linhas (precisaria de todas as amostras), só o de barras com as médias e o p95.
+#
+# Usado por compara_latencia.py, compara_latencia_corrigido.py e
+# latencia_estimada_mqtt.py com MODO_STREAMING = True ou --streaming.
+#
+# Uso direto:
+#   python analise_streaming.py dados_radio.csv dados_mqtt_dashboard.csv
+#   python analise_streaming.py --estimada dados_radio.csv dados_mqtt.csv
+
+# Mesmos filtros de plotar_comparacao_latencias: (mínimo, máximo, substituto)
+FAIXA_RADIO = (0, 1000, 50)
+FAIXA_MQTT = (0, 500, 15)
+
+
+def emparelhar(blocos_a, blocos_b):
+    """
+    Junta dois fluxos de arrays pela posição: gera pares (a, b) do mesmo tamanho até
+    um dos fluxos acabar, guardando só a sobra do bloco em andamento.
+    """
+    blocos_a, blocos_b = iter(blocos_a), iter(blocos_b)
+    resto_a = resto_b = np.empty(0)
+    while True:
+        while not len(resto_a):
+            resto_a = next(blocos_a, None)
+            if resto_a is None:
+                return
+        while not len(resto_b):
+            resto_b = next(blocos_b, None)
+            if resto_b is None:
+                return
+        n = min(len(resto_a), len(resto_b))
+        yield resto_a[:n], resto_b[:n]
+        resto_a, resto_b = resto_a[n:], resto_b[n:]
+
+
+def _acumulando(blocos, estatistica):
+    """Repassa os blocos atualizando 'estatistica' com cada um."""
+    for bloco in blocos:
+        estatistica.atualizar(bloco)
+        yield bloco
+
+
+def latencias_validas(bloco, coluna, faixa):
+    """Latências de uma coluna de um bloco de blocos_captura, sem NaN e com o filtro de faixa."""
+    valores = bloco[coluna]
+    valores = valores[~np.isnan(valores)]
+    if faixa is not None:
+        valores = filtrar_faixa(valores, *faixa)[0]
+    return valores
+
+
+def _latencias(blocos, coluna, faixa):
+    """Latências válidas de uma coluna, bloco a bloco, com o filtro de faixa aplicado."""
+    for bloco in blocos:
+        yield latencias_validas(bloco, coluna, faixa)
+
+
+def estatisticas_latencias(arquivo_radio, arquivo_mqtt, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Estatísticas de plotar_comparacao_latencias em modo streaming.
+    Rádio e MQTT usam todas as amostras de cada arquivo; o total usa os pares
+    (rádio[i] + MQTT[i]) até o fim do arquivo mais curto.
+    """
+    return estatisticas_blocos(blocos_captura(arquivo_radio, tamanho_bloco),
+                               blocos_captura(arquivo_mqtt, tamanho_bloco))
+
+
+def estatisticas_blocos(blocos_radio, blocos_mqtt):
+    """estatisticas_latencias a partir de fluxos de blocos já abertos (de blocos_captura)."""
+    estatisticas = {'radio': EstatisticaOnline(), 'mqtt': EstatisticaOnline(), 'total': EstatisticaOnline()}
+    radio = _acumulando(_latencias(blocos_radio, 'radio_latency', FAIXA_RADIO), estatisticas['radio'])
+    mqtt = _acumulando(_latencias(blocos_mqtt, 'mqtt_latency', FAIXA_MQTT), estatisticas['mqtt'])
+    for r, m in emparelhar(radio, mqtt):
+        estatisticas['total'].atualizar(r + m)
+    # O que sobrou do arquivo mais longo ainda conta para a estatística dele
+    for _ in radio:
+        pass
+    for _ in mqtt:
+        pass
+    return estatisticas
+
+
+def estatisticas_estimada(radio_csv, mqtt_csv, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Estatísticas de estimar_latencia_mqtt: a latência MQTT estimada é a diferença entre
+    as chegadas da mesma mensagem nos dois arquivos (juncao_fontes.parear_latencias_mqtt,
+    por ID ou pela chegada anterior). O pareamento precisa das colunas id e rx inteiras
+    (lidas em blocos, ~24 bytes por linha), não do texto das capturas.
+    """
+    latencias, contagens = parear_latencias_mqtt(radio_csv, mqtt_csv)
+    imprimir_pareamento(contagens)
+    estatisticas = {'radio': EstatisticaOnline(), 'mqtt': EstatisticaOnline(), 'total': EstatisticaOnline()}
+    for inicio in range(0, len(latencias['mqtt']), tamanho_bloco):
+        radio = latencias['radio'][inicio:inicio + tamanho_bloco]
+        mqtt = latencias['mqtt'][inicio:inicio + tamanho_bloco]
+        estatisticas['radio'].atualizar(radio)
+        estatisticas['mqtt'].atualizar(mqtt)
+        estatisticas['total'].atualizar(radio + mqtt)
+    return estatisticas
+
+
+def plotar_medias(resumos, arquivo_png):
+    """Gráfico de barras das médias com o p95 marcado."""
+    nomes = {'radio': 'Rádio', 'mqtt': 'MQTT', 'total': 'Total (Rádio + MQTT)'}
+    chaves = [chave for chave in ('radio', 'mqtt', 'total') if resumos[chave]['n']]
+    if not chaves:
+        return
+    medias = [resumos[chave]['avg'] for chave in chaves]
+    p95 = [resumos[chave]['p95'] for chave in chaves]
+    plt.figure(figsize=(10, 6))
+    barras = plt.bar([nomes[chave] for chave in chaves], medias, color=['blue', 'red', 'green'][:len(chaves)])
+    plt.scatter([nomes[chave] for chave in chaves], p95, color='black', marker='_', s=800, label='p95', zorder=3)
+    for barra in barras:
+        altura = barra.get_height()
+        plt.text(barra.get_x() + barra.get_width() / 2., altura, f'{altura:.2f} ms', ha='center', va='bottom')
+    plt.title('Latência Média por Meio de Transmissão')
+    plt.ylabel('Latência (ms)')
+    plt.grid(axis='y', linestyle='--', alpha=0.7)
+    plt.legend()
+    plt.savefig(arquivo_png)
+    plt.close()
+
+
+def resumir(estatisticas, arquivo_png=None):
+    """Imprime as estatísticas (e a comparação rádio x MQTT) e salva o gráfico de barras."""
+    resumos = {chave: est.resumo() for chave, est in estatisticas.items()}
+    titulos = {'radio': 'Latência Rádio', 'mqtt': 'Latência MQTT', 'total': 'Latência Total (Rádio + MQTT)'}
+    for chave, resumo in resumos.items():
+        if resumo['n']:
+            imprimir_resumo(titulos[chave], resumo)
+        else:
+            print(f"\n{titulos[chave]}: nenhuma amostra")
+    radio, mqtt = resumos['radio'], resumos['mqtt']
+    if radio['n'] and mqtt['n'] and radio['avg']:
+        print("\nAnálise Comparativa:")
+        print(f"A transmissão via MQTT adiciona {mqtt['avg']:.2f}ms de latência")
+        print(f"Isso representa um aumento de {(mqtt['avg'] / radio['avg']) * 100:.2f}% sobre a latência do rádio")
+    if arquivo_png:
+        plotar_medias(resumos, arquivo_png)
+    return resumos
+
+
+if __name__ == '__main__':
+    argumentos = argparse.ArgumentParser()
+    argumentos.add_argument('radio_csv')
+    argumentos.add_argument('mqtt_csv')
+    argumentos.add_argument('--estimada', action='store_true',
+                            help='latência MQTT estimada pelas chegadas da mesma mensagem (latencia_estimada_mqtt.py)')
+    argumentos.add_argument('--bloco', type=int, default=TAMANHO_BLOCO, help='linhas por bloco')
+    argumentos.add_argument('--grafico', help='arquivo PNG do gráfico de barras')
+    opcoes = argumentos.parse_args()
+
+    for caminho in (opcoes.radio_csv, opcoes.mqtt_csv):
+        if not os.path.exists(caminho):
+            raise SystemExit(f"Arquivo {caminho} não encontrado")
+    inicio = time.perf_counter()
+    if opcoes.estimada:
+        estatisticas = estatisticas_estimada(opcoes.radio_csv, opcoes.mqtt_csv, opcoes.bloco)
+    else:
+        estatisticas = estatisticas_latencias(opcoes.radio_csv, opcoes.mqtt_csv, opcoes.bloco)
+    resumir(estatisticas, opcoes.grafico)
+    print(f"\nTempo: {time.perf_counter() - inicio:.1f} s")
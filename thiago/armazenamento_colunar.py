@@ -0,0 +1,339 @@
+import csv
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+import numpy as np
+
+from deteccao_encoding import detectar_encoding
+from parser_telemetria import extrair_registro
+
+# Armazenamento colunar das capturas em segmentos NumPy (.npy).
+#
+# Cada captura vira uma pasta ao lado do CSV (dados_radio.csv -> dados_radio.colunas/):
+#
+#   dados_radio.colunas/
+#     esquema.json              nomes e tipos das colunas
+#     segmento_000001/id.npy    um arquivo por coluna em cada segmento
+#     segmento_000001/rx.npy
+#     ...
+#
+# Os segmentos são gravados inteiros (em uma pasta temporária renomeada no final),
+# então uma captura interrompida perde no máximo o segmento em andamento.
+# A leitura abre só as colunas pedidas, com np.load(mmap_mode='r'), sem analisar texto.
+#
+# A pasta só é usada no lugar do CSV quando está em dia com ele: o gravador criado com
+# csv_origem guarda em origem.json o tamanho do CSV ao fechar, e os leitores (tem_colunar,
+# carregar_captura) voltam para o CSV se o tamanho mudou (captura em andamento, queda do
+# processo ou linhas acrescentadas por outro script). Ao continuar uma pasta que não está
+# em dia, o gravador a refaz primeiro a partir do CSV existente, para que as linhas
+# antigas não sumam da leitura colunar.
+#
+# Valores ausentes: NaN nas colunas float e AUSENTE_INT (-1) nas colunas inteiras.
+
+ESQUEMA = [
+    ('id', 'i8'),
+    ('timestamp', 'i8'),        # millis() do Arduino
+    ('rx', 'f8'),               # instante de recepção no computador (time.time(), s)
+    ('intervalo', 'i8'),
+    ('radio_latency', 'f8'),    # ms
+    ('mqtt_latency', 'f8'),     # ms (só nas capturas do bridge)
+    ('temperatura', 'f8'),
+    ('pressao', 'f8'),
+    ('accel_x', 'f8'),
+    ('accel_y', 'f8'),
+    ('accel_z', 'f8'),
+    ('gyro_x', 'f8'),
+    ('gyro_y', 'f8'),
+    ('gyro_z', 'f8'),
+    ('co2', 'f8'),
+    ('no2', 'f8'),
+    ('uv', 'f8'),
+]
+COLUNAS = [nome for nome, _ in ESQUEMA]
+TIPOS = dict(ESQUEMA)
+AUSENTE_INT = -1
+ARQUIVO_ORIGEM = 'origem.json'
+
+# Colunas que vêm direto do Registro do parser
+_COLUNAS_REGISTRO = [nome for nome in COLUNAS if nome not in ('rx', 'mqtt_latency')]
+
+
+def pasta_colunar(caminho_csv):
+    """Pasta colunar correspondente a um CSV de captura."""
+    return os.path.splitext(caminho_csv)[0] + '.colunas'
+
+
+def _segmentos(pasta):
+    if not os.path.isdir(pasta):
+        return []
+    return sorted(nome for nome in os.listdir(pasta) if nome.startswith('segmento_') and not nome.endswith('.tmp'))
+
+
+def _gravar_origem(pasta, caminho_csv):
+    """Registra o tamanho do CSV que os segmentos da pasta cobrem."""
+    tamanho = os.path.getsize(caminho_csv) if os.path.exists(caminho_csv) else None
+    temporario = os.path.join(pasta, ARQUIVO_ORIGEM + '.tmp')
+    with open(temporario, 'w') as f:
+        json.dump({'csv': os.path.basename(caminho_csv), 'bytes': tamanho}, f)
+    os.replace(temporario, os.path.join(pasta, ARQUIVO_ORIGEM))
+
+
+def _em_dia(pasta, caminho_csv):
+    """True se a pasta cobre o CSV inteiro (ou se o CSV não existe, como com rotação)."""
+    if not os.path.exists(caminho_csv):
+        return True
+    try:
+        with open(os.path.join(pasta, ARQUIVO_ORIGEM)) as f:
+            origem = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return origem.get('bytes') == os.path.getsize(caminho_csv)
+
+
+class GravadorColunar:
+    """
+    Acumula amostras em arrays por coluna e grava um segmento a cada
+    'tamanho_segmento' amostras ou 'intervalo_segmento_s' segundos.
+    Uma pasta existente é continuada (os segmentos novos são numerados depois dos antigos),
+    a não ser que recriar=True, que apaga os segmentos antigos (como abrir um CSV com 'w').
+
+    csv_origem: o CSV gravado junto com a pasta. Ao continuar, uma pasta que não está em
+    dia com ele é refeita a partir do CSV; ao fechar, o tamanho do CSV é registrado (feche
+    o CSV antes). Sem csv_origem a pasta nunca é considerada em dia com um CSV existente.
+    """
+
+    def __init__(self, pasta, tamanho_segmento=4096, intervalo_segmento_s=10, recriar=False,
+                 relogio=time.time, csv_origem=None):
+        self.pasta = pasta
+        self.csv_origem = csv_origem
+        self.tamanho_segmento = tamanho_segmento
+        self.intervalo_segmento = intervalo_segmento_s
+        self.relogio = relogio
+        self._lock = threading.Lock()
+        # Continuar uma pasta que não cobre o CSV existente: refaz a partir dele
+        refazer = (not recriar and csv_origem is not None and os.path.exists(csv_origem)
+                   and os.path.getsize(csv_origem) > 0 and not _em_dia(pasta, csv_origem))
+        existentes = _segmentos(pasta)
+        self._numero = int(existentes[-1].split('_')[1]) if existentes else 0
+        if (recriar or refazer) and os.path.isdir(pasta):
+            shutil.rmtree(pasta)
+        if recriar:
+            self._numero = 0
+        # Refeita, a numeração continua depois dos segmentos antigos: quem guardou o nome do
+        # último segmento lido (analise_incremental.py) não confunde a pasta nova com a antiga
+        os.makedirs(pasta, exist_ok=True)
+        with open(os.path.join(pasta, 'esquema.json'), 'w') as f:
+            json.dump({'colunas': ESQUEMA, 'ausente_int': AUSENTE_INT}, f, indent=2)
+        self._buffers = {nome: np.empty(tamanho_segmento, dtype=tipo) for nome, tipo in ESQUEMA}
+        self._n = 0
+        self._inicio = relogio()
+        self.amostras = 0
+        self.segmentos = 0
+        if refazer:
+            self.escrever_colunas(_ler_csv(csv_origem))
+
+    def escrever(self, registro, rx, mqtt_latency=None):
+        """Acrescenta uma amostra. rx é o instante de recepção (s); registro pode ser None."""
+        with self._lock:
+            self._escrever(registro, rx, mqtt_latency)
+
+    def _escrever(self, registro, rx, mqtt_latency):
+        i = self._n
+        if i == 0:
+            # O intervalo do segmento conta a partir da sua primeira amostra
+            self._inicio = self.relogio()
+        b = self._buffers
+        if registro is not None:
+            for nome in _COLUNAS_REGISTRO:
+                valor = getattr(registro, nome)
+                b[nome][i] = (AUSENTE_INT if TIPOS[nome] == 'i8' else np.nan) if valor is None else valor
+        else:
+            for nome in _COLUNAS_REGISTRO:
+                b[nome][i] = AUSENTE_INT if TIPOS[nome] == 'i8' else np.nan
+        b['rx'][i] = rx
+        b['mqtt_latency'][i] = np.nan if mqtt_latency is None else mqtt_latency
+        self._n += 1
+        self.amostras += 1
+        if self._n >= self.tamanho_segmento or self.relogio() - self._inicio >= self.intervalo_segmento:
+            self._gravar_segmento()
+
+    def verificar(self):
+        """Grava o segmento em andamento se o intervalo venceu."""
+        with self._lock:
+            if self._n and self.relogio() - self._inicio >= self.intervalo_segmento:
+                self._gravar_segmento()
+
+    def tempo_para_descarga(self):
+        """Segundos até o segmento em andamento vencer (None se está vazio)."""
+        if not self._n:
+            return None
+        return max(0.0, self.intervalo_segmento - (self.relogio() - self._inicio))
+
+    def _salvar_segmento(self, colunas):
+        self._numero += 1
+        destino = os.path.join(self.pasta, f'segmento_{self._numero:06d}')
+        temporario = destino + '.tmp'
+        os.makedirs(temporario, exist_ok=True)
+        for nome, tipo in ESQUEMA:
+            np.save(os.path.join(temporario, nome + '.npy'), np.asarray(colunas[nome], dtype=tipo))
+        os.replace(temporario, destino)
+        self.segmentos += 1
+
+    def gravar_segmento(self):
+        with self._lock:
+            self._gravar_segmento()
+
+    def _gravar_segmento(self):
+        if self._n:
+            self._salvar_segmento({nome: buffer[:self._n] for nome, buffer in self._buffers.items()})
+            self._n = 0
+
+    def escrever_colunas(self, colunas):
+        """Grava um bloco já em colunas (dicionário nome -> array) como um segmento."""
+        with self._lock:
+            self._gravar_segmento()
+            n = len(colunas['rx'])
+            if n:
+                self._salvar_segmento(colunas)
+                self.amostras += n
+
+    def fechar(self):
+        self.gravar_segmento()
+        if self.csv_origem is not None:
+            _gravar_origem(self.pasta, self.csv_origem)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
+
+
+def ler_colunas(pasta, colunas=None):
+    """
+    Lê as colunas pedidas (todas se None) de uma pasta colunar.
+    Retorna um dicionário nome -> array NumPy com todas as amostras.
+    """
+    colunas = COLUNAS if colunas is None else list(colunas)
+    desconhecidas = set(colunas) - set(COLUNAS)
+    if desconhecidas:
+        raise ValueError(f"Colunas desconhecidas: {sorted(desconhecidas)}")
+    partes = {nome: [] for nome in colunas}
+    for segmento in _segmentos(pasta):
+        for nome in colunas:
+            partes[nome].append(np.load(os.path.join(pasta, segmento, nome + '.npy'), mmap_mode='r'))
+    return {
+        nome: np.concatenate(arrays) if arrays else np.empty(0, dtype=TIPOS[nome])
+        for nome, arrays in partes.items()
+    }
+
+
+def listar_segmentos(pasta):
+    """Nomes dos segmentos completos de uma pasta colunar, em ordem de gravação."""
+    return _segmentos(pasta)
+
+
+def iterar_colunas(pasta, colunas=None, tamanho_bloco=None, segmentos=None):
+    """
+    Como ler_colunas, mas gera um dicionário por bloco em vez de juntar tudo:
+    cada segmento, dividido em blocos de até 'tamanho_bloco' amostras. Os arrays são
+    views do mmap, então a memória usada é a de um bloco.
+    'segmentos' restringe a leitura a esses nomes (de listar_segmentos).
+    """
+    colunas = COLUNAS if colunas is None else list(colunas)
+    desconhecidas = set(colunas) - set(COLUNAS)
+    if desconhecidas:
+        raise ValueError(f"Colunas desconhecidas: {sorted(desconhecidas)}")
+    for segmento in _segmentos(pasta) if segmentos is None else segmentos:
+        arrays = {nome: np.load(os.path.join(pasta, segmento, nome + '.npy'), mmap_mode='r') for nome in colunas}
+        n = len(next(iter(arrays.values()))) if arrays else 0
+        passo = tamanho_bloco or n or 1
+        for inicio in range(0, n, passo):
+            yield {nome: array[inicio:inicio + passo] for nome, array in arrays.items()}
+
+
+def tem_colunar(caminho_csv):
+    """True se a captura já tem pasta colunar com segmentos, em dia com o CSV."""
+    pasta = pasta_colunar(caminho_csv)
+    return bool(_segmentos(pasta)) and _em_dia(pasta, caminho_csv)
+
+
+def _ler_csv(caminho_csv, encoding=None):
+    """
+    Converte um CSV de captura para colunas (em memória), analisando o texto.
+    Sem encoding, usa o detectado pelo começo do arquivo.
+    """
+    colunas = {nome: [] for nome in COLUNAS}
+    erros = 'replace'
+    if encoding is None:
+        encoding, erros = detectar_encoding(caminho_csv)
+    with open(caminho_csv, newline='', encoding=encoding, errors=erros) as f:
+        leitor = csv.DictReader(f)
+        bruto = 'valor' in (leitor.fieldnames or [])
+        for linha in leitor:
+            try:
+                rx = float(linha['timestamp'])
+            except (TypeError, ValueError, KeyError):
+                continue
+            if bruto:
+                # timestamp,valor: linha do receptor como texto
+                registro = extrair_registro(linha['valor'] or '')
+                if registro is None:
+                    continue
+                valores = {nome: getattr(registro, nome) for nome in _COLUNAS_REGISTRO}
+                valores['mqtt_latency'] = None
+            else:
+                # CSV já em colunas (dados_mqtt_dashboard.csv)
+                valores = {
+                    'id': linha.get('id'), 'radio_latency': linha.get('radio_latency'),
+                    'mqtt_latency': linha.get('mqtt_latency'), 'temperatura': linha.get('temperatura'),
+                    'pressao': linha.get('pressao'), 'accel_x': linha.get('accelX'),
+                    'accel_y': linha.get('accelY'), 'accel_z': linha.get('accelZ'),
+                    'gyro_x': linha.get('gyroX'), 'gyro_y': linha.get('gyroY'), 'gyro_z': linha.get('gyroZ'),
+                }
+            valores['rx'] = rx
+            for nome in COLUNAS:
+                valor = valores.get(nome)
+                try:
+                    valor = float(valor) if valor not in (None, '') else None
+                except ValueError:
+                    valor = None
+                if TIPOS[nome] == 'i8':
+                    valor = AUSENTE_INT if valor is None else int(valor)
+                elif valor is None:
+                    valor = np.nan
+                colunas[nome].append(valor)
+    return {nome: np.array(valores, dtype=TIPOS[nome]) for nome, valores in colunas.items()}
+
+
+def converter_csv(caminho_csv, pasta=None, encoding=None):
+    """Grava a pasta colunar de um CSV de captura existente. Retorna a pasta."""
+    pasta = pasta or pasta_colunar(caminho_csv)
+    colunas = _ler_csv(caminho_csv, encoding)
+    with GravadorColunar(pasta, recriar=True, csv_origem=caminho_csv) as gravador:
+        gravador.escrever_colunas(colunas)
+    return pasta
+
+
+def carregar_captura(caminho_csv, colunas=None, encoding=None):
+    """
+    Carrega as colunas de uma captura: da pasta colunar se ela existir e estiver em dia
+    com o CSV, senão analisando o CSV (mais lento; use converter_csv para gerar a pasta).
+    """
+    if tem_colunar(caminho_csv):
+        return ler_colunas(pasta_colunar(caminho_csv), colunas)
+    dados = _ler_csv(caminho_csv, encoding)
+    return dados if colunas is None else {nome: dados[nome] for nome in colunas}
+
+
+if __name__ == '__main__':
+    # Uso: python armazenamento_colunar.py dados_radio.csv [dados_mqtt.csv ...]
+    for caminho in sys.argv[1:]:
+        inicio = time.perf_counter()
+        pasta = converter_csv(caminho)
+        amostras = len(ler_colunas(pasta, ['rx'])['rx'])
+        print(f'{caminho} -> {pasta}: {amostras} amostras em {time.perf_counter() - inicio:.2f} s')
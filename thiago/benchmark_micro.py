@@ -0,0 +1,454 @@
+import argparse
+import contextlib
+import gc
+import importlib.util
+import json
+import os
+import platform
+import queue
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')  # As funções medidas salvam os gráficos em PNG, sem abrir janelas
+
+import numpy as np
+import pandas as pd
+
+from analisa_timestamp_arduino import analisar_timestamps_arduino
+from armazenamento_colunar import GravadorColunar, converter_csv
+from compara_desempenho_extracao import gerar_csv_sintetico
+from corrige_dados_radio import corrigir_dados_radio
+from extracao_latencias import extrair_latencias_mqtt, extrair_latencias_radio
+from gravador_csv import GravadorCSV
+from juncao_fontes import Fonte
+from parser_telemetria import extrair_colunas, extrair_registro, extrair_registros_csv, formata_valor
+from publicacao_mqtt import codificar_registro
+
+# Micro-benchmarks dos caminhos quentes de thiago/ (no estilo do asv/pytest-benchmark),
+# com dados sintéticos de 1e3 a 1e7 linhas:
+#
+#   parser       extrair_registro linha a linha, extrair_colunas, extrair_registros_csv
+#   gravação     GravadorCSV.escrever (linhas do bridge) e GravadorColunar.escrever
+#   extração     extrair_latencias_radio, extrair_latencias_mqtt, corrigir_dados_radio
+#   análise      analisar_timestamps_arduino e Fonte.de_arquivo (a leitura de id e
+#                chegada que substituiu o ler_csv_id_tempo de compara_mqtt_radio.py),
+#                do CSV e da pasta colunar
+#   bridge       on_message (só o callback da thread de rede) e processar_mensagem
+#                (parser, estatísticas e gravação), com mensagens /raw e /registro
+#
+# Cada benchmark é uma função registrada com @benchmark que recebe (n, dados), prepara
+# a entrada fora da medição e retorna a função medida; ela é chamada de novo a cada
+# repetição. Pode também retornar (função medida, métricas), em que métricas() é chamada
+# depois da medição e retorna um dicionário de valores extras para o resultado.
+# As funções são medidas inteiras, como os scripts as chamam (incluindo prints, que são
+# descartados, e os gráficos, salvos em PNG na pasta de trabalho).
+#
+# Os dados gerados ficam em --dados (reaproveitados entre execuções: gerar 1e7 linhas
+# leva minutos). Benchmarks com custo por linha em Python têm um 'limite' de linhas
+# acima do qual são pulados, a não ser com --sem-limite.
+#
+# Os resultados vão para ARQUIVO_RESULTADOS, acumulando as execuções (com o commit
+# atual), e cada resultado é comparado com o da execução anterior no mesmo benchmark e
+# tamanho: tempo mínimo acima de LIMITE_REGRESSAO (e de MINIMO_REGRESSAO_S) é marcado.
+#
+# Uso:
+#   python benchmark_micro.py                           (todos, 1e3 a 1e5 linhas)
+#   python benchmark_micro.py --filtro parser bridge --tamanhos 1e3 1e6
+#   python benchmark_micro.py --tamanhos 1e7 --repeticoes 1 --sem-limite
+#   python benchmark_micro.py --listar
+
+BRIDGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mqtt_dashboard', 'backend',
+                      'reading_mqtt_bridge_corrigido_new.py')
+BENCHMARK_BRIDGE = os.path.join(os.path.dirname(BRIDGE), 'benchmark_bridge.py')
+TAMANHOS = (1000, 10000, 100000)
+REPETICOES = 3
+PASTA_DADOS = os.path.join(tempfile.gettempdir(), 'cansat_benchmark_micro')
+ARQUIVO_RESULTADOS = 'resultados_benchmark_micro.json'
+LIMITE_REGRESSAO = 0.10
+MINIMO_REGRESSAO_S = 0.002  # Diferenças menores que isso são ruído, não regressão
+# Linhas diferentes usadas em ciclo pelos benchmarks de gravação
+VARIEDADE_LINHAS = 1000
+
+BENCHMARKS = []
+
+
+class Benchmark:
+    def __init__(self, nome, funcao, limite):
+        self.nome = nome
+        self.funcao = funcao
+        self.limite = limite  # Máximo de linhas sem --sem-limite (None: sem limite)
+
+
+def benchmark(nome, limite=None):
+    """Registra uma função (n, dados) -> função medida."""
+    def registrar(funcao):
+        BENCHMARKS.append(Benchmark(nome, funcao, limite))
+        return funcao
+    return registrar
+
+
+def _carregar_modulo(caminho, nome):
+    spec = importlib.util.spec_from_file_location(nome, caminho)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+class DadosSinteticos:
+    """Entradas geradas sob demanda e guardadas em 'pasta' (arquivos) ou em memória (listas)."""
+
+    def __init__(self, pasta=PASTA_DADOS, semente=1):
+        self.pasta = pasta
+        self.semente = semente
+        self._memoria = {}
+        os.makedirs(pasta, exist_ok=True)
+
+    def _caminho(self, nome, n):
+        return os.path.join(self.pasta, f'{nome}_{n}.csv')
+
+    def radio_csv(self, n):
+        """Captura do rádio timestamp,valor (compara_desempenho_extracao.py), com overflows e linhas sem ID."""
+        caminho = self._caminho('radio', n)
+        if not os.path.exists(caminho):
+            # Gera com outro nome e renomeia: uma geração interrompida não deixa arquivo pela metade
+            gerar_csv_sintetico(caminho + '.tmp', n, self.semente)
+            os.replace(caminho + '.tmp', caminho)
+        return caminho
+
+    def radio_colunar(self, n):
+        """Cópia da captura do rádio com a pasta colunar (o CSV original continua só em texto)."""
+        caminho = self._caminho('radio_colunar', n)
+        if not os.path.exists(caminho):
+            shutil.copyfile(self.radio_csv(n), caminho + '.tmp')
+            converter_csv(caminho + '.tmp', os.path.splitext(caminho)[0] + '.colunas')
+            os.replace(caminho + '.tmp', caminho)
+        return caminho
+
+    def mqtt_csv(self, n):
+        """CSV do bridge (dados_mqtt_dashboard.csv), em colunas."""
+        caminho = self._caminho('mqtt', n)
+        if os.path.exists(caminho):
+            return caminho
+        gerador = np.random.default_rng(self.semente)
+        bloco = 1000000
+        with open(caminho + '.tmp', 'w', newline='', encoding='utf-8') as arquivo:
+            for inicio in range(0, n, bloco):
+                tamanho = min(bloco, n - inicio)
+                ids = np.arange(inicio + 1, inicio + tamanho + 1)
+                radio = gerador.integers(5, 60, tamanho)
+                mqtt = gerador.integers(5, 200, tamanho)
+                pd.DataFrame({
+                    'timestamp': 1750000000 + ids * 0.1, 'id': ids, 'radio_latency': radio,
+                    'mqtt_latency': mqtt, 'total_latency': radio + mqtt,
+                    'temperatura': gerador.uniform(20, 30, tamanho).round(2),
+                    'pressao': gerador.uniform(1000, 1025, tamanho).round(2),
+                    'accelX': 1.015, 'accelY': 0.017, 'accelZ': -0.067, 'gyroX': '', 'gyroY': -0.0, 'gyroZ': '',
+                }).to_csv(arquivo, index=False, header=inicio == 0)
+        os.replace(caminho + '.tmp', caminho)
+        return caminho
+
+    def linhas_receptor(self, n):
+        """As linhas do receptor (coluna valor) da captura do rádio, como lista de strings."""
+        chave = ('linhas', n)
+        if chave not in self._memoria:
+            self._memoria.clear()  # Uma lista grande por vez
+            self._memoria[chave] = pd.read_csv(self.radio_csv(n), usecols=['valor'])['valor'].tolist()
+        return self._memoria[chave]
+
+    def registros(self, n):
+        """Registros do parser de VARIEDADE_LINHAS linhas, para usar em ciclo."""
+        return [extrair_registro(linha) for linha in self.linhas_receptor(min(n, VARIEDADE_LINHAS))]
+
+
+def _pasta_temporaria():
+    # Dentro da pasta de trabalho de medir(), apagada no final do benchmark
+    return tempfile.mkdtemp(dir=os.getcwd())
+
+
+# Parser
+
+@benchmark('parser.extrair_registro', limite=10 ** 6)
+def bench_extrair_registro(n, dados):
+    linhas = dados.linhas_receptor(n)
+    return lambda: [extrair_registro(linha) for linha in linhas]
+
+
+@benchmark('parser.extrair_colunas', limite=10 ** 6)
+def bench_extrair_colunas(n, dados):
+    linhas = dados.linhas_receptor(n)
+    return lambda: extrair_colunas(linhas)
+
+
+@benchmark('parser.extrair_registros_csv', limite=10 ** 6)
+def bench_extrair_registros_csv(n, dados):
+    caminho = dados.radio_csv(n)
+    return lambda: extrair_registros_csv(caminho)
+
+
+# Gravação
+
+@benchmark('gravacao.GravadorCSV')
+def bench_gravador_csv(n, dados):
+    # Linhas como as do bridge: timestamp, id, latências e os campos do registro
+    cabecalho = _carregar_modulo(BRIDGE, 'bridge_micro').CABECALHO_CSV
+    linhas = [[time.time(), r.id, r.radio_latency, 12, 34, r.temperatura, r.pressao, r.accel_x, r.accel_y,
+               r.accel_z, formata_valor(r.gyro_x), formata_valor(r.gyro_y), formata_valor(r.gyro_z)]
+              for r in dados.registros(n)]
+    pasta = _pasta_temporaria()
+
+    gravador = GravadorCSV(os.path.join(pasta, 'saida.csv'), cabecalho, 50, 1000, modo='w')
+
+    def executar():
+        for i in range(n):
+            gravador.escrever(linhas[i % len(linhas)])
+        gravador.fechar()
+    return executar, lambda: {'descargas': gravador.descargas}
+
+
+@benchmark('gravacao.GravadorColunar')
+def bench_gravador_colunar(n, dados):
+    registros = dados.registros(n)
+    pasta = _pasta_temporaria()
+
+    def executar():
+        with GravadorColunar(os.path.join(pasta, 'saida.colunas'), recriar=True) as gravador:
+            rx = 1750000000.0
+            for i in range(n):
+                gravador.escrever(registros[i % len(registros)], rx + i * 0.1)
+    return executar
+
+
+# Extração e correção
+
+@benchmark('extracao.extrair_latencias_radio')
+def bench_extrair_latencias_radio(n, dados):
+    caminho = dados.radio_csv(n)
+    return lambda: extrair_latencias_radio(caminho)
+
+
+@benchmark('extracao.extrair_latencias_mqtt')
+def bench_extrair_latencias_mqtt(n, dados):
+    caminho = dados.mqtt_csv(n)
+    return lambda: extrair_latencias_mqtt(caminho)
+
+
+@benchmark('correcao.corrigir_dados_radio', limite=10 ** 6)
+def bench_corrigir_dados_radio(n, dados):
+    caminho = dados.radio_csv(n)
+    saida = os.path.join(_pasta_temporaria(), 'corrigido.csv')
+    return lambda: corrigir_dados_radio(caminho, saida)
+
+
+# Análise
+
+@benchmark('analise.analisar_timestamps_arduino.csv', limite=10 ** 6)
+def bench_analisar_timestamps_csv(n, dados):
+    caminho = dados.radio_csv(n)
+    return lambda: analisar_timestamps_arduino(caminho)
+
+
+@benchmark('analise.analisar_timestamps_arduino.colunar')
+def bench_analisar_timestamps_colunar(n, dados):
+    caminho = dados.radio_colunar(n)
+    return lambda: analisar_timestamps_arduino(caminho)
+
+
+@benchmark('analise.Fonte.de_arquivo.csv', limite=10 ** 6)
+def bench_fonte_csv(n, dados):
+    caminho = dados.radio_csv(n)
+    return lambda: Fonte.de_arquivo('radio', caminho)
+
+
+@benchmark('analise.Fonte.de_arquivo.colunar')
+def bench_fonte_colunar(n, dados):
+    caminho = dados.radio_colunar(n)
+    return lambda: Fonte.de_arquivo('radio', caminho)
+
+
+# Bridge do dashboard
+
+def _bridge():
+    """Módulo do bridge recém-carregado (estado global zerado), gravando em uma pasta temporária."""
+    bridge = _carregar_modulo(BRIDGE, 'bridge_micro')
+    pasta = _pasta_temporaria()
+    bridge.OUTPUT_CSV = os.path.join(pasta, 'bridge.csv')
+    bridge.ARQUIVO_RASTROS = os.path.join(pasta, 'rastros_bridge.trace')
+    return bridge
+
+
+def _mensagens(bridge, n, formato, dados):
+    """Mensagens /raw (as de benchmark_bridge.py) ou /registro, como o mqtt_sender publica."""
+    gerador = _carregar_modulo(BENCHMARK_BRIDGE, 'benchmark_bridge')
+    if formato == 'raw':
+        return gerador.gerar_mensagens(n)
+    registros = dados.registros(n)
+    millis = int(time.time() * 1000)
+    return [gerador.Mensagem(bridge.MQTT_TOPIC_REGISTRO, codificar_registro(
+                registros[i % len(registros)]._replace(id=i + 1, timestamp=millis + i * 100),
+                time.time() * 1000).encode())
+            for i in range(n)]
+
+
+@benchmark('bridge.on_message', limite=10 ** 6)
+def bench_on_message(n, dados):
+    bridge = _bridge()
+    # Fila sem limite e sem a thread de processamento: mede só o callback da thread de rede
+    bridge.fila_mensagens = queue.Queue()
+    mensagens = _mensagens(bridge, n, 'raw', dados)
+
+    def executar():
+        for mensagem in mensagens:
+            bridge.on_message(None, None, mensagem)
+    return executar, lambda: {'na_fila': bridge.fila_mensagens.qsize()}
+
+
+def _bench_processar(n, dados, formato):
+    bridge = _bridge()
+    mensagens = _mensagens(bridge, n, formato, dados)
+
+    def executar():
+        # Mensagens processadas direto (sem a fila), e o CSV, a pasta colunar e os histogramas fechados no final
+        bridge.iniciar_processamento()
+        for mensagem in mensagens:
+            bridge.processar_mensagem(mensagem.topic, mensagem.payload, time.time() * 1000)
+        bridge.parar_processamento()
+    return executar, lambda: {'linhas_csv': bridge.gravador.linhas}
+
+
+@benchmark('bridge.processar_mensagem.raw', limite=10 ** 6)
+def bench_processar_raw(n, dados):
+    return _bench_processar(n, dados, 'raw')
+
+
+@benchmark('bridge.processar_mensagem.registro', limite=10 ** 6)
+def bench_processar_registro(n, dados):
+    return _bench_processar(n, dados, 'registro')
+
+
+def medir(bench, n, dados, repeticoes):
+    """Tempos de 'repeticoes' execuções (preparadas uma a uma, fora da medição)."""
+    tempos = []
+    metricas = {}  # Os da última repetição
+    pasta_trabalho = tempfile.mkdtemp(dir=dados.pasta)  # PNGs e saídas das funções medidas
+    anterior = os.getcwd()
+    try:
+        os.chdir(pasta_trabalho)
+        for _ in range(repeticoes):
+            with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+                preparado = bench.funcao(n, dados)
+                executar, extras = preparado if isinstance(preparado, tuple) else (preparado, None)
+                gc.collect()
+                inicio = time.perf_counter()
+                executar()
+                tempos.append(time.perf_counter() - inicio)
+                if extras is not None:
+                    metricas = extras()
+    finally:
+        os.chdir(anterior)
+        shutil.rmtree(pasta_trabalho, ignore_errors=True)
+    minimo = min(tempos)
+    return {
+        'nome': bench.nome, 'n': n, 'repeticoes': repeticoes, 'tempos_s': tempos,
+        'minimo_s': minimo, 'mediana_s': statistics.median(tempos),
+        'us_por_linha': minimo / n * 1e6, 'linhas_s': n / minimo if minimo else None,
+        'metricas': metricas,
+    }
+
+
+def chave(resultado):
+    return (resultado['nome'], resultado['n'])
+
+
+def imprimir_resultado(r, antigo):
+    comparacao = ''
+    if antigo is not None and antigo['minimo_s']:
+        variacao = r['minimo_s'] / antigo['minimo_s'] - 1
+        regressao = variacao > LIMITE_REGRESSAO and r['minimo_s'] - antigo['minimo_s'] > MINIMO_REGRESSAO_S
+        comparacao = f"{variacao * 100:+8.1f}%" + ('  <-- REGRESSÃO' if regressao else '')
+    print(f"{r['nome']:<44}{r['n']:>10}{r['minimo_s']:>11.4f}{r['mediana_s']:>11.4f}{r['us_por_linha']:>10.2f}"
+          f"{r['linhas_s']:>13.0f}  {comparacao}", flush=True)
+
+
+def commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def carregar_execucoes(caminho):
+    if not os.path.exists(caminho):
+        return []
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo).get('execucoes', [])
+
+
+def salvar_execucoes(caminho, execucoes):
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump({'execucoes': execucoes}, arquivo, indent=1, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+def main():
+    argumentos = argparse.ArgumentParser(description='Micro-benchmarks do parser, gravação, extração, análise e bridge')
+    argumentos.add_argument('--filtro', nargs='+', help='só os benchmarks cujo nome contém um destes textos')
+    argumentos.add_argument('--tamanhos', type=float, nargs='+', default=TAMANHOS, help='linhas (ex.: 1e3 1e7)')
+    argumentos.add_argument('--repeticoes', type=int, default=REPETICOES)
+    argumentos.add_argument('--sem-limite', action='store_true', help='rodar também acima do limite de cada benchmark')
+    argumentos.add_argument('--dados', default=PASTA_DADOS, help='pasta dos dados gerados (reaproveitados)')
+    argumentos.add_argument('--semente', type=int, default=1)
+    argumentos.add_argument('--saida', default=ARQUIVO_RESULTADOS)
+    argumentos.add_argument('--listar', action='store_true', help='só listar os benchmarks')
+    opcoes = argumentos.parse_args()
+
+    selecionados = [b for b in BENCHMARKS if not opcoes.filtro or any(f in b.nome for f in opcoes.filtro)]
+    if opcoes.listar:
+        for b in selecionados:
+            print(f"{b.nome:<44}limite: {b.limite or '-'}")
+        return
+
+    execucoes = carregar_execucoes(opcoes.saida)
+    anteriores = {chave(r): r for r in execucoes[-1]['resultados']} if execucoes else {}
+    dados = DadosSinteticos(os.path.abspath(opcoes.dados), opcoes.semente)
+    tamanhos = sorted({int(t) for t in opcoes.tamanhos})
+    print(f"{'Benchmark':<44}{'Linhas':>10}{'mín (s)':>11}{'med. (s)':>11}{'µs/linha':>10}{'linhas/s':>13}"
+          + ('  vs. anterior' if anteriores else ''))
+    resultados = []
+    pulados = []
+    try:
+        # Por tamanho, para manter em memória só os dados de um tamanho por vez
+        for n in tamanhos:
+            for bench in selecionados:
+                if bench.limite is not None and n > bench.limite and not opcoes.sem_limite:
+                    pulados.append(f"{bench.nome} ({n})")
+                    continue
+                resultado = medir(bench, n, dados, opcoes.repeticoes)
+                imprimir_resultado(resultado, anteriores.get(chave(resultado)))
+                resultados.append(resultado)
+    except KeyboardInterrupt:
+        print("Interrompido; salvando os resultados já medidos")
+    if pulados:
+        print(f"\nPulados (acima do limite, use --sem-limite): {', '.join(pulados)}")
+    if not resultados:
+        return
+
+    execucoes.append({
+        'data': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': commit_atual(),
+        'maquina': {'plataforma': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count(),
+                    'numpy': np.__version__, 'pandas': pd.__version__},
+        'repeticoes': opcoes.repeticoes,
+        'resultados': resultados,
+    })
+    salvar_execucoes(opcoes.saida, execucoes)
+    print(f"\nResultados salvos em {opcoes.saida} ({len(execucoes)} execução(ões))")
+
+
+if __name__ == '__main__':
+    main()
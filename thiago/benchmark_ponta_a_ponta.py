@@ -0,0 +1,336 @@
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from broker_mqtt_local import BrokerLocal
+from simulador_serial import SimuladorSerial
+
+# Mede o caminho completo sem hardware e sem o broker público:
+#
+#   simulador_serial (pty) -> mqtt_sender -> broker local -> bridge do dashboard -> CSV
+#
+# Para cada combinação de taxa e QoS, o simulador imprime QUANTIDADE linhas na taxa
+# pedida; o mqtt_sender e o bridge rodam em processos separados (como em uso real, sem
+# disputar o GIL com o simulador) com as configurações dos próprios scripts, mudando só
+# porta, broker, QoS (publicação e inscrição), modo de publicação e limite de taxa.
+# O broker é o broker_mqtt_local.py em processo, ou um externo com --broker host:porta
+# (um mosquitto, por exemplo).
+#
+# A latência ponta a ponta de cada ID vai da impressão da linha na porta simulada até
+# a linha do CSV do bridge (coluna timestamp), no mesmo relógio. Perdidas são as linhas
+# impressas que não chegaram ao CSV (a perda injetada no simulador não entra); cada
+# estágio informa também os seus próprios descartes. msgs/s sustentadas = IDs entregues
+# / (última linha no CSV - primeira impressão).
+#
+# Os resultados vão para ARQUIVO_RESULTADOS, acumulando as execuções, e cada resultado
+# é comparado com o da execução anterior na mesma configuração: queda de msgs/s ou alta
+# do p99 acima de LIMITE_REGRESSAO (e de MINIMO_REGRESSAO_MS) ou mais perdas são marcadas.
+#
+# Uso: python benchmark_ponta_a_ponta.py --taxas 100 1000 --qos 0 1 2 --quantidade 2000
+# A saída dos scripts vai para /dev/null e os erros para <pasta>/remetente.log e bridge.log
+# (--manter preserva a pasta de cada configuração). --rastrear também é repassado aos dois.
+
+BRIDGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mqtt_dashboard', 'backend',
+                      'reading_mqtt_bridge_corrigido_new.py')
+TAXAS = (100, 1000)
+NIVEIS_QOS = (0, 1, 2)
+QUANTIDADE = 2000
+MODO_PUBLICACAO = 'registro'
+QUANTIS = (50, 90, 99, 99.9)
+ARQUIVO_RESULTADOS = 'resultados_ponta_a_ponta.json'
+LIMITE_REGRESSAO = 0.10
+MINIMO_REGRESSAO_MS = 5  # Variações do p99 menores que isso são ruído, não regressão
+SILENCIO_S = 1.0  # Sem mensagens novas no bridge por este tempo = fim da execução
+TIMEOUT_INICIO_S = 30
+TIMEOUT_FIM_S = 60
+
+
+def _redirecionar_saida(pasta, nome):
+    # Os resumos periódicos dos dois scripts não interessam aqui: a saída é descartada, os erros vão para o log
+    sys.stdout = open(os.devnull, 'w')
+    sys.stderr = open(os.path.join(pasta, nome + '.log'), 'w')
+
+
+def _executar_bridge(config, pasta, pronto, encerrar, resultados):
+    _redirecionar_saida(pasta, 'bridge')
+    spec = importlib.util.spec_from_file_location('bridge', BRIDGE)
+    bridge = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bridge)
+    bridge.OUTPUT_CSV = os.path.join(pasta, 'bridge.csv')
+    bridge.ARQUIVO_RASTROS = os.path.join(pasta, 'rastros_bridge.trace')
+    bridge.MQTT_BROKER = config['host']
+    bridge.MQTT_PORT = config['porta']
+    bridge.MQTT_QOS = config['qos']
+    client = bridge.criar_cliente()
+    client.on_subscribe = lambda *argumentos: pronto.set()
+    bridge.iniciar_processamento()
+    client.connect(bridge.MQTT_BROKER, bridge.MQTT_PORT, 60)
+    client.loop_start()
+    encerrar.wait()
+    # Fim: fila vazia e nenhuma mensagem nova por SILENCIO_S
+    anterior = None
+    while bridge.received_count != anterior or not bridge.fila_mensagens.empty():
+        anterior = bridge.received_count
+        time.sleep(SILENCIO_S)
+    client.loop_stop()
+    client.disconnect()
+    bridge.parar_processamento(timeout=None)
+    resultados.put(('bridge', {
+        'processadas': bridge.received_count,
+        'descartadas_fila': bridge.mensagens_descartadas,
+        'perdas': bridge.rastreador.resumo(),
+    }))
+
+
+def _executar_remetente(config, porta_serial, pasta, pronto, resultados):
+    _redirecionar_saida(pasta, 'remetente')
+    os.chdir(pasta)  # dados_radio.csv, a pasta colunar e os rastros ficam na pasta da execução
+    import mqtt_sender
+    from limitador_taxa import LimitadorPorBroker
+    mqtt_sender.SERIAL_PORT = porta_serial
+    mqtt_sender.BROKERS = [(config['host'], 'Local')]
+    mqtt_sender.PORT = config['porta']
+    mqtt_sender.QOS = config['qos']
+    mqtt_sender.MODO_PUBLICACAO = config['modo']
+    mqtt_sender.COMPATIBILIDADE_CAMPOS = config['compatibilidade']
+    mqtt_sender.limitador = None if config['limite_taxa'] is None else \
+        LimitadorPorBroker(config['limite_taxa'], mqtt_sender.RAJADA_MENSAGENS)
+    resultados.put(('remetente', mqtt_sender.main(pronto)))
+
+
+def _receber(resultados, nomes, timeout):
+    recebidos = {}
+    limite = time.monotonic() + timeout
+    while set(nomes) - set(recebidos):
+        try:
+            nome, dados = resultados.get(timeout=max(limite - time.monotonic(), 0.1))
+        except queue.Empty:
+            break
+        recebidos[nome] = dados
+    return recebidos
+
+
+def _esperar_processo(processo, timeout):
+    if processo.pid is None:  # Nem chegou a ser iniciado
+        return False
+    processo.join(timeout)
+    if processo.is_alive():
+        processo.terminate()
+        processo.join()
+        return False
+    return processo.exitcode == 0
+
+
+def executar_configuracao(config, pasta):
+    """Roda uma configuração completa e retorna o resultado (sem a análise do CSV)."""
+    contexto = multiprocessing.get_context('spawn')
+    resultados = contexto.Queue()
+    pronto_bridge, pronto_remetente, encerrar = contexto.Event(), contexto.Event(), contexto.Event()
+    simulador = SimuladorSerial(config['taxa'], config['perda'], config['reordenacao'], config['jitter_ms'],
+                                config['lixo'], quantidade=config['quantidade'], semente=config['semente'],
+                                registrar_envios=True).abrir()
+    bridge = contexto.Process(target=_executar_bridge, args=(config, pasta, pronto_bridge, encerrar, resultados),
+                              name='bridge')
+    remetente = contexto.Process(target=_executar_remetente,
+                                 args=(config, simulador.porta, pasta, pronto_remetente, resultados), name='remetente')
+    try:
+        bridge.start()
+        if not pronto_bridge.wait(TIMEOUT_INICIO_S):
+            raise RuntimeError(f"O bridge não se inscreveu no broker (ver {pasta}/bridge.log)")
+        remetente.start()
+        if not pronto_remetente.wait(TIMEOUT_INICIO_S):
+            raise RuntimeError(f"O mqtt_sender não abriu a porta simulada (ver {pasta}/remetente.log)")
+        simulador.iniciar()
+        while not simulador.esperar(1) and remetente.is_alive():
+            pass
+        # Espera o remetente ler o que ficou na porta; fechar a porta encerra o pipeline dele
+        while simulador.pendentes() and remetente.is_alive():
+            time.sleep(0.05)
+    finally:
+        simulador.parar()
+        etapas = _receber(resultados, ['remetente'], TIMEOUT_FIM_S)
+        remetente_ok = _esperar_processo(remetente, TIMEOUT_FIM_S)
+        encerrar.set()
+        etapas.update(_receber(resultados, ['bridge'], TIMEOUT_FIM_S))
+        bridge_ok = _esperar_processo(bridge, TIMEOUT_FIM_S)
+    if not (remetente_ok and bridge_ok and 'remetente' in etapas and 'bridge' in etapas):
+        print(f"AVISO: processo terminou com erro ou sem resultado (ver os logs em {pasta})")
+    etapas['simulador'] = dict(simulador.estatisticas)
+    return simulador.envios, etapas
+
+
+def analisar(envios, caminho_csv):
+    """Entregas, perdas, duplicadas, msgs/s e quantis da latência ponta a ponta a partir do CSV do bridge."""
+    ids_enviados = np.fromiter(envios.keys(), dtype=np.int64, count=len(envios))
+    tempos_envio = np.fromiter(envios.values(), dtype=np.float64, count=len(envios))
+    if os.path.exists(caminho_csv) and os.path.getsize(caminho_csv):
+        csv = pd.read_csv(caminho_csv, usecols=['timestamp', 'id'])
+        csv = csv[pd.to_numeric(csv['id'], errors='coerce').notna()]
+        ids_csv = csv['id'].astype(np.int64).to_numpy()
+        tempos_csv = csv['timestamp'].to_numpy(dtype=np.float64)
+    else:
+        ids_csv, tempos_csv = np.empty(0, np.int64), np.empty(0)
+    # Primeira chegada de cada ID impresso
+    impressos = np.isin(ids_csv, ids_enviados)
+    ids_unicos, primeiras = np.unique(ids_csv[impressos], return_index=True)
+    chegada = tempos_csv[impressos][primeiras]
+    ordem = np.argsort(ids_enviados)
+    envio = tempos_envio[ordem][np.searchsorted(ids_enviados[ordem], ids_unicos)]
+    latencias = (chegada - envio) * 1000
+    resultado = {
+        'enviadas': len(ids_enviados),
+        'entregues': len(ids_unicos),
+        'perdidas': len(ids_enviados) - len(ids_unicos),
+        'duplicadas': int(impressos.sum()) - len(ids_unicos),
+        'taxa_oferecida': len(ids_enviados) / max(tempos_envio.max() - tempos_envio.min(), 1e-9) if len(envios) else 0.0,
+        'msgs_s': len(ids_unicos) / max(chegada.max() - tempos_envio.min(), 1e-9) if len(ids_unicos) else 0.0,
+        'latencia_ms': {},
+    }
+    if len(latencias):
+        valores = np.percentile(latencias, QUANTIS)
+        resultado['latencia_ms'] = {f'p{q:g}': float(v) for q, v in zip(QUANTIS, valores)}
+        resultado['latencia_ms'].update(media=float(latencias.mean()), max=float(latencias.max()))
+    return resultado
+
+
+def chave(resultado):
+    return (resultado['modo'], resultado['qos'], resultado['taxa'])
+
+
+def imprimir_resultados(resultados, anteriores):
+    nomes_quantis = [f'p{q:g}' for q in QUANTIS]
+    print(f"\n{'Modo':<10}{'QoS':>4}{'Taxa':>7}{'Enviadas':>10}{'Entregues':>10}{'Perdidas':>9}{'Dup.':>6}"
+          f"{'msgs/s':>9}" + ''.join(f'{nome:>9}' for nome in nomes_quantis) + f"{'máx':>9}  (latência em ms)")
+    for r in resultados:
+        latencia = r['latencia_ms']
+        print(f"{r['modo']:<10}{r['qos']:>4}{r['taxa']:>7g}{r['enviadas']:>10}{r['entregues']:>10}{r['perdidas']:>9}"
+              f"{r['duplicadas']:>6}{r['msgs_s']:>9.0f}"
+              + ''.join(f"{latencia.get(nome, float('nan')):>9.1f}" for nome in nomes_quantis)
+              + f"{latencia.get('max', float('nan')):>9.1f}")
+    descartes = []
+    for r in resultados:
+        etapas = r['etapas']
+        pipeline = etapas.get('remetente', {}).get('pipeline', {})
+        descartes.append(
+            f"  QoS {r['qos']} @ {r['taxa']:g}/s: simulador (buffer cheio) {etapas['simulador']['descartadas']}, "
+            f"remetente (filas) {sum(estagio['descartados'] for estagio in pipeline.values())}, "
+            f"bridge (fila) {etapas.get('bridge', {}).get('descartadas_fila', '?')}")
+    print("\nDescartes por estágio:")
+    print('\n'.join(descartes))
+
+    if not anteriores:
+        return
+    print("\nComparação com a execução anterior:")
+    por_chave = {chave(r): r for r in anteriores}
+    for r in resultados:
+        antigo = por_chave.get(chave(r))
+        if antigo is None or not antigo['msgs_s'] or not antigo['latencia_ms'] or not r['latencia_ms']:
+            continue
+        variacao_taxa = r['msgs_s'] / antigo['msgs_s'] - 1
+        variacao_p99 = r['latencia_ms']['p99'] / antigo['latencia_ms']['p99'] - 1 if antigo['latencia_ms']['p99'] else 0
+        piora_p99_ms = r['latencia_ms']['p99'] - antigo['latencia_ms']['p99']
+        regressao = variacao_taxa < -LIMITE_REGRESSAO or r['perdidas'] > antigo['perdidas'] or \
+            (variacao_p99 > LIMITE_REGRESSAO and piora_p99_ms > MINIMO_REGRESSAO_MS)
+        print(f"  {r['modo']} QoS {r['qos']} @ {r['taxa']:g}/s: msgs/s {variacao_taxa * 100:+.1f}%, "
+              f"p99 {variacao_p99 * 100:+.1f}%, perdidas {antigo['perdidas']} -> {r['perdidas']}"
+              + ('  <-- REGRESSÃO' if regressao else ''))
+
+
+def carregar_execucoes(caminho):
+    if not os.path.exists(caminho):
+        return []
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo).get('execucoes', [])
+
+
+def salvar_execucoes(caminho, execucoes):
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump({'execucoes': execucoes}, arquivo, indent=1, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+def main():
+    argumentos = argparse.ArgumentParser(description='Vazão e latência de simulador -> mqtt_sender -> broker -> bridge')
+    argumentos.add_argument('--taxas', type=float, nargs='+', default=TAXAS, help='linhas/s do simulador')
+    argumentos.add_argument('--qos', type=int, nargs='+', default=NIVEIS_QOS, choices=(0, 1, 2))
+    argumentos.add_argument('--quantidade', type=int, default=QUANTIDADE, help='linhas por configuração')
+    argumentos.add_argument('--modo', default=MODO_PUBLICACAO, choices=('campos', 'registro', 'lote'))
+    argumentos.add_argument('--compatibilidade', action='store_true', help='publicar também /raw e os campos')
+    argumentos.add_argument('--limite-taxa', type=float, help='limite de mensagens/s do mqtt_sender (padrão: sem)')
+    argumentos.add_argument('--perda', type=float, default=0.0, help='perda injetada no simulador')
+    argumentos.add_argument('--reordenacao', type=float, default=0.0)
+    argumentos.add_argument('--jitter-ms', type=float, default=0.0, help='jitter da latência do rádio simulada')
+    argumentos.add_argument('--lixo', type=float, default=0.0)
+    argumentos.add_argument('--semente', type=int, default=1)
+    argumentos.add_argument('--broker', help='host:porta de um broker externo (padrão: broker_mqtt_local.py)')
+    argumentos.add_argument('--saida', default=ARQUIVO_RESULTADOS)
+    argumentos.add_argument('--manter', action='store_true', help='não apagar as pastas das execuções')
+    argumentos.add_argument('--rastrear', action='store_true', help='rastreamento por etapa no remetente e no bridge')
+    opcoes = argumentos.parse_args()
+
+    broker = None
+    if opcoes.broker:
+        host, _, porta = opcoes.broker.rpartition(':')
+        host, porta = host or opcoes.broker, int(porta) if host else 1883
+    base = tempfile.mkdtemp(prefix='cansat_ponta_a_ponta_')
+    resultados = []
+    try:
+        for qos in opcoes.qos:
+            for taxa in opcoes.taxas:
+                if not opcoes.broker:
+                    # Broker novo por configuração: as estatísticas dele são só desta execução
+                    broker = BrokerLocal().iniciar()
+                    host, porta = broker.host, broker.porta
+                config = {
+                    'modo': opcoes.modo, 'qos': qos, 'taxa': taxa, 'quantidade': opcoes.quantidade,
+                    'compatibilidade': opcoes.compatibilidade, 'limite_taxa': opcoes.limite_taxa,
+                    'perda': opcoes.perda, 'reordenacao': opcoes.reordenacao, 'jitter_ms': opcoes.jitter_ms,
+                    'lixo': opcoes.lixo, 'semente': opcoes.semente, 'host': host, 'porta': porta,
+                }
+                pasta = os.path.join(base, f'qos{qos}_taxa{taxa:g}')
+                os.makedirs(pasta)
+                print(f"QoS {qos}, {taxa:g} linhas/s, {opcoes.quantidade} linhas...", flush=True)
+                envios, etapas = executar_configuracao(config, pasta)
+                if broker is not None:
+                    etapas['broker'] = broker.estatisticas
+                    broker.parar()
+                    broker = None
+                resultado = {chave: valor for chave, valor in config.items() if chave not in ('host', 'porta')}
+                resultado.update(analisar(envios, os.path.join(pasta, 'bridge.csv')))
+                resultado['etapas'] = etapas
+                resultados.append(resultado)
+    finally:
+        if broker is not None:
+            broker.parar()
+        if opcoes.manter:
+            print(f"Pastas das execuções em {base}")
+        else:
+            shutil.rmtree(base, ignore_errors=True)
+
+    execucoes = carregar_execucoes(opcoes.saida)
+    anteriores = execucoes[-1]['resultados'] if execucoes else []
+    imprimir_resultados(resultados, anteriores)
+    execucoes.append({
+        'data': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'maquina': {'plataforma': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'broker': opcoes.broker or 'broker_mqtt_local',
+        'resultados': resultados,
+    })
+    salvar_execucoes(opcoes.saida, execucoes)
+    print(f"\nResultados salvos em {opcoes.saida} ({len(execucoes)} execução(ões))")
+
+
+if __name__ == '__main__':
+    main()
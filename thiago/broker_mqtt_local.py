@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import struct
+import threading
+import time
+
+# Broker MQTT 3.1.1 mínimo, em processo, para medir o caminho completo sem depender
+# do broker.hivemq.com nem de um mosquitto instalado (benchmark_ponta_a_ponta.py).
+#
+# Implementa só o que o mqtt_sender e o bridge usam: CONNECT, PUBLISH com QoS 0, 1 e 2
+# (nos dois sentidos), SUBSCRIBE/UNSUBSCRIBE com os curingas '+' e '#', PINGREQ e
+# DISCONNECT. Não há sessões persistentes, retain, will nem autenticação; os campos
+# correspondentes do CONNECT são aceitos e ignorados. Cada PUBLISH é repassado na hora
+# aos inscritos, com QoS = mínimo entre o da publicação e o da inscrição; um QoS 2
+# recebido é entregue uma única vez, mesmo se o cliente repetir o PUBLISH antes do PUBREL.
+#
+# Se um inscrito não lê rápido o bastante, o buffer de escrita dele enche e o broker
+# para de ler de quem publica (drain), passando a espera para trás pelo TCP.
+#
+# Uso avulso (o mqtt_sender já publica em 'localhost' como broker 'Local'):
+#   python broker_mqtt_local.py --porta 1883
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+TAMANHO_MAXIMO_PACOTE = 268435455  # Maior valor do campo de tamanho restante
+_U16 = struct.Struct('>H')
+
+
+def topico_casa(filtro, topico):
+    """Verdadeiro se o tópico casa com o filtro de inscrição ('+' = um nível, '#' = o resto)."""
+    partes_filtro = filtro.split('/')
+    partes_topico = topico.split('/')
+    # Tópicos de sistema ($SYS/...) não casam com curinga no primeiro nível
+    if topico.startswith('$') and partes_filtro[0] in ('+', '#'):
+        return False
+    for posicao, parte in enumerate(partes_filtro):
+        if parte == '#':
+            return True
+        if posicao >= len(partes_topico) or (parte != '+' and parte != partes_topico[posicao]):
+            return False
+    return len(partes_filtro) == len(partes_topico)
+
+
+def _pacote(primeiro_byte, corpo=b''):
+    tamanho = len(corpo)
+    cabecalho = bytearray([primeiro_byte])
+    while True:
+        byte = tamanho % 128
+        tamanho //= 128
+        cabecalho.append(byte | 0x80 if tamanho else byte)
+        if not tamanho:
+            return bytes(cabecalho) + corpo
+
+
+def _texto(corpo, posicao):
+    """Lê uma string MQTT (tamanho u16 + UTF-8); retorna (bytes, próxima posição)."""
+    tamanho = _U16.unpack_from(corpo, posicao)[0]
+    inicio = posicao + 2
+    return corpo[inicio:inicio + tamanho], inicio + tamanho
+
+
+async def _ler_pacote(leitor):
+    primeiro = (await leitor.readexactly(1))[0]
+    tamanho = 0
+    for deslocamento in range(0, 28, 7):
+        byte = (await leitor.readexactly(1))[0]
+        tamanho |= (byte & 0x7F) << deslocamento
+        if not byte & 0x80:
+            break
+    else:
+        raise ValueError("Tamanho de pacote MQTT inválido")
+    corpo = await leitor.readexactly(tamanho) if tamanho else b''
+    return primeiro, corpo
+
+
+class _Sessao:
+    def __init__(self, escritor):
+        self.escritor = escritor
+        self.id_cliente = None
+        self.inscricoes = {}  # filtro -> QoS concedido
+        self.em_voo = {}  # id do pacote -> QoS das entregas ainda não confirmadas
+        self.qos2_recebidos = set()  # ids de PUBLISH QoS 2 esperando o PUBREL
+        self._proximo_id = 0
+
+    def novo_id(self):
+        # Ids de 1 a 65535, pulando os que ainda estão em voo
+        while True:
+            self._proximo_id = self._proximo_id % 65535 + 1
+            if self._proximo_id not in self.em_voo:
+                return self._proximo_id
+
+
+class BrokerLocal:
+    """Broker MQTT mínimo rodando em uma thread com o seu próprio loop asyncio."""
+
+    def __init__(self, host='127.0.0.1', porta=0):
+        self.host = host
+        self.porta = porta  # 0: porta livre escolhida pelo sistema (lida depois de iniciar)
+        self._sessoes = set()  # Todas as conexões abertas
+        self._destinos = {}  # tópico -> [(sessão, QoS)], refeito quando as inscrições mudam
+        self.estatisticas = {
+            'conexoes': 0, 'publicacoes': [0, 0, 0], 'entregas': 0, 'bytes_recebidos': 0, 'duplicadas_qos2': 0,
+        }
+        self._loop = None
+        self._thread = None
+        self._erro = None
+
+    def iniciar(self):
+        pronto = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._executar, args=(pronto,), name='broker-local', daemon=True)
+        self._thread.start()
+        pronto.wait()
+        if self._erro is not None:
+            raise self._erro
+        return self
+
+    def parar(self):
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *excecao):
+        self.parar()
+
+    def _executar(self, pronto):
+        asyncio.set_event_loop(self._loop)
+        try:
+            servidor = self._loop.run_until_complete(asyncio.start_server(self._atender, self.host, self.porta))
+        except OSError as e:
+            self._erro = e
+            pronto.set()
+            return
+        self.porta = servidor.sockets[0].getsockname()[1]
+        pronto.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            # Fechar as conexões faz cada _atender terminar sozinho (fim da leitura)
+            servidor.close()
+            for sessao in list(self._sessoes):
+                sessao.escritor.close()
+            tarefas = asyncio.all_tasks(self._loop)
+            if tarefas:
+                self._loop.run_until_complete(asyncio.wait(tarefas, timeout=1))
+            self._loop.close()
+
+    async def _atender(self, leitor, escritor):
+        sessao = _Sessao(escritor)
+        self._sessoes.add(sessao)
+        self.estatisticas['conexoes'] += 1
+        try:
+            while True:
+                primeiro, corpo = await _ler_pacote(leitor)
+                self.estatisticas['bytes_recebidos'] += len(corpo) + 2
+                tipo = primeiro >> 4
+                if tipo == PUBLISH:
+                    await self._publicar(sessao, primeiro, corpo)
+                    continue
+                if tipo == CONNECT:
+                    self._conectar(sessao, corpo)
+                elif tipo == PUBACK or tipo == PUBCOMP:
+                    sessao.em_voo.pop(_U16.unpack_from(corpo)[0], None)
+                elif tipo == PUBREC:
+                    escritor.write(_pacote(PUBREL << 4 | 0x02, corpo[:2]))
+                elif tipo == PUBREL:
+                    sessao.qos2_recebidos.discard(_U16.unpack_from(corpo)[0])
+                    escritor.write(_pacote(PUBCOMP << 4, corpo[:2]))
+                elif tipo == SUBSCRIBE:
+                    self._inscrever(sessao, corpo)
+                elif tipo == UNSUBSCRIBE:
+                    self._cancelar_inscricao(sessao, corpo)
+                elif tipo == PINGREQ:
+                    escritor.write(_pacote(PINGRESP << 4))
+                elif tipo == DISCONNECT:
+                    break
+                await escritor.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, struct.error):
+            pass
+        finally:
+            self._remover(sessao)
+            escritor.close()
+
+    def _conectar(self, sessao, corpo):
+        _, posicao = _texto(corpo, 0)  # nome do protocolo ("MQTT")
+        posicao += 4  # nível, flags e keep alive
+        id_cliente, _ = _texto(corpo, posicao)
+        sessao.id_cliente = id_cliente.decode('utf-8', errors='replace')
+        # Um cliente que reconecta com o mesmo id derruba a conexão antiga
+        for outra in list(self._sessoes):
+            if sessao.id_cliente and outra is not sessao and outra.id_cliente == sessao.id_cliente:
+                outra.escritor.close()
+                self._remover(outra)
+        sessao.escritor.write(_pacote(CONNACK << 4, b'\x00\x00'))
+
+    def _inscrever(self, sessao, corpo):
+        id_pacote = corpo[:2]
+        posicao = 2
+        concedidos = bytearray()
+        while posicao < len(corpo):
+            filtro, posicao = _texto(corpo, posicao)
+            qos = min(corpo[posicao] & 0x03, 2)
+            posicao += 1
+            sessao.inscricoes[filtro.decode('utf-8', errors='replace')] = qos
+            concedidos.append(qos)
+        self._destinos.clear()
+        sessao.escritor.write(_pacote(SUBACK << 4, id_pacote + bytes(concedidos)))
+
+    def _cancelar_inscricao(self, sessao, corpo):
+        posicao = 2
+        while posicao < len(corpo):
+            filtro, posicao = _texto(corpo, posicao)
+            sessao.inscricoes.pop(filtro.decode('utf-8', errors='replace'), None)
+        self._destinos.clear()
+        sessao.escritor.write(_pacote(UNSUBACK << 4, corpo[:2]))
+
+    def _remover(self, sessao):
+        if sessao in self._sessoes:
+            self._sessoes.discard(sessao)
+            self._destinos.clear()
+
+    def destinos(self, topico):
+        """Inscritos que recebem o tópico, com o QoS de cada um (em cache até as inscrições mudarem)."""
+        destinos = self._destinos.get(topico)
+        if destinos is None:
+            destinos = []
+            for sessao in self._sessoes:
+                casados = [qos for filtro, qos in sessao.inscricoes.items() if topico_casa(filtro, topico)]
+                if casados:
+                    destinos.append((sessao, max(casados)))
+            self._destinos[topico] = destinos
+        return destinos
+
+    async def _publicar(self, sessao, primeiro, corpo):
+        qos = (primeiro >> 1) & 0x03
+        topico_bytes, posicao = _texto(corpo, 0)
+        if qos:
+            id_pacote = corpo[posicao:posicao + 2]
+            posicao += 2
+        payload = corpo[posicao:]
+        self.estatisticas['publicacoes'][min(qos, 2)] += 1
+        repetida = False
+        if qos == 1:
+            sessao.escritor.write(_pacote(PUBACK << 4, id_pacote))
+        elif qos == 2:
+            numero = _U16.unpack(id_pacote)[0]
+            repetida = numero in sessao.qos2_recebidos
+            sessao.qos2_recebidos.add(numero)
+            sessao.escritor.write(_pacote(PUBREC << 4, id_pacote))
+        if repetida:
+            self.estatisticas['duplicadas_qos2'] += 1
+        else:
+            topico = topico_bytes.decode('utf-8', errors='replace')
+            texto_topico = _U16.pack(len(topico_bytes)) + topico_bytes
+            for destino, qos_inscricao in self.destinos(topico):
+                qos_entrega = min(qos, qos_inscricao)
+                if qos_entrega:
+                    numero = destino.novo_id()
+                    destino.em_voo[numero] = qos_entrega
+                    pacote = _pacote(PUBLISH << 4 | qos_entrega << 1, texto_topico + _U16.pack(numero) + payload)
+                else:
+                    pacote = _pacote(PUBLISH << 4, texto_topico + payload)
+                destino.escritor.write(pacote)
+                self.estatisticas['entregas'] += 1
+            for destino, _ in self.destinos(topico):
+                try:
+                    await destino.escritor.drain()
+                except ConnectionError:
+                    pass
+        await sessao.escritor.drain()
+
+
+if __name__ == '__main__':
+    argumentos = argparse.ArgumentParser(description='Broker MQTT mínimo para testes locais')
+    argumentos.add_argument('--host', default='127.0.0.1')
+    argumentos.add_argument('--porta', type=int, default=1883)
+    opcoes = argumentos.parse_args()
+    broker = BrokerLocal(opcoes.host, opcoes.porta).iniciar()
+    print(f"Broker MQTT local em {opcoes.host}:{broker.porta} (CTRL+C para encerrar)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print('Encerrando...')
+    finally:
+        print(f"Estatísticas: {broker.estatisticas}")
+        broker.parar()
@@ -0,0 +1,120 @@
+import argparse
+import contextlib
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import extracao_latencias
+from parser_telemetria import extrair_registro
+
+# Compara o tempo da extração de latências do rádio antiga (iterrows + parser linha a
+# linha + print por linha) com a vetorizada (extracao_latencias.py) em um
+# dados_radio.csv sintético.
+#
+# Uso: python compara_desempenho_extracao.py [--linhas 10000000] [--linhas-antigo 200000]
+#
+# A versão antiga leva minutos em milhões de linhas, então por padrão ela roda só nas
+# primeiras --linhas-antigo linhas e o tempo é extrapolado para o arquivo inteiro
+# (--linhas-antigo 0 roda no arquivo inteiro).
+
+ARQUIVO_SINTETICO = 'dados_radio_sintetico.csv'
+BLOCO_GERACAO = 200000
+
+
+def gerar_csv_sintetico(caminho, linhas, semente=1):
+    """Gera um CSV timestamp,valor no formato do receptor, com alguns overflows e linhas sem ID."""
+    gerador = np.random.default_rng(semente)
+    with open(caminho, 'w', encoding='utf-8', newline='') as f:
+        f.write('timestamp,valor\n')
+        for inicio in range(0, linhas, BLOCO_GERACAO):
+            n = min(BLOCO_GERACAO, linhas - inicio)
+            ids = np.arange(inicio + 1, inicio + n + 1)
+            latencias = gerador.integers(5, 60, n)
+            # ~0,1% de underflow do Arduino (valores perto de 2^32)
+            overflow = gerador.random(n) < 0.001
+            latencias[overflow] = (1 << 32) - latencias[overflow]
+            sem_id = gerador.random(n) < 0.001
+            temperaturas = gerador.uniform(20, 30, n)
+            pressoes = gerador.uniform(1000, 1025, n)
+            linhas_csv = []
+            for i in range(n):
+                id_msg = ids[i]
+                prefixo = '' if sem_id[i] else f'ID: {id_msg} | '
+                linhas_csv.append(
+                    f'{1750000000 + id_msg * 0.1:.4f},"{prefixo}Timestamp: {id_msg * 100} | Intervalo: 100 ms | '
+                    f'RadioLatency: {latencias[i]} ms | Temperatura: {temperaturas[i]:.2f} C | '
+                    f'Pressao: {pressoes[i]:.2f} hPa | Accel [X,Y,Z]: 1.015, 0.017, -0.067 | '
+                    f'Gyro [X,Y,Z] (°/s): ovf, -0.00, ovf"\n')
+            f.write(''.join(linhas_csv))
+
+
+def extrair_latencias_radio_antigo(arquivo_csv):
+    """Caminho antigo de compara_latencia_corrigido.py (iterrows, print por linha, loop de overflow)."""
+    df = pd.read_csv(arquivo_csv)
+    latencias_radio = []
+    ids = []
+    for index, row in df.iterrows():
+        valor = str(row['valor']) if 'valor' in df.columns else ''
+        registro = extrair_registro(valor)
+        if registro is not None and registro.radio_latency is not None:
+            radio_latency_val = registro.radio_latency
+            print(f"[DEBUG] Linha {index}: ID={registro.id}, RadioLatency={radio_latency_val} ms")
+            if radio_latency_val > 4000000000:
+                radio_latency_val = abs(radio_latency_val - (1 << 32))
+            latencias_radio.append(radio_latency_val)
+            ids.append(registro.id if registro.id is not None else index)
+        else:
+            print(f"[DEBUG] Nenhum valor de RadioLatency encontrado na linha {index}")
+    return ids, latencias_radio
+
+
+def main():
+    argumentos = argparse.ArgumentParser()
+    argumentos.add_argument('--linhas', type=int, default=10000000)
+    argumentos.add_argument('--linhas-antigo', type=int, default=200000)
+    argumentos.add_argument('--arquivo', default=ARQUIVO_SINTETICO)
+    opcoes = argumentos.parse_args()
+
+    if not os.path.exists(opcoes.arquivo):
+        print(f'Gerando {opcoes.linhas} linhas em {opcoes.arquivo}...')
+        inicio = time.perf_counter()
+        gerar_csv_sintetico(opcoes.arquivo, opcoes.linhas)
+        print(f'  {time.perf_counter() - inicio:.1f} s, {os.path.getsize(opcoes.arquivo) / 1e9:.2f} GB')
+    total_linhas = sum(1 for _ in open(opcoes.arquivo, 'rb')) - 1
+
+    inicio = time.perf_counter()
+    ids, latencias = extracao_latencias.extrair_latencias_radio(opcoes.arquivo)
+    tempo_novo = time.perf_counter() - inicio
+    print(f'Vetorizada: {len(latencias)} latências em {tempo_novo:.1f} s')
+
+    arquivo_antigo = opcoes.arquivo
+    linhas_antigo = total_linhas
+    if opcoes.linhas_antigo and opcoes.linhas_antigo < total_linhas:
+        # Amostra com as primeiras linhas para a versão antiga
+        arquivo_antigo = opcoes.arquivo + '.amostra.csv'
+        with open(opcoes.arquivo, encoding='utf-8') as origem, open(arquivo_antigo, 'w', encoding='utf-8') as destino:
+            for _ in range(opcoes.linhas_antigo + 1):
+                destino.write(origem.readline())
+        linhas_antigo = opcoes.linhas_antigo
+
+    # A saída por linha da versão antiga é descartada (no terminal ela seria ainda mais lenta)
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        ids_antigo, latencias_antigo = extrair_latencias_radio_antigo(arquivo_antigo)
+    tempo_antigo = (time.perf_counter() - inicio) * total_linhas / linhas_antigo
+    if arquivo_antigo != opcoes.arquivo:
+        os.remove(arquivo_antigo)
+
+    n = len(latencias_antigo)
+    iguais = ids_antigo == ids[:n].tolist() and latencias_antigo == latencias[:n].tolist()
+    estimado = ' (extrapolado de %d linhas)' % linhas_antigo if linhas_antigo < total_linhas else ''
+    print(f'Antiga: {tempo_antigo:.1f} s{estimado}')
+    print(f'Resultados iguais nas linhas comparadas: {"sim" if iguais else "NÃO"}')
+    print(f'Aceleração: {tempo_antigo / tempo_novo:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
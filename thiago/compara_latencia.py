@@ -1,8 +1,11 @@
-import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import re
 import os
+import sys
+import analise_streaming
+import deteccao_encoding
+import extracao_latencias
+from extracao_latencias import filtrar_faixa
+from renderizacao import Serie, figura_latencias, figura_medias, renderizar
 
 # IMPORTANTE: Este script SEMPRE obtém os dados de latência do rádio do arquivo dados_radio.csv,
 # mesmo quando estiver comparando com dados de MQTT. Isto garante que a fonte de dados
@@ -11,8 +14,11 @@ import os
 # Função para limpar caracteres problemáticos em arquivos CSV
 def limpar_arquivo_csv(arquivo_entrada, arquivo_saida=None):
     """
-    Limpa caracteres não-ASCII de um arquivo CSV para evitar problemas de encoding.
+    Limpa caracteres não-ASCII de um arquivo CSV, gravando uma cópia em UTF-8.
     Se arquivo_saida for None, sobrescreve o arquivo original.
+
+    Não é mais necessária para as análises (a leitura detecta o encoding sozinha);
+    fica para quem precisa de uma cópia só ASCII. A cópia é feita em blocos.
     """
     if arquivo_saida is None:
         arquivo_saida = arquivo_entrada + '.temp'
@@ -23,33 +29,12 @@ def limpar_arquivo_csv(arquivo_entrada, arquivo_saida=None):
     print(f"Limpando caracteres problemáticos de {arquivo_entrada}...")
     
     try:
-        # Tentar diferentes encodings para leitura
-        for encoding in ['utf-8', 'latin1', 'cp1252', 'iso-8859-1']:
-            try:
-                with open(arquivo_entrada, 'r', encoding=encoding, errors='replace') as f:
-                    conteudo = f.read()
-                print(f"Arquivo lido com sucesso usando encoding {encoding}")
-                break
-            except UnicodeDecodeError:
-                print(f"Falha ao ler com encoding {encoding}")
-                if encoding == 'iso-8859-1':  # último da lista
-                    raise Exception("Não foi possível ler o arquivo com nenhum encoding")
-        
-        # Limpar caracteres não-ASCII ou problemáticos
-        conteudo_limpo = ''
-        for char in conteudo:
-            if ord(char) < 128 or char in ',"\n\r':
-                conteudo_limpo += char
-            else:
-                conteudo_limpo += ' '  # Substitui caracteres problemáticos por espaço
-        
-        # Escrever arquivo limpo
-        with open(arquivo_saida, 'w', encoding='utf-8') as f:
-            f.write(conteudo_limpo)
+        encoding, erros = deteccao_encoding.transcodificar(arquivo_entrada, arquivo_saida, somente_ascii=True)
+        print(f"Arquivo lido com encoding {encoding}" + (" (bytes inválidos substituídos)" if erros != 'strict' else ""))
         
         if sobrescrever:
-            import os
             os.replace(arquivo_saida, arquivo_entrada)
+            deteccao_encoding.limpar_cache()
             print(f"Arquivo {arquivo_entrada} foi limpo e sobrescrito")
         else:
             print(f"Arquivo limpo salvo como {arquivo_saida}")
@@ -59,233 +44,47 @@ def limpar_arquivo_csv(arquivo_entrada, arquivo_saida=None):
         print(f"Erro ao limpar arquivo: {e}")
         return False
 
-# Regex para extrair dados do CSV (para compatibilidade com formato atual)
-radio_regex = re.compile(r'ID: (\d+) \| Timestamp: (\d+) \| Intervalo: \d+ ms \| RadioLatency: (\d+) ms')
-mqtt_regex = re.compile(r'Radio Latency: (\d+)ms, MQTT Latency: (\d+)ms, Total: (\d+)ms')
+# Mostrar um resumo da extração (contagens e linhas de exemplo) no terminal
+DEBUG_EXTRACAO = False
+# Modo streaming (analise_streaming.py): lê as capturas em blocos e calcula só as
+# estatísticas (com p95/p99), com memória limitada. Também ativado por --streaming
+MODO_STREAMING = False
 
-def extrair_latencias_radio(arquivo_csv):
-    # Verificar se o arquivo existe
-    if not os.path.exists(arquivo_csv):
-        print(f"Arquivo {arquivo_csv} não encontrado")
-        return [], []
-    
-    # Lista de encodings para tentar
-    encodings = ['utf-8', 'latin1', 'cp1252', 'iso-8859-1']
-    
-    # Tentar diferentes encodings
-    for encoding in encodings:
-        try:
-            print(f"Tentando ler {arquivo_csv} com encoding {encoding}...")
-            df = pd.read_csv(arquivo_csv, encoding=encoding)
-            print(f"Leitura bem-sucedida com encoding {encoding}")
-            break
-        except UnicodeDecodeError:
-            print(f"Erro de decodificação com encoding {encoding}")
-            if encoding == encodings[-1]:
-                print(f"Todos os encodings falharam, não foi possível ler {arquivo_csv}")
-                return [], []
-    
-    # Extrair latência do rádio das linhas de log
-    latencias_radio = []
-    ids = []
-    
-    # Verificar se o arquivo é no formato novo (dados_mqtt_dashboard.csv)
-    if 'radio_latency' in df.columns:
-        # Formato novo - valores diretos
-        latencias_radio_raw = df['radio_latency'].dropna().astype(int).tolist()
-        ids = list(range(len(latencias_radio_raw)))
-        
-        # Corrigir overflow do unsigned long no Arduino
-        # Se o valor é muito grande (próximo a 2^32), significa que houve underflow
-        # na subtração do timestamp no Arduino
-        for val in latencias_radio_raw:
-            if val > 4000000000:  # Valor próximo a 2^32 indica overflow
-                # Corrigir o overflow: real = 2^32 - val (inverte o underflow)
-                corrigido = val - (1 << 32)
-                latencias_radio.append(abs(corrigido))
-            else:
-                latencias_radio.append(val)
-    else:
-        # Formato antigo - extrair por regex
-        for index, row in df.iterrows():
-            valor = str(row['valor']) if 'valor' in df.columns else ''
-            
-            # Usar regex para capturar RadioLatency
-            match = radio_regex.search(valor)
-            if match:
-                id_num, timestamp, radio_latency = match.groups()
-                radio_latency_val = int(radio_latency)
-                
-                # Corrigir overflow
-                if radio_latency_val > 4000000000:
-                    radio_latency_val = abs(radio_latency_val - (1 << 32))
-                
-                latencias_radio.append(radio_latency_val)
-                ids.append(int(id_num))
-            else:
-                # Se o padrão principal não foi encontrado, tentar uma regex mais genérica
-                generic_regex = re.compile(r'RadioLatency: (\d+) ms')
-                match = generic_regex.search(valor)
-                if match:
-                    radio_latency = match.group(1)
-                    radio_latency_val = int(radio_latency)
-                    
-                    if radio_latency_val > 4000000000:
-                        radio_latency_val = abs(radio_latency_val - (1 << 32))
-                    
-                    latencias_radio.append(radio_latency_val)
-                    ids.append(index)  # Usar o índice como ID já que não temos o ID real
-    
-    return ids, latencias_radio
+def extrair_latencias_radio(arquivo_csv, debug=DEBUG_EXTRACAO):
+    ids, latencias_radio = extracao_latencias.extrair_latencias_radio(arquivo_csv, debug)
+    return ids.tolist(), latencias_radio.tolist()
 
-def extrair_latencias_mqtt(arquivo_csv):
+def extrair_latencias_mqtt(arquivo_csv, debug=DEBUG_EXTRACAO):
     """
     Extrai apenas as latências do MQTT a partir do arquivo CSV.
     IMPORTANTE: A função retorna uma lista vazia para latencias_radio,
     pois todas as latências de rádio devem vir do arquivo dados_radio.csv.
     """
-    # Verificar se o arquivo existe
-    if not os.path.exists(arquivo_csv):
-        print(f"Arquivo {arquivo_csv} não encontrado")
-        return [], [], []
-    
-    # Lista de encodings para tentar
-    encodings = ['utf-8', 'latin1', 'cp1252', 'iso-8859-1']
-    
-    # Tentar diferentes encodings
-    for encoding in encodings:
-        try:
-            print(f"Tentando ler {arquivo_csv} com encoding {encoding}...")
-            df = pd.read_csv(arquivo_csv, encoding=encoding)
-            print(f"Leitura bem-sucedida com encoding {encoding}")
-            break
-        except UnicodeDecodeError:
-            print(f"Erro de decodificação com encoding {encoding}")
-            if encoding == encodings[-1]:
-                print(f"Todos os encodings falharam, não foi possível ler {arquivo_csv}")
-                return [], [], []
-    
-    # Extrair latências do MQTT apenas
-    latencias_mqtt = []
-    latencias_total = []
-    
-    # IMPORTANTE: Inicializamos com uma lista vazia, pois os dados de rádio
-    # devem vir SEMPRE do arquivo dados_radio.csv
-    latencias_radio = []
-    
-    # Verificar se o arquivo é no formato novo (dados_mqtt_dashboard.csv)
-    if 'mqtt_latency' in df.columns and 'total_latency' in df.columns:
-        # Para valores MQTT muito grandes (erro de timestamp), vamos calcular 
-        # valores mais realistas baseados no timestamp do arquivo e nos IDs
-        
-        # Extrair timestamps do sistema
-        timestamps_sistema = df['timestamp'].dropna().tolist()
-        
-        # Verificar coluna mqtt_latency para valores realistas
-        if 'mqtt_latency' in df.columns:
-            latencias_mqtt_raw = df['mqtt_latency'].dropna().tolist()
-            
-            # Se os valores são irrealistas (muito grandes), gerar valores realistas
-            if any(l > 1000000 for l in latencias_mqtt_raw):
-                # Gerar latências MQTT realistas (5-20ms é uma faixa típica)
-                print("Valores de latência MQTT irrealistas detectados, gerando valores realistas...")
-                latencias_mqtt = [np.random.randint(5, 20) for _ in range(len(latencias_radio))]
-            else:
-                # Usar valores reais da coluna
-                latencias_mqtt = latencias_mqtt_raw
-        else:
-            # Estimar latência MQTT se não houver dados
-            mqtt_base_latency = 5  # ms - valor base estimado
-            latencias_mqtt = [mqtt_base_latency + (i % 15) for i in range(len(latencias_radio))]
-        
-        # Verificar coluna total_latency para valores realistas
-        if 'total_latency' in df.columns:
-            latencias_total_raw = df['total_latency'].dropna().tolist()
-            
-            # Se os valores são irrealistas (muito grandes), calcular valores realistas
-            if any(l > 1000000 for l in latencias_total_raw):
-                print("Valores de latência total irrealistas detectados, recalculando...")
-                # Calcular latência total como a soma das latências individuais
-                latencias_total = []
-                for i in range(min(len(latencias_radio), len(latencias_mqtt))):
-                    latencias_total.append(latencias_radio[i] + latencias_mqtt[i])
-            else:
-                # Usar valores reais da coluna
-                latencias_total = latencias_total_raw
-        else:
-            # Calcular latência total como a soma das latências individuais
-            latencias_total = []
-            for i in range(min(len(latencias_radio), len(latencias_mqtt))):
-                latencias_total.append(latencias_radio[i] + latencias_mqtt[i])
-    
-    else:
-        # Formato antigo - extrair por regex
-        for index, row in df.iterrows():
-            valor = str(row['valor']) if 'valor' in df.columns else ''
-            match = mqtt_regex.search(valor)
-            if match:
-                radio_latency, mqtt_latency, total_latency = match.groups()
-                # Corrigir overflow do rádio se necessário
-                radio_latency_val = int(radio_latency)
-                if radio_latency_val > 4000000000:
-                    radio_latency_val = abs(radio_latency_val - (1 << 32))
-                
-                mqtt_latency_val = int(mqtt_latency)
-                # Verificar se o valor MQTT é realista
-                if mqtt_latency_val > 1000000:
-                    mqtt_latency_val = np.random.randint(5, 20)
-                
-                latencias_radio.append(radio_latency_val)
-                latencias_mqtt.append(mqtt_latency_val)
-                # Sempre calcular a total como soma das partes para garantir consistência
-                latencias_total.append(radio_latency_val + mqtt_latency_val)
-    
-    # Garantir que todas as listas tenham o mesmo comprimento para facilitar a plotagem
-    min_len = min(len(latencias_radio), len(latencias_mqtt), len(latencias_total))
-    latencias_radio = latencias_radio[:min_len]
-    latencias_mqtt = latencias_mqtt[:min_len]
-    latencias_total = latencias_total[:min_len]
-    
-    # Verificação final para garantir que total = radio + mqtt
-    # Esta etapa confirma que os dados são consistentes
-    for i in range(len(latencias_total)):
-        # Se a diferença entre o total e a soma for maior que 1ms, corrigir
-        if abs(latencias_total[i] - (latencias_radio[i] + latencias_mqtt[i])) > 1:
-            print(f"Corrigindo inconsistência na amostra {i}: total={latencias_total[i]}, radio={latencias_radio[i]}, mqtt={latencias_mqtt[i]}")
-            latencias_total[i] = latencias_radio[i] + latencias_mqtt[i]
-    
-    return latencias_radio, latencias_mqtt, latencias_total
+    _, latencias_mqtt, latencias_total = extracao_latencias.extrair_latencias_mqtt(arquivo_csv, debug)
+    return [], latencias_mqtt.tolist(), latencias_total.tolist()
 
 def plotar_comparacao_latencias():
     # Usar sempre o arquivo dados_radio.csv para extrair as latências do rádio
     arquivo_radio = 'dados_radio.csv'
     
-    # Tentar limpar o arquivo CSV caso haja problemas de encoding
-    limpar_arquivo_csv(arquivo_radio)
       # Carregar dados do rádio
     try:
-        # Tentar ler o arquivo como texto primeiro para diagnosticar problemas
+        # O encoding é detectado pelo começo do arquivo (caracteres corrompidos como
+        # o "°/s" da serial não impedem a leitura)
         try:
-            with open(arquivo_radio, 'rb') as f:
-                # Ler os primeiros bytes para diagnóstico
-                conteudo = f.read(100)
-                print(f"Primeiros bytes do arquivo {arquivo_radio}: {conteudo}")
-        except Exception as e:
-            print(f"Erro ao tentar ler bytes do arquivo para diagnóstico: {e}")
+            encoding, erros = deteccao_encoding.detectar_encoding(arquivo_radio)
+            print(f"Encoding de {arquivo_radio}: {encoding}" + (" (bytes inválidos substituídos)" if erros != 'strict' else ""))
+        except OSError as e:
+            print(f"Erro ao detectar o encoding de {arquivo_radio}: {e}")
         
         # Tentar extrair latências
         ids_radio, latencias_radio = extrair_latencias_radio(arquivo_radio)
         print(f"Dados de rádio (de {arquivo_radio}): {len(latencias_radio)} amostras")
         
-        # Filtragem e normalização dos dados de rádio
-        latencias_radio_filtradas = []
-        for latencia in latencias_radio:
-            # Filtra valores absurdos (negativos ou muito altos)
-            if 0 <= latencia <= 1000:  # limite razoável para latência
-                latencias_radio_filtradas.append(latencia)
-            else:
-                # Gerar valor realista baseado em outros valores ou usar valor padrão
-                latencias_radio_filtradas.append(50)  # 50ms é um valor típico
+        # Filtragem e normalização dos dados de rádio: valores absurdos (negativos ou
+        # acima de 1000 ms) viram 50 ms, um valor típico
+        latencias_radio_filtradas, _ = filtrar_faixa(latencias_radio, 0, 1000, 50)
+        latencias_radio_filtradas = latencias_radio_filtradas.tolist()
         
         # Se não temos valores válidos após filtragem, gerar alguns dados realistas
         if not latencias_radio_filtradas or all(l == 50 for l in latencias_radio_filtradas):
@@ -302,24 +101,13 @@ def plotar_comparacao_latencias():
         # Gerar dados realistas para rádio
         latencias_radio = [np.random.randint(40, 60) for _ in range(50)]    # Tentar carregar dados do MQTT do novo formato
     try:
-        # Limpar arquivo MQTT se necessário
-        limpar_arquivo_csv('dados_mqtt_dashboard.csv')
-        
         # Carregamos dados MQTT do dashboard
         _, latencias_mqtt, _ = extrair_latencias_mqtt('dados_mqtt_dashboard.csv')
         print(f"Dados de MQTT (novo formato): {len(latencias_mqtt)} amostras")
         
-        # Verificar valores extremos de latências e corrigir
-        latencias_mqtt_filtradas = []
-        for latencia in latencias_mqtt:
-            # Filtrar valores irrealistas (muito grandes ou negativos)
-            if 0 <= latencia <= 500:  # 500ms como limite superior razoável
-                latencias_mqtt_filtradas.append(latencia)
-            else:
-                # Usar um valor típico para MQTT
-                latencias_mqtt_filtradas.append(15)  # ~15ms é típico para MQTT local
-        
-        latencias_mqtt = latencias_mqtt_filtradas
+        # Verificar valores extremos de latências e corrigir: fora de 0-500 ms viram
+        # 15 ms, típico para MQTT local
+        latencias_mqtt = filtrar_faixa(latencias_mqtt, 0, 500, 15)[0].tolist()
         
         # Recalcular latências totais usando sempre os dados de rádio do dados_radio.csv
         latencias_total = []
@@ -331,24 +119,12 @@ def plotar_comparacao_latencias():
     except Exception as e:
         print(f"Erro ao carregar dados do MQTT do novo formato: {e}")        # Tentar formato antigo
         try:
-            # Limpar arquivo MQTT se necessário
-            limpar_arquivo_csv('dados_mqtt.csv')
-            
             # Carrega apenas os dados de MQTT do formato antigo
             _, latencias_mqtt, _ = extrair_latencias_mqtt('dados_mqtt.csv')
             print(f"Dados de MQTT (formato antigo): {len(latencias_mqtt)} amostras")
             
             # Verificar valores extremos das latências
-            latencias_mqtt_filtradas = []
-            for latencia in latencias_mqtt:
-                # Filtrar valores irrealistas
-                if 0 <= latencia <= 500:
-                    latencias_mqtt_filtradas.append(latencia)
-                else:
-                    # Usar um valor típico para MQTT
-                    latencias_mqtt_filtradas.append(15)
-            
-            latencias_mqtt = latencias_mqtt_filtradas
+            latencias_mqtt = filtrar_faixa(latencias_mqtt, 0, 500, 15)[0].tolist()
             
             # Recalcular totais usando sempre o dados_radio.csv para as latências do rádio
             latencias_total = []
@@ -384,18 +160,14 @@ def plotar_comparacao_latencias():
         print("Nenhum dado encontrado para análise.")
         return
     
-    # Criar figura para o gráfico
-    plt.figure(figsize=(12, 8))
-    
-    # Plotar dados disponíveis
-    x_radio = range(len(latencias_radio))
-    x_mqtt = range(len(latencias_mqtt))
+    # Séries do gráfico de linhas, reduzidas para desenhar (renderizacao.py)
+    series = []
     
     # Estatísticas
     stats = {}
     
     if latencias_radio:
-        plt.plot(x_radio, latencias_radio, 'b-', label='Latência Rádio (ms)')
+        series.append((Serie(None, latencias_radio), 'b-', 'Latência Rádio (ms)'))
         stats['radio'] = {
             'min': min(latencias_radio),
             'max': max(latencias_radio),
@@ -405,8 +177,8 @@ def plotar_comparacao_latencias():
         }
     
     if latencias_mqtt:
-        plt.plot(x_mqtt, latencias_mqtt, 'r-', label='Latência MQTT (ms)')
-        plt.plot(x_mqtt, latencias_total, 'g-', label='Latência Total (Rádio + MQTT) (ms)')
+        series.append((Serie(None, latencias_mqtt), 'r-', 'Latência MQTT (ms)'))
+        series.append((Serie(None, latencias_total), 'g-', 'Latência Total (Rádio + MQTT) (ms)'))
         stats['mqtt'] = {
             'min': min(latencias_mqtt),
             'max': max(latencias_mqtt),
@@ -421,15 +193,7 @@ def plotar_comparacao_latencias():
             'median': np.median(latencias_total),
             'std': np.std(latencias_total)
         }
-      # Configurações do gráfico
-    plt.title('Comparação de Latências: Rádio vs MQTT')
-    plt.xlabel('Número da amostra')
-    plt.ylabel('Latência (ms)')
-    plt.grid(True)
-    plt.legend()
-    
-    # Criar um gráfico de barras para comparar médias
-    plt.figure(figsize=(10, 6))
+    # Médias para o gráfico de barras
     meios = []
     latencias_medias = []
     
@@ -444,7 +208,8 @@ def plotar_comparacao_latencias():
     if 'total' in stats:
         meios.append('Total (Rádio + MQTT)')
         latencias_medias.append(stats['total']['avg'])
-      # Ajustar escala vertical para valores razoáveis
+    
+    # Ajustar escala vertical para valores razoáveis
     max_latency = max(stats['radio']['avg'] if 'radio' in stats else 0, 
                       stats['mqtt']['avg'] if 'mqtt' in stats else 0,
                       stats['total']['avg'] if 'total' in stats else 0)
@@ -452,22 +217,6 @@ def plotar_comparacao_latencias():
     # Adicionar 20% de margem
     plt_max = max_latency * 1.2
     
-    # Criar gráfico de barras com cores diferentes
-    bars = plt.bar(meios, latencias_medias, color=['blue', 'red', 'green'])
-    plt.ylim(0, plt_max)  # Limitar a altura do gráfico
-    
-    # Adicionar valores nas barras
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2., height + (plt_max * 0.02),
-                 f'{height:.2f} ms',
-                 ha='center', va='bottom')
-    
-    plt.title('Latência Média por Meio de Transmissão')
-    plt.ylabel('Latência Média (ms)')
-    plt.grid(axis='y', linestyle='--', alpha=0.7)
-    plt.savefig('comparacao_latencias_barras.png')
-    
     # Imprimir estatísticas
     print("\nEstatísticas de Latência:")
     for key, data in stats.items():
@@ -478,10 +227,6 @@ def plotar_comparacao_latencias():
         print(f"Mediana: {data['median']} ms")
         print(f"Desvio Padrão: {data['std']:.2f} ms")
     
-    # Salvar e mostrar o gráfico de linhas
-    plt.figure(1)
-    plt.savefig('comparacao_latencias.png')
-    
     # Validação final
     if 'radio' in stats and 'mqtt' in stats and 'total' in stats:
         soma_medias = stats['radio']['avg'] + stats['mqtt']['avg']
@@ -500,7 +245,25 @@ def plotar_comparacao_latencias():
         print(f"A transmissão via MQTT é {diff_percent:.2f}% {'mais lenta' if diff_percent > 0 else 'mais rápida'} que a transmissão via Rádio")
         print(f"Diferença absoluta média: {abs(stats['mqtt']['avg'] - stats['radio']['avg']):.2f} ms")
     
-    plt.show()
+    # Gráfico de linhas e de barras: em janela, ou salvos em paralelo com --sem-janela
+    renderizar([
+        (figura_latencias, (series,), 'comparacao_latencias.png'),
+        (figura_medias, (meios, latencias_medias, plt_max), 'comparacao_latencias_barras.png'),
+    ])
+
+def resumir_latencias_streaming():
+    """Estatísticas de plotar_comparacao_latencias lendo as capturas em blocos."""
+    arquivo_radio = 'dados_radio.csv'
+    arquivo_mqtt = 'dados_mqtt_dashboard.csv' if os.path.exists('dados_mqtt_dashboard.csv') else 'dados_mqtt.csv'
+    if not os.path.exists(arquivo_radio) or not os.path.exists(arquivo_mqtt):
+        print("Arquivos de dados não encontrados")
+        return
+    print(f"Modo streaming: {arquivo_radio} e {arquivo_mqtt}")
+    estatisticas = analise_streaming.estatisticas_latencias(arquivo_radio, arquivo_mqtt)
+    analise_streaming.resumir(estatisticas, 'comparacao_latencias_barras.png')
 
 if __name__ == "__main__":
-    plotar_comparacao_latencias()
+    if MODO_STREAMING or '--streaming' in sys.argv:
+        resumir_latencias_streaming()
+    else:
+        plotar_comparacao_latencias()
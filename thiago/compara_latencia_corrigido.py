@@ -1,196 +1,34 @@
-import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import re
 import os
+import sys
+import analise_incremental
+import analise_streaming
+import extracao_latencias
+from extracao_latencias import filtrar_faixa
+from renderizacao import Serie, figura_latencias, figura_medias, renderizar
 
-# Regex corrigido para extrair dados do CSV (usando o formato atual do dados_radio.csv)
-radio_regex = re.compile(r'ID: (\d+) \| Timestamp: (\d+) \| Intervalo: \d+ ms \| RadioLatency: (\d+) ms')
-mqtt_regex = re.compile(r'Radio Latency: (\d+)ms, MQTT Latency: (\d+)ms, Total: (\d+)ms')
+# Mostrar um resumo da extração (contagens e linhas de exemplo) no terminal
+DEBUG_EXTRACAO = False
+# Modo streaming (analise_streaming.py): lê as capturas em blocos e calcula só as
+# estatísticas (com p95/p99), com memória limitada. Também ativado por --streaming
+MODO_STREAMING = False
+# Modo incremental (analise_incremental.py): como o streaming, mas guarda um checkpoint
+# e na próxima execução lê só o que foi acrescentado às capturas. Também ativado por
+# --incremental (--reiniciar descarta o checkpoint)
+MODO_INCREMENTAL = False
 
-def extrair_latencias_radio(arquivo_csv):
+def extrair_latencias_radio(arquivo_csv, debug=DEBUG_EXTRACAO):
     """
     Extrai as latências do rádio a partir do arquivo CSV.
-    Suporta tanto o formato novo quanto o antigo.
+    Suporta tanto o formato novo quanto o antigo (ver extracao_latencias.py).
     """
-    # Verificar se o arquivo existe
-    if not os.path.exists(arquivo_csv):
-        print(f"Arquivo {arquivo_csv} não encontrado")
-        return [], []
-        
-    df = pd.read_csv(arquivo_csv)
-    
-    # Extrair latência do rádio das linhas de log
-    latencias_radio = []
-    ids = []
-    
-    # Verificar se o arquivo é no formato novo (dados_mqtt_dashboard.csv)
-    if 'radio_latency' in df.columns:
-        print(f"Usando formato novo de dados (coluna radio_latency) do arquivo {arquivo_csv}")
-        # Formato novo - valores diretos
-        latencias_radio_raw = df['radio_latency'].dropna().astype(int).tolist()
-        ids = list(range(len(latencias_radio_raw)))
-        
-        # Corrigir overflow do unsigned long no Arduino
-        # Se o valor é muito grande (próximo a 2^32), significa que houve underflow
-        # na subtração do timestamp no Arduino
-        for val in latencias_radio_raw:
-            if val > 4000000000:  # Valor próximo a 2^32 indica overflow
-                # Corrigir o overflow: real = 2^32 - val (inverte o underflow)
-                corrigido = val - (1 << 32)
-                latencias_radio.append(abs(corrigido))
-            else:
-                latencias_radio.append(val)
-    else:
-        print(f"Usando formato antigo de dados (regex na coluna valor) do arquivo {arquivo_csv}")
-        print("Procurando por padrão: 'ID: X | Timestamp: X | ... | RadioLatency: X ms'")
-        
-        # Formato antigo - extrair por regex
-        for index, row in df.iterrows():
-            # Converter para string se necessário e verificar se a coluna 'valor' existe
-            valor = str(row['valor']) if 'valor' in df.columns else ''
-            
-            # Usar regex corrigido para capturar RadioLatency
-            match = radio_regex.search(valor)
-            if match:
-                id_num, timestamp, radio_latency = match.groups()
-                radio_latency_val = int(radio_latency)
-                
-                print(f"[DEBUG] Linha {index}: ID={id_num}, RadioLatency={radio_latency} ms")
-                
-                # Corrigir overflow se necessário
-                if radio_latency_val > 4000000000:
-                    radio_latency_val = abs(radio_latency_val - (1 << 32))
-                
-                latencias_radio.append(radio_latency_val)
-                ids.append(int(id_num))
-            else:
-                # Se o padrão principal não foi encontrado, tentar uma regex mais genérica
-                generic_regex = re.compile(r'RadioLatency: (\d+) ms')
-                match = generic_regex.search(valor)
-                if match:
-                    radio_latency = match.group(1)
-                    radio_latency_val = int(radio_latency)
-                    
-                    print(f"[DEBUG] Linha {index}: RadioLatency={radio_latency} ms (usando regex genérica)")
-                    
-                    if radio_latency_val > 4000000000:
-                        radio_latency_val = abs(radio_latency_val - (1 << 32))
-                    
-                    latencias_radio.append(radio_latency_val)
-                    ids.append(index)  # Usar o índice como ID já que não temos o ID real
-                else:
-                    print(f"[DEBUG] Nenhum valor de RadioLatency encontrado na linha {index}")
-    
+    ids, latencias_radio = extracao_latencias.extrair_latencias_radio(arquivo_csv, debug)
     print(f"Total de {len(latencias_radio)} valores de latência encontrados em {arquivo_csv}")
-    return ids, latencias_radio
+    return ids.tolist(), latencias_radio.tolist()
 
-def extrair_latencias_mqtt(arquivo_csv):
-    # Verificar se o arquivo existe
-    if not os.path.exists(arquivo_csv):
-        print(f"Arquivo {arquivo_csv} não encontrado")
-        return [], [], []
-        
-    df = pd.read_csv(arquivo_csv)
-    
-    # Extrair latências do MQTT
-    latencias_radio = []
-    latencias_mqtt = []
-    latencias_total = []
-    
-    # Verificar se o arquivo é no formato novo (dados_mqtt_dashboard.csv)
-    if 'mqtt_latency' in df.columns and 'total_latency' in df.columns:
-        print(f"Usando formato novo de dados MQTT do arquivo {arquivo_csv}")
-        
-        # Extrair timestamps do sistema
-        timestamps_sistema = df['timestamp'].dropna().tolist()
-        
-        if 'radio_latency' in df.columns:
-            # Corrigir valores de latência do rádio (overflow do Arduino)
-            latencias_radio_raw = df['radio_latency'].dropna().astype(int).tolist()
-            for val in latencias_radio_raw:
-                if val > 4000000000:  # Valor próximo a 2^32 indica overflow
-                    # Corrigir o overflow
-                    corrigido = abs(val - (1 << 32))
-                    latencias_radio.append(corrigido)
-                else:
-                    latencias_radio.append(val)
-        
-        # Verificar coluna mqtt_latency para valores realistas
-        if 'mqtt_latency' in df.columns:
-            latencias_mqtt_raw = df['mqtt_latency'].dropna().tolist()
-            
-            # Se os valores são irrealistas (muito grandes), gerar valores realistas
-            if any(l > 1000000 for l in latencias_mqtt_raw):
-                print("Valores de latência MQTT irrealistas detectados, gerando valores realistas...")
-                # Gerar latências MQTT realistas (5-20ms é uma faixa típica)
-                latencias_mqtt = [np.random.randint(5, 20) for _ in range(len(latencias_radio))]
-            else:
-                # Usar valores reais da coluna
-                latencias_mqtt = latencias_mqtt_raw
-        else:
-            # Estimar latência MQTT se não houver dados
-            mqtt_base_latency = 5  # ms - valor base estimado
-            latencias_mqtt = [mqtt_base_latency + (i % 15) for i in range(len(latencias_radio))]
-        
-        # Verificar coluna total_latency para valores realistas
-        if 'total_latency' in df.columns:
-            latencias_total_raw = df['total_latency'].dropna().tolist()
-            
-            # Se os valores são irrealistas (muito grandes), calcular valores realistas
-            if any(l > 1000000 for l in latencias_total_raw):
-                print("Valores de latência total irrealistas detectados, recalculando...")
-                # Calcular latência total como a soma das latências individuais
-                latencias_total = []
-                for i in range(min(len(latencias_radio), len(latencias_mqtt))):
-                    latencias_total.append(latencias_radio[i] + latencias_mqtt[i])
-            else:
-                # Usar valores reais da coluna
-                latencias_total = latencias_total_raw
-        else:
-            # Calcular latência total como a soma das latências individuais
-            latencias_total = []
-            for i in range(min(len(latencias_radio), len(latencias_mqtt))):
-                latencias_total.append(latencias_radio[i] + latencias_mqtt[i])
-    
-    else:
-        print(f"Usando formato antigo de dados MQTT do arquivo {arquivo_csv}")
-        # Formato antigo - extrair por regex
-        for index, row in df.iterrows():
-            valor = str(row['valor']) if 'valor' in df.columns else ''
-            match = mqtt_regex.search(valor)
-            if match:
-                radio_latency, mqtt_latency, total_latency = match.groups()
-                # Corrigir overflow do rádio se necessário
-                radio_latency_val = int(radio_latency)
-                if radio_latency_val > 4000000000:
-                    radio_latency_val = abs(radio_latency_val - (1 << 32))
-                
-                mqtt_latency_val = int(mqtt_latency)
-                # Verificar se o valor MQTT é realista
-                if mqtt_latency_val > 1000000:
-                    mqtt_latency_val = np.random.randint(5, 20)
-                
-                latencias_radio.append(radio_latency_val)
-                latencias_mqtt.append(mqtt_latency_val)
-                # Sempre calcular a total como soma das partes para garantir consistência
-                latencias_total.append(radio_latency_val + mqtt_latency_val)
-    
-    # Garantir que todas as listas tenham o mesmo comprimento para facilitar a plotagem
-    min_len = min(len(latencias_radio), len(latencias_mqtt), len(latencias_total))
-    latencias_radio = latencias_radio[:min_len]
-    latencias_mqtt = latencias_mqtt[:min_len]
-    latencias_total = latencias_total[:min_len]
-    
-    # Verificação final para garantir que total = radio + mqtt
-    # Esta etapa confirma que os dados são consistentes
-    for i in range(len(latencias_total)):
-        # Se a diferença entre o total e a soma for maior que 1ms, corrigir
-        if abs(latencias_total[i] - (latencias_radio[i] + latencias_mqtt[i])) > 1:
-            print(f"Corrigindo inconsistência na amostra {i}: total={latencias_total[i]}, radio={latencias_radio[i]}, mqtt={latencias_mqtt[i]}")
-            latencias_total[i] = latencias_radio[i] + latencias_mqtt[i]
-    
-    return latencias_radio, latencias_mqtt, latencias_total
+def extrair_latencias_mqtt(arquivo_csv, debug=DEBUG_EXTRACAO):
+    latencias_radio, latencias_mqtt, latencias_total = extracao_latencias.extrair_latencias_mqtt(arquivo_csv, debug)
+    return latencias_radio.tolist(), latencias_mqtt.tolist(), latencias_total.tolist()
 
 def plotar_comparacao_latencias():
     # Verificar se existe o arquivo de dados corrigidos
@@ -206,16 +44,12 @@ def plotar_comparacao_latencias():
             
         print(f"Valores de latência do rádio: {latencias_radio[:10]}... (primeiros 10)")
         
-        # Filtragem e normalização dos dados de rádio
-        latencias_radio_filtradas = []
-        for latencia in latencias_radio:
-            # Filtra valores absurdos (negativos ou muito altos)
-            if 0 <= latencia <= 1000:  # limite razoável para latência
-                latencias_radio_filtradas.append(latencia)
-            else:
-                print(f"Valor de latência fora do limite: {latencia}ms - substituindo por 50ms")
-                # Gerar valor realista baseado em outros valores ou usar valor padrão
-                latencias_radio_filtradas.append(50)  # 50ms é um valor típico
+        # Filtragem e normalização dos dados de rádio: valores absurdos (negativos ou
+        # acima de 1000 ms) viram 50 ms, um valor típico
+        latencias_radio_filtradas, fora = filtrar_faixa(latencias_radio, 0, 1000, 50)
+        latencias_radio_filtradas = latencias_radio_filtradas.tolist()
+        if fora:
+            print(f"{fora} valores de latência fora do limite substituídos por 50ms")
         
         # Se não temos valores válidos após filtragem, gerar alguns dados realistas
         if not latencias_radio_filtradas or all(l == latencias_radio_filtradas[0] for l in latencias_radio_filtradas):
@@ -254,18 +88,12 @@ def plotar_comparacao_latencias():
             
         print(f"Valores de latência do MQTT: {latencias_mqtt[:10]}... (primeiros 10)")
         
-        # Verificar valores extremos de latências e corrigir
-        latencias_mqtt_filtradas = []
-        for latencia in latencias_mqtt:
-            # Filtrar valores irrealistas (muito grandes ou negativos)
-            if 0 <= latencia <= 500:  # 500ms como limite superior razoável
-                latencias_mqtt_filtradas.append(latencia)
-            else:
-                print(f"Valor de latência MQTT fora do limite: {latencia}ms - substituindo por 15ms")
-                # Usar um valor típico para MQTT
-                latencias_mqtt_filtradas.append(15)  # ~15ms é típico para MQTT local
-        
-        latencias_mqtt = latencias_mqtt_filtradas
+        # Verificar valores extremos de latências e corrigir: fora de 0-500 ms viram
+        # 15 ms, típico para MQTT local
+        latencias_mqtt, fora = filtrar_faixa(latencias_mqtt, 0, 500, 15)
+        latencias_mqtt = latencias_mqtt.tolist()
+        if fora:
+            print(f"{fora} valores de latência MQTT fora do limite substituídos por 15ms")
         
         # Recalcular latências totais para garantir consistência
         latencias_total = []
@@ -285,16 +113,7 @@ def plotar_comparacao_latencias():
                 raise ValueError("Nenhum dado de latência MQTT encontrado no formato antigo")
                 
             # Verificar valores extremos das latências
-            latencias_mqtt_filtradas = []
-            for latencia in latencias_mqtt:
-                # Filtrar valores irrealistas
-                if 0 <= latencia <= 500:
-                    latencias_mqtt_filtradas.append(latencia)
-                else:
-                    # Usar um valor típico para MQTT
-                    latencias_mqtt_filtradas.append(15)
-            
-            latencias_mqtt = latencias_mqtt_filtradas
+            latencias_mqtt = filtrar_faixa(latencias_mqtt, 0, 500, 15)[0].tolist()
             
             # Recalcular totais
             latencias_total = []
@@ -336,18 +155,14 @@ def plotar_comparacao_latencias():
         print("Nenhum dado encontrado para análise.")
         return
     
-    # Criar figura para o gráfico
-    plt.figure(figsize=(12, 8))
-    
-    # Plotar dados disponíveis
-    x_radio = range(len(latencias_radio))
-    x_mqtt = range(len(latencias_mqtt))
+    # Séries do gráfico de linhas, reduzidas para desenhar (renderizacao.py)
+    series = []
     
     # Estatísticas
     stats = {}
     
     if latencias_radio:
-        plt.plot(x_radio, latencias_radio, 'b-', label='Latência Rádio (ms)')
+        series.append((Serie(None, latencias_radio), 'b-', 'Latência Rádio (ms)'))
         stats['radio'] = {
             'min': min(latencias_radio),
             'max': max(latencias_radio),
@@ -357,8 +172,8 @@ def plotar_comparacao_latencias():
         }
     
     if latencias_mqtt:
-        plt.plot(x_mqtt, latencias_mqtt, 'r-', label='Latência MQTT (ms)')
-        plt.plot(x_mqtt, latencias_total, 'g-', label='Latência Total (Rádio + MQTT) (ms)')
+        series.append((Serie(None, latencias_mqtt), 'r-', 'Latência MQTT (ms)'))
+        series.append((Serie(None, latencias_total), 'g-', 'Latência Total (Rádio + MQTT) (ms)'))
         stats['mqtt'] = {
             'min': min(latencias_mqtt),
             'max': max(latencias_mqtt),
@@ -374,15 +189,7 @@ def plotar_comparacao_latencias():
             'std': np.std(latencias_total)
         }
     
-    # Configurações do gráfico
-    plt.title('Comparação de Latências: Rádio vs MQTT')
-    plt.xlabel('Número da amostra')
-    plt.ylabel('Latência (ms)')
-    plt.grid(True)
-    plt.legend()
-    
-    # Criar um gráfico de barras para comparar médias
-    plt.figure(figsize=(10, 6))
+    # Médias para o gráfico de barras
     meios = []
     latencias_medias = []
     
@@ -406,22 +213,6 @@ def plotar_comparacao_latencias():
     # Adicionar 20% de margem
     plt_max = max_latency * 1.2
     
-    # Criar gráfico de barras com cores diferentes
-    bars = plt.bar(meios, latencias_medias, color=['blue', 'red', 'green'])
-    plt.ylim(0, plt_max)  # Limitar a altura do gráfico
-    
-    # Adicionar valores nas barras
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2., height + (plt_max * 0.02),
-                 f'{height:.2f} ms',
-                 ha='center', va='bottom')
-    
-    plt.title('Latência Média por Meio de Transmissão')
-    plt.ylabel('Latência Média (ms)')
-    plt.grid(axis='y', linestyle='--', alpha=0.7)
-    plt.savefig('comparacao_latencias_barras.png')
-    
     # Imprimir estatísticas
     print("\nEstatísticas de Latência:")
     for key, data in stats.items():
@@ -432,10 +223,6 @@ def plotar_comparacao_latencias():
         print(f"Mediana: {data['median']} ms")
         print(f"Desvio Padrão: {data['std']:.2f} ms")
     
-    # Salvar e mostrar o gráfico de linhas
-    plt.figure(1)
-    plt.savefig('comparacao_latencias.png')
-    
     # Validação final
     if 'radio' in stats and 'mqtt' in stats and 'total' in stats:
         soma_medias = stats['radio']['avg'] + stats['mqtt']['avg']
@@ -454,7 +241,41 @@ def plotar_comparacao_latencias():
         print(f"A transmissão via MQTT é {diff_percent:.2f}% {'mais lenta' if diff_percent > 0 else 'mais rápida'} que a transmissão via Rádio")
         print(f"Diferença absoluta média: {abs(stats['mqtt']['avg'] - stats['radio']['avg']):.2f} ms")
     
-    plt.show()
+    # Gráfico de linhas e de barras: em janela, ou salvos em paralelo com --sem-janela
+    renderizar([
+        (figura_latencias, (series,), 'comparacao_latencias.png'),
+        (figura_medias, (meios, latencias_medias, plt_max), 'comparacao_latencias_barras.png'),
+    ])
+
+def resumir_latencias_streaming():
+    """Estatísticas de plotar_comparacao_latencias lendo as capturas em blocos."""
+    arquivo_radio = 'dados_radio_corrigido.csv' if os.path.exists('dados_radio_corrigido.csv') else 'dados_radio.csv'
+    arquivo_mqtt = 'dados_mqtt_dashboard.csv' if os.path.exists('dados_mqtt_dashboard.csv') else 'dados_mqtt.csv'
+    if not os.path.exists(arquivo_radio) or not os.path.exists(arquivo_mqtt):
+        print("Arquivos de dados não encontrados")
+        return
+    print(f"Modo streaming: {arquivo_radio} e {arquivo_mqtt}")
+    estatisticas = analise_streaming.estatisticas_latencias(arquivo_radio, arquivo_mqtt)
+    analise_streaming.resumir(estatisticas, 'comparacao_latencias_barras.png')
+
+def resumir_latencias_incremental(reiniciar=False):
+    """Estatísticas de plotar_comparacao_latencias processando só os dados novos desde a última execução."""
+    arquivo_radio = 'dados_radio_corrigido.csv' if os.path.exists('dados_radio_corrigido.csv') else 'dados_radio.csv'
+    arquivo_mqtt = 'dados_mqtt_dashboard.csv' if os.path.exists('dados_mqtt_dashboard.csv') else 'dados_mqtt.csv'
+    if not os.path.exists(arquivo_radio) or not os.path.exists(arquivo_mqtt):
+        print("Arquivos de dados não encontrados")
+        return
+    checkpoint = analise_incremental.arquivo_checkpoint(arquivo_radio, 'latencias')
+    if reiniciar and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    print(f"Modo incremental: {arquivo_radio} e {arquivo_mqtt} (checkpoint {checkpoint})")
+    estatisticas = analise_incremental.estatisticas_latencias_incremental(arquivo_radio, arquivo_mqtt, checkpoint)
+    analise_streaming.resumir(estatisticas, 'comparacao_latencias_barras.png')
 
 if __name__ == "__main__":
-    plotar_comparacao_latencias()
+    if MODO_INCREMENTAL or '--incremental' in sys.argv:
+        resumir_latencias_incremental('--reiniciar' in sys.argv)
+    elif MODO_STREAMING or '--streaming' in sys.argv:
+        resumir_latencias_streaming()
+    else:
+        plotar_comparacao_latencias()
@@ -0,0 +1,119 @@
+import sys
+import time
+import random
+
+from parser_telemetria import Registro, formatar_linha
+from publicacao_mqtt import PublicadorMQTT, MODOS
+
+# Compara os modos de publicação MQTT (campos, registro, lote) em mensagens/s e bytes/s.
+#
+# Sem argumentos, usa um cliente de contagem (sem rede): mede quantas mensagens e
+# bytes cada modo gera por amostra e o custo de CPU do caminho de publicação.
+# Com um broker como argumento (ex.: python compara_modos_publicacao.py localhost),
+# publica de verdade e mede a taxa sustentada até o broker confirmar tudo (QoS 1).
+
+NUM_AMOSTRAS = 2000
+
+
+class ClienteContador:
+    """Cliente MQTT falso: só aceita as publicações."""
+
+    def publish(self, topico, payload, qos=0):
+        return None
+
+
+def gerar_amostras(n, inicio_id=1):
+    """Gera n amostras sintéticas (linha, registro) no formato do receptor."""
+    amostras = []
+    millis = 1000000
+    for i in range(n):
+        millis += random.randint(90, 110)
+        registro = Registro(
+            id=inicio_id + i, timestamp=millis, intervalo=100, radio_latency=random.randint(5, 60),
+            temperatura=round(random.uniform(20, 30), 2), pressao=round(random.uniform(1000, 1025), 2),
+            accel_x=round(random.uniform(-1, 1), 3), accel_y=round(random.uniform(-1, 1), 3),
+            accel_z=round(random.uniform(-1, 1), 3), gyro_x=round(random.uniform(-5, 5), 2),
+            gyro_y=round(random.uniform(-5, 5), 2), gyro_z=round(random.uniform(-5, 5), 2),
+        )
+        amostras.append((formatar_linha(registro), registro))
+    return amostras
+
+
+def medir_modo(client, modo, amostras, compatibilidade=False, janela_lote=0.2, aguardar=None):
+    publicador = PublicadorMQTT(client, modo, modo, compatibilidade=compatibilidade, janela_lote=janela_lote)
+    inicio = time.perf_counter()
+    for linha, registro in amostras:
+        publicador.publicar(linha, registro, time.time() * 1000)
+    publicador.descarregar()
+    if aguardar is not None:
+        aguardar()
+    duracao = time.perf_counter() - inicio
+    stats = publicador.estatisticas()
+    return {
+        'modo': modo + (' + compat.' if compatibilidade and modo != 'campos' else ''),
+        'amostras': stats['amostras'],
+        'mensagens': stats['mensagens'],
+        'bytes': stats['bytes'],
+        'duracao': duracao,
+        'msgs_por_amostra': stats['mensagens'] / stats['amostras'],
+        'bytes_por_amostra': stats['bytes'] / stats['amostras'],
+        'amostras_s': stats['amostras'] / duracao,
+        'msgs_s': stats['mensagens'] / duracao,
+        'bytes_s': stats['bytes'] / duracao,
+    }
+
+
+def imprimir_resultados(resultados):
+    print(f"\n{'Modo':<20}{'msgs/amostra':>14}{'bytes/amostra':>15}{'amostras/s':>14}{'msgs/s':>12}{'bytes/s':>14}")
+    for r in resultados:
+        print(f"{r['modo']:<20}{r['msgs_por_amostra']:>14.2f}{r['bytes_por_amostra']:>15.1f}"
+              f"{r['amostras_s']:>14.0f}{r['msgs_s']:>12.0f}{r['bytes_s']:>14.0f}")
+
+
+def main():
+    amostras = gerar_amostras(NUM_AMOSTRAS)
+    configuracoes = [(modo, False) for modo in MODOS] + [('registro', True)]
+
+    if len(sys.argv) > 1:
+        import paho.mqtt.client as mqtt
+        broker = sys.argv[1]
+        print(f"Publicando {NUM_AMOSTRAS} amostras por modo no broker {broker}...")
+        resultados = []
+        for modo, compatibilidade in configuracoes:
+            client = mqtt.Client()
+            client.max_inflight_messages_set(1000)
+            client.connect(broker, 1883, 60)
+            client.loop_start()
+            pendentes = []
+            publish_original = client.publish
+
+            def publish(topico, payload, qos=0):
+                info = publish_original(topico, payload, qos=qos)
+                pendentes.append(info)
+                return info
+
+            client.publish = publish
+
+            def aguardar():
+                for info in pendentes:
+                    info.wait_for_publish()
+
+            resultados.append(medir_modo(client, modo, amostras, compatibilidade, aguardar=aguardar))
+            client.loop_stop()
+            client.disconnect()
+    else:
+        print(f"Medindo {NUM_AMOSTRAS} amostras por modo com cliente de contagem (sem rede)...")
+        resultados = [medir_modo(ClienteContador(), modo, amostras, compatibilidade)
+                      for modo, compatibilidade in configuracoes]
+
+    imprimir_resultados(resultados)
+
+    base = resultados[0]
+    print()
+    for r in resultados[1:]:
+        print(f"{r['modo']}: {base['msgs_por_amostra'] / r['msgs_por_amostra']:.1f}x menos mensagens e "
+              f"{base['bytes_por_amostra'] / r['bytes_por_amostra']:.1f}x menos bytes por amostra que 'campos'")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,9 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import re
 import os
+from parser_telemetria import extrair_registro, SEPARADOR_CAMPOS
+from renderizacao import Histograma, renderizar
 
 def corrigir_dados_radio(arquivo_input, arquivo_output):
     """
@@ -20,9 +21,6 @@ def corrigir_dados_radio(arquivo_input, arquivo_output):
     df = pd.read_csv(arquivo_input)
     print(f"Carregado arquivo {arquivo_input} com {len(df)} linhas")
     
-    # Regex para extrair valores do campo 'valor'
-    radio_regex = re.compile(r'ID: (\d+) \| Timestamp: (\d+) \| RadioLatency: (\d+) ms')
-    
     # Colunas para o novo DataFrame
     timestamps = []
     ids = []
@@ -39,14 +37,12 @@ def corrigir_dados_radio(arquivo_input, arquivo_output):
         valor = str(row['valor']) if 'valor' in df.columns else ''
         valores_originais.append(valor)
         
-        # Extrair valores usando regex
-        match = radio_regex.search(valor)
-        if match:
-            id_num, timestamp_arduino, radio_latency = match.groups()
-            ids.append(int(id_num))
+        # Extrair valores usando o parser compartilhado
+        registro = extrair_registro(valor)
+        if registro is not None and registro.id is not None and registro.radio_latency is not None:
+            ids.append(registro.id)
             
-            # Convertendo para inteiro
-            latencia_original = int(radio_latency)
+            latencia_original = registro.radio_latency
             
             # Corrigir overflow
             latencia_corrigida = latencia_original
@@ -61,9 +57,11 @@ def corrigir_dados_radio(arquivo_input, arquivo_output):
             latencias_corrigidas.append(latencia_corrigida)
             
             # Criar a nova string de dados com latência corrigida
-            partes = valor.split(" | ")
-            novo_valor = partes[0] + " | " + partes[1] + f" | RadioLatency: {latencia_corrigida} ms | " + " | ".join(partes[3:])
-            dados_completos.append(novo_valor)
+            partes = [
+                f"RadioLatency: {latencia_corrigida} ms" if parte.startswith("RadioLatency") else parte
+                for parte in valor.split(SEPARADOR_CAMPOS)
+            ]
+            dados_completos.append(SEPARADOR_CAMPOS.join(partes))
         else:
             ids.append(None)
             latencias_corrigidas.append(None)
@@ -98,18 +96,21 @@ def corrigir_dados_radio(arquivo_input, arquivo_output):
         print(f"Média: {np.mean(latencias_validas):.2f} ms")
         print(f"Mediana: {np.median(latencias_validas):.2f} ms")
         
-        # Plotar histograma das latências corrigidas
-        plt.figure(figsize=(10, 6))
-        plt.hist(latencias_validas, bins=20, color='blue', alpha=0.7)
-        plt.title('Distribuição de Latências de Rádio Corrigidas')
-        plt.xlabel('Latência (ms)')
-        plt.ylabel('Frequência')
-        plt.grid(True, alpha=0.3)
-        plt.savefig('latencia_radio_histograma.png')
-        plt.show()
+        # Histograma das latências corrigidas: em janela, ou salvo sem bloquear com --sem-janela
+        renderizar([(figura_histograma, (Histograma(latencias_validas, bins=20),), 'latencia_radio_histograma.png')])
     
     return df_novo
 
+def figura_histograma(histograma):
+    """Distribuição das latências corrigidas (contagens já calculadas)"""
+    figura, ax = plt.subplots(figsize=(10, 6))
+    histograma.plotar(ax, color='blue', alpha=0.7)
+    ax.set_title('Distribuição de Latências de Rádio Corrigidas')
+    ax.set_xlabel('Latência (ms)')
+    ax.set_ylabel('Frequência')
+    ax.grid(True, alpha=0.3)
+    return figura
+
 if __name__ == "__main__":
     arquivo_input = "dados_radio.csv"
     arquivo_output = "dados_radio_corrigido.csv"
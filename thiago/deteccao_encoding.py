@@ -0,0 +1,125 @@
+import codecs
+import os
+import re
+import sys
+
+# Detecção do encoding dos arquivos de captura a partir de um prefixo limitado.
+#
+# Em vez de tentar ler o arquivo inteiro com cada encoding até um funcionar, o
+# encoding é decidido olhando só os primeiros TAMANHO_PREFIXO bytes, uma vez por
+# arquivo (o veredito fica em cache enquanto o arquivo não for recriado). A leitura
+# depois é decodificada em fluxo (open/read_csv com o encoding detectado), sem
+# gerar uma cópia limpa do arquivo.
+#
+# Regras:
+#   - BOM UTF-8/UTF-16: o encoding do BOM
+#   - prefixo UTF-8 válido (ou só ASCII): 'utf-8' ('strict' se o prefixo é o arquivo
+#     inteiro, senão com erros substituídos, para a leitura nunca parar no meio)
+#   - UTF-8 com alguns bytes inválidos: 'utf-8' com erros substituídos por U+FFFD.
+#     É o caso dos logs da serial, em que o '°' de "(°/s)" às vezes chega como um byte
+#     latin-1 solto (0xB0) no meio de texto UTF-8; o parser só usa os números
+#   - sem nenhuma sequência UTF-8 válida: 'cp1252' (ou 'latin-1' se houver bytes
+#     que não existem no cp1252), que decodificam qualquer byte
+
+TAMANHO_PREFIXO = 64 * 1024
+BLOCO_TRANSCODIFICACAO = 1 << 20
+
+_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+# Bytes sem caractere no cp1252
+_INDEFINIDOS_CP1252 = set(b'\x81\x8d\x8f\x90\x9d')
+_SUBSTITUTO_UTF8 = '\ufffd'.encode('utf-8')
+
+# caminho absoluto -> (dispositivo, inode, tamanho na detecção, bytes analisados, (encoding, erros))
+_cache = {}
+
+
+def analisar_prefixo(prefixo, completo=True):
+    """
+    Decide (encoding, erros) para um prefixo em bytes. 'completo' indica que o
+    prefixo é o arquivo inteiro (senão uma sequência UTF-8 cortada no fim é ignorada).
+    """
+    for bom, encoding in _BOMS:
+        if prefixo.startswith(bom):
+            return encoding, 'strict'
+    # Se só o começo do arquivo foi visto, um byte inválido mais adiante não pode
+    # interromper a leitura no meio: o UTF-8 sem erros no prefixo usa 'replace'
+    sem_erros = 'strict' if completo else 'replace'
+    if prefixo.isascii():
+        return 'utf-8', sem_erros
+
+    decodificador = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    texto = decodificador.decode(prefixo, final=completo)
+    # U+FFFD que já estava no arquivo (gravado por quem leu a serial com errors='replace')
+    # não é erro de decodificação
+    invalidos = texto.count('\ufffd') - prefixo.count(_SUBSTITUTO_UTF8)
+    if not invalidos:
+        return 'utf-8', sem_erros
+    multibyte_validos = sum(1 for c in texto if ord(c) > 127 and c != '\ufffd')
+    if multibyte_validos:
+        return 'utf-8', 'replace'
+    if _INDEFINIDOS_CP1252 & set(prefixo):
+        return 'latin-1', 'strict'
+    return 'cp1252', sem_erros
+
+
+def detectar_encoding(caminho, tamanho_prefixo=TAMANHO_PREFIXO):
+    """(encoding, erros) de um arquivo, lendo no máximo 'tamanho_prefixo' bytes. Usa o cache."""
+    chave = os.path.abspath(caminho)
+    estado = os.stat(caminho)
+    salvo = _cache.get(chave)
+    if salvo is not None:
+        dispositivo, inode, tamanho, analisados, veredito = salvo
+        # Arquivo que só cresceu mantém o veredito, a não ser que o prefixo analisado
+        # fosse o arquivo inteiro (os bytes novos ainda não foram vistos)
+        if (dispositivo, inode) == (estado.st_dev, estado.st_ino) and estado.st_size >= tamanho and (
+                analisados >= tamanho_prefixo or estado.st_size == tamanho):
+            return veredito
+    with open(caminho, 'rb') as f:
+        prefixo = f.read(tamanho_prefixo)
+    veredito = analisar_prefixo(prefixo, completo=len(prefixo) < tamanho_prefixo)
+    _cache[chave] = (estado.st_dev, estado.st_ino, estado.st_size, len(prefixo), veredito)
+    return veredito
+
+
+def limpar_cache():
+    _cache.clear()
+
+
+def abrir_texto(caminho, **kwargs):
+    """open() em modo texto com o encoding detectado (decodificação em fluxo)."""
+    encoding, erros = detectar_encoding(caminho)
+    return open(caminho, encoding=encoding, errors=erros, **kwargs)
+
+
+def opcoes_pandas(caminho):
+    """Argumentos de encoding para pd.read_csv(caminho, **opcoes_pandas(caminho))."""
+    encoding, erros = detectar_encoding(caminho)
+    return {'encoding': encoding, 'encoding_errors': erros}
+
+
+def transcodificar(origem, destino, encoding_destino='utf-8', somente_ascii=False):
+    """
+    Copia 'origem' para 'destino' em 'encoding_destino', em blocos (memória constante).
+    Com somente_ascii=True, caracteres não-ASCII viram espaço. Retorna (encoding, erros) da origem.
+    """
+    encoding, erros = detectar_encoding(origem)
+    nao_ascii = re.compile(r'[^\x00-\x7f]')
+    with open(origem, encoding=encoding, errors=erros, newline='') as entrada, \
+            open(destino, 'w', encoding=encoding_destino, newline='') as saida:
+        while True:
+            bloco = entrada.read(BLOCO_TRANSCODIFICACAO)
+            if not bloco:
+                break
+            saida.write(nao_ascii.sub(' ', bloco) if somente_ascii else bloco)
+    return encoding, erros
+
+
+if __name__ == '__main__':
+    # Uso: python deteccao_encoding.py dados_radio.csv [dados_mqtt.csv ...]
+    for caminho in sys.argv[1:]:
+        encoding, erros = detectar_encoding(caminho)
+        print(f'{caminho}: {encoding}' + (f' (erros: {erros})' if erros != 'strict' else ''))
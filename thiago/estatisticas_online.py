@@ -0,0 +1,237 @@
+import math
+
+import numpy as np
+
+# Estatísticas de latência calculadas em blocos, com memória limitada.
+#
+# Para resumir capturas de muitos GB (testes de longa duração) sem carregar tudo:
+#   - mínimo, máximo, média e desvio padrão: Welford, com os blocos combinados
+#     pela fórmula de Chan (cada bloco é resumido com NumPy e juntado ao total)
+#   - mediana, p95 e p99: t-digest (centróides ordenados, mais finos nas caudas)
+#
+# O t-digest foi escolhido em vez do P² porque aceita blocos inteiros de uma vez
+# (ordenar + agrupar com NumPy, sem laço por valor em Python) e porque dois
+# resumos podem ser combinados (combinar()), por exemplo de arquivos diferentes.
+# A memória é da ordem de 'compressao' centróides, qualquer que seja o tamanho da série.
+#
+# estado()/de_estado() convertem os resumos em dicionários serializáveis em JSON,
+# para guardar o resumo parcial de uma captura e continuar depois (analise_incremental.py).
+
+COMPRESSAO_PADRAO = 200
+# Valores acumulados antes de juntar ao t-digest (multiplicado por 'compressao')
+FATOR_BUFFER = 50
+
+
+class MomentosOnline:
+    """Contagem, mínimo, máximo, média e variância (populacional, como np.std) por Welford."""
+
+    def __init__(self):
+        self.n = 0
+        self.media = 0.0
+        self._m2 = 0.0
+        self.minimo = math.inf
+        self.maximo = -math.inf
+
+    def atualizar(self, valores):
+        valores = np.asarray(valores, dtype=np.float64)
+        if not len(valores):
+            return
+        self._juntar(len(valores), float(valores.mean()), float(((valores - valores.mean()) ** 2).sum()),
+                     float(valores.min()), float(valores.max()))
+
+    def _juntar(self, n, media, m2, minimo, maximo):
+        total = self.n + n
+        delta = media - self.media
+        self.media += delta * n / total
+        self._m2 += m2 + delta * delta * self.n * n / total
+        self.n = total
+        self.minimo = min(self.minimo, minimo)
+        self.maximo = max(self.maximo, maximo)
+
+    def combinar(self, outro):
+        if outro.n:
+            self._juntar(outro.n, outro.media, outro._m2, outro.minimo, outro.maximo)
+
+    def estado(self):
+        return {'n': self.n, 'media': self.media, 'm2': self._m2, 'minimo': self.minimo, 'maximo': self.maximo}
+
+    @classmethod
+    def de_estado(cls, estado):
+        momentos = cls()
+        momentos.n = estado['n']
+        momentos.media = estado['media']
+        momentos._m2 = estado['m2']
+        momentos.minimo = estado['minimo']
+        momentos.maximo = estado['maximo']
+        return momentos
+
+    @property
+    def variancia(self):
+        return self._m2 / self.n if self.n else math.nan
+
+    @property
+    def desvio(self):
+        return math.sqrt(self.variancia) if self.n else math.nan
+
+
+class DigestoT:
+    """
+    Quantis aproximados (t-digest). O erro é menor nas caudas (p99) que no meio,
+    e valores repetidos ou séries curtas (até ~compressao valores) ficam exatos.
+    """
+
+    def __init__(self, compressao=COMPRESSAO_PADRAO):
+        self.compressao = compressao
+        self._medias = np.empty(0)
+        self._pesos = np.empty(0)
+        self._pendentes = []
+        self._n_pendentes = 0
+        self.n = 0
+        self.minimo = math.inf
+        self.maximo = -math.inf
+
+    def atualizar(self, valores):
+        valores = np.asarray(valores, dtype=np.float64)
+        if not len(valores):
+            return
+        self._pendentes.append(valores)
+        self._n_pendentes += len(valores)
+        self.n += len(valores)
+        self.minimo = min(self.minimo, float(valores.min()))
+        self.maximo = max(self.maximo, float(valores.max()))
+        if self._n_pendentes >= FATOR_BUFFER * self.compressao:
+            self._comprimir()
+
+    def combinar(self, outro):
+        outro._comprimir()
+        if not outro.n:
+            return
+        self._comprimir()
+        self._agrupar(np.concatenate([self._medias, outro._medias]),
+                      np.concatenate([self._pesos, outro._pesos]))
+        self.n += outro.n
+        self.minimo = min(self.minimo, outro.minimo)
+        self.maximo = max(self.maximo, outro.maximo)
+
+    def estado(self):
+        self._comprimir()
+        return {
+            'compressao': self.compressao, 'n': self.n, 'minimo': self.minimo, 'maximo': self.maximo,
+            'medias': self._medias.tolist(), 'pesos': self._pesos.tolist(),
+        }
+
+    @classmethod
+    def de_estado(cls, estado):
+        digesto = cls(estado['compressao'])
+        digesto.n = estado['n']
+        digesto.minimo = estado['minimo']
+        digesto.maximo = estado['maximo']
+        digesto._medias = np.asarray(estado['medias'], dtype=np.float64)
+        digesto._pesos = np.asarray(estado['pesos'], dtype=np.float64)
+        return digesto
+
+    def _comprimir(self):
+        if not self._pendentes:
+            return
+        novos = np.concatenate(self._pendentes)
+        self._pendentes = []
+        self._n_pendentes = 0
+        self._agrupar(np.concatenate([self._medias, novos]),
+                      np.concatenate([self._pesos, np.ones(len(novos))]))
+
+    def _agrupar(self, medias, pesos):
+        ordem = np.argsort(medias, kind='stable')
+        medias, pesos = medias[ordem], pesos[ordem]
+        total = pesos.sum()
+        acumulado = np.cumsum(pesos)
+        # Escala k(q) = compressao/(2π)·asin(2q-1): cada centróide cobre no máximo uma
+        # unidade de k, o que dá centróides pequenos perto de q=0 e q=1
+        q = (acumulado - pesos / 2) / total
+        k = self.compressao / (2 * math.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1))
+        grupo = np.floor(k - k[0]).astype(np.int64)
+        inicios = np.flatnonzero(np.r_[True, grupo[1:] != grupo[:-1]])
+        pesos_grupo = np.add.reduceat(pesos, inicios)
+        self._medias = np.add.reduceat(medias * pesos, inicios) / pesos_grupo
+        self._pesos = pesos_grupo
+
+    def quantil(self, q):
+        """Valor do quantil q (0 a 1), interpolado entre os centróides."""
+        self._comprimir()
+        if not self.n:
+            return math.nan
+        if len(self._medias) == self.n:
+            # Nenhum valor foi agrupado: quantil exato, igual ao np.quantile
+            return float(np.quantile(self._medias, q))
+        # Cada centróide fica no centro da sua massa; as pontas são o mínimo e o máximo exatos
+        centros = np.cumsum(self._pesos) - self._pesos / 2
+        posicoes = np.r_[0.0, centros, float(self.n)]
+        valores = np.r_[self.minimo, self._medias, self.maximo]
+        return float(np.interp(q * self.n, posicoes, valores))
+
+    @property
+    def centroides(self):
+        self._comprimir()
+        return len(self._medias)
+
+
+class EstatisticaOnline:
+    """
+    Resumo de uma série lida em blocos: est.atualizar(bloco) para cada bloco e
+    est.resumo() no final (mesmas chaves do dicionário 'stats' dos scripts de comparação).
+    Valores NaN são ignorados.
+    """
+
+    def __init__(self, compressao=COMPRESSAO_PADRAO):
+        self.momentos = MomentosOnline()
+        self.digesto = DigestoT(compressao)
+
+    def atualizar(self, valores):
+        valores = np.asarray(valores, dtype=np.float64)
+        valores = valores[~np.isnan(valores)]
+        self.momentos.atualizar(valores)
+        self.digesto.atualizar(valores)
+
+    def combinar(self, outra):
+        self.momentos.combinar(outra.momentos)
+        self.digesto.combinar(outra.digesto)
+
+    def estado(self):
+        return {'momentos': self.momentos.estado(), 'digesto': self.digesto.estado()}
+
+    @classmethod
+    def de_estado(cls, estado):
+        estatistica = cls()
+        estatistica.momentos = MomentosOnline.de_estado(estado['momentos'])
+        estatistica.digesto = DigestoT.de_estado(estado['digesto'])
+        return estatistica
+
+    @property
+    def n(self):
+        return self.momentos.n
+
+    def quantil(self, q):
+        return self.digesto.quantil(q)
+
+    def resumo(self):
+        m = self.momentos
+        return {
+            'n': m.n,
+            'min': m.minimo if m.n else math.nan,
+            'max': m.maximo if m.n else math.nan,
+            'avg': m.media if m.n else math.nan,
+            'median': self.quantil(0.5),
+            'std': m.desvio,
+            'p95': self.quantil(0.95),
+            'p99': self.quantil(0.99),
+        }
+
+
+def imprimir_resumo(titulo, resumo):
+    print(f"\n{titulo} ({resumo['n']} amostras):")
+    print(f"Mínimo: {resumo['min']:.2f} ms")
+    print(f"Máximo: {resumo['max']:.2f} ms")
+    print(f"Média: {resumo['avg']:.2f} ms")
+    print(f"Mediana: {resumo['median']:.2f} ms")
+    print(f"Desvio Padrão: {resumo['std']:.2f} ms")
+    print(f"p95: {resumo['p95']:.2f} ms")
+    print(f"p99: {resumo['p99']:.2f} ms")
@@ -0,0 +1,265 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from armazenamento_colunar import AUSENTE_INT, iterar_colunas, pasta_colunar, tem_colunar
+from deteccao_encoding import opcoes_pandas
+
+# Extração vetorizada das latências dos CSVs de captura, usada por
+# compara_latencia.py e compara_latencia_corrigido.py.
+#
+# Em vez de percorrer o DataFrame com iterrows() e aplicar regex linha a linha em
+# Python, as colunas inteiras passam por Series.str.extract e a correção de
+# overflow e os filtros de faixa são máscaras NumPy.
+#
+# A saída de depuração é opcional (debug=True) e resumida: contagens e algumas
+# linhas de exemplo, em vez de um print por linha.
+#
+# blocos_captura() lê uma captura em blocos para o modo streaming (analise_streaming.py).
+
+# Latência do rádio acima disso é underflow do unsigned long no Arduino (perto de 2^32)
+LIMITE_OVERFLOW = 4000000000
+# Latências MQTT acima disso são erro de timestamp
+LIMITE_MQTT_IRREAL = 1000000
+
+# ID e RadioLatency da linha do receptor. Dois padrões simples são mais rápidos
+# que um único padrão com o ID opcional (que obriga o regex a voltar atrás)
+REGEX_ID = r'(?:^|\| )ID: (\d+)'
+REGEX_RADIO_LATENCY = r'RadioLatency: (\d+)'
+REGEX_TIMESTAMP = r'(?:^|\| )Timestamp: (\d+)'
+# Linhas de log antigas do MQTT
+REGEX_MQTT = r'Radio Latency: (?P<radio>\d+)ms, MQTT Latency: (?P<mqtt>\d+)ms, Total: (?P<total>\d+)ms'
+
+EXEMPLOS_DEBUG = 5
+# Linhas por bloco na leitura em blocos (blocos_captura)
+TAMANHO_BLOCO = 200000
+# Colunas opcionais de blocos_captura (extras=...) -> coluna da pasta colunar.
+# Inteiras com AUSENTE_INT sem valor, menos 'radio_bruta' (latência sem corrigir, float)
+COLUNAS_EXTRAS = {'id': 'id', 'timestamp': 'timestamp', 'radio_bruta': 'radio_latency'}
+
+
+def ler_csv(arquivo_csv, colunas=None, debug=False):
+    """
+    Lê só as colunas indicadas (todas se None), com o encoding detectado pelo
+    começo do arquivo (deteccao_encoding.py). Retorna None se a leitura falhar.
+    """
+    usecols = None if colunas is None else (lambda nome: nome in colunas)
+    opcoes = opcoes_pandas(arquivo_csv)
+    try:
+        df = pd.read_csv(arquivo_csv, usecols=usecols, **opcoes)
+    except UnicodeDecodeError as e:
+        print(f"Não foi possível ler {arquivo_csv} com encoding {opcoes['encoding']}: {e}")
+        return None
+    if debug:
+        print(f"[DEBUG] {arquivo_csv}: {len(df)} linhas lidas com encoding {opcoes['encoding']}")
+    return df
+
+
+def corrigir_overflow(latencias):
+    """Corrige o underflow do Arduino: valores perto de 2^32 viram |valor - 2^32|."""
+    latencias = np.asarray(latencias, dtype=np.int64)
+    return np.where(latencias > LIMITE_OVERFLOW, np.abs(latencias - (1 << 32)), latencias)
+
+
+def filtrar_faixa(latencias, minimo, maximo, substituto):
+    """Troca por 'substituto' os valores fora de [minimo, maximo]. Retorna (valores, quantidade trocada)."""
+    latencias = np.asarray(latencias)
+    fora = (latencias < minimo) | (latencias > maximo)
+    return np.where(fora, substituto, latencias), int(fora.sum())
+
+
+def _resumo_debug(arquivo_csv, total, encontrados, overflows, exemplos):
+    print(f"[DEBUG] {arquivo_csv}: {encontrados}/{total} linhas com latência, "
+          f"{total - encontrados} sem latência, {overflows} overflows corrigidos")
+    for linha in exemplos:
+        print(f"[DEBUG]   {linha}")
+
+
+def _latencias_valor(valores):
+    """
+    Latências da coluna 'valor' (linhas do receptor como texto).
+    Retorna (máscara das linhas com latência, latências brutas, ids), com a posição
+    da linha como ID quando a linha não tem ID.
+    """
+    valores = valores.astype(str)
+    latencias_texto = valores.str.extract(REGEX_RADIO_LATENCY, expand=False)
+    encontrados = latencias_texto.notna().to_numpy()
+    brutas = latencias_texto.to_numpy()[encontrados].astype(np.int64)
+    ids_texto = valores[encontrados].str.extract(REGEX_ID, expand=False).to_numpy()
+    tem_id = pd.notna(ids_texto)
+    ids = np.flatnonzero(encontrados)
+    ids[tem_id] = ids_texto[tem_id].astype(np.int64)
+    return encontrados, brutas, ids
+
+
+def extrair_latencias_radio(arquivo_csv, debug=False):
+    """
+    Retorna (ids, latencias_radio) como arrays NumPy.
+    Formato novo (coluna radio_latency): ids são as posições das linhas.
+    Formato antigo (coluna valor): ids da linha do receptor, ou a posição da linha sem ID.
+    """
+    if not os.path.exists(arquivo_csv):
+        print(f"Arquivo {arquivo_csv} não encontrado")
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    df = ler_csv(arquivo_csv, ['radio_latency', 'valor'], debug)
+    if df is None:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    if 'radio_latency' in df.columns:
+        brutas = df['radio_latency'].dropna().to_numpy(dtype=np.int64)
+        latencias = corrigir_overflow(brutas)
+        ids = np.arange(len(latencias))
+        if debug:
+            _resumo_debug(arquivo_csv, len(df), len(latencias), int((brutas > LIMITE_OVERFLOW).sum()), [])
+        return ids, latencias
+
+    if 'valor' not in df.columns:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    encontrados, brutas, ids = _latencias_valor(df['valor'])
+    latencias = corrigir_overflow(brutas)
+
+    if debug:
+        exemplos = [f"linha {i}: ID={id_msg}, RadioLatency={lat} ms"
+                    for i, id_msg, lat in zip(np.flatnonzero(encontrados)[:EXEMPLOS_DEBUG], ids, latencias)]
+        _resumo_debug(arquivo_csv, len(df), int(encontrados.sum()),
+                      int((brutas > LIMITE_OVERFLOW).sum()), exemplos)
+    return ids, latencias
+
+
+def extrair_latencias_mqtt(arquivo_csv, debug=False, gerador=np.random):
+    """
+    Retorna (latencias_radio, latencias_mqtt, latencias_total) como arrays NumPy,
+    com o mesmo comprimento e total = rádio + MQTT.
+
+    Mantém o comportamento anterior para valores irreais: latências MQTT acima de
+    LIMITE_MQTT_IRREAL são substituídas por valores entre 5 e 20 ms de 'gerador'.
+    """
+    vazio = (np.empty(0, dtype=np.int64),) * 3
+    if not os.path.exists(arquivo_csv):
+        print(f"Arquivo {arquivo_csv} não encontrado")
+        return vazio
+
+    df = ler_csv(arquivo_csv, ['radio_latency', 'mqtt_latency', 'total_latency', 'valor'], debug)
+    if df is None:
+        return vazio
+
+    if 'mqtt_latency' in df.columns and 'total_latency' in df.columns:
+        radio = (corrigir_overflow(df['radio_latency'].dropna().to_numpy(dtype=np.int64))
+                 if 'radio_latency' in df.columns else np.empty(0, dtype=np.int64))
+        mqtt = df['mqtt_latency'].dropna().to_numpy()
+        if (mqtt > LIMITE_MQTT_IRREAL).any():
+            print("Valores de latência MQTT irrealistas detectados, gerando valores realistas...")
+            mqtt = gerador.randint(5, 20, size=len(radio))
+        total = df['total_latency'].dropna().to_numpy()
+        n = min(len(radio), len(mqtt))
+        if (total > LIMITE_MQTT_IRREAL).any():
+            print("Valores de latência total irrealistas detectados, recalculando...")
+            total = radio[:n] + mqtt[:n]
+    elif 'valor' in df.columns:
+        extraidos = df['valor'].astype(str).str.extract(REGEX_MQTT).dropna()
+        radio = corrigir_overflow(extraidos['radio'].to_numpy(dtype=np.int64))
+        mqtt = extraidos['mqtt'].to_numpy(dtype=np.int64)
+        irreais = mqtt > LIMITE_MQTT_IRREAL
+        mqtt[irreais] = gerador.randint(5, 20, size=int(irreais.sum()))
+        total = radio + mqtt
+    else:
+        return vazio
+
+    # Mesmo comprimento e total = rádio + MQTT (diferenças acima de 1 ms são corrigidas)
+    n = min(len(radio), len(mqtt), len(total))
+    radio, mqtt, total = radio[:n], mqtt[:n], np.asarray(total[:n])
+    inconsistentes = np.abs(total - (radio + mqtt)) > 1
+    if inconsistentes.any():
+        print(f"Corrigindo {int(inconsistentes.sum())} amostras com total diferente de rádio + MQTT")
+        total = np.where(inconsistentes, radio + mqtt, total)
+    if debug:
+        _resumo_debug(arquivo_csv, len(df), n, 0, [])
+    return radio, mqtt, total
+
+
+def blocos_captura(arquivo_csv, tamanho_bloco=TAMANHO_BLOCO, extras=()):
+    """
+    Lê uma captura em blocos de até 'tamanho_bloco' linhas, com memória limitada.
+
+    Gera um dicionário por bloco com 'rx' (instante de recepção, s), 'radio_latency'
+    (com o overflow já corrigido) e 'mqtt_latency' (ms), como arrays float com NaN
+    onde o valor não existe, mais as colunas de 'extras' (ver COLUNAS_EXTRAS).
+    Usa a pasta colunar da captura se existir, senão o CSV (formato timestamp,valor
+    ou em colunas) com read_csv(chunksize=...).
+    """
+    if tem_colunar(arquivo_csv):
+        yield from blocos_colunares(pasta_colunar(arquivo_csv), tamanho_bloco, extras)
+        return
+
+    colunas = {'timestamp', 'valor', 'radio_latency', 'mqtt_latency', 'id'}
+    leitor = pd.read_csv(arquivo_csv, usecols=lambda nome: nome in colunas, chunksize=tamanho_bloco,
+                         **opcoes_pandas(arquivo_csv))
+    for df in leitor:
+        yield bloco_de_dataframe(df, extras)
+
+
+def blocos_colunares(pasta, tamanho_bloco=TAMANHO_BLOCO, extras=(), segmentos=None):
+    """blocos_captura lendo de uma pasta colunar (só os 'segmentos' indicados, se houver)."""
+    colunas = {'rx', 'radio_latency', 'mqtt_latency'}
+    colunas.update(COLUNAS_EXTRAS[nome] for nome in extras)
+    for bloco in iterar_colunas(pasta, sorted(colunas), tamanho_bloco, segmentos):
+        brutas = np.asarray(bloco['radio_latency'], dtype=np.float64)
+        saida = {
+            'rx': np.asarray(bloco['rx'], dtype=np.float64),
+            'radio_latency': _corrigir_overflow_float(brutas),
+            'mqtt_latency': np.asarray(bloco['mqtt_latency'], dtype=np.float64),
+        }
+        for nome in extras:
+            saida[nome] = brutas if nome == 'radio_bruta' else np.asarray(bloco[nome], dtype=np.int64)
+        yield saida
+
+
+def bloco_de_dataframe(df, extras=()):
+    """Converte um pedaço do CSV de captura (DataFrame) no dicionário de blocos_captura."""
+    n = len(df)
+    rx = (pd.to_numeric(df['timestamp'], errors='coerce').to_numpy(dtype=np.float64)
+          if 'timestamp' in df.columns else np.full(n, np.nan))
+    brutas = np.full(n, np.nan)
+    if 'radio_latency' in df.columns:
+        brutas = pd.to_numeric(df['radio_latency'], errors='coerce').to_numpy(dtype=np.float64)
+    elif 'valor' in df.columns:
+        encontrados, valores, _ = _latencias_valor(df['valor'])
+        brutas[encontrados] = valores
+    mqtt = (pd.to_numeric(df['mqtt_latency'], errors='coerce').to_numpy(dtype=np.float64)
+            if 'mqtt_latency' in df.columns else np.full(n, np.nan))
+    saida = {'rx': rx, 'radio_latency': _corrigir_overflow_float(brutas), 'mqtt_latency': mqtt}
+    for nome in extras:
+        if nome == 'radio_bruta':
+            saida[nome] = brutas
+            continue
+        # id: coluna própria (CSVs do bridge) ou a linha do receptor em 'valor'; o
+        # timestamp do Arduino só existe na linha do receptor ('timestamp' do CSV é o rx)
+        if nome == 'id' and 'id' in df.columns:
+            valores = pd.to_numeric(df['id'], errors='coerce')
+        elif 'valor' in df.columns:
+            regex = REGEX_ID if nome == 'id' else REGEX_TIMESTAMP
+            valores = pd.to_numeric(df['valor'].astype(str).str.extract(regex, expand=False), errors='coerce')
+        else:
+            valores = pd.Series(np.nan, index=df.index)
+        saida[nome] = valores.fillna(AUSENTE_INT).to_numpy(dtype=np.int64)
+    return saida
+
+
+def carregar_chegadas(arquivo_csv, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Todas as linhas de uma captura como arrays 'id', 'rx' e 'radio_latency' (lidas em
+    blocos, só as colunas numéricas ficam na memória). Linhas sem ID têm AUSENTE_INT.
+    """
+    blocos = list(blocos_captura(arquivo_csv, tamanho_bloco, extras=('id',)))
+    if not blocos:
+        return {'id': np.empty(0, dtype=np.int64), 'rx': np.empty(0), 'radio_latency': np.empty(0)}
+    return {nome: np.concatenate([bloco[nome] for bloco in blocos]) for nome in ('id', 'rx', 'radio_latency')}
+
+
+def _corrigir_overflow_float(latencias):
+    """corrigir_overflow para arrays float que podem ter NaN."""
+    latencias = np.asarray(latencias, dtype=np.float64)
+    return np.where(latencias > LIMITE_OVERFLOW, np.abs(latencias - (1 << 32)), latencias)
@@ -0,0 +1,147 @@
+import binascii
+import struct
+
+import numpy as np
+
+from parser_telemetria import Registro
+
+# Frame binário compacto de telemetria (alternativa à linha de texto de ~200 bytes).
+#
+# Layout (little-endian, 37 bytes no total):
+#   sync         2 bytes  0xCA 0x5A
+#   tamanho      uint8    tamanho do payload (32)
+#   payload:
+#     id             uint32
+#     timestamp      uint32   millis() do transmissor
+#     intervalo      uint16   ms
+#     radio_latency  uint32   ms
+#     temperatura    int16    °C x 100
+#     pressao        uint32   hPa x 100
+#     accel x,y,z    int16    g x 1000
+#     gyro x,y,z     int16    °/s x 100
+#   crc          uint16   CRC-16/CCITT (init 0xFFFF) de tamanho + payload
+#
+# Valores ausentes ou inválidos ("ovf" no formato de texto) são enviados como um valor
+# reservado: -32768 nos campos int16 e todos os bits em 1 nos campos sem sinal (0xFFFF
+# no uint16, 0xFFFFFFFF nos uint32). Os dois decodificadores os devolvem como None/NaN.
+
+SYNC = b'\xca\x5a'
+CABECALHO = struct.Struct('<2sB')
+PAYLOAD = struct.Struct('<IIHIhIhhhhhh')
+CRC = struct.Struct('<H')
+TAMANHO_FRAME = CABECALHO.size + PAYLOAD.size + CRC.size
+
+INVALIDO_I16 = -32768
+INVALIDO_U16 = 0xFFFF
+INVALIDO_U32 = 0xFFFFFFFF
+
+# Nome do campo e escala aplicada na codificação (valor_real = inteiro / escala)
+CAMPOS_FRAME = [
+    ('id', None),
+    ('timestamp', None),
+    ('intervalo', None),
+    ('radio_latency', None),
+    ('temperatura', 100),
+    ('pressao', 100),
+    ('accel_x', 1000),
+    ('accel_y', 1000),
+    ('accel_z', 1000),
+    ('gyro_x', 100),
+    ('gyro_y', 100),
+    ('gyro_z', 100),
+]
+
+# Os campos do frame são os primeiros do Registro, na mesma ordem
+assert tuple(nome for nome, _ in CAMPOS_FRAME) == Registro._fields[:len(CAMPOS_FRAME)]
+_PREENCHIMENTO = [None] * (len(Registro._fields) - len(CAMPOS_FRAME))
+_INT16 = {'temperatura', 'accel_x', 'accel_y', 'accel_z', 'gyro_x', 'gyro_y', 'gyro_z'}
+# Valor reservado para ausente em cada campo
+_INVALIDO = {nome: INVALIDO_I16 if nome in _INT16 else INVALIDO_U16 if nome == 'intervalo' else INVALIDO_U32
+             for nome, _ in CAMPOS_FRAME}
+
+# dtype equivalente para decodificar muitos frames de uma vez com NumPy
+DTYPE_FRAME = np.dtype([
+    ('sync', 'S2'),
+    ('tamanho', 'u1'),
+    ('id', '<u4'),
+    ('timestamp', '<u4'),
+    ('intervalo', '<u2'),
+    ('radio_latency', '<u4'),
+    ('temperatura', '<i2'),
+    ('pressao', '<u4'),
+    ('accel_x', '<i2'),
+    ('accel_y', '<i2'),
+    ('accel_z', '<i2'),
+    ('gyro_x', '<i2'),
+    ('gyro_y', '<i2'),
+    ('gyro_z', '<i2'),
+    ('crc', '<u2'),
+])
+assert DTYPE_FRAME.itemsize == TAMANHO_FRAME
+
+
+def crc16(dados):
+    """CRC-16/CCITT com valor inicial 0xFFFF (implementação em C do binascii)."""
+    return binascii.crc_hqx(dados, 0xFFFF)
+
+
+def codificar_frame(registro):
+    """Codifica um Registro em um frame binário (usado pelo simulador e para testes)."""
+    inteiros = []
+    for nome, escala in CAMPOS_FRAME:
+        valor = getattr(registro, nome)
+        if valor is None:
+            inteiros.append(_INVALIDO[nome])
+        elif escala is None:
+            inteiros.append(int(valor))
+        else:
+            inteiros.append(int(round(valor * escala)))
+    corpo = bytes([PAYLOAD.size]) + PAYLOAD.pack(*inteiros)
+    return SYNC + corpo + CRC.pack(crc16(corpo))
+
+
+def frame_valido(frame):
+    """Verifica sync, tamanho e CRC de um frame completo."""
+    if len(frame) != TAMANHO_FRAME or frame[:2] != SYNC or frame[2] != PAYLOAD.size:
+        return False
+    return crc16(frame[2:-2]) == CRC.unpack_from(frame, TAMANHO_FRAME - 2)[0]
+
+
+def decodificar_frame(frame):
+    """Decodifica um frame completo em um Registro. Retorna None se o frame for inválido."""
+    if not frame_valido(frame):
+        return None
+    valores = list(PAYLOAD.unpack_from(frame, CABECALHO.size))
+    for i, (nome, escala) in enumerate(CAMPOS_FRAME):
+        if valores[i] == _INVALIDO[nome]:
+            valores[i] = None
+        elif escala is not None:
+            valores[i] = valores[i] / escala
+    return Registro._make(valores + _PREENCHIMENTO)
+
+
+def decodificar_frames_numpy(dados):
+    """
+    Decodifica um bloco contíguo de frames (por exemplo, um arquivo .bin gravado da serial).
+    Retorna um dicionário nome -> array NumPy float64, já com as escalas aplicadas
+    (valores ausentes viram NaN). Frames com sync ou CRC inválidos são descartados.
+    """
+    quantidade = len(dados) // TAMANHO_FRAME
+    brutos = np.frombuffer(dados, dtype=DTYPE_FRAME, count=quantidade)
+    validos = (brutos['sync'] == SYNC) & (brutos['tamanho'] == PAYLOAD.size)
+    # O CRC não é vetorizável; binascii em C é rápido o bastante por frame
+    memoria = memoryview(dados)
+    for i in np.flatnonzero(validos):
+        inicio = i * TAMANHO_FRAME
+        validos[i] = crc16(memoria[inicio + 2:inicio + TAMANHO_FRAME - 2]) == brutos['crc'][i]
+    brutos = brutos[validos]
+
+    colunas = {}
+    for nome, escala in CAMPOS_FRAME:
+        coluna = brutos[nome]
+        convertida = coluna.astype(np.float64)
+        if escala is not None:
+            convertida /= escala
+        convertida[coluna == _INVALIDO[nome]] = np.nan
+        colunas[nome] = convertida
+    return colunas
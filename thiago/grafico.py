@@ -1,31 +1,37 @@
 import csv
 import matplotlib.pyplot as plt
+from renderizacao import Serie, renderizar
 
-# Listas para armazenar os dados
-totais = []
-recebidos = []
-perdas = []
+def figura_perdas(perdas):
+    """Perda de pacotes pelo total de mensagens enviadas"""
+    figura, ax = plt.subplots(figsize=(10, 6))
+    perdas.plotar(ax, '-', marker='o', color='red', label='Perda de Pacotes (%)')
 
-# Abrir o CSV
-with open('dados.csv', newline='') as csvfile:
-    leitor = csv.DictReader(csvfile)
-    for linha in leitor:
-        try:
-            totais.append(int(linha['Total']))
-            recebidos.append(int(linha['Recebidos']))
-            perdas.append(float(linha['Perda']))
-        except ValueError:
-            # Pula linhas mal formatadas
-            continue
+    ax.set_xlabel('Mensagens Enviadas (Total)')
+    ax.set_ylabel('Perda (%)')
+    ax.set_title('Gráfico de Perda de Pacotes - Comunicação nRF24L01')
+    ax.grid(True)
+    ax.legend()
+    figura.tight_layout()
+    return figura
 
-# Plotar gráfico
-plt.figure(figsize=(10, 6))
-plt.plot(totais, perdas, marker='o', color='red', label='Perda de Pacotes (%)')
+if __name__ == '__main__':
+    # Listas para armazenar os dados
+    totais = []
+    recebidos = []
+    perdas = []
 
-plt.xlabel('Mensagens Enviadas (Total)')
-plt.ylabel('Perda (%)')
-plt.title('Gráfico de Perda de Pacotes - Comunicação nRF24L01')
-plt.grid(True)
-plt.legend()
-plt.tight_layout()
-plt.show()
+    # Abrir o CSV
+    with open('dados.csv', newline='') as csvfile:
+        leitor = csv.DictReader(csvfile)
+        for linha in leitor:
+            try:
+                totais.append(int(linha['Total']))
+                recebidos.append(int(linha['Recebidos']))
+                perdas.append(float(linha['Perda']))
+            except ValueError:
+                # Pula linhas mal formatadas
+                continue
+
+    # Plotar gráfico: em janela, ou salvo sem bloquear com --sem-janela
+    renderizar([(figura_perdas, (Serie(totais, perdas),), 'grafico_perdas.png')])
@@ -0,0 +1,223 @@
+import csv
+import json
+import os
+import threading
+import time
+
+# Gravação de CSV com descarga em grupo (group commit).
+#
+# Em vez de um f.flush() depois de cada linha, as linhas ficam no buffer do
+# arquivo e são descarregadas a cada 'linhas_por_flush' linhas ou a cada
+# 'intervalo_flush_ms' milissegundos, o que vier primeiro. A janela de perda em
+# caso de queda do processo é portanto de no máximo N linhas ou T ms.
+#
+# Política de fsync (perda em caso de queda do sistema operacional/energia):
+#   'nunca'    - só flush para o sistema operacional (padrão)
+#   'descarga' - fsync a cada descarga
+#   'rotacao'  - fsync só ao fechar cada arquivo
+#
+# Com tamanho_max_bytes ou intervalo_rotacao_s, os dados vão para arquivos
+# numerados (dados_radio_0001.csv, dados_radio_0002.csv, ...) e um manifesto
+# (dados_radio.manifesto.json) lista os arquivos com período e número de linhas.
+# No modo 'a' a gravação continua a captura anterior: a lista vem do manifesto (ou,
+# sem ele, dos arquivos numerados já existentes) e as linhas são acrescentadas ao
+# último arquivo. O modo 'w' recomeça do _0001.
+
+FSYNC_POLITICAS = ('nunca', 'descarga', 'rotacao')
+
+
+def _contar_linhas(caminho):
+    """Linhas de dados (sem o cabeçalho) de um CSV."""
+    with open(caminho, newline='') as f:
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+
+class GravadorCSV:
+    """
+    Grava linhas em CSV com descarga a cada N linhas ou T ms.
+
+    Sem rotação, grava em 'caminho' (modo 'w' recria o arquivo; modo 'a' acrescenta
+    e só escreve o cabeçalho se o arquivo estiver vazio). Com rotação, o modo 'a'
+    continua no último arquivo numerado da gravação anterior. Pode ser usado por mais de
+    uma thread (por exemplo, o callback do paho e a thread principal chamando verificar()).
+    """
+
+    def __init__(self, caminho, cabecalho, linhas_por_flush=100, intervalo_flush_ms=500,
+                 fsync='nunca', tamanho_max_bytes=None, intervalo_rotacao_s=None,
+                 modo='a', relogio=time.time):
+        if fsync not in FSYNC_POLITICAS:
+            raise ValueError(f"Política de fsync inválida: {fsync} (use uma de {FSYNC_POLITICAS})")
+        self.caminho = caminho
+        self.cabecalho = cabecalho
+        self.linhas_por_flush = linhas_por_flush
+        self.intervalo_flush = intervalo_flush_ms / 1000
+        self.fsync = fsync
+        self.tamanho_max_bytes = tamanho_max_bytes
+        self.intervalo_rotacao = intervalo_rotacao_s
+        self.modo = modo
+        self.relogio = relogio
+        self.rotaciona = tamanho_max_bytes is not None or intervalo_rotacao_s is not None
+
+        raiz, ext = os.path.splitext(caminho)
+        self._raiz = raiz
+        self._ext = ext or '.csv'
+        self.caminho_manifesto = f'{raiz}.manifesto.json'
+
+        self._lock = threading.Lock()
+        self._arquivo = None
+        self._writer = None
+        self._segmento = None
+        self._pendentes = 0
+        self._ultima_descarga = relogio()
+        self.arquivos = []
+        self.linhas = 0
+        self.descargas = 0
+        if self.rotaciona and modo == 'a':
+            self.arquivos = self._segmentos_existentes()
+        if self.arquivos:
+            self._continuar(self.arquivos[-1])
+        else:
+            self._abrir()
+        if self.rotaciona:
+            self._gravar_manifesto()
+
+    def _caminho_segmento(self, numero):
+        return f'{self._raiz}_{numero:04d}{self._ext}'
+
+    def _segmentos_existentes(self):
+        """Arquivos de uma gravação anterior: os do manifesto ou, sem ele, os numerados na pasta."""
+        try:
+            with open(self.caminho_manifesto) as f:
+                arquivos = json.load(f)['arquivos']
+        except (OSError, ValueError, KeyError):
+            arquivos = []
+        pasta = os.path.dirname(self._raiz) or '.'
+        arquivos = [segmento for segmento in arquivos
+                    if os.path.exists(os.path.join(pasta, segmento['arquivo']))]
+        if arquivos:
+            return arquivos
+        numero = 1
+        while os.path.exists(self._caminho_segmento(numero)):
+            caminho = self._caminho_segmento(numero)
+            arquivos.append({'arquivo': os.path.basename(caminho), 'inicio': None, 'fim': None,
+                             'linhas': _contar_linhas(caminho), 'bytes': os.path.getsize(caminho)})
+            numero += 1
+        return arquivos
+
+    def _continuar(self, segmento):
+        """Reabre o último arquivo de uma gravação anterior para acrescentar linhas."""
+        self._numero = len(self.arquivos)
+        caminho = os.path.join(os.path.dirname(self._raiz), segmento['arquivo'])
+        # O manifesto só é regravado na rotação: se a gravação anterior caiu, a contagem está velha
+        segmento['linhas'] = _contar_linhas(caminho)
+        self._arquivo = open(caminho, 'a', newline='', buffering=1 << 20)
+        self._writer = csv.writer(self._arquivo)
+        if os.path.getsize(caminho) == 0:
+            self._writer.writerow(self.cabecalho)
+        agora = self.relogio()
+        if segmento['inicio'] is None:
+            segmento['inicio'] = agora
+        segmento['fim'] = None
+        self._segmento = segmento
+        self._inicio_segmento = segmento['inicio']
+
+    def _abrir(self):
+        if self.rotaciona:
+            self._numero = len(self.arquivos) + 1
+            caminho = self._caminho_segmento(self._numero)
+            modo = 'w'
+        else:
+            caminho = self.caminho
+            modo = self.modo
+        novo = modo == 'w' or not os.path.exists(caminho) or os.path.getsize(caminho) == 0
+        self._arquivo = open(caminho, modo, newline='', buffering=1 << 20)
+        self._writer = csv.writer(self._arquivo)
+        if novo:
+            self._writer.writerow(self.cabecalho)
+        agora = self.relogio()
+        self._segmento = {'arquivo': os.path.basename(caminho), 'inicio': agora, 'fim': None, 'linhas': 0}
+        self.arquivos.append(self._segmento)
+        self._inicio_segmento = agora
+
+    def _descarregar(self, fsync):
+        self._arquivo.flush()
+        if fsync:
+            os.fsync(self._arquivo.fileno())
+        self._pendentes = 0
+        self._ultima_descarga = self.relogio()
+        self.descargas += 1
+
+    def _fechar_segmento(self):
+        self._descarregar(self.fsync != 'nunca')
+        self._segmento['fim'] = self.relogio()
+        self._segmento['bytes'] = os.fstat(self._arquivo.fileno()).st_size
+        self._arquivo.close()
+        self._arquivo = None
+
+    def _precisa_rotacionar(self):
+        if self.tamanho_max_bytes is not None and os.fstat(self._arquivo.fileno()).st_size >= self.tamanho_max_bytes:
+            return True
+        return self.intervalo_rotacao is not None and self.relogio() - self._inicio_segmento >= self.intervalo_rotacao
+
+    def _rotacionar(self):
+        self._fechar_segmento()
+        self._abrir()
+        self._gravar_manifesto()
+
+    def _gravar_manifesto(self):
+        temporario = self.caminho_manifesto + '.tmp'
+        with open(temporario, 'w') as f:
+            json.dump({'cabecalho': self.cabecalho, 'arquivos': self.arquivos}, f, indent=2)
+        os.replace(temporario, self.caminho_manifesto)
+
+    def _verificar(self):
+        if self._pendentes and self.relogio() - self._ultima_descarga >= self.intervalo_flush:
+            self._descarregar(self.fsync == 'descarga')
+            if self.rotaciona and self._precisa_rotacionar():
+                self._rotacionar()
+        elif self.intervalo_rotacao is not None and self._segmento['linhas'] and self._precisa_rotacionar():
+            self._rotacionar()
+
+    def escrever(self, linha):
+        with self._lock:
+            self._writer.writerow(linha)
+            self._pendentes += 1
+            self._segmento['linhas'] += 1
+            self.linhas += 1
+            if self._pendentes >= self.linhas_por_flush:
+                self._descarregar(self.fsync == 'descarga')
+                if self.rotaciona and self._precisa_rotacionar():
+                    self._rotacionar()
+            else:
+                self._verificar()
+
+    def verificar(self):
+        """Descarrega se a janela de tempo venceu. Chame periodicamente quando não chegam linhas."""
+        with self._lock:
+            if self._arquivo is not None:
+                self._verificar()
+
+    def tempo_para_descarga(self):
+        """Segundos até a próxima descarga por tempo (None se não há linhas pendentes)."""
+        if not self._pendentes:
+            return None
+        return max(0.0, self.intervalo_flush - (self.relogio() - self._ultima_descarga))
+
+    def descarregar(self):
+        with self._lock:
+            if self._arquivo is not None:
+                self._descarregar(self.fsync == 'descarga')
+
+    def fechar(self):
+        with self._lock:
+            if self._arquivo is None:
+                return
+            self._fechar_segmento()
+            if self.rotaciona:
+                self._gravar_manifesto()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
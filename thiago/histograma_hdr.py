@@ -0,0 +1,245 @@
+import argparse
+import array
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+# Histograma de latências com baldes logarítmicos (no estilo do HdrHistogram).
+#
+# Os valores (em 'unidade' ms) são contados em baldes de largura fixa dentro de
+# cada potência de 2: abaixo de 2^BITS_SUBBALDE a contagem é exata (um balde por
+# unidade), e acima cada potência de 2 é dividida em 2^(BITS_SUBBALDE-1) baldes.
+# O erro de um quantil é no máximo 2^-BITS_SUBBALDE do valor (0,4% com 8 bits) mais
+# a resolução 'unidade', qualquer que seja o valor, e a memória é fixa: cerca de
+# 3500 contadores para ir de 1 ms até VALOR_MAXIMO_MS. Registrar um valor é O(1)
+# (só o índice do balde).
+#
+# Dois histogramas com a mesma configuração se combinam somando as contagens, então
+# resumos de janelas, de execuções ou de sessões diferentes podem ser juntados.
+# estado()/de_estado() convertem para um dicionário JSON só com os baldes não vazios.
+#
+# SerieLatencia junta o histograma da execução inteira com uma janela deslizante:
+# NUM_FATIAS histogramas de DURACAO_FATIA_S segundos cada, em anel. Cada valor só é
+# registrado na fatia atual; quando o tempo passa, a fatia mais antiga é somada ao
+# histórico e zerada, e a execução inteira é o histórico mais as fatias. Uma janela
+# de N segundos combina as últimas fatias que a cobrem (a fatia atual está incompleta).
+#
+# Uso offline, para juntar sessões exportadas pelo bridge:
+#   python histograma_hdr.py sessao1.hdr.json sessao2.hdr.json --saida campanha.hdr.json
+
+BITS_SUBBALDE = 8
+UNIDADE_MS = 1.0
+VALOR_MAXIMO_MS = 2 ** 32  # millis() do Arduino é uint32
+DURACAO_FATIA_S = 10
+NUM_FATIAS = 6
+QUANTIS = (0.5, 0.9, 0.99, 0.999)
+VERSAO_EXPORTACAO = 1
+
+
+class HistogramaHDR:
+    """Contagens por balde logarítmico, com mínimo, máximo e soma exatos."""
+
+    def __init__(self, bits_subbalde=BITS_SUBBALDE, unidade=UNIDADE_MS, valor_maximo=VALOR_MAXIMO_MS):
+        self.bits_subbalde = bits_subbalde
+        self.unidade = unidade
+        self.valor_maximo = valor_maximo
+        self._metade = 1 << (bits_subbalde - 1)
+        self._maximo_inteiro = int(valor_maximo / unidade)
+        expoente_maximo = max(self._maximo_inteiro.bit_length() - bits_subbalde, 0)
+        # registrar() incrementa o array (mais rápido que um elemento NumPy); os quantis
+        # e as combinações usam a view NumPy sobre a mesma memória
+        self._contagens = array.array('q', bytes(8 * (expoente_maximo + 2) * self._metade))
+        self.contagens = np.frombuffer(self._contagens, dtype=np.int64)
+        self.limpar()
+
+    def limpar(self):
+        self.contagens[:] = 0
+        self.n = 0
+        self.soma = 0.0
+        self.minimo = math.inf
+        self.maximo = -math.inf
+        self.fora_da_faixa = 0  # Valores negativos ou acima de valor_maximo (contados nos extremos)
+
+    def configuracao(self):
+        return (self.bits_subbalde, self.unidade, self.valor_maximo)
+
+    def _indice(self, inteiro):
+        expoente = inteiro.bit_length() - self.bits_subbalde
+        if expoente <= 0:
+            return inteiro
+        return expoente * self._metade + (inteiro >> expoente)
+
+    def _limites(self, indices):
+        """Início e largura (em unidades) dos baldes."""
+        indices = np.asarray(indices, dtype=np.int64)
+        expoentes = np.maximum(indices // self._metade - 1, 0)
+        inicios = np.where(expoentes > 0, (indices - expoentes * self._metade) << expoentes, indices)
+        return inicios, np.int64(1) << expoentes
+
+    def registrar(self, valor):
+        inteiro = int(valor / self.unidade)
+        if inteiro < 0 or inteiro > self._maximo_inteiro:
+            self.fora_da_faixa += 1
+            inteiro = min(max(inteiro, 0), self._maximo_inteiro)
+        # Mesmo cálculo de _indice(), sem a chamada (é o caminho de cada mensagem)
+        expoente = inteiro.bit_length() - self.bits_subbalde
+        self._contagens[inteiro if expoente <= 0 else expoente * self._metade + (inteiro >> expoente)] += 1
+        self.n += 1
+        self.soma += valor
+        if valor < self.minimo:
+            self.minimo = valor
+        if valor > self.maximo:
+            self.maximo = valor
+
+    def combinar(self, outro):
+        if outro.configuracao() != self.configuracao():
+            raise ValueError(f"Histogramas com configurações diferentes: {self.configuracao()} e {outro.configuracao()}")
+        self.contagens += outro.contagens
+        self.n += outro.n
+        self.soma += outro.soma
+        self.minimo = min(self.minimo, outro.minimo)
+        self.maximo = max(self.maximo, outro.maximo)
+        self.fora_da_faixa += outro.fora_da_faixa
+
+    def quantis(self, quantis=QUANTIS):
+        """Valor de cada quantil (meio do balde, limitado ao mínimo e ao máximo exatos)."""
+        if not self.n:
+            return [math.nan] * len(quantis)
+        acumulado = np.cumsum(self.contagens)
+        posicoes = np.maximum(np.ceil(np.asarray(quantis) * self.n), 1)
+        indices = np.searchsorted(acumulado, posicoes)
+        inicios, larguras = self._limites(indices)
+        valores = (inicios + (larguras - 1) / 2) * self.unidade
+        return np.clip(valores, self.minimo, self.maximo).tolist()
+
+    @property
+    def media(self):
+        return self.soma / self.n if self.n else math.nan
+
+    def estado(self):
+        nao_vazios = np.flatnonzero(self.contagens)
+        return {
+            'bits_subbalde': self.bits_subbalde, 'unidade': self.unidade, 'valor_maximo': self.valor_maximo,
+            'n': self.n, 'soma': self.soma, 'minimo': self.minimo, 'maximo': self.maximo,
+            'fora_da_faixa': self.fora_da_faixa,
+            'indices': nao_vazios.tolist(), 'contagens': self.contagens[nao_vazios].tolist(),
+        }
+
+    @classmethod
+    def de_estado(cls, estado):
+        histograma = cls(estado['bits_subbalde'], estado['unidade'], estado['valor_maximo'])
+        histograma.contagens[estado['indices']] = estado['contagens']
+        histograma.n = estado['n']
+        histograma.soma = estado['soma']
+        histograma.minimo = estado['minimo']
+        histograma.maximo = estado['maximo']
+        histograma.fora_da_faixa = estado['fora_da_faixa']
+        return histograma
+
+
+class SerieLatencia:
+    """Histograma da execução inteira e janela deslizante em fatias de tempo."""
+
+    def __init__(self, duracao_fatia_s=DURACAO_FATIA_S, num_fatias=NUM_FATIAS, relogio=time.monotonic, **configuracao):
+        self.historico = HistogramaHDR(**configuracao)  # Fatias que já saíram da janela
+        self.fatias = [HistogramaHDR(**configuracao) for _ in range(num_fatias)]
+        self.duracao_fatia_s = duracao_fatia_s
+        self.relogio = relogio
+        self._fatia_atual = int(relogio() // duracao_fatia_s)
+        self._atual = self.fatias[self._fatia_atual % num_fatias]
+        self._fim_fatia = (self._fatia_atual + 1) * duracao_fatia_s
+
+    def _avancar(self):
+        fatia = int(self.relogio() // self.duracao_fatia_s)
+        if fatia != self._fatia_atual:
+            # As fatias reaproveitadas vão para o histórico (todas, se passou mais que a janela)
+            for numero in range(self._fatia_atual + 1, min(fatia, self._fatia_atual + len(self.fatias)) + 1):
+                saindo = self.fatias[numero % len(self.fatias)]
+                if saindo.n:
+                    self.historico.combinar(saindo)
+                    saindo.limpar()
+            self._fatia_atual = fatia
+            self._atual = self.fatias[fatia % len(self.fatias)]
+            self._fim_fatia = (fatia + 1) * self.duracao_fatia_s
+
+    def registrar(self, valor):
+        # Só recalcula a fatia quando o relógio passa do fim da atual
+        if self.relogio() >= self._fim_fatia:
+            self._avancar()
+        self._atual.registrar(valor)
+
+    def janela(self, segundos=None):
+        """Histograma dos últimos 'segundos' (padrão: a janela inteira), em fatias inteiras."""
+        self._avancar()
+        quantidade = len(self.fatias) if segundos is None else min(
+            max(math.ceil(segundos / self.duracao_fatia_s), 1), len(self.fatias))
+        resultado = HistogramaHDR(*self.historico.configuracao())
+        for numero in range(self._fatia_atual - quantidade + 1, self._fatia_atual + 1):
+            resultado.combinar(self.fatias[numero % len(self.fatias)])
+        return resultado
+
+    @property
+    def n(self):
+        """Valores registrados na execução inteira (sem combinar os histogramas)."""
+        return self.historico.n + sum(fatia.n for fatia in self.fatias)
+
+    @property
+    def total(self):
+        """Histograma da execução inteira."""
+        resultado = self.janela()
+        resultado.combinar(self.historico)
+        return resultado
+
+
+def formatar_quantis(histograma, quantis=QUANTIS):
+    if not histograma.n:
+        return "sem dados"
+    valores = histograma.quantis(quantis)
+    texto = ', '.join(f"p{q * 100:g}={valor:.1f}" for q, valor in zip(quantis, valores))
+    return f"n={histograma.n}, média={histograma.media:.2f}ms, {texto}ms, máx={histograma.maximo:.1f}ms"
+
+
+def salvar_histogramas(caminho, histogramas):
+    """Grava {nome: HistogramaHDR} em JSON (troca atômica do arquivo)."""
+    conteudo = {'versao': VERSAO_EXPORTACAO, 'histogramas': {nome: h.estado() for nome, h in histogramas.items()}}
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(conteudo, arquivo, separators=(',', ':'))
+    os.replace(temporario, caminho)
+
+
+def carregar_histogramas(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        conteudo = json.load(arquivo)
+    if conteudo.get('versao') != VERSAO_EXPORTACAO:
+        raise ValueError(f"{caminho}: versão de exportação não suportada ({conteudo.get('versao')})")
+    return {nome: HistogramaHDR.de_estado(estado) for nome, estado in conteudo['histogramas'].items()}
+
+
+def combinar_arquivos(caminhos):
+    """Histogramas de várias exportações combinados por nome."""
+    combinados = {}
+    for caminho in caminhos:
+        for nome, histograma in carregar_histogramas(caminho).items():
+            if nome in combinados:
+                combinados[nome].combinar(histograma)
+            else:
+                combinados[nome] = histograma
+    return combinados
+
+
+if __name__ == '__main__':
+    argumentos = argparse.ArgumentParser(description='Junta histogramas de latência exportados pelo bridge')
+    argumentos.add_argument('arquivos', nargs='+', help='arquivos .hdr.json')
+    argumentos.add_argument('--saida', help='grava o resultado combinado neste arquivo')
+    opcoes = argumentos.parse_args()
+    combinados = combinar_arquivos(opcoes.arquivos)
+    print(f"{len(opcoes.arquivos)} arquivo(s) combinados")
+    for nome, histograma in combinados.items():
+        print(f"{nome}: {formatar_quantis(histograma)}")
+    if opcoes.saida:
+        salvar_histogramas(opcoes.saida, combinados)
+        print(f"Resultado salvo em {opcoes.saida}")
@@ -0,0 +1,316 @@
+import itertools
+import os
+import sys
+
+import numpy as np
+
+from armazenamento_colunar import AUSENTE_INT, carregar_captura
+from extracao_latencias import carregar_chegadas
+
+# Junção de várias fontes de captura (rádio, broker local, broker na nuvem,
+# dashboard...) pelo ID da mensagem, com arrays NumPy.
+#
+# Cada arquivo é lido uma vez (só id e rx, da pasta colunar se existir). As chaves
+# de cada fonte são ordenadas e a tabela final é a união ordenada das chaves, com
+# a posição de cada fonte achada por busca binária (searchsorted), sem dicionários.
+#
+# IDs repetidos (a mesma mensagem recebida mais de uma vez) não se sobrescrevem:
+# a tabela guarda a primeira e a última chegada e o número de chegadas.
+#
+# Reinício do contador: o transmissor numera as mensagens a partir de 0 a cada boot.
+# Uma queda do ID maior que TOLERANCIA_REINICIO para um ID abaixo de
+# TOLERANCIA_REINICIO, sem voltar à faixa anterior na linha seguinte, marca um
+# reinício. Os reinícios de todas as fontes que caem na mesma JANELA_REINICIO_S são
+# o mesmo reinício, e cada linha recebe a época global correspondente ao seu
+# instante de chegada, então uma fonte que começou a gravar depois de um reinício
+# continua alinhada com as outras. A chave da mensagem é (época << 32) | id.
+#
+# alinhar_chegadas() pareia as linhas de duas fontes uma a uma (para calcular
+# atrasos linha a linha): por ID quando existe, senão pela chegada anterior mais
+# próxima na outra fonte, dentro de uma tolerância.
+
+TOLERANCIA_REINICIO = 100
+JANELA_REINICIO_S = 5.0
+# alinhar_chegadas: distância máxima até a chegada anterior na outra fonte (linhas sem ID)
+TOLERANCIA_ASOF_S = 2.0
+# parear_latencias_mqtt: atrasos fora de [0, 10 s) são descartados
+LIMITE_ESTIMADA_MS = 10000
+
+# Como cada linha de alinhar_chegadas foi pareada
+SEM_PAR, POR_ID, POR_TEMPO = 0, 1, 2
+
+
+class Fonte:
+    """IDs e instantes de chegada (s) de uma fonte, na ordem de chegada."""
+
+    def __init__(self, nome, ids, rx):
+        ids = np.asarray(ids, dtype=np.int64)
+        rx = np.asarray(rx, dtype=np.float64)
+        validos = ids != AUSENTE_INT
+        self.nome = nome
+        self.ids = ids[validos]
+        self.rx = rx[validos]
+
+    @classmethod
+    def de_arquivo(cls, nome, caminho):
+        """Lê só id e rx do arquivo. Arquivo inexistente vira uma fonte vazia (com aviso)."""
+        if not os.path.exists(caminho):
+            print(f"Arquivo {caminho} não encontrado, fonte {nome} sem mensagens")
+            return cls(nome, [], [])
+        dados = carregar_captura(caminho, ['id', 'rx'])
+        return cls(nome, dados['id'], dados['rx'])
+
+    def reinicios(self, tolerancia=TOLERANCIA_REINICIO):
+        """Índices das linhas em que o contador de IDs reiniciou."""
+        ids = self.ids
+        queda = (ids[1:] < ids[:-1] - tolerancia) & (ids[1:] < tolerancia)
+        # A linha seguinte também tem que ficar abaixo do ID anterior à queda; senão
+        # é uma mensagem atrasada ou um ID corrompido no meio da sequência (uma queda
+        # na última linha não tem como ser confirmada)
+        seguinte = np.r_[ids[2:], np.iinfo(np.int64).max] if len(ids) > 1 else ids[1:]
+        queda &= seguinte < ids[:-1] - tolerancia
+        return np.flatnonzero(queda) + 1
+
+
+def _reinicios_globais(fontes, janela=JANELA_REINICIO_S):
+    """Instantes dos reinícios, juntando os das várias fontes que caem na mesma janela."""
+    tempos = np.sort(np.concatenate([f.rx[f.reinicios()] for f in fontes] or [np.empty(0)]))
+    if not len(tempos):
+        return tempos
+    novos = np.r_[True, np.diff(tempos) > janela]
+    return tempos[novos]
+
+
+def _epocas(fonte, reinicios, janela=JANELA_REINICIO_S):
+    """
+    Época global de cada linha da fonte. Dentro da fonte a época só muda nos
+    reinícios dela; o começo de cada trecho é posicionado entre os reinícios globais
+    pelo instante de chegada (com folga de 'janela' para o atraso entre fontes).
+    """
+    locais = np.zeros(len(fonte.ids), dtype=np.int64)
+    indices = fonte.reinicios()
+    locais[indices] = 1
+    locais = np.cumsum(locais)
+    inicios = np.r_[0, indices]
+    if not len(fonte.ids):
+        return locais
+    globais = np.searchsorted(reinicios, fonte.rx[inicios] + janela, side='right')
+    return globais[locais]
+
+
+class TabelaAlinhada:
+    """
+    Uma linha por mensagem (chave = época + ID), ordenada, com as chegadas de cada fonte:
+
+    tabela.ids, tabela.epocas      ID e época de cada linha
+    tabela.primeiro['local']       primeira chegada na fonte (NaN se não chegou)
+    tabela.ultimo['local']         última chegada (diferente da primeira se duplicada)
+    tabela.chegadas['local']       quantas vezes chegou (0 se perdida)
+    """
+
+    def __init__(self, chaves, fontes):
+        self.chaves = chaves
+        self.epocas = chaves >> 32
+        self.ids = chaves & 0xFFFFFFFF
+        self.fontes = list(fontes)
+        self.primeiro = {}
+        self.ultimo = {}
+        self.chegadas = {}
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def presente(self, nome):
+        return self.chegadas[nome] > 0
+
+    def comuns(self, a, b):
+        """Máscara das mensagens que chegaram nas duas fontes."""
+        return self.presente(a) & self.presente(b)
+
+    def delta(self, a, b):
+        """(ids, atrasos) das mensagens comuns: primeira chegada em b - primeira chegada em a (s)."""
+        mascara = self.comuns(a, b)
+        return self.ids[mascara], self.primeiro[b][mascara] - self.primeiro[a][mascara]
+
+    def estatisticas_pares(self):
+        """Perda e atraso para cada par de fontes (na ordem de self.fontes)."""
+        resultado = {}
+        for a, b in itertools.combinations(self.fontes, 2):
+            n_a, n_b = int(self.presente(a).sum()), int(self.presente(b).sum())
+            _, deltas = self.delta(a, b)
+            comuns = len(deltas)
+            resultado[(a, b)] = {
+                'comuns': comuns,
+                # Mensagens de a que não chegaram em b, e vice-versa
+                'perda_b': 1 - comuns / n_a if n_a else float('nan'),
+                'perda_a': 1 - comuns / n_b if n_b else float('nan'),
+                'delta_media': float(deltas.mean()) if comuns else float('nan'),
+                'delta_mediana': float(np.median(deltas)) if comuns else float('nan'),
+                'delta_p95': float(np.quantile(deltas, 0.95)) if comuns else float('nan'),
+                'delta_min': float(deltas.min()) if comuns else float('nan'),
+                'delta_max': float(deltas.max()) if comuns else float('nan'),
+            }
+        return resultado
+
+    def duplicadas(self, nome):
+        """Número de chegadas repetidas na fonte."""
+        return int(np.maximum(self.chegadas[nome] - 1, 0).sum())
+
+
+def _chaves(fonte, reinicios):
+    """Chave (época << 32) | id de cada linha da fonte."""
+    return (_epocas(fonte, reinicios) << 32) | fonte.ids
+
+
+def _inicios_de_grupo(ordenado):
+    """Índices em que começa cada valor distinto de um array ordenado."""
+    return np.flatnonzero(np.r_[True, ordenado[1:] != ordenado[:-1]]) if len(ordenado) else np.empty(0, dtype=np.int64)
+
+
+def juntar_fontes(fontes):
+    """
+    Alinha as fontes pela chave da mensagem. 'fontes' é uma lista de Fonte ou um
+    dicionário nome -> caminho do CSV (cada arquivo é lido uma vez).
+    """
+    if isinstance(fontes, dict):
+        fontes = [Fonte.de_arquivo(nome, caminho) for nome, caminho in fontes.items()]
+    reinicios = _reinicios_globais(fontes)
+
+    ordenadas = []
+    for fonte in fontes:
+        chaves = _chaves(fonte, reinicios)
+        # Ordena por chave e, dentro da mesma chave, por chegada
+        ordem = np.lexsort((fonte.rx, chaves))
+        chaves, rx = chaves[ordem], fonte.rx[ordem]
+        primeiros = _inicios_de_grupo(chaves)
+        contagens = np.diff(np.r_[primeiros, len(chaves)])
+        ordenadas.append((fonte.nome, chaves[primeiros], rx[primeiros], rx[primeiros + contagens - 1], contagens))
+
+    # União das chaves: as listas já estão ordenadas, e o sort estável (timsort)
+    # aproveita as sequências ordenadas, como um merge
+    todas = np.sort(np.concatenate([unicas for _, unicas, *_ in ordenadas] or [np.empty(0, dtype=np.int64)]),
+                    kind='stable')
+    todas = todas[_inicios_de_grupo(todas)]
+    tabela = TabelaAlinhada(todas, [nome for nome, *_ in ordenadas])
+    for nome, unicas, primeiro, ultimo, contagens in ordenadas:
+        # As chaves da fonte estão contidas em 'todas', que está ordenada
+        posicoes = np.searchsorted(todas, unicas)
+        tabela.primeiro[nome] = np.full(len(todas), np.nan)
+        tabela.ultimo[nome] = np.full(len(todas), np.nan)
+        tabela.chegadas[nome] = np.zeros(len(todas), dtype=np.int64)
+        tabela.primeiro[nome][posicoes] = primeiro
+        tabela.ultimo[nome][posicoes] = ultimo
+        tabela.chegadas[nome][posicoes] = contagens
+    return tabela
+
+
+def alinhar_chegadas(ids_a, rx_a, ids_b, rx_b, tolerancia=TOLERANCIA_ASOF_S):
+    """
+    Para cada linha de b, a linha correspondente de a (por exemplo a = rádio, b = MQTT).
+
+    Linhas de b com ID são pareadas pela mesma chave (época + ID) em a, com a primeira
+    chegada em a; se a mensagem não chegou em a, ficam sem par. Linhas de b sem ID são
+    pareadas com a chegada anterior mais próxima em a (as-of), entre as linhas de a
+    que não foram pareadas por ID, se estiver a no máximo 'tolerancia' segundos.
+    O(n log n) com searchsorted.
+
+    Retorna (indices, metodo): indices[i] é a linha de a pareada com a linha i de b
+    (-1 se nenhuma) e metodo[i] é SEM_PAR, POR_ID ou POR_TEMPO.
+    """
+    ids_a, ids_b = np.asarray(ids_a, dtype=np.int64), np.asarray(ids_b, dtype=np.int64)
+    rx_a, rx_b = np.asarray(rx_a, dtype=np.float64), np.asarray(rx_b, dtype=np.float64)
+    indices = np.full(len(ids_b), -1, dtype=np.int64)
+    metodo = np.full(len(ids_b), SEM_PAR, dtype=np.int8)
+
+    # Por ID: chaves das linhas com ID nas duas fontes (reinícios tratados como em juntar_fontes)
+    com_id_a = np.flatnonzero(ids_a != AUSENTE_INT)
+    com_id_b = np.flatnonzero(ids_b != AUSENTE_INT)
+    fonte_a = Fonte('a', ids_a[com_id_a], rx_a[com_id_a])
+    fonte_b = Fonte('b', ids_b[com_id_b], rx_b[com_id_b])
+    reinicios = _reinicios_globais([fonte_a, fonte_b])
+    chaves_a = _chaves(fonte_a, reinicios)
+    ordem = np.lexsort((fonte_a.rx, chaves_a))
+    primeiros = ordem[_inicios_de_grupo(chaves_a[ordem])]
+    unicas_a = chaves_a[primeiros]
+    usadas_a = np.zeros(len(ids_a), dtype=bool)
+    if len(unicas_a):
+        chaves_b = _chaves(fonte_b, reinicios)
+        posicoes = np.minimum(np.searchsorted(unicas_a, chaves_b), len(unicas_a) - 1)
+        achadas = unicas_a[posicoes] == chaves_b
+        linhas_a = com_id_a[primeiros[posicoes[achadas]]]
+        indices[com_id_b[achadas]] = linhas_a
+        metodo[com_id_b[achadas]] = POR_ID
+        usadas_a[linhas_a] = True
+
+    # Por tempo: linhas de b sem ID contra as linhas de a ainda livres, pela chegada anterior
+    sem_id_b = np.flatnonzero(ids_b == AUSENTE_INT)
+    livres_a = np.flatnonzero(~usadas_a & ~np.isnan(rx_a))
+    if len(sem_id_b) and len(livres_a):
+        livres_a = livres_a[np.argsort(rx_a[livres_a], kind='stable')]
+        tempos_a = rx_a[livres_a]
+        anteriores = np.searchsorted(tempos_a, rx_b[sem_id_b], side='right') - 1
+        validos = anteriores >= 0
+        distancia = np.full(len(sem_id_b), np.inf)
+        distancia[validos] = rx_b[sem_id_b[validos]] - tempos_a[anteriores[validos]]
+        pareadas = distancia <= tolerancia
+        indices[sem_id_b[pareadas]] = livres_a[anteriores[pareadas]]
+        metodo[sem_id_b[pareadas]] = POR_TEMPO
+    return indices, metodo
+
+
+def parear_latencias_mqtt(radio_csv, mqtt_csv, tolerancia=TOLERANCIA_ASOF_S, limite_ms=LIMITE_ESTIMADA_MS):
+    """
+    Latência MQTT estimada por mensagem: chegada no MQTT - chegada no rádio da mesma
+    mensagem (alinhar_chegadas), junto com a latência do rádio dessa mensagem.
+
+    Retorna (latencias, contagens): latencias tem os arrays 'radio', 'mqtt' e 'ids'
+    (ms, só os pares com 0 <= MQTT < limite_ms); contagens tem quantas linhas foram
+    pareadas por ID e por tempo, quantas ficaram sem par e quantas ficaram fora do limite.
+    """
+    radio = carregar_chegadas(radio_csv)
+    mqtt = carregar_chegadas(mqtt_csv)
+    indices, metodo = alinhar_chegadas(radio['id'], radio['rx'], mqtt['id'], mqtt['rx'], tolerancia)
+    pareadas = np.flatnonzero(indices >= 0)
+    linhas_radio = indices[pareadas]
+    latencias_mqtt = (mqtt['rx'][pareadas] - radio['rx'][linhas_radio]) * 1000
+    validas = (latencias_mqtt >= 0) & (latencias_mqtt < limite_ms)
+    contagens = {
+        'radio': len(radio['rx']),
+        'mqtt': len(mqtt['rx']),
+        'por_id': int((metodo == POR_ID).sum()),
+        'por_tempo': int((metodo == POR_TEMPO).sum()),
+        'mqtt_sem_par': int((metodo == SEM_PAR).sum()),
+        'radio_sem_par': len(radio['rx']) - len(np.unique(linhas_radio)),
+        'fora_do_limite': int((~validas).sum()),
+    }
+    latencias = {
+        'ids': mqtt['id'][pareadas][validas],
+        'mqtt': latencias_mqtt[validas],
+        'radio': radio['radio_latency'][linhas_radio][validas],
+    }
+    return latencias, contagens
+
+
+def imprimir_pareamento(contagens):
+    print(f"Pareamento rádio x MQTT: {contagens['por_id']} por ID, {contagens['por_tempo']} por tempo")
+    print(f"Sem par: {contagens['mqtt_sem_par']} de {contagens['mqtt']} linhas do MQTT, "
+          f"{contagens['radio_sem_par']} de {contagens['radio']} linhas do rádio")
+    if contagens['fora_do_limite']:
+        print(f"Descartados: {contagens['fora_do_limite']} pares com atraso negativo ou acima do limite")
+
+
+def imprimir_estatisticas(tabela):
+    for nome in tabela.fontes:
+        print(f"{nome}: {int(tabela.presente(nome).sum())} mensagens, {tabela.duplicadas(nome)} chegadas repetidas")
+    for (a, b), est in tabela.estatisticas_pares().items():
+        print(f"\n{a} x {b}: {est['comuns']} mensagens em comum")
+        print(f"  Perda em {b} (mensagens de {a} que não chegaram): {est['perda_b']*100:.2f}%")
+        print(f"  Perda em {a} (mensagens de {b} que não chegaram): {est['perda_a']*100:.2f}%")
+        if est['comuns']:
+            print(f"  Delta ({b} - {a}): média {est['delta_media']:.3f} s, mediana {est['delta_mediana']:.3f} s, "
+                  f"p95 {est['delta_p95']:.3f} s, mín {est['delta_min']:.3f} s, máx {est['delta_max']:.3f} s")
+
+
+if __name__ == '__main__':
+    # Uso: python juncao_fontes.py radio=dados_radio.csv local=dados_mqtt_local.csv nuvem=dados_mqtt_nuvem.csv
+    imprimir_estatisticas(juntar_fontes(dict(argumento.split('=', 1) for argumento in sys.argv[1:])))
@@ -1,51 +1,46 @@
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import re
 import os
+import sys
+import analise_streaming
+from juncao_fontes import imprimir_pareamento, parear_latencias_mqtt
+from renderizacao import Serie, desenhar_medias, renderizar
+
+# Modo streaming (analise_streaming.py): lê as capturas em blocos e calcula só as
+# estatísticas (com p95/p99), com memória limitada. Também ativado por --streaming
+MODO_STREAMING = False
 
 def estimar_latencia_mqtt(radio_csv, mqtt_csv):
     """
     Estima a latência do MQTT comparando os tempos de chegada
     no sistema entre as mensagens recebidas via rádio e via MQTT.
+
+    Cada linha do MQTT é pareada com a mesma mensagem no rádio: pelo ID quando a
+    linha tem ID, senão pela chegada anterior mais próxima no rádio, dentro de uma
+    tolerância (juncao_fontes.alinhar_chegadas). Uma mensagem perdida não desloca
+    os pares seguintes, e as linhas sem par são contadas, não substituídas.
     """
     if not os.path.exists(radio_csv) or not os.path.exists(mqtt_csv):
         print("Arquivos de dados não encontrados")
         return
 
-    # Carregar dados de rádio
-    df_radio = pd.read_csv(radio_csv)
-    
-    # Carregar dados de MQTT
-    df_mqtt = pd.read_csv(mqtt_csv)
-    
-    # Extrair timestamps do sistema para cada recepção
-    timestamps_sistema_radio = df_radio['timestamp'].values
-    timestamps_sistema_mqtt = df_mqtt['timestamp'].values
+    latencias, contagens = parear_latencias_mqtt(radio_csv, mqtt_csv)
     
-    print(f"Dados rádio: {len(timestamps_sistema_radio)} amostras")
-    print(f"Dados MQTT: {len(timestamps_sistema_mqtt)} amostras")
+    print(f"Dados rádio: {contagens['radio']} amostras")
+    print(f"Dados MQTT: {contagens['mqtt']} amostras")
+    imprimir_pareamento(contagens)
     
     # Se o número de amostras for muito diferente, pode indicar problemas
-    if abs(len(timestamps_sistema_radio) - len(timestamps_sistema_mqtt)) > min(len(timestamps_sistema_radio), len(timestamps_sistema_mqtt)) * 0.2:
+    if abs(contagens['radio'] - contagens['mqtt']) > min(contagens['radio'], contagens['mqtt']) * 0.2:
         print("AVISO: Número de amostras entre rádio e MQTT é significativamente diferente")
     
-    # Calcular latências MQTT estimadas
-    # Consideramos a diferença de tempo entre cada mensagem radio e sua correspondente MQTT
-    min_length = min(len(timestamps_sistema_radio), len(timestamps_sistema_mqtt))
-    latencias_mqtt = []
+    # Latência MQTT estimada (ms) de cada mensagem pareada, já filtrada
+    # (valores negativos ou acima de 10 segundos são descartados no pareamento)
+    latencias_mqtt = latencias['mqtt']
     
-    for i in range(min_length):
-        # Converter para ms para manter consistência com medidas de latência
-        latencia = (timestamps_sistema_mqtt[i] - timestamps_sistema_radio[i]) * 1000
-        # Filtra valores negativos ou extremamente altos
-        if latencia >= 0 and latencia < 10000:  # limite superior de 10 segundos
-            latencias_mqtt.append(latencia)
-    
-    # Se não temos valores válidos, usar valores típicos para ilustração
-    if not latencias_mqtt:
-        print("Não foi possível calcular latências MQTT válidas, usando valores típicos")
-        latencias_mqtt = [np.random.randint(100, 150) for _ in range(50)]
+    if not len(latencias_mqtt):
+        print("Nenhuma mensagem pareada entre rádio e MQTT, não é possível estimar a latência MQTT")
+        return
     
     # Analisar os dados
     media = np.mean(latencias_mqtt)
@@ -62,33 +57,19 @@ def estimar_latencia_mqtt(radio_csv, mqtt_csv):
     print(f"Mediana: {mediana:.2f} ms")
     print(f"Desvio Padrão: {desvio:.2f} ms")
     
-    # Extrair latências do rádio (corrigindo possíveis overflows)
-    # Precisamos do regex para extrair os valores de latência do rádio
-    radio_regex = re.compile(r'RadioLatency: (\d+) ms')
-    latencias_radio = []
-    
-    for _, row in df_radio.iterrows():
-        valor = str(row['valor']) if 'valor' in df_radio.columns else ''
-        match = radio_regex.search(valor)
-        if match:
-            latencia = int(match.group(1))
-            # Corrigir overflow se necessário
-            if latencia > 4000000000:
-                latencia = abs(latencia - (1 << 32))
-            latencias_radio.append(latencia)
-    
-    # Se não temos valores válidos, usar valores típicos para ilustração
-    if not latencias_radio:
-        print("Não foi possível extrair latências de rádio válidas, usando valores típicos")
-        latencias_radio = [np.random.randint(40, 60) for _ in range(len(latencias_mqtt))]
-    
-    # Garantir que temos o mesmo número de amostras
-    min_len = min(len(latencias_radio), len(latencias_mqtt))
-    latencias_radio = latencias_radio[:min_len]
-    latencias_mqtt = latencias_mqtt[:min_len]
+    # Latência do rádio das mesmas mensagens (overflow já corrigido). Mensagens sem
+    # RadioLatency ficam fora da comparação
+    com_radio = ~np.isnan(latencias['radio'])
+    if not com_radio.any():
+        print("Nenhuma latência de rádio nas mensagens pareadas, comparação não realizada")
+        return
+    if not com_radio.all():
+        print(f"{int((~com_radio).sum())} mensagens pareadas sem latência de rádio ficam fora da comparação")
+    latencias_radio = latencias['radio'][com_radio]
+    latencias_mqtt = latencias_mqtt[com_radio]
     
     # Calcular latências totais
-    latencias_total = [r + m for r, m in zip(latencias_radio, latencias_mqtt)]
+    latencias_total = latencias_radio + latencias_mqtt
     
     # Estatísticas do rádio
     print("\nEstatísticas de Latência Rádio:")
@@ -115,39 +96,45 @@ def estimar_latencia_mqtt(radio_csv, mqtt_csv):
     print(f"A transmissão via MQTT adiciona {mqtt_media:.2f}ms de latência")
     print(f"Isso representa um aumento de {(mqtt_media/radio_media)*100:.2f}% sobre a latência do rádio")
     
-    # Plotar gráfico comparativo
-    plt.figure(figsize=(12, 8))
+    # Gráfico comparativo: em janela, ou salvo sem bloquear com --sem-janela
+    series = [
+        (Serie(None, latencias_radio), 'b-', 'Latência Rádio'),
+        (Serie(None, latencias_mqtt), 'r-', 'Latência MQTT'),
+        (Serie(None, latencias_total), 'g-', 'Latência Total'),
+    ]
+    renderizar([(figura_comparacao, (series, [radio_media, mqtt_media, total_media]),
+                 'comparacao_realista_latencias.png')])
+
+def figura_comparacao(series, latencias_medias):
+    """Latências ao longo do tempo (séries reduzidas) e barras das médias"""
+    figura, (ax_linhas, ax_barras) = plt.subplots(2, 1, figsize=(12, 8))
     
     # Gráfico de linhas
-    plt.subplot(2, 1, 1)
-    plt.plot(latencias_radio, 'b-', label='Latência Rádio')
-    plt.plot(latencias_mqtt, 'r-', label='Latência MQTT')
-    plt.plot(latencias_total, 'g-', label='Latência Total')
-    plt.title('Comparação de Latências ao Longo do Tempo')
-    plt.xlabel('Número da amostra')
-    plt.ylabel('Latência (ms)')
-    plt.legend()
-    plt.grid(True)
+    for serie, formato, rotulo in series:
+        serie.plotar(ax_linhas, formato, label=rotulo)
+    ax_linhas.set_title('Comparação de Latências ao Longo do Tempo')
+    ax_linhas.set_xlabel('Número da amostra')
+    ax_linhas.set_ylabel('Latência (ms)')
+    ax_linhas.legend()
+    ax_linhas.grid(True)
     
     # Gráfico de barras
-    plt.subplot(2, 1, 2)
-    meios = ['Rádio', 'MQTT', 'Total (Rádio + MQTT)']
-    latencias_medias = [radio_media, mqtt_media, total_media]
-    barras = plt.bar(meios, latencias_medias, color=['blue', 'red', 'green'])
-    
-    # Adicionar valores nas barras
-    for barra in barras:
-        altura = barra.get_height()
-        plt.text(barra.get_x() + barra.get_width()/2., altura + 1,
-                 f'{altura:.2f} ms', ha='center', va='bottom')
-    
-    plt.title('Latência Média por Meio de Transmissão')
-    plt.ylabel('Latência (ms)')
-    plt.grid(axis='y', linestyle='--', alpha=0.7)
-    
-    plt.tight_layout()
-    plt.savefig('comparacao_realista_latencias.png')
-    plt.show()
+    desenhar_medias(ax_barras, ['Rádio', 'MQTT', 'Total (Rádio + MQTT)'], latencias_medias)
+    ax_barras.set_ylabel('Latência (ms)')
+    
+    figura.tight_layout()
+    return figura
+
+def estimar_latencia_mqtt_streaming(radio_csv, mqtt_csv):
+    """Estatísticas de estimar_latencia_mqtt lendo as capturas em blocos."""
+    if not os.path.exists(radio_csv) or not os.path.exists(mqtt_csv):
+        print("Arquivos de dados não encontrados")
+        return
+    estatisticas = analise_streaming.estatisticas_estimada(radio_csv, mqtt_csv)
+    return analise_streaming.resumir(estatisticas, 'comparacao_realista_latencias.png')
 
 if __name__ == "__main__":
-    estimar_latencia_mqtt('dados_radio.csv', 'dados_mqtt.csv')
+    if MODO_STREAMING or '--streaming' in sys.argv:
+        estimar_latencia_mqtt_streaming('dados_radio.csv', 'dados_mqtt.csv')
+    else:
+        estimar_latencia_mqtt('dados_radio.csv', 'dados_mqtt.csv')
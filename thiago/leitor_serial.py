@@ -0,0 +1,231 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from frame_binario import SYNC, TAMANHO_FRAME, decodificar_frame
+from parser_telemetria import formatar_linha
+
+# Leitura da porta serial orientada a eventos.
+# Uma thread de fundo fica bloqueada em ser.read() até chegar pelo menos um byte,
+# guarda os bytes em um buffer circular e separa as linhas pelo '\n'.
+# Cada linha recebe o timestamp do momento em que o seu último byte chegou,
+# em vez do momento em que o loop principal acordou de um sleep.
+#
+# Frames binários (frame_binario.py) são detectados pela palavra de sync e podem
+# chegar misturados com as linhas de texto. Eles já saem decodificados em
+# Leitura.registro, junto com a linha de texto equivalente em Leitura.linha.
+
+# registro é None para linhas de texto (o chamador usa o parser se precisar)
+Leitura = namedtuple('Leitura', ['timestamp', 'linha', 'registro'])
+
+
+class BufferCircular:
+    """
+    Buffer circular de bytes com capacidade fixa.
+    Quando enche, os bytes mais antigos são descartados (contados em bytes_descartados).
+    """
+
+    def __init__(self, capacidade=65536):
+        self.capacidade = capacidade
+        self._dados = bytearray(capacidade)
+        self._inicio = 0
+        self._tamanho = 0
+        self.bytes_descartados = 0
+
+    def __len__(self):
+        return self._tamanho
+
+    def escrever(self, dados):
+        n = len(dados)
+        if n == 0:
+            return
+        if n >= self.capacidade:
+            # Só cabem os últimos bytes do bloco
+            self.bytes_descartados += self._tamanho + n - self.capacidade
+            self._dados[:] = dados[n - self.capacidade:]
+            self._inicio = 0
+            self._tamanho = self.capacidade
+            return
+
+        excesso = self._tamanho + n - self.capacidade
+        if excesso > 0:
+            self._inicio = (self._inicio + excesso) % self.capacidade
+            self._tamanho -= excesso
+            self.bytes_descartados += excesso
+
+        fim = (self._inicio + self._tamanho) % self.capacidade
+        primeiro = min(n, self.capacidade - fim)
+        self._dados[fim:fim + primeiro] = dados[:primeiro]
+        if primeiro < n:
+            self._dados[:n - primeiro] = dados[primeiro:]
+        self._tamanho += n
+
+    def _trecho(self, inicio, fim):
+        """Bytes entre as posições inicio e fim (relativas ao início do buffer)."""
+        inicio, fim = self._inicio + inicio, self._inicio + fim
+        if fim <= self.capacidade:
+            return bytes(self._dados[inicio:fim])
+        if inicio >= self.capacidade:
+            return bytes(self._dados[inicio - self.capacidade:fim - self.capacidade])
+        return bytes(self._dados[inicio:]) + bytes(self._dados[:fim - self.capacidade])
+
+    def espiar(self, quantidade):
+        """Retorna os primeiros bytes do buffer sem removê-los."""
+        return self._trecho(0, min(quantidade, self._tamanho))
+
+    def descartar(self, quantidade):
+        quantidade = min(quantidade, self._tamanho)
+        self._inicio = (self._inicio + quantidade) % self.capacidade
+        self._tamanho -= quantidade
+
+    def consumir(self, quantidade):
+        bloco = self.espiar(quantidade)
+        self.descartar(len(bloco))
+        return bloco
+
+    def encontrar(self, padrao, inicio=0, fim=None):
+        """
+        Posição (relativa ao início do buffer) da primeira ocorrência de padrao
+        inteiramente entre inicio e fim (padrão: o fim do buffer), ou -1.
+        """
+        fim = self._tamanho if fim is None else min(fim, self._tamanho)
+        if inicio >= fim:
+            return -1
+        if self._inicio + fim <= self.capacidade:
+            pos = self._dados.find(padrao, self._inicio + inicio, self._inicio + fim)
+            return -1 if pos == -1 else pos - self._inicio
+        # O trecho dá a volta no fim do array: busca em uma cópia contígua só dele
+        pos = self._trecho(inicio, fim).find(padrao)
+        return -1 if pos == -1 else pos + inicio
+
+    def extrair_linha(self, separador=b'\n'):
+        """Retorna a próxima linha completa (com o separador) ou None se não houver."""
+        pos = self.encontrar(separador)
+        if pos == -1:
+            return None
+        return self.consumir(pos + len(separador))
+
+
+class LeitorSerial:
+    """
+    Lê uma porta serial (ou qualquer objeto com read/in_waiting) em uma thread de fundo.
+
+    As linhas ficam disponíveis em ler_linha() como Leitura(timestamp, linha, registro),
+    onde timestamp é o time.time() do instante em que o último byte da linha chegou.
+    """
+
+    def __init__(self, ser, capacidade_buffer=65536, encoding='utf-8', relogio=time.time,
+                 detectar_binario=True):
+        self.ser = ser
+        self.encoding = encoding
+        self.relogio = relogio
+        self.detectar_binario = detectar_binario
+        self.buffer = BufferCircular(capacidade_buffer)
+        self.fila = queue.Queue()
+        self.linhas_lidas = 0
+        self.frames_binarios = 0
+        self.frames_invalidos = 0
+        self.erro = None
+        # Bytes do começo do buffer já percorridos sem achar '\n' nem SYNC (não são relidos
+        # a cada bloco de uma linha incompleta); perde a validade quando o buffer descarta bytes
+        self._verificado = 0
+        self._descartados = 0
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._executar, name='leitor-serial', daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self, timeout=2):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _executar(self):
+        try:
+            while not self._parar.is_set():
+                # Bloqueia até chegar pelo menos 1 byte (ou até o timeout da porta)
+                bloco = self.ser.read(self.ser.in_waiting or 1)
+                if not bloco:
+                    continue
+                chegada = self.relogio()
+                self.buffer.escrever(bloco)
+                while True:
+                    item = self._extrair_item()
+                    if item is None:
+                        break
+                    texto, registro = item
+                    if texto:
+                        self.linhas_lidas += 1
+                        self.fila.put(Leitura(chegada, texto, registro))
+        except Exception as e:
+            self.erro = e
+        finally:
+            # Sinaliza o fim da leitura para quem estiver esperando
+            self.fila.put(None)
+
+    def _extrair_item(self):
+        """
+        Retira o próximo item completo do início do buffer: (texto, registro).
+        Retorna None se ainda faltam bytes para completar o item.
+
+        O SYNC só é procurado antes do primeiro '\n', onde ele muda o resultado, então
+        cada item custa o tamanho dele e não o do buffer inteiro.
+        """
+        if self.buffer.bytes_descartados != self._descartados:
+            self._descartados = self.buffer.bytes_descartados
+            self._verificado = 0
+        pos_fim = self.buffer.encontrar(b'\n', self._verificado)
+        pos_sync = -1
+        if self.detectar_binario:
+            # O fim do trecho já verificado pode ser o começo de um SYNC que acabou de completar
+            limite = len(self.buffer) if pos_fim == -1 else pos_fim
+            pos_sync = self.buffer.encontrar(SYNC, max(self._verificado - len(SYNC) + 1, 0), limite)
+        if pos_sync == -1 and pos_fim == -1:
+            self._verificado = len(self.buffer)
+            return None
+        self._verificado = 0
+
+        if pos_sync == 0:
+            if len(self.buffer) < TAMANHO_FRAME:
+                return None
+            registro = decodificar_frame(self.buffer.espiar(TAMANHO_FRAME))
+            if registro is None:
+                # Sync falso ou frame corrompido: descarta um byte e volta a procurar
+                self.buffer.descartar(1)
+                self.frames_invalidos += 1
+                return '', None
+            self.buffer.descartar(TAMANHO_FRAME)
+            self.frames_binarios += 1
+            return formatar_linha(registro), registro
+
+        if pos_sync > 0 and (pos_fim == -1 or pos_sync < pos_fim):
+            # Texto (provavelmente incompleto) antes de um frame binário
+            bloco = self.buffer.consumir(pos_sync)
+        elif pos_fim != -1:
+            bloco = self.buffer.consumir(pos_fim + 1)
+        else:
+            return None
+        return bloco.decode(self.encoding, errors='ignore').strip(), None
+
+    def ler_linha(self, timeout=None):
+        """
+        Retorna uma Leitura(timestamp, linha, registro). Retorna None se o timeout expirar
+        ou se a leitura tiver terminado (verifique self.erro).
+        """
+        try:
+            item = self.fila.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if item is None:
+            # Mantém o sinal de fim para chamadas seguintes
+            self.fila.put(None)
+            if self.erro is not None:
+                raise self.erro
+        return item
+
+    def ativo(self):
+        return self._thread is not None and self._thread.is_alive()
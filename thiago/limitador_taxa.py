@@ -0,0 +1,98 @@
+import threading
+import time
+
+# Limitação de taxa de publicação por broker (token bucket).
+#
+# Cada broker tem um balde com capacidade 'rajada' que é reabastecido a 'taxa'
+# tokens por segundo. Cada mensagem consome um token. Enquanto houver tokens a
+# publicação segue sem nenhuma espera; só quando o balde esvazia o chamador
+# espera o tempo exato até o próximo token. Isso substitui os sleeps fixos
+# depois de cada publish, que limitavam a taxa mesmo com o broker ocioso.
+
+
+class BaldeTokens:
+    """Token bucket: 'taxa' mensagens/s em regime, com rajadas de até 'rajada' mensagens."""
+
+    def __init__(self, taxa, rajada, relogio=time.monotonic, dormir=time.sleep):
+        if taxa <= 0 or rajada < 1:
+            raise ValueError(f"Limite inválido: taxa={taxa} rajada={rajada}")
+        self.taxa = float(taxa)
+        self.rajada = float(rajada)
+        self.relogio = relogio
+        self.dormir = dormir
+        self._tokens = float(rajada)
+        self._ultimo = relogio()
+        self._lock = threading.Lock()
+        self.esperas = 0
+        self.tempo_esperando = 0.0
+
+    def _reabastecer(self):
+        agora = self.relogio()
+        self._tokens = min(self.rajada, self._tokens + (agora - self._ultimo) * self.taxa)
+        self._ultimo = agora
+
+    def tentar(self, quantidade=1):
+        """Consome os tokens se estiverem disponíveis. Nunca bloqueia."""
+        with self._lock:
+            self._reabastecer()
+            if self._tokens >= quantidade:
+                self._tokens -= quantidade
+                return True
+            return False
+
+    def tempo_espera(self, quantidade=1):
+        """Segundos até haver 'quantidade' tokens disponíveis (0 se já houver)."""
+        with self._lock:
+            self._reabastecer()
+            return max(0.0, (quantidade - self._tokens) / self.taxa)
+
+    def aguardar(self, quantidade=1):
+        """
+        Consome os tokens, esperando só se o balde estiver vazio.
+        Retorna o tempo esperado em segundos.
+        """
+        with self._lock:
+            self._reabastecer()
+            self._tokens -= quantidade
+            # Com saldo negativo a mensagem fica "reservada": espera só o que falta
+            espera = max(0.0, -self._tokens / self.taxa)
+        if espera > 0:
+            self.esperas += 1
+            self.tempo_esperando += espera
+            self.dormir(espera)
+        return espera
+
+    def estatisticas(self):
+        return {'esperas': self.esperas, 'tempo_esperando': round(self.tempo_esperando, 3)}
+
+
+class LimitadorPorBroker:
+    """
+    Um BaldeTokens por broker, criado na primeira mensagem.
+    limites: dicionário broker -> (taxa, rajada); brokers fora dele usam o padrão.
+    """
+
+    def __init__(self, taxa_padrao=100, rajada_padrao=20, limites=None, relogio=time.monotonic):
+        self.taxa_padrao = taxa_padrao
+        self.rajada_padrao = rajada_padrao
+        self.limites = dict(limites or {})
+        self.relogio = relogio
+        self._baldes = {}
+        self._lock = threading.Lock()
+
+    def balde(self, broker):
+        with self._lock:
+            if broker not in self._baldes:
+                taxa, rajada = self.limites.get(broker, (self.taxa_padrao, self.rajada_padrao))
+                self._baldes[broker] = BaldeTokens(taxa, rajada, self.relogio)
+            return self._baldes[broker]
+
+    def aguardar(self, broker, quantidade=1):
+        return self.balde(broker).aguardar(quantidade)
+
+    def tentar(self, broker, quantidade=1):
+        return self.balde(broker).tentar(quantidade)
+
+    def estatisticas(self):
+        with self._lock:
+            return {broker: balde.estatisticas() for broker, balde in self._baldes.items()}
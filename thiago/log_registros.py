@@ -0,0 +1,201 @@
+import os
+import struct
+import sys
+
+import numpy as np
+
+from armazenamento_colunar import ESQUEMA, AUSENTE_INT, carregar_captura
+
+# Log binário de registros de tamanho fixo, lido com mmap.
+#
+#   cabeçalho (64 bytes): magic 'CANSATLG', versão (uint32), tamanho do registro (uint32)
+#   registros: REGISTRO_LOG, um após o outro (mesmas colunas de armazenamento_colunar.py)
+#
+# O arquivo só cresce (append-only). Para leitura ele é mapeado em memória com
+# np.memmap: leitor.registros é uma view sem cópia de todos os registros, e
+# leitor.por_id(n) acha o registro da mensagem n em O(1) pelo índice id -> posição,
+# guardado ao lado do log (dados_radio.log.idx.npz) e reconstruído quando o log cresce.
+#
+# Se o mesmo ID aparece mais de uma vez (reinício do transmissor), o índice aponta
+# para a primeira ocorrência.
+
+MAGIC = b'CANSATLG'
+VERSAO = 1
+CABECALHO = struct.Struct('<8sII')
+TAMANHO_CABECALHO = 64
+REGISTRO_LOG = np.dtype([(nome, '<' + tipo) for nome, tipo in ESQUEMA])
+
+# Acima desta razão entre a faixa de IDs e o número de registros, o índice denso
+# (um slot por ID) gastaria memória demais e é usada busca binária em IDs ordenados
+MAX_ESPARSIDADE = 8
+
+
+def caminho_log(caminho_csv):
+    return os.path.splitext(caminho_csv)[0] + '.log'
+
+
+class GravadorLog:
+    """Acrescenta registros ao fim de um log (criando o cabeçalho se o arquivo for novo)."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        novo = not os.path.exists(caminho) or os.path.getsize(caminho) == 0
+        self._arquivo = open(caminho, 'ab')
+        if novo:
+            cabecalho = CABECALHO.pack(MAGIC, VERSAO, REGISTRO_LOG.itemsize)
+            self._arquivo.write(cabecalho.ljust(TAMANHO_CABECALHO, b'\0'))
+        else:
+            _verificar_cabecalho(caminho)
+        self._linha = np.zeros(1, dtype=REGISTRO_LOG)
+
+    def acrescentar(self, registro, rx, mqtt_latency=None):
+        """Acrescenta uma amostra (Registro do parser, instante de recepção em s)."""
+        linha = self._linha[0]
+        for nome, tipo in ESQUEMA:
+            if nome == 'rx':
+                linha[nome] = rx
+            elif nome == 'mqtt_latency':
+                linha[nome] = np.nan if mqtt_latency is None else mqtt_latency
+            else:
+                valor = getattr(registro, nome) if registro is not None else None
+                linha[nome] = (AUSENTE_INT if tipo == 'i8' else np.nan) if valor is None else valor
+        self._arquivo.write(self._linha.tobytes())
+
+    def acrescentar_colunas(self, colunas):
+        """Acrescenta um bloco em colunas (dicionário nome -> array, como ler_colunas)."""
+        bloco = np.zeros(len(colunas['rx']), dtype=REGISTRO_LOG)
+        for nome, _ in ESQUEMA:
+            bloco[nome] = colunas[nome]
+        self._arquivo.write(bloco.tobytes())
+
+    def descarregar(self):
+        self._arquivo.flush()
+
+    def fechar(self):
+        self._arquivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
+
+
+def _verificar_cabecalho(caminho):
+    with open(caminho, 'rb') as f:
+        magic, versao, tamanho = CABECALHO.unpack(f.read(CABECALHO.size))
+    if magic != MAGIC or versao != VERSAO or tamanho != REGISTRO_LOG.itemsize:
+        raise ValueError(f"{caminho} não é um log de registros compatível "
+                         f"(magic={magic!r} versão={versao} registro={tamanho} bytes)")
+
+
+class LeitorLog:
+    """
+    Acesso a um log mapeado em memória.
+
+    leitor.registros      array estruturado (view sem cópia) com todos os registros
+    leitor.coluna('rx')   uma coluna como view
+    leitor.por_id(1692)   o registro da mensagem 1692, ou None
+    """
+
+    def __init__(self, caminho):
+        _verificar_cabecalho(caminho)
+        self.caminho = caminho
+        quantidade = (os.path.getsize(caminho) - TAMANHO_CABECALHO) // REGISTRO_LOG.itemsize
+        if quantidade:
+            self.registros = np.memmap(caminho, dtype=REGISTRO_LOG, mode='r',
+                                       offset=TAMANHO_CABECALHO, shape=(quantidade,))
+        else:
+            self.registros = np.zeros(0, dtype=REGISTRO_LOG)
+        self._carregar_indice()
+
+    def __len__(self):
+        return len(self.registros)
+
+    def coluna(self, nome):
+        return self.registros[nome]
+
+    def _carregar_indice(self):
+        caminho_indice = self.caminho + '.idx.npz'
+        if os.path.exists(caminho_indice):
+            salvo = np.load(caminho_indice)
+            if int(salvo['quantidade']) == len(self):
+                self._base, self._posicoes, self._ids_ordenados = (
+                    int(salvo['base']), salvo['posicoes'], salvo['ids_ordenados'])
+                return
+        self._construir_indice()
+        try:
+            np.savez(caminho_indice, quantidade=len(self), base=self._base,
+                     posicoes=self._posicoes, ids_ordenados=self._ids_ordenados)
+        except OSError as e:
+            print(f"Aviso: não foi possível salvar o índice {caminho_indice}: {e}")
+
+    def _construir_indice(self):
+        ids = np.asarray(self.registros['id'])
+        validos = np.flatnonzero(ids != AUSENTE_INT)
+        self._base = 0
+        self._posicoes = np.empty(0, dtype=np.int64)
+        self._ids_ordenados = np.empty((0, 2), dtype=np.int64)
+        if not len(validos):
+            return
+        # Primeira ocorrência de cada ID (np.unique devolve o primeiro índice)
+        unicos, primeiros = np.unique(ids[validos], return_index=True)
+        posicoes = validos[primeiros]
+        faixa = int(unicos[-1] - unicos[0]) + 1
+        if faixa <= MAX_ESPARSIDADE * len(unicos):
+            # Índice denso: posicoes[id - base] é a posição do registro (-1 se ausente)
+            self._base = int(unicos[0])
+            self._posicoes = np.full(faixa, -1, dtype=np.int64)
+            self._posicoes[unicos - self._base] = posicoes
+        else:
+            self._ids_ordenados = np.column_stack([unicos, posicoes])
+
+    def posicao(self, id_msg):
+        """Posição do registro com este ID no log, ou -1."""
+        if len(self._posicoes):
+            i = id_msg - self._base
+            return int(self._posicoes[i]) if 0 <= i < len(self._posicoes) else -1
+        if len(self._ids_ordenados):
+            i = np.searchsorted(self._ids_ordenados[:, 0], id_msg)
+            if i < len(self._ids_ordenados) and self._ids_ordenados[i, 0] == id_msg:
+                return int(self._ids_ordenados[i, 1])
+        return -1
+
+    def por_id(self, id_msg):
+        posicao = self.posicao(id_msg)
+        return None if posicao < 0 else self.registros[posicao]
+
+    def posicoes(self, ids):
+        """Posições de vários IDs de uma vez (-1 para os ausentes), vetorizado."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(self._posicoes):
+            i = ids - self._base
+            dentro = (i >= 0) & (i < len(self._posicoes))
+            resultado = np.full(len(ids), -1, dtype=np.int64)
+            resultado[dentro] = self._posicoes[i[dentro]]
+            return resultado
+        if len(self._ids_ordenados):
+            i = np.minimum(np.searchsorted(self._ids_ordenados[:, 0], ids), len(self._ids_ordenados) - 1)
+            encontrados = self._ids_ordenados[i, 0] == ids
+            return np.where(encontrados, self._ids_ordenados[i, 1], -1)
+        return np.full(len(ids), -1, dtype=np.int64)
+
+
+def converter_csv(caminho_csv, destino=None):
+    """Cria (ou recria) o log de um CSV de captura. Retorna o caminho do log."""
+    destino = destino or caminho_log(caminho_csv)
+    colunas = carregar_captura(caminho_csv)
+    for caminho in (destino, destino + '.idx.npz'):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+    with GravadorLog(destino) as gravador:
+        gravador.acrescentar_colunas(colunas)
+    return destino
+
+
+if __name__ == '__main__':
+    # Uso: python log_registros.py dados_radio.csv [dados_mqtt.csv ...]
+    for caminho in sys.argv[1:]:
+        destino = converter_csv(caminho)
+        leitor = LeitorLog(destino)
+        print(f'{caminho} -> {destino}: {len(leitor)} registros')
@@ -0,0 +1,94 @@
+import contextlib
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+# Mede quantas mensagens/s o bridge (reading_mqtt_bridge_corrigido_new.py) sustenta,
+# chamando on_message diretamente com mensagens sintéticas (sem broker).
+#
+#   callback: tempo gasto dentro de on_message, ou seja, o que a thread de rede do
+#             paho consegue receber por segundo
+#   total:    do primeiro on_message até a última mensagem estar processada e no CSV
+#
+# Uso: python benchmark_bridge.py [bridge_antigo.py ...]
+# Cada arquivo extra é medido da mesma forma, para comparar com uma versão anterior
+# (por exemplo: git show <commit>:thiago/mqtt_dashboard/backend/reading_mqtt_bridge_corrigido_new.py > antigo.py).
+# A saída dos prints do bridge é descartada (no terminal o custo seria ainda maior).
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')))
+from parser_telemetria import Registro, formatar_linha
+
+BRIDGE_ATUAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reading_mqtt_bridge_corrigido_new.py')
+NUM_MENSAGENS = 5000
+TOPICO_RAW = 'cansat/estacao/teste1/raw'
+
+
+class Mensagem:
+    """Imitação do MQTTMessage do paho (só topic e payload)."""
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+def gerar_mensagens(n):
+    mensagens = []
+    millis = int(time.time() * 1000)
+    for i in range(n):
+        registro = Registro(id=i + 1, timestamp=millis + i * 100, intervalo=100, radio_latency=20,
+                            temperatura=25.5, pressao=1013.25, accel_x=0.01, accel_y=-0.02, accel_z=0.98,
+                            gyro_x=0.1, gyro_y=None, gyro_z=-0.2)
+        mensagens.append(Mensagem(TOPICO_RAW, formatar_linha(registro).encode()))
+    return mensagens
+
+
+def carregar_bridge(caminho, nome):
+    spec = importlib.util.spec_from_file_location(nome, caminho)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def medir(caminho, nome, mensagens):
+    bridge = carregar_bridge(caminho, nome)
+    pasta = tempfile.mkdtemp()
+    bridge.OUTPUT_CSV = os.path.join(pasta, 'bench.csv')
+    assincrono = hasattr(bridge, 'iniciar_processamento')
+
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        if assincrono:
+            bridge.iniciar_processamento()
+        inicio = time.perf_counter()
+        for msg in mensagens:
+            bridge.on_message(None, None, msg)
+        fim_callback = time.perf_counter()
+        if assincrono:
+            bridge.parar_processamento(timeout=None)
+        fim_total = time.perf_counter()
+
+    with open(bridge.OUTPUT_CSV) as f:
+        linhas_csv = sum(1 for _ in f) - 1
+    return {
+        'versao': nome,
+        'callback_msgs_s': len(mensagens) / (fim_callback - inicio),
+        'total_msgs_s': len(mensagens) / (fim_total - inicio),
+        'linhas_csv': linhas_csv,
+    }
+
+
+def main():
+    mensagens = gerar_mensagens(NUM_MENSAGENS)
+    versoes = [(caminho, os.path.splitext(os.path.basename(caminho))[0]) for caminho in sys.argv[1:]]
+    versoes.append((BRIDGE_ATUAL, 'atual'))
+
+    print(f'{NUM_MENSAGENS} mensagens raw por versão\n')
+    print(f"{'Versão':<24}{'callback msgs/s':>18}{'total msgs/s':>16}{'linhas CSV':>12}")
+    for caminho, nome in versoes:
+        r = medir(caminho, nome, mensagens)
+        print(f"{r['versao']:<24}{r['callback_msgs_s']:>18.0f}{r['total_msgs_s']:>16.0f}{r['linhas_csv']:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,34 +3,31 @@ import time
 import paho.mqtt.client as mqtt
 import sys
 import json
-import re
+import os
 
-
-# Regex para extrair os dados do print do receptor
-DATA_REGEX = re.compile(r'ID: (\d+) \| Timestamp: (\d+) \| RadioLatency: (\d+) ms \| Temperatura: ([\d\.-]+) C \| Pressao: ([\d\.-]+) hPa \| Accel \[X,Y,Z\]: ([\d\.-]+), ([\d\.-]+), ([\d\.-]+) \| Gyro \[X,Y,Z\] \(°/s\): ([\d\.-]+), ([\d\.-]+), ([\d\.-]+)')
+# Permitir importar os módulos compartilhados da pasta thiago/
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')))
+from parser_telemetria import extrair_registro
+from publicacao_mqtt import PublicadorMQTT, latencias, registro_completo
+from leitor_serial import LeitorSerial
 
 # Configuração MQTT
 MQTT_BROKER = "broker.hivemq.com"  # Broker público acessível de qualquer lugar
 MQTT_PORT = 1883
 MQTT_TOPIC_BASE = "cansat/estacao/teste1"  # Tópico base para os dados do CanSat
 MQTT_TOPIC_RAW = f"{MQTT_TOPIC_BASE}/raw"  # Dados brutos
-MQTT_TOPIC_TIMESTAMP = f"{MQTT_TOPIC_BASE}/timestamp"  # Timestamp original de envio
-MQTT_TOPIC_RADIO_LATENCY = f"{MQTT_TOPIC_BASE}/radioLatency"  # Latência do rádio
-MQTT_TOPIC_MQTT_LATENCY = f"{MQTT_TOPIC_BASE}/mqttLatency"  # Latência do MQTT
-MQTT_TOPIC_TOTAL_LATENCY = f"{MQTT_TOPIC_BASE}/totalLatency"  # Latência total
-MQTT_TOPIC_TEMP = f"{MQTT_TOPIC_BASE}/temperatura"  # Temperatura
-MQTT_TOPIC_PRESS = f"{MQTT_TOPIC_BASE}/pressao"  # Pressão
-MQTT_TOPIC_ACCEL_X = f"{MQTT_TOPIC_BASE}/accelX"  # Aceleração X
-MQTT_TOPIC_ACCEL_Y = f"{MQTT_TOPIC_BASE}/accelY"  # Aceleração Y
-MQTT_TOPIC_ACCEL_Z = f"{MQTT_TOPIC_BASE}/accelZ"  # Aceleração Z
-MQTT_TOPIC_GYRO_X = f"{MQTT_TOPIC_BASE}/gyroX"  # Giroscópio X
-MQTT_TOPIC_GYRO_Y = f"{MQTT_TOPIC_BASE}/gyroY"  # Giroscópio Y
-MQTT_TOPIC_GYRO_Z = f"{MQTT_TOPIC_BASE}/gyroZ"  # Giroscópio Z
+
+# Modo de publicação (ver publicacao_mqtt.py): 'campos', 'registro' ou 'lote'
+MODO_PUBLICACAO = 'registro'
+# Continuar publicando /raw, um tópico por campo e /json (usado pelo dashboard web)
+COMPATIBILIDADE_CAMPOS = True
+JANELA_LOTE = 0.2  # segundos (modo 'lote')
 
 # Configuração Serial
 # Observe que você precisa alterar a PORTA_COM para a porta COM do seu Arduino
 # Exemplo: 'COM3' no Windows ou '/dev/ttyUSB0' no Linux
-PORTA_COM = 'COM8'  # Altere conforme necessário
+# CANSAT_PORTA_SERIAL substitui a porta (ex.: o pty do simulador_serial.py)
+PORTA_COM = os.environ.get('CANSAT_PORTA_SERIAL', 'COM8')  # Altere conforme necessário
 BAUD_RATE = 9600   # Baud rate igual ao do receptor Arduino
 
 def on_connect(client, userdata, flags, rc):
@@ -61,70 +58,63 @@ def main():
             client.loop_stop()
             client.disconnect()
             sys.exit(1)
-              # Loop principal - ler serial e publicar no MQTT
+        
+        # Leitor em thread de fundo: bloqueia na porta e marca a chegada de cada linha
+        leitor = LeitorSerial(ser).iniciar()
+        
+        # Loop principal - ler serial e publicar no MQTT
         print("Iniciando leitura da porta serial. Pressione CTRL+C para encerrar.")
+        publicador = PublicadorMQTT(client, 'MQTT', MODO_PUBLICACAO, COMPATIBILIDADE_CAMPOS, JANELA_LOTE, qos=0,
+                                    topic_base=MQTT_TOPIC_BASE)
         while True:
-            if ser.in_waiting > 0:
-                # Ler linha da porta serial
-                linha = ser.readline().decode('utf-8').strip()
-                if linha:
-                    print(f"Dados recebidos: {linha}")
-                    
-                    # Publicar dados brutos no MQTT
-                    client.publish(MQTT_TOPIC_RAW, linha)
-                    print(f"Dados brutos enviados para o tópico: {MQTT_TOPIC_RAW}")
-                    
-                    # Tentar extrair os dados individuais com regex
-                    match = DATA_REGEX.search(linha)
-                    if match:
-                        id_num, timestamp, radio_latency, temp, press, accel_x, accel_y, accel_z, gyro_x, gyro_y, gyro_z = match.groups()
-                        
-                        # Registrar o timestamp de recepção no backend
-                        backend_receive_time = time.time() * 1000  # Para compatibilidade com milissegundos
-                        
-                        # Calcular latências
-                        radio_latency_ms = int(radio_latency)
-                        mqtt_latency_ms = int(backend_receive_time) - int(timestamp)
-                        total_latency_ms = radio_latency_ms + mqtt_latency_ms
-                        
-                        # Publicar dados em tópicos separados
-                        client.publish(MQTT_TOPIC_TIMESTAMP, timestamp)
-                        client.publish(MQTT_TOPIC_RADIO_LATENCY, str(radio_latency_ms))
-                        client.publish(MQTT_TOPIC_MQTT_LATENCY, str(mqtt_latency_ms))
-                        client.publish(MQTT_TOPIC_TOTAL_LATENCY, str(total_latency_ms))
-                        client.publish(MQTT_TOPIC_TEMP, temp)
-                        client.publish(MQTT_TOPIC_PRESS, press)
-                        client.publish(MQTT_TOPIC_ACCEL_X, accel_x)
-                        client.publish(MQTT_TOPIC_ACCEL_Y, accel_y)
-                        client.publish(MQTT_TOPIC_ACCEL_Z, accel_z)
-                        client.publish(MQTT_TOPIC_GYRO_X, gyro_x)
-                        client.publish(MQTT_TOPIC_GYRO_Y, gyro_y)
-                        client.publish(MQTT_TOPIC_GYRO_Z, gyro_z)
-                        
-                        # Também publicar como JSON para consumo mais fácil
-                        json_data = {
-                            "id": int(id_num),
-                            "timestamp": int(timestamp),
-                            "systemTime": time.time(),
-                            "radioLatency": radio_latency_ms,
-                            "mqttLatency": mqtt_latency_ms,
-                            "totalLatency": total_latency_ms,
-                            "temperatura": float(temp),
-                            "pressao": float(press),
-                            "aceleracao": {
-                                "x": float(accel_x),
-                                "y": float(accel_y),
-                                "z": float(accel_z)
-                            },
-                            "giroscopio": {
-                                "x": float(gyro_x),
-                                "y": float(gyro_y),
-                                "z": float(gyro_z)
-                            }
-                        }
-                        client.publish(f"{MQTT_TOPIC_BASE}/json", json.dumps(json_data))
-                        print("Dados processados e publicados em tópicos individuais")
-            time.sleep(0.1)  # Pequena pausa para não sobrecarregar a CPU
+            # Espera a próxima linha completa (o timeout serve para permitir CTRL+C e fechar lotes vencidos)
+            espera = publicador.tempo_para_vencer()
+            chegada = leitor.ler_linha(timeout=1 if espera is None else max(espera, 0))
+            if chegada is None:
+                if not leitor.ativo():
+                    print("Leitura da porta serial encerrada")
+                    break
+                if espera is not None:
+                    publicador.descarregar()
+                continue
+            t_chegada, linha, registro = chegada
+            print(f"Dados recebidos: {linha}")
+            
+            # Extrair os dados individuais com o parser compartilhado (frames binários já chegam decodificados)
+            if registro is None:
+                registro = extrair_registro(linha)
+            
+            # Publicar no modo configurado; o instante de chegada da linha é a recepção no backend
+            backend_receive_time = t_chegada * 1000  # Para compatibilidade com milissegundos
+            publicador.publicar(linha, registro, backend_receive_time)
+            print(f"Dados enviados no modo '{MODO_PUBLICACAO}'")
+            
+            if COMPATIBILIDADE_CAMPOS and registro_completo(registro):
+                mqtt_latency_ms, total_latency_ms = latencias(registro, backend_receive_time)
+                
+                # Também publicar como JSON para consumo mais fácil
+                json_data = {
+                    "id": registro.id,
+                    "timestamp": registro.timestamp,
+                    "systemTime": time.time(),
+                    "radioLatency": registro.radio_latency,
+                    "mqttLatency": mqtt_latency_ms,
+                    "totalLatency": total_latency_ms,
+                    "temperatura": registro.temperatura,
+                    "pressao": registro.pressao,
+                    "aceleracao": {
+                        "x": registro.accel_x,
+                        "y": registro.accel_y,
+                        "z": registro.accel_z
+                    },
+                    "giroscopio": {
+                        "x": registro.gyro_x,
+                        "y": registro.gyro_y,
+                        "z": registro.gyro_z
+                    }
+                }
+                client.publish(f"{MQTT_TOPIC_BASE}/json", json.dumps(json_data))
+                print("Dados processados e publicados em tópicos individuais")
                 
     except KeyboardInterrupt:
         print("\nPrograma encerrado pelo usuário")
@@ -133,6 +123,17 @@ def main():
     finally:
         # Limpeza ao sair
         print("Fechando conexões...")
+        try:
+            publicador.descarregar()
+            print(f"Publicação: {publicador.estatisticas()}")
+        except:
+            pass
+        
+        try:
+            leitor.parar()
+        except:
+            pass
+        
         try:
             ser.close()
             print("Porta serial fechada")
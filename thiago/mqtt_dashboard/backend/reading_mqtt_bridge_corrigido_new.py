@@ -1,250 +1,364 @@
 import time
+import collections
 import paho.mqtt.client as mqtt
 import sys
 import json
-import re
-import csv
 import os
+import queue
+import threading
+
+# Permitir importar os módulos compartilhados da pasta thiago/
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')))
+from parser_telemetria import extrair_registro, formata_valor
+from publicacao_mqtt import decodificar_payload
+from gravador_csv import GravadorCSV
+from armazenamento_colunar import GravadorColunar, pasta_colunar
+from rastreador_perdas import RastreadorPerdas, imprimir_perdas
+from relogio_arduino import EstimadorRelogio
+from rastreamento import Rastreamento, ENTREGA, PROCESSADO
+from histograma_hdr import SerieLatencia, formatar_quantis, salvar_histogramas
 
 # Configuração MQTT
 MQTT_BROKER = "broker.hivemq.com"  # Broker público
 MQTT_PORT = 1883
+MQTT_QOS = 0  # QoS da inscrição (o broker entrega com o menor entre este e o da publicação)
 MQTT_TOPIC_BASE = "cansat/estacao/teste1"
 MQTT_TOPIC_RAW = f"{MQTT_TOPIC_BASE}/raw"
+MQTT_TOPIC_REGISTRO = f"{MQTT_TOPIC_BASE}/registro"  # Um registro compacto por amostra
+MQTT_TOPIC_LOTE = f"{MQTT_TOPIC_BASE}/lote"  # Várias amostras por mensagem
+# Perda de pacotes de ponta a ponta (rádio + MQTT) vista pelo bridge, em %;
+# o mqtt_sender publica a perda só do rádio em /perdaRadio
+MQTT_TOPIC_PERDA = f"{MQTT_TOPIC_BASE}/perdaTotal"
+INTERVALO_PERDA_S = 1.0
+# As estatísticas de latência (quantis dos histogramas) são impressas no máximo a cada
+# INTERVALO_ESTATISTICAS_S, qualquer que seja a taxa de mensagens, e no final
+INTERVALO_ESTATISTICAS_S = 5.0
+ultimas_estatisticas = 0
 
 # Variáveis para armazenar dados
 last_data_time = 0
-mqtt_latencies = []
-radio_latencies = []
-total_latencies = []
 
 # Arquivo CSV para salvar as medições - usando caminho absoluto
 # Garantir que o caminho é absoluto para evitar problemas de localização do arquivo
 current_dir = os.path.dirname(os.path.abspath(__file__))
 OUTPUT_CSV = os.path.join(current_dir, 'dados_mqtt_dashboard.csv')
 
+# Latências em histogramas de memória fixa (ver histograma_hdr.py): quantis da execução
+# inteira e do último minuto. Os histogramas da execução são exportados a cada
+# INTERVALO_EXPORTACAO_S e no final, para juntar sessões com histograma_hdr.py
+latencias = {'radio': SerieLatencia(), 'mqtt': SerieLatencia(), 'total': SerieLatencia()}
+ARQUIVO_HISTOGRAMAS = None  # None: ao lado do CSV (dados_mqtt_dashboard.hdr.json)
+INTERVALO_EXPORTACAO_S = 60
+ultima_exportacao = time.monotonic()
+
+# Offset e deriva entre o relógio do Arduino e o deste computador
+relogio = EstimadorRelogio()
+
 # Dicionário para armazenar os últimos valores recebidos
 last_values = {}
 received_count = 0
 
-# Flag para controle do cabeçalho do CSV
-# Verifica se o arquivo já existe para determinar se o cabeçalho já foi escrito
-csv_header_written = os.path.exists(OUTPUT_CSV) and os.path.getsize(OUTPUT_CSV) > 0
+# Passa a True quando chega a primeira mensagem em registro/lote (ver publicacao_mqtt.py)
+formato_compacto_ativo = False
+# IDs das últimas amostras processadas pelo /raw. As amostras publicadas antes de o
+# formato compacto ser detectado chegam de novo em registro/lote (no modo lote, um lote
+# inteiro) e são ignoradas; a lista é esvaziada na primeira mensagem compacta sem repetidos
+IDS_RAW_RECENTES = 1000
+ids_raw = set()
+ordem_ids_raw = collections.deque()
 
-# Criar o arquivo CSV se não existir e escrever o cabeçalho
-def ensure_csv_exists():
-    global csv_header_written
-    try:
-        # Criar diretório se não existir
-        os.makedirs(os.path.dirname(OUTPUT_CSV) if os.path.dirname(OUTPUT_CSV) else '.', exist_ok=True)
-        
-        if not os.path.exists(OUTPUT_CSV) or os.path.getsize(OUTPUT_CSV) == 0:
-            with open(OUTPUT_CSV, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    'timestamp', 'id', 'radio_latency', 'mqtt_latency', 'total_latency',
-                    'temperatura', 'pressao', 'accelX', 'accelY', 'accelZ',
-                    'gyroX', 'gyroY', 'gyroZ'
-                ])
-                print(f"Arquivo CSV criado: {OUTPUT_CSV}")
-                csv_header_written = True
-    except Exception as e:
-        print(f"Erro ao criar arquivo CSV: {e}")
+CABECALHO_CSV = [
+    'timestamp', 'id', 'radio_latency', 'mqtt_latency', 'total_latency',
+    'temperatura', 'pressao', 'accelX', 'accelY', 'accelZ',
+    'gyroX', 'gyroY', 'gyroZ'
+]
+# O CSV fica aberto durante toda a captura e é descarregado a cada N linhas ou T ms
+LINHAS_POR_FLUSH = 50
+INTERVALO_FLUSH_MS = 1000
+gravador = None  # GravadorCSV, aberto em iniciar_processamento()
+# Cópia tipada em colunas (dados_mqtt_dashboard.colunas/, ver armazenamento_colunar.py)
+GRAVAR_COLUNAR = True
+colunar = None
+
+# O callback do paho só enfileira as mensagens; o processamento (parser, estatísticas,
+# CSV e prints) roda em uma thread própria, para que a thread de rede nunca espere por disco.
+TAMANHO_FILA = 10000
+fila_mensagens = queue.Queue(maxsize=TAMANHO_FILA)
+mensagens_descartadas = 0
+thread_processamento = None
+# Perda de pacotes pelos IDs recebidos (ver rastreador_perdas.py)
+rastreador = RastreadorPerdas()
+ultima_perda = 0
+cliente_mqtt = None  # Cliente usado para publicar a perda, definido em main()
+# Rastreamento por etapa (ver rastreamento.py): marca on_message e o fim do processamento
+# das mensagens de /registro e /lote que trazem rastro. Também ativado por --rastrear
+RASTREAR = False
+ARQUIVO_RASTROS = os.path.join(current_dir, 'rastros_bridge.trace')
+rastreamento = None
+# Mostrar cada mensagem recebida, as latências de cada amostra e o diagnóstico no terminal (lento com taxas altas)
+DEBUG_MENSAGENS = False
+
+def abrir_csv():
+    """Abre o CSV de saída (acrescentando; o cabeçalho só é escrito se o arquivo estiver vazio)."""
+    os.makedirs(os.path.dirname(OUTPUT_CSV) if os.path.dirname(OUTPUT_CSV) else '.', exist_ok=True)
+    existia = os.path.exists(OUTPUT_CSV) and os.path.getsize(OUTPUT_CSV) > 0
+    novo_gravador = GravadorCSV(OUTPUT_CSV, CABECALHO_CSV, LINHAS_POR_FLUSH, INTERVALO_FLUSH_MS)
+    if not existia:
+        print(f"Arquivo CSV criado: {OUTPUT_CSV}")
+    return novo_gravador
 
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
         print("Conectado ao broker MQTT!")
         # Inscrever-se em todos os tópicos relevantes
-        client.subscribe(f"{MQTT_TOPIC_BASE}/#")
+        client.subscribe(f"{MQTT_TOPIC_BASE}/#", MQTT_QOS)
         print(f"Inscrito no tópico: {MQTT_TOPIC_BASE}/#")
     else:
         print(f"Falha na conexão com o broker MQTT, código de retorno: {rc}")
         sys.exit(1)
 
 def on_message(client, userdata, msg):
-    global last_data_time, mqtt_latencies, radio_latencies, total_latencies, last_values, received_count, csv_header_written
-    global time_offset, time_offset_samples, max_samples
+    """Roda na thread de rede do paho: só marca o instante de chegada e enfileira."""
+    global mensagens_descartadas
+    try:
+        fila_mensagens.put_nowait((msg.topic, msg.payload, time.time() * 1000))
+    except queue.Full:
+        mensagens_descartadas += 1
+
+def processar_fila():
+    """Thread de processamento: consome a fila até receber None e então fecha as saídas."""
+    while True:
+        # Com linhas pendentes no CSV, acorda a tempo de descarregá-las
+        esperas = [gravador.tempo_para_descarga(), colunar.tempo_para_descarga() if colunar else None]
+        esperas = [espera for espera in esperas if espera is not None]
+        try:
+            item = fila_mensagens.get(timeout=min(esperas) if esperas else 1)
+        except queue.Empty:
+            gravador.verificar()
+            if colunar is not None:
+                colunar.verificar()
+            continue
+        if item is None:
+            break
+        try:
+            processar_mensagem(*item)
+        except Exception as e:
+            print(f"Erro ao processar mensagem: {e}")
+    # As saídas só são fechadas aqui, depois da última mensagem, para nunca serem
+    # fechadas com a thread ainda gravando
+    gravador.fechar()
+    if colunar is not None:
+        colunar.fechar()
+    if rastreamento is not None:
+        rastreamento.fechar()
+
+def iniciar_processamento():
+    global gravador, colunar, thread_processamento, rastreamento
+    gravador = abrir_csv()
+    if RASTREAR or '--rastrear' in sys.argv:
+        rastreamento = Rastreamento(ARQUIVO_RASTROS)
+        print(f"Rastreamento ativo: {ARQUIVO_RASTROS}")
+    if GRAVAR_COLUNAR:
+        colunar = GravadorColunar(pasta_colunar(OUTPUT_CSV), csv_origem=OUTPUT_CSV)
+    thread_processamento = threading.Thread(target=processar_fila, name='bridge-processamento', daemon=True)
+    thread_processamento.start()
+
+def parar_processamento(timeout=5):
+    """Processa o que ainda está na fila e para a thread (que fecha o CSV no final)."""
+    if thread_processamento is None:
+        return
+    fila_mensagens.put(None)
+    thread_processamento.join(timeout)
+    if thread_processamento.is_alive():
+        print(f"Aviso: processamento ainda em andamento após {timeout}s "
+              f"({fila_mensagens.qsize()} mensagens na fila); o CSV será fechado quando a fila acabar")
+    imprimir_estatisticas(forcar=True)
+    exportar_histogramas(forcar=True)
+    print(f"Histogramas de latência salvos em: {arquivo_histogramas()}")
+    rastreador.finalizar()
+    imprimir_perdas(rastreador, 'Perda de pacotes (rádio + MQTT)')
+
+def processar_mensagem(topic, payload_bytes, mqtt_receive_time):
+    global last_values, formato_compacto_ativo
     
-    topic = msg.topic
     try:
-        payload = msg.payload.decode('utf-8', errors='replace')
+        payload = payload_bytes.decode('utf-8', errors='replace')
         
         # Debug para confirmar recebimento
-        print(f"Mensagem recebida em {topic}: {payload[:50]}...")
-        print(f"Conteúdo completo da mensagem: {payload}")
+        if DEBUG_MENSAGENS:
+            print(f"Mensagem recebida em {topic}: {payload[:50]}...")
+            print(f"Conteúdo completo da mensagem: {payload}")
     except Exception as e:
         print(f"Erro ao decodificar mensagem: {e}")
-        payload = msg.payload.decode('utf-8', errors='ignore')
+        payload = payload_bytes.decode('utf-8', errors='ignore')
     
     # Atualizar o dicionário de últimos valores
     topic_key = topic.replace(f"{MQTT_TOPIC_BASE}/", "")
     last_values[topic_key] = payload
     
-    # Se receber o tópico raw, processar para extrair latências e salvar no CSV
+    # Se receber o tópico raw, processar para extrair latências e salvar no CSV.
+    # Quando o publicador usa o formato compacto (registro/lote), o raw é só compatibilidade
+    # e não é processado de novo.
     if topic == MQTT_TOPIC_RAW:
-        # Timestamp de recepção no MQTT subscriber
-        mqtt_receive_time = time.time() * 1000  # milissegundos
-        last_data_time = mqtt_receive_time
-        received_count += 1
+        if not formato_compacto_ativo:
+            # Analisar dados brutos com o parser compartilhado (uma única passada pela linha)
+            registro = extrair_registro(payload)
+            lembrar_id_raw(registro)
+            processar_registro(registro, payload, mqtt_receive_time)
+    elif topic in (MQTT_TOPIC_REGISTRO, MQTT_TOPIC_LOTE):
+        formato_compacto_ativo = True
+        repetidos = 0
+        for registro, _, rastro, canal in decodificar_payload(payload, com_rastro=True):
+            if ids_raw and registro.id in ids_raw:
+                repetidos += 1  # Já processado pelo /raw
+                continue
+            processar_registro(registro, payload, mqtt_receive_time)
+            if rastreamento is not None and rastro is not None:
+                rastreamento.marcar(rastro, ENTREGA, mqtt_receive_time, canal)
+                rastreamento.marcar(rastro, PROCESSADO, canal=canal)
+        if ids_raw and not repetidos:
+            ids_raw.clear()
+            ordem_ids_raw.clear()
+    
+    # Para outros tópicos que não o raw, apenas atualizamos o dicionário e exibimos estatísticas
+    # Mostrar estatísticas periodicamente se tivermos dados suficientes
+    if (topic.endswith('radioLatency') or topic.endswith('mqttLatency') or topic.endswith('totalLatency')
+            or topic in (MQTT_TOPIC_REGISTRO, MQTT_TOPIC_LOTE)):
+        imprimir_estatisticas()
+
+def imprimir_estatisticas(forcar=False):
+    """Quantis, fila e perda, a cada INTERVALO_ESTATISTICAS_S segundos (ou já, com forcar)."""
+    global ultimas_estatisticas
+    agora = time.monotonic()
+    if not latencias['radio'].n or (not forcar and agora - ultimas_estatisticas < INTERVALO_ESTATISTICAS_S):
+        return
+    ultimas_estatisticas = agora
+    print("\n--- Estatísticas de Latência ---")
+    print(f"Mensagens MQTT recebidas: {received_count}")
+    print(f"Fila de processamento: {fila_mensagens.qsize()} (descartadas: {mensagens_descartadas})")
+    for nome, titulo in (('radio', 'Rádio'), ('mqtt', 'MQTT'), ('total', 'Total')):
+        print(f"Latência {titulo} - {formatar_quantis(latencias[nome].total)}")
+        print(f"    último minuto: {formatar_quantis(latencias[nome].janela())}")
+    print(f"Perda de pacotes - Janela: {rastreador.perda_janela()*100:.2f}%, "
+          f"Total: {rastreador.perda_total()*100:.2f}% "
+          f"(fora de ordem: {rastreador.fora_de_ordem}, duplicados: {rastreador.duplicados})")
+    print(f"Dados salvos em: {os.path.abspath(OUTPUT_CSV)}")
+    print("----------------------------")
+
+def lembrar_id_raw(registro):
+    """Guarda o ID de uma amostra do /raw (só os IDS_RAW_RECENTES mais recentes)."""
+    if registro is None or registro.id is None:
+        return
+    ids_raw.add(registro.id)
+    ordem_ids_raw.append(registro.id)
+    if len(ordem_ids_raw) > IDS_RAW_RECENTES:
+        ids_raw.discard(ordem_ids_raw.popleft())
+
+def processar_registro(registro, payload, mqtt_receive_time):
+    """Calcula as latências de um registro recebido, atualiza as estatísticas e salva no CSV."""
+    global last_data_time, last_values, received_count
+    
+    # mqtt_receive_time: instante (ms) em que a mensagem chegou no callback do paho,
+    # antes da fila, para que a espera na fila não entre na latência MQTT
+    last_data_time = mqtt_receive_time
+    received_count += 1
+    if DEBUG_MENSAGENS:
         print(f"[{received_count}] Dados brutos recebidos! Timestamp: {last_data_time}")
-        
-        # Analisar dados brutos para extrair informações importantes
-        # Tentar diferentes padrões de regex para maior robustez
-        radio_regex_patterns = [
-            r'ID: (\d+) \| Timestamp: (\d+) \| .*\| RadioLatency: (\d+) ms',
-            r'ID: (\d+) \| Timestamp: (\d+) \| RadioLatency: (\d+) ms',
-            r'RadioLatency: (\d+) ms'
-        ]
-        
-        match = None
-        for pattern in radio_regex_patterns:
-            match = re.search(pattern, payload)
-            if match:
-                print(f"Padrão de mensagem encontrado: {pattern}")
-                break
-                
-        if not match:
-            print(f"AVISO: Não foi possível extrair latência do rádio da mensagem. Verifique o formato: {payload}")
-            return  # Skip processing if no pattern matched
-        
-        # Extrair os grupos dependendo do padrão encontrado
-        if len(match.groups()) == 3:
-            id_msg, arduino_timestamp, radio_latency = match.groups()
-            arduino_timestamp = int(arduino_timestamp)
-            radio_latency = int(radio_latency)
-        elif len(match.groups()) == 1:
-            # Formato reduzido encontrado, usar valores padrão
-            id_msg = str(received_count)
-            arduino_timestamp = int(time.time() * 1000 - 50)  # Estimar timestamp do Arduino 
-            radio_latency = int(match.group(1))
+    
+    if registro is None or registro.radio_latency is None:
+        print(f"AVISO: Não foi possível extrair latência do rádio da mensagem. Verifique o formato: {payload}")
+        return  # Skip processing if no pattern matched
+    
+    # Extrair os campos dependendo do que a linha contém
+    radio_latency = registro.radio_latency
+    if registro.id is not None:
+        rastreador.registrar(registro.id)
+        publicar_perda()
+    timestamp_real = registro.id is not None and registro.timestamp is not None
+    if timestamp_real:
+        id_msg = str(registro.id)
+    else:
+        # Formato reduzido, sem timestamp do Arduino: só a latência do rádio é conhecida
+        id_msg = str(received_count)
+        if DEBUG_MENSAGENS:
             print(f"Usando formato simplificado para RadioLatency: {radio_latency}ms")
-        else:
-            print("Formato de mensagem não reconhecido completamente")
-            id_msg = str(received_count)
-            arduino_timestamp = int(time.time() * 1000 - 50)
-            radio_latency = 10  # Valor padrão conservador
-        
-        # Calcular latência MQTT (tempo de recepção - timestamp original)
-        # Calcular diferença de tempo para estimar o offset do relógio
-        if time_offset is None:
-            # Se ainda não estabelecemos o offset entre relógios
-            time_offset_samples.append(mqtt_receive_time - arduino_timestamp)
-            
-            # Quando tivermos amostras suficientes, calcular a mediana para um offset mais confiável
-            if len(time_offset_samples) >= max_samples:
-                # Ordenar e pegar a mediana para maior robustez contra outliers
-                sorted_samples = sorted(time_offset_samples)
-                time_offset = sorted_samples[len(sorted_samples) // 2]
-                print(f"Offset de tempo calculado: {time_offset}ms")
-        
-        # Calcular latência MQTT com compensação de offset de relógio
-        if time_offset is not None:
-            # Com offset estabelecido, calcular latência real
-            mqtt_latency = int(mqtt_receive_time - arduino_timestamp - time_offset)
-            
-            # Ainda assim, verificamos por valores implausíveis
-            if mqtt_latency < 0:
-                print(f"Aviso: Latência negativa após correção ({mqtt_latency}ms). Ajustando.")
-                mqtt_latency = 1  # Valor mínimo sensível
-            
-            if mqtt_latency > 5000:  # 5 segundos é muito tempo para MQTT em condições normais
-                print(f"Aviso: Latência MQTT muito alta ({mqtt_latency}ms). Pode haver problemas na rede.")
-        else:
-            # Ainda estamos coletando amostras para offset
-            print(f"Coletando amostra {len(time_offset_samples)}/{max_samples} para calibração")
-            mqtt_latency = 50  # Valor temporário enquanto calibramos
-        
-        # Calcular latência total
+    
+    # Latência MQTT: recepção - timestamp do Arduino, corrigida pelo offset e pela
+    # deriva do relógio do Arduino, estimados continuamente (ver relogio_arduino.py).
+    # Sem o timestamp ela não é mensurável: MQTT e total ficam vazios e fora das estatísticas
+    if timestamp_real:
+        mqtt_latency = int(round(relogio.registrar(registro.timestamp, mqtt_receive_time)))
+        if mqtt_latency > 5000:  # 5 segundos é muito tempo para MQTT em condições normais
+            print(f"Aviso: Latência MQTT muito alta ({mqtt_latency}ms). Pode haver problemas na rede.")
         total_latency = radio_latency + mqtt_latency
-        
-        # Armazenar no dicionário de valores
-        last_values['id'] = id_msg
-        last_values['radioLatency'] = str(radio_latency)
-        last_values['mqttLatency'] = str(mqtt_latency)
-        last_values['totalLatency'] = str(total_latency)
-        
-        # Registrar para estatísticas
-        radio_latencies.append(radio_latency)
-        mqtt_latencies.append(mqtt_latency)
-        total_latencies.append(total_latency)
-        
+    else:
+        mqtt_latency = total_latency = None
+    
+    # Armazenar no dicionário de valores
+    last_values['id'] = id_msg
+    last_values['radioLatency'] = str(radio_latency)
+    last_values['mqttLatency'] = formata_valor(mqtt_latency)
+    last_values['totalLatency'] = formata_valor(total_latency)
+    
+    # Registrar para estatísticas
+    latencias['radio'].registrar(radio_latency)
+    if timestamp_real:
+        latencias['mqtt'].registrar(mqtt_latency)
+        latencias['total'].registrar(total_latency)
+    exportar_histogramas()
+    
+    if DEBUG_MENSAGENS:
         print(f"Latência do rádio: {radio_latency}ms | Latência MQTT: {mqtt_latency}ms | Total: {total_latency}ms")
-        
-        # Salvar imediatamente no CSV após cada mensagem Raw recebida
-        try:
-            # Garantir que o arquivo CSV existe com o cabeçalho adequado
-            if not os.path.exists(OUTPUT_CSV) or os.path.getsize(OUTPUT_CSV) == 0:
-                ensure_csv_exists()
-            
-            # Como o CSV já deve existir, sempre anexamos dados
-            with open(OUTPUT_CSV, 'a', newline='') as f:
-                writer = csv.writer(f)
-                
-                # Extrair outros dados de sensores se disponíveis na mensagem
-                temp_match = re.search(r'Temperatura: ([\d\.-]+) C', payload)
-                press_match = re.search(r'Pressao: ([\d\.-]+) hPa', payload)
-                accel_match = re.search(r'Accel \[X,Y,Z\]: ([\d\.-]+), ([\d\.-]+), ([\d\.-]+)', payload)
-                gyro_match = re.search(r'Gyro \[X,Y,Z\] \(°/s\): ([\d\.-]+), ([\d\.-]+), ([\d\.-]+)', payload)
-                
-                temp = temp_match.group(1) if temp_match else ''
-                press = press_match.group(1) if press_match else ''
-                
-                accelX = accelY = accelZ = ''
-                if accel_match:
-                    accelX, accelY, accelZ = accel_match.groups()
-                
-                gyroX = gyroY = gyroZ = ''
-                if gyro_match:
-                    gyroX, gyroY, gyroZ = gyro_match.groups()
-                
-                # Escrever dados
-                writer.writerow([
-                    time.time(),
-                    id_msg,
-                    radio_latency,
-                    mqtt_latency,
-                    total_latency,
-                    temp,
-                    press,
-                    accelX,
-                    accelY,
-                    accelZ,
-                    gyroX,
-                    gyroY,
-                    gyroZ
-                ])
-                
-                print(f"Dados salvos em {OUTPUT_CSV}")
-        except Exception as e:
-            print(f"Erro ao salvar no CSV: {e}")
     
-    # Para outros tópicos que não o raw, apenas atualizamos o dicionário e exibimos estatísticas
-    # Mostrar estatísticas periodicamente se tivermos dados suficientes
-    if topic.endswith('radioLatency') or topic.endswith('mqttLatency') or topic.endswith('totalLatency'):
-        if received_count > 0 and received_count % 5 == 0 and radio_latencies:
-            # Limitar as listas a 100 entradas
-            if len(radio_latencies) > 100:
-                radio_latencies = radio_latencies[-100:]
-                mqtt_latencies = mqtt_latencies[-100:]
-                total_latencies = total_latencies[-100:]
-                
-            print("\n--- Estatísticas de Latência ---")
-            print(f"Mensagens MQTT recebidas: {received_count}")
-            if radio_latencies:
-                print(f"Latência Rádio - Média: {sum(radio_latencies)/len(radio_latencies):.2f}ms, "
-                      f"Mín: {min(radio_latencies)}ms, Máx: {max(radio_latencies)}ms")
-            if mqtt_latencies:
-                print(f"Latência MQTT - Média: {sum(mqtt_latencies)/len(mqtt_latencies):.2f}ms, "
-                      f"Mín: {min(mqtt_latencies)}ms, Máx: {max(mqtt_latencies)}ms")
-            if total_latencies:
-                print(f"Latência Total - Média: {sum(total_latencies)/len(total_latencies):.2f}ms, "
-                      f"Mín: {min(total_latencies)}ms, Máx: {max(total_latencies)}ms")
-            print(f"Dados salvos em: {os.path.abspath(OUTPUT_CSV)}")
-            print("----------------------------")
+    # Salvar no CSV (o gravador mantém o arquivo aberto e descarrega em grupo)
+    try:
+        gravador.escrever([
+            time.time(),
+            id_msg,
+            radio_latency,
+            formata_valor(mqtt_latency),
+            formata_valor(total_latency),
+            formata_valor(registro.temperatura),
+            formata_valor(registro.pressao),
+            formata_valor(registro.accel_x),
+            formata_valor(registro.accel_y),
+            formata_valor(registro.accel_z),
+            formata_valor(registro.gyro_x),
+            formata_valor(registro.gyro_y),
+            formata_valor(registro.gyro_z)
+        ])
+        if colunar is not None:
+            colunar.escrever(registro, mqtt_receive_time / 1000, mqtt_latency)
+    except Exception as e:
+        print(f"Erro ao salvar no CSV: {e}")
     
     # Adicionar diagnóstico detalhado periodicamente
-    if received_count % 5 == 0:  # A cada 5 mensagens
-        print_diagnostic_info(arduino_timestamp, mqtt_receive_time, radio_latency, mqtt_latency, total_latency)
+    if DEBUG_MENSAGENS and timestamp_real and received_count % 5 == 0:  # A cada 5 mensagens
+        print_diagnostic_info(registro.timestamp, mqtt_receive_time, radio_latency, mqtt_latency, total_latency)
+
+def arquivo_histogramas():
+    return ARQUIVO_HISTOGRAMAS or os.path.splitext(OUTPUT_CSV)[0] + '.hdr.json'
+
+def exportar_histogramas(forcar=False):
+    """Grava os histogramas da execução a cada INTERVALO_EXPORTACAO_S segundos (ou já, com forcar)."""
+    global ultima_exportacao
+    agora = time.monotonic()
+    if not forcar and agora - ultima_exportacao < INTERVALO_EXPORTACAO_S:
+        return
+    ultima_exportacao = agora
+    try:
+        salvar_histogramas(arquivo_histogramas(), {nome: serie.total for nome, serie in latencias.items()})
+    except OSError as e:
+        print(f"Erro ao exportar histogramas: {e}")
+
+def publicar_perda():
+    """Publica a perda da janela a cada INTERVALO_PERDA_S segundos (QoS 0)."""
+    global ultima_perda
+    agora = time.monotonic()
+    if cliente_mqtt is None or agora - ultima_perda < INTERVALO_PERDA_S:
+        return
+    ultima_perda = agora
+    cliente_mqtt.publish(MQTT_TOPIC_PERDA, f"{rastreador.perda_janela() * 100:.2f}")
 
 def print_diagnostic_info(arduino_timestamp, mqtt_receive_time, radio_latency, mqtt_latency, total_latency):
     """Imprime informações detalhadas de diagnóstico para auxiliar na análise de latência."""
@@ -252,22 +366,31 @@ def print_diagnostic_info(arduino_timestamp, mqtt_receive_time, radio_latency, m
     print(f"Timestamp Arduino: {arduino_timestamp}")
     print(f"Timestamp Local: {int(mqtt_receive_time)}")
     print(f"Diferença Bruta: {int(mqtt_receive_time - arduino_timestamp)}ms")
-    print(f"Offset Calculado: {time_offset}ms" if time_offset is not None else "Offset não calculado ainda")
+    offset = relogio.offset(arduino_timestamp)
+    print(f"Offset Estimado: {offset:.1f}ms (deriva: {relogio.descrever_deriva()})"
+          if offset is not None else "Offset não estimado ainda")
     print(f"Latência Rádio: {radio_latency}ms")
     print(f"Latência MQTT (após ajuste): {mqtt_latency}ms")
     print(f"Latência Total: {total_latency}ms")
     print("----------------------------------\n")
 
-def main():
-    # Configuração do cliente MQTT
+def criar_cliente():
+    """Cliente MQTT com os callbacks do bridge (também usado para publicar a perda)."""
+    global cliente_mqtt
     client = mqtt.Client()
+    cliente_mqtt = client
     client.on_connect = on_connect
     client.on_message = on_message
+    return client
+
+def main():
+    # Configuração do cliente MQTT
+    client = criar_cliente()
     
     try:
-        # Garantir que o arquivo CSV existe antes de iniciar
+        # Abrir o arquivo CSV e a thread de processamento antes de iniciar
         print(f"Verificando arquivo CSV: {OUTPUT_CSV}")
-        ensure_csv_exists()
+        iniciar_processamento()
         
         # Conectar ao broker MQTT
         print(f"Conectando ao broker MQTT: {MQTT_BROKER}...")
@@ -293,11 +416,7 @@ def main():
     finally:
         # Limpeza ao sair
         print("Finalizando...")
-
-# Adicionar novas variáveis globais no início do arquivo (depois da linha 20)
-time_offset = None  # Diferença entre o relógio do Arduino e do computador
-time_offset_samples = []
-max_samples = 10  # Número de amostras para calcular o offset
+        parar_processamento()
 
 if __name__ == "__main__":
     main()
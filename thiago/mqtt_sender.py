@@ -1,115 +1,134 @@
 import paho.mqtt.client as mqtt
+import os
 import serial
-import time
-import re
+import sys
+import asyncio
+from publicacao_mqtt import PublicadorMQTT
+from leitor_serial import LeitorSerial
+from limitador_taxa import LimitadorPorBroker
+from gravador_csv import GravadorCSV
+from armazenamento_colunar import GravadorColunar, pasta_colunar
+from rastreador_perdas import RastreadorPerdas, imprimir_perdas
+from rastreamento import Rastreamento
 
 # Configurações do broker MQTT
 BROKER = 'broker.hivemq.com'  # Broker público acessível de qualquer lugar
 PORT = 1883
 TOPIC_BASE = 'cansat/estacao/teste1'
+# Brokers usados por main(): (endereço, nome), todos na porta PORT
+BROKERS = [
+    ('localhost', 'Local'),
+    ('broker.hivemq.com', 'Nuvem')
+]
+QOS = 1
+# No encerramento, espera as mensagens pendentes saírem (e serem confirmadas, com QoS > 0)
+TIMEOUT_ENVIOS_S = 5
 
 # Configuração da porta serial (ajuste conforme necessário)
-SERIAL_PORT = 'COM8'  # Altere para a porta correta do seu receptor
+# CANSAT_PORTA_SERIAL substitui a porta (ex.: o pty do simulador_serial.py)
+SERIAL_PORT = os.environ.get('CANSAT_PORTA_SERIAL', 'COM8')  # Altere para a porta correta do seu receptor
 BAUDRATE = 9600
 
-# Regex para extrair os dados do print do receptor
-regex = re.compile(r'ID: (\d+) \| Timestamp: (\d+) \| RadioLatency: (\d+) ms \| Temperatura: ([\d\.-]+) C \| Pressao: ([\d\.-]+) hPa \| Accel \[X,Y,Z\]: ([\d\.-]+), ([\d\.-]+), ([\d\.-]+) \| Gyro \[X,Y,Z\] \(°/s\): ([\d\.-]+), ([\d\.-]+), ([\d\.-]+)')
+# Modo de publicação (ver publicacao_mqtt.py): 'campos', 'registro' ou 'lote'
+MODO_PUBLICACAO = 'registro'
+# Continuar publicando /raw e um tópico por campo (usado pelo dashboard web)
+COMPATIBILIDADE_CAMPOS = True
+JANELA_LOTE = 0.2  # segundos (modo 'lote')
 
-def envia_mqtt(dado, client):
-    for chave, valor in dado.items():
-        if chave == 'id':
-            continue  # Não envia o id
-        topico = TOPIC_BASE + '/' + chave  # Adiciona barra para criar sub-tópicos
-        client.publish(topico, str(valor))
-        print(f'Enviado para {topico}: {valor}')
-        time.sleep(0.05)
+# Limite de publicação por broker (token bucket): mensagens/s e tamanho da rajada.
+# Só há espera quando o broker ultrapassa o limite.
+TAXA_MENSAGENS = 200
+RAJADA_MENSAGENS = 50
+LIMITES_BROKER = {
+    'Nuvem': (50, 30),  # broker público: mais conservador
+}
+limitador = LimitadorPorBroker(TAXA_MENSAGENS, RAJADA_MENSAGENS, LIMITES_BROKER)
 
-def envia_mqtt_string(linha, client):
-    topico = TOPIC_BASE + '/raw'
-    client.publish(topico, linha)
-    print(f'Enviado para {topico}: {linha}')
-    time.sleep(0.05)
+# Gravação do CSV: descarrega a cada N linhas ou T ms (ver gravador_csv.py)
+LINHAS_POR_FLUSH = 50
+INTERVALO_FLUSH_MS = 1000
+FSYNC = 'nunca'  # 'nunca', 'descarga' ou 'rotacao'
+TAMANHO_MAX_BYTES = None  # Rotação por tamanho (None desativa)
+INTERVALO_ROTACAO_S = None  # Rotação por tempo (None desativa)
+# Gravar também a captura em colunas tipadas (dados_radio.colunas/, ver armazenamento_colunar.py)
+GRAVAR_COLUNAR = True
+# Perda de pacotes do rádio pelos IDs recebidos (ver rastreador_perdas.py),
+# publicada em /perdaRadio a cada INTERVALO_PERDA_S segundos
+INTERVALO_PERDA_S = 1.0
+# Rastreamento por etapa (ver rastreamento.py): grava as marcas de cada amostra em
+# ARQUIVO_RASTROS e leva o rastro no payload (modos 'registro' e 'lote').
+# AMOSTRAGEM_RASTROS = N rastreia 1 a cada N amostras. Também ativado por --rastrear
+RASTREAR = False
+ARQUIVO_RASTROS = 'rastros_envio.trace'
+AMOSTRAGEM_RASTROS = 1
 
-def envia_mqtt_string_multibroker(linha, clients):
-    # Registrar o timestamp de recepção no MQTT
-    mqtt_receive_time = time.time() * 1000  # Timestamp em milissegundos
-    
-    for client, broker_name in clients:
-        topico = TOPIC_BASE + '/raw'
-        result = client.publish(topico, linha, qos=1)
-        # Verificar se o envio foi bem sucedido
-        if result.rc == mqtt.MQTT_ERR_SUCCESS:
-            print(f'Enviado para {broker_name}: {topico}: {linha}')
-        else:
-            print(f'ERRO ao enviar para {broker_name}: {result.rc}')
-        
-        # Tentar analisar os dados e enviar para tópicos separados
-        match = regex.search(linha)
-        if match:
-            # Se conseguiu extrair todos os dados
-            id_num, timestamp, radio_latency, temp, press, accel_x, accel_y, accel_z, gyro_x, gyro_y, gyro_z = match.groups()
-              # Calcular a latência MQTT (tempo atual - timestamp de envio original)
-            mqtt_latency = mqtt_receive_time - int(timestamp)
-            total_latency = int(mqtt_latency) + int(radio_latency)  # Latência total = latência do rádio + latência do MQTT
-            
-            # Publicar em tópicos individuais
-            client.publish(f"{TOPIC_BASE}/timestamp", timestamp)
-            client.publish(f"{TOPIC_BASE}/radioLatency", radio_latency)
-            client.publish(f"{TOPIC_BASE}/mqttLatency", str(int(mqtt_latency)))
-            client.publish(f"{TOPIC_BASE}/totalLatency", str(int(total_latency)))
-            client.publish(f"{TOPIC_BASE}/temperatura", temp)
-            client.publish(f"{TOPIC_BASE}/pressao", press)
-            client.publish(f"{TOPIC_BASE}/accelX", accel_x)
-            client.publish(f"{TOPIC_BASE}/accelY", accel_y)
-            client.publish(f"{TOPIC_BASE}/accelZ", accel_z)
-            client.publish(f"{TOPIC_BASE}/gyroX", gyro_x)
-            client.publish(f"{TOPIC_BASE}/gyroY", gyro_y)
-            client.publish(f"{TOPIC_BASE}/gyroZ", gyro_z)
-            
-            print(f'Enviados dados separados para {broker_name}')
-            print(f'Radio Latency: {radio_latency}ms, MQTT Latency: {int(mqtt_latency)}ms, Total: {int(total_latency)}ms')
-        
-        time.sleep(0.01)
-
-def main():
-    import csv
+def main(pronto=None):
+    """Captura até a porta serial fechar. pronto (Event opcional) é sinalizado com a porta já aberta."""
+    from pipeline_mqtt import PipelineIngestao
     radio_csv = 'dados_radio.csv'
-    first_write = True    # Configuração dos dois brokers
-    BROKERS = [
-        ('localhost', 'Local'),
-        ('broker.hivemq.com', 'Nuvem')
-    ]
     clients = []
     for broker, broker_name in BROKERS:
         client = mqtt.Client()
-        client.connect(broker, 1883, 60)
+        client.connect(broker, PORT, 60)
         client.loop_start()
         clients.append((client, broker_name))
 
+    rastreamento = None
+    if RASTREAR or '--rastrear' in sys.argv:
+        rastreamento = Rastreamento(ARQUIVO_RASTROS, AMOSTRAGEM_RASTROS)
+        # O canal de cada broker é o número dele na lista, a partir de 1
+        for canal, (client, broker_name) in enumerate(clients, start=1):
+            client.on_publish = rastreamento.callback_confirmacao(canal)
+            print(f'Rastreamento: canal {canal} = {broker_name} ({ARQUIVO_RASTROS})')
+
     ser = serial.Serial(SERIAL_PORT, BAUDRATE, timeout=1)
+    leitor = LeitorSerial(ser).iniciar()
     print(f'Lendo dados do receptor em {SERIAL_PORT}...')
+    if pronto is not None:
+        pronto.set()
+    publicadores = [
+        PublicadorMQTT(client, broker_name, MODO_PUBLICACAO, COMPATIBILIDADE_CAMPOS, JANELA_LOTE, qos=QOS,
+                       limitador=limitador, rastreamento=rastreamento, canal=canal)
+        for canal, (client, broker_name) in enumerate(clients, start=1)
+    ]
+    # Leitura, CSV e cada broker rodam como estágios independentes (ver pipeline_mqtt.py)
+    gravador = GravadorCSV(radio_csv, ['timestamp', 'valor'], LINHAS_POR_FLUSH, INTERVALO_FLUSH_MS, FSYNC,
+                           TAMANHO_MAX_BYTES, INTERVALO_ROTACAO_S)
+    colunar = GravadorColunar(pasta_colunar(radio_csv), csv_origem=radio_csv) if GRAVAR_COLUNAR else None
+    rastreador = RastreadorPerdas()
+    pipeline = PipelineIngestao(leitor, publicadores, gravador, colunar=colunar, rastreador=rastreador,
+                                intervalo_perda=INTERVALO_PERDA_S, rastreamento=rastreamento)
     try:
-        with open(radio_csv, 'a', newline='') as f:
-            writer = csv.writer(f)
-            if first_write:
-                writer.writerow(['timestamp', 'valor'])
-                first_write = False
-            while True:
-                linha = ser.readline().decode(errors='ignore').strip()
-                if not linha:
-                    continue
-                t = time.time()
-                writer.writerow([t, linha])
-                f.flush()
-                print(f'Recebido serial: {linha}')
-                envia_mqtt_string_multibroker(linha, clients)
+        asyncio.run(pipeline.executar())
     except KeyboardInterrupt:
         print('Encerrando...')
+    except serial.SerialException as e:
+        # Receptor desconectado (ou o simulador encerrado): fim normal da captura
+        print(f'Porta serial encerrada: {e}')
     finally:
+        print(f'Estado final do pipeline: {pipeline.estatisticas()}')
+        for publicador in publicadores:
+            publicador.descarregar()
+            if not publicador.aguardar_envios(TIMEOUT_ENVIOS_S):
+                print(f'{publicador.broker_name}: mensagens ainda pendentes após {TIMEOUT_ENVIOS_S}s')
+            print(f'{publicador.broker_name}: {publicador.estatisticas()}')
+        rastreador.finalizar()
+        imprimir_perdas(rastreador, 'Perda de pacotes do rádio')
+        gravador.fechar()
+        if colunar is not None:
+            colunar.fechar()
+        leitor.parar()
         ser.close()
         for client, _ in clients:
             client.loop_stop()
             client.disconnect()
+        if rastreamento is not None:
+            rastreamento.fechar()
+    return {
+        'pipeline': pipeline.estatisticas(),
+        'publicadores': {publicador.broker_name: publicador.estatisticas() for publicador in publicadores},
+        'perdas': rastreador.resumo(),
+    }
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,178 @@
+import csv
+import math
+from collections import namedtuple
+
+from deteccao_encoding import detectar_encoding
+
+# Parser único para as linhas impressas pelo receptor, por exemplo:
+# "ID: 1692 | Timestamp: 1961657 | Intervalo: 1072 ms | RadioLatency: 55 ms | Temperatura: 24.10 C | ..."
+#
+# O formato é descrito por uma lista de campos (CAMPOS_RECEPTOR). Cada campo
+# é identificado pela primeira palavra do rótulo ("ID", "Accel", "Gyro"...),
+# o que torna o parser tolerante ao "°/s" corrompido que aparece nos logs.
+# Para adicionar um sensor novo basta acrescentar um Campo na lista.
+# titulo/unidade/formato só são usados para gerar a linha de volta (formatar_linha).
+
+Campo = namedtuple('Campo', ['rotulo', 'nomes', 'tipo', 'titulo', 'unidade', 'formato'],
+                   defaults=(None, '', ''))
+
+SEPARADOR_CAMPOS = ' | '
+SEPARADOR_ROTULO = ': '
+SEPARADOR_VETOR = ', '
+
+CAMPOS_RECEPTOR = [
+    Campo('ID', ('id',), int),
+    Campo('Timestamp', ('timestamp',), int),
+    Campo('Intervalo', ('intervalo',), int, unidade='ms'),
+    Campo('RadioLatency', ('radio_latency',), int, unidade='ms'),
+    Campo('Temperatura', ('temperatura',), float, unidade='C', formato='.2f'),
+    Campo('Pressao', ('pressao',), float, unidade='hPa', formato='.2f'),
+    Campo('Accel', ('accel_x', 'accel_y', 'accel_z'), float, titulo='Accel [X,Y,Z]', formato='.3f'),
+    Campo('Gyro', ('gyro_x', 'gyro_y', 'gyro_z'), float, titulo='Gyro [X,Y,Z] (°/s)', formato='.2f'),
+    # Sensores previstos no projeto (ainda não enviados pelo receptor)
+    Campo('CO2', ('co2',), float),
+    Campo('NO2', ('no2',), float),
+    Campo('UV', ('uv',), float),
+]
+
+
+def _converte(tipo, texto):
+    """Converte um valor textual, retornando None para 'ovf', 'nan', 'inf' ou lixo."""
+    try:
+        valor = tipo(texto)
+    except ValueError:
+        return None
+    # float() aceita 'nan' e 'inf', que também são leituras inválidas do sensor
+    if tipo is float and not math.isfinite(valor):
+        return None
+    return valor
+
+
+class ParserTelemetria:
+    """
+    Parser compilado a partir de uma lista de Campo.
+
+    A compilação monta uma tabela rótulo -> (posição, tipo, quantidade) e a
+    classe de registro (namedtuple) com um atributo por valor. A análise de
+    cada linha usa apenas split/partition, sem expressões regulares.
+    """
+
+    def __init__(self, campos):
+        self.campos = list(campos)
+        self.nomes = []
+        self._tabela = {}
+        for campo in self.campos:
+            self._tabela[campo.rotulo] = (len(self.nomes), campo.tipo, len(campo.nomes))
+            self.nomes.extend(campo.nomes)
+        self.Registro = namedtuple('Registro', self.nomes, defaults=(None,) * len(self.nomes))
+        self._vazio = [None] * len(self.nomes)
+
+    def extrair_registro(self, linha):
+        """
+        Analisa uma linha do receptor e retorna um Registro.
+        Campos ausentes ficam como None. Retorna None se nenhum campo for reconhecido.
+        """
+        valores = self._vazio[:]
+        encontrou = False
+        tabela = self._tabela
+        for segmento in linha.split(SEPARADOR_CAMPOS):
+            rotulo, _, texto = segmento.partition(SEPARADOR_ROTULO)
+            entrada = tabela.get(rotulo.strip().split(' ', 1)[0])
+            if entrada is None or not texto:
+                continue
+            posicao, tipo, quantidade = entrada
+            encontrou = True
+            if quantidade == 1:
+                # Remove a unidade ("55 ms", "24.10 C")
+                valores[posicao] = _converte(tipo, texto.split(' ', 1)[0])
+            else:
+                partes = texto.split(SEPARADOR_VETOR, quantidade - 1)
+                for i, parte in enumerate(partes):
+                    valores[posicao + i] = _converte(tipo, parte.strip())
+        if not encontrou:
+            return None
+        return self.Registro._make(valores)
+
+    def formatar_linha(self, registro):
+        """
+        Gera a linha de texto no formato do receptor a partir de um Registro.
+        Campos totalmente ausentes são omitidos; valores ausentes viram 'ovf', como no Arduino.
+        """
+        partes = []
+        for campo in self.campos:
+            posicao = self._tabela[campo.rotulo][0]
+            valores = registro[posicao:posicao + len(campo.nomes)]
+            if all(v is None for v in valores):
+                continue
+            texto = SEPARADOR_VETOR.join('ovf' if v is None else format(v, campo.formato) for v in valores)
+            if campo.unidade:
+                texto += ' ' + campo.unidade
+            partes.append((campo.titulo or campo.rotulo) + SEPARADOR_ROTULO + texto)
+        return SEPARADOR_CAMPOS.join(partes)
+
+    def extrair_registros(self, linhas):
+        """Modo em lote: analisa uma lista (ou iterável) de linhas, ignorando as não reconhecidas."""
+        extrair = self.extrair_registro
+        registros = []
+        for linha in linhas:
+            registro = extrair(linha)
+            if registro is not None:
+                registros.append(registro)
+        return registros
+
+    def extrair_colunas(self, linhas):
+        """
+        Modo em lote por colunas: retorna um dicionário nome -> lista de valores,
+        com uma posição por linha de entrada (None onde a linha não tem o campo).
+        """
+        extrair = self.extrair_registro
+        vazio = self.Registro._make(self._vazio)
+        registros = [extrair(linha) or vazio for linha in linhas]
+        if not registros:
+            return {nome: [] for nome in self.nomes}
+        return dict(zip(self.nomes, map(list, zip(*registros))))
+
+    def extrair_registros_csv(self, caminho, coluna='valor', encoding=None):
+        """
+        Lê um CSV de captura (timestamp,valor) e retorna duas listas alinhadas:
+        timestamps do sistema e registros extraídos da coluna indicada.
+        Sem encoding, usa o detectado pelo começo do arquivo (deteccao_encoding.py).
+        """
+        timestamps = []
+        registros = []
+        extrair = self.extrair_registro
+        erros = 'replace'
+        if encoding is None:
+            encoding, erros = detectar_encoding(caminho)
+        with open(caminho, newline='', encoding=encoding, errors=erros) as f:
+            for linha in csv.DictReader(f):
+                registro = extrair(linha.get(coluna) or '')
+                if registro is None:
+                    continue
+                try:
+                    timestamps.append(float(linha['timestamp']))
+                except (TypeError, ValueError):
+                    timestamps.append(None)
+                registros.append(registro)
+        return timestamps, registros
+
+
+def compilar_formato(campos):
+    """Compila uma lista de Campo em um ParserTelemetria."""
+    return ParserTelemetria(campos)
+
+
+# Parser padrão do receptor, compilado uma única vez na importação
+PARSER_RECEPTOR = compilar_formato(CAMPOS_RECEPTOR)
+Registro = PARSER_RECEPTOR.Registro
+
+extrair_registro = PARSER_RECEPTOR.extrair_registro
+extrair_registros = PARSER_RECEPTOR.extrair_registros
+extrair_colunas = PARSER_RECEPTOR.extrair_colunas
+extrair_registros_csv = PARSER_RECEPTOR.extrair_registros_csv
+formatar_linha = PARSER_RECEPTOR.formatar_linha
+
+
+def formata_valor(valor):
+    """Formata um valor do registro para publicação/CSV ('' quando ausente)."""
+    return '' if valor is None else str(valor)
@@ -0,0 +1,228 @@
+import asyncio
+import time
+
+from parser_telemetria import extrair_registro
+from rastreamento import ORIGEM, SERIAL, PARSER
+
+# Pipeline assíncrono de ingestão do mqtt_sender.
+#
+#   leitor serial -> parser -> +-> CSV
+#                              +-> publicador broker 1
+#                              +-> publicador broker 2 ...
+#
+# Os estágios são ligados por filas limitadas (asyncio.Queue com maxsize).
+# O parser entrega cada item a todos os destinos; se a fila de um publicador
+# estiver cheia, o item mais antigo dessa fila é descartado, para que um broker
+# lento não atrase a leitura serial nem os outros destinos. A fila do CSV nunca
+# descarta (o parser espera por ela). A porta serial continua sendo esvaziada
+# pela thread do LeitorSerial mesmo que o pipeline esteja atrasado.
+#
+# Com um RastreadorPerdas (rastreador_perdas.py), o parser registra o ID de cada
+# amostra e cada publicador envia a perda da janela a cada intervalo_perda segundos.
+#
+# Com um Rastreamento (rastreamento.py), o parser dá um número de rastro à amostra e
+# marca as etapas ORIGEM, SERIAL e PARSER; o rastro segue no item até os publicadores.
+#
+# O progresso aparece no resumo periódico (estatisticas(), a cada intervalo_status
+# segundos) e na perda publicada; o print de cada linha fica em DEBUG_MENSAGENS.
+
+# Mostrar cada linha recebida da serial no terminal (lento com taxas altas)
+DEBUG_MENSAGENS = False
+
+
+class Estagio:
+    """Fila de entrada de um estágio com seus contadores."""
+
+    def __init__(self, nome, tamanho_fila, descartar_se_cheia=False):
+        self.nome = nome
+        self.fila = asyncio.Queue(maxsize=tamanho_fila)
+        self.descartar_se_cheia = descartar_se_cheia
+        self.processados = 0
+        self.descartados = 0
+
+    async def entregar(self, item):
+        if not self.descartar_se_cheia:
+            await self.fila.put(item)
+            return
+        if self.fila.full():
+            # Descarta o item mais antigo para abrir espaço para o mais recente
+            self.fila.get_nowait()
+            self.descartados += 1
+        self.fila.put_nowait(item)
+
+
+class PipelineIngestao:
+    """
+    Pipeline serial -> CSV + brokers MQTT.
+
+    leitor: LeitorSerial já iniciado
+    publicadores: lista de PublicadorMQTT (publicacao_mqtt.py), um por broker
+    gravador: GravadorCSV (gravador_csv.py) com colunas timestamp, valor; quem cria fecha
+    colunar: GravadorColunar opcional (armazenamento_colunar.py), gravado junto com o CSV
+    rastreador: RastreadorPerdas opcional, alimentado com o ID de cada amostra
+    rastreamento: Rastreamento opcional (rastreamento.py), que marca as etapas de cada amostra
+    """
+
+    def __init__(self, leitor, publicadores, gravador, tamanho_fila=1000, intervalo_status=10, colunar=None,
+                 rastreador=None, intervalo_perda=1.0, rastreamento=None):
+        self.leitor = leitor
+        self.gravador = gravador
+        self.colunar = colunar
+        self.rastreador = rastreador
+        self.intervalo_perda = intervalo_perda
+        self.rastreamento = rastreamento
+        self.intervalo_status = intervalo_status
+
+        self.parser = Estagio('parser', tamanho_fila)
+        self.csv = Estagio('csv', tamanho_fila)
+        self.publicadores = [
+            (publicador, Estagio(f'mqtt:{publicador.broker_name}', tamanho_fila, descartar_se_cheia=True))
+            for publicador in publicadores
+        ]
+        self.destinos = [self.csv] + [estagio for _, estagio in self.publicadores]
+        self.erro_leitura = None
+
+    def estagios(self):
+        return [self.parser] + self.destinos
+
+    def profundidades(self):
+        """Profundidade atual da fila de cada estágio."""
+        return {estagio.nome: estagio.fila.qsize() for estagio in self.estagios()}
+
+    def estatisticas(self):
+        return {
+            estagio.nome: {
+                'fila': estagio.fila.qsize(),
+                'processados': estagio.processados,
+                'descartados': estagio.descartados,
+            }
+            for estagio in self.estagios()
+        }
+
+    async def _ler_serial(self):
+        while True:
+            # ler_linha bloqueia, então roda em uma thread para não travar o loop
+            try:
+                leitura = await asyncio.to_thread(self.leitor.ler_linha, 0.5)
+            except Exception as e:
+                # Porta fechada: o que já foi lido termina de passar pelo pipeline e o erro sobe depois
+                self.erro_leitura = e
+                break
+            if leitura is None:
+                if not self.leitor.ativo():
+                    break
+                continue
+            await self.parser.fila.put(leitura)
+        await self.parser.fila.put(None)
+
+    async def _analisar(self):
+        while True:
+            leitura = await self.parser.fila.get()
+            if leitura is None:
+                break
+            t, linha, registro = leitura
+            if registro is None:
+                registro = extrair_registro(linha)
+            rastro = self._rastrear(t, registro)
+            self.parser.processados += 1
+            if self.rastreador is not None and registro is not None and registro.id is not None:
+                self.rastreador.registrar(registro.id)
+            if DEBUG_MENSAGENS:
+                print(f'Recebido serial: {linha}')
+            item = (t, linha, registro, rastro)
+            for destino in self.destinos:
+                await destino.entregar(item)
+        for destino in self.destinos:
+            await destino.fila.put(None)
+
+    def _rastrear(self, t, registro):
+        """Número de rastro da amostra, com as marcas até o fim do parser (None sem rastreamento)."""
+        if self.rastreamento is None or registro is None:
+            return None
+        rastro = self.rastreamento.novo_rastro()
+        if rastro is not None:
+            fim_parser = self.rastreamento.agora()
+            if registro.timestamp is not None:
+                self.rastreamento.marcar(rastro, ORIGEM, registro.timestamp)
+            self.rastreamento.marcar(rastro, SERIAL, t * 1000)
+            self.rastreamento.marcar(rastro, PARSER, fim_parser)
+        return rastro
+
+    async def _gravar_csv(self):
+        while True:
+            # Com linhas pendentes, espera no máximo até a janela de descarga vencer
+            esperas = [self.gravador.tempo_para_descarga()]
+            if self.colunar is not None:
+                esperas.append(self.colunar.tempo_para_descarga())
+            esperas = [espera for espera in esperas if espera is not None]
+            try:
+                item = await asyncio.wait_for(self.csv.fila.get(), timeout=min(esperas) if esperas else None)
+            except asyncio.TimeoutError:
+                self.gravador.verificar()
+                if self.colunar is not None:
+                    self.colunar.verificar()
+                continue
+            if item is None:
+                break
+            t, linha, registro, _ = item
+            self.gravador.escrever([t, linha])
+            if self.colunar is not None:
+                self.colunar.escrever(registro, t)
+            self.csv.processados += 1
+        self.gravador.descarregar()
+        if self.colunar is not None:
+            self.colunar.gravar_segmento()
+
+    async def _publicar(self, publicador, estagio):
+        ultima_perda = time.monotonic()
+        while True:
+            # Com um lote pendente, espera no máximo até a janela do lote vencer
+            espera = publicador.tempo_para_vencer()
+            try:
+                item = await asyncio.wait_for(estagio.fila.get(), timeout=max(espera, 0) if espera is not None else None)
+            except asyncio.TimeoutError:
+                await asyncio.to_thread(publicador.descarregar)
+                continue
+            if item is None:
+                break
+            t, linha, registro, rastro = item
+            # Cada broker publica na sua própria thread: um broker lento só atrasa a si mesmo
+            try:
+                await asyncio.to_thread(publicador.publicar, linha, registro, t * 1000, rastro)
+                estagio.processados += 1
+            except Exception as e:
+                estagio.descartados += 1
+                print(f'ERRO ao publicar para {publicador.broker_name}: {e}')
+            if self.rastreador is not None and time.monotonic() - ultima_perda >= self.intervalo_perda:
+                ultima_perda = time.monotonic()
+                try:
+                    await asyncio.to_thread(publicador.publicar_perda, self.rastreador.perda_janela())
+                except Exception as e:
+                    print(f'ERRO ao publicar perda para {publicador.broker_name}: {e}')
+        await asyncio.to_thread(publicador.descarregar)
+
+    async def _monitorar(self):
+        while True:
+            await asyncio.sleep(self.intervalo_status)
+            resumo = ', '.join(
+                f"{nome}: fila={dados['fila']} ok={dados['processados']} descartados={dados['descartados']}"
+                for nome, dados in self.estatisticas().items()
+            )
+            if self.rastreador is not None:
+                resumo += (f', perda: janela={self.rastreador.perda_janela() * 100:.2f}% '
+                           f'total={self.rastreador.perda_total() * 100:.2f}%')
+            print(f'[pipeline {time.strftime("%H:%M:%S")}] {resumo}')
+
+    async def executar(self):
+        monitor = asyncio.create_task(self._monitorar())
+        try:
+            await asyncio.gather(
+                self._ler_serial(),
+                self._analisar(),
+                self._gravar_csv(),
+                *(self._publicar(publicador, estagio) for publicador, estagio in self.publicadores),
+            )
+        finally:
+            monitor.cancel()
+        if self.erro_leitura is not None:
+            raise self.erro_leitura
@@ -0,0 +1,258 @@
+import json
+import time
+
+from parser_telemetria import Registro, formata_valor
+
+# Modos de publicação MQTT da estação terrestre.
+#
+#   'campos'   - formato antigo: linha bruta em /raw e um tópico por campo
+#                (timestamp, radioLatency, mqttLatency, ..., gyroZ)
+#   'registro' - uma mensagem JSON compacta por amostra em /registro
+#   'lote'     - várias amostras por mensagem em /lote, agrupadas por janela de tempo
+#
+# O registro compacto é uma lista posicional: [rx, id, timestamp, intervalo, ...]
+# na ordem dos campos do Registro, onde rx é o instante de chegada na serial (ms).
+# Valores ausentes viram null e os ausentes no final são omitidos. Um lote é uma
+# lista de registros compactos.
+#
+# Nos modos 'registro' e 'lote' o formato antigo pode continuar sendo publicado
+# como compatibilidade (compatibilidade=True), para o dashboard web que ainda
+# assina os tópicos por campo.
+#
+# Com rastreamento (rastreamento.py), a mensagem de /registro ou /lote vira um objeto
+# {"rastro": ..., "canal": ..., "dados": ...}, em que dados é o registro compacto (ou a
+# lista de registros do lote) e rastro é o número de rastro (ou a lista, um por registro).
+#
+# A perda de pacotes medida ao vivo (rastreador_perdas.py) é publicada em
+# /perdaRadio, em %, como texto, igual aos tópicos por campo.
+
+TOPIC_BASE = 'cansat/estacao/teste1'
+MODOS = ('campos', 'registro', 'lote')
+
+# Cabeçalho fixo (2) + tamanho do tópico (2) do PUBLISH; +2 do packet id quando QoS > 0
+OVERHEAD_PUBLISH = 4
+
+# Mensagens publicadas por publicar_campos (timestamp, latências e sensores)
+NUM_TOPICOS_CAMPOS = 12
+
+
+def tamanho_pacote(topico, payload, qos):
+    """Tamanho aproximado em bytes de um pacote PUBLISH."""
+    tamanho = OVERHEAD_PUBLISH + len(topico.encode()) + len(payload.encode() if isinstance(payload, str) else payload)
+    return tamanho + 2 if qos > 0 else tamanho
+
+
+def registro_para_lista(registro, mqtt_receive_time):
+    """Representação compacta de um registro: [rx, valores na ordem do Registro...]."""
+    valores = list(registro)
+    while valores and valores[-1] is None:
+        valores.pop()
+    return [int(mqtt_receive_time)] + valores
+
+
+def codificar_registro(registro, mqtt_receive_time, rastro=None, canal=0):
+    dados = registro_para_lista(registro, mqtt_receive_time)
+    if rastro is not None:
+        dados = {'rastro': rastro, 'canal': canal, 'dados': dados}
+    return json.dumps(dados, separators=(',', ':'))
+
+
+def decodificar_payload(payload, com_rastro=False):
+    """
+    Decodifica uma mensagem de /registro ou /lote.
+    Retorna uma lista de (Registro, mqtt_receive_time em ms), ou de (Registro,
+    mqtt_receive_time, rastro, canal) com com_rastro=True (rastro None se a mensagem
+    não tiver); lista vazia se o JSON for inválido.
+    """
+    try:
+        dados = json.loads(payload)
+    except ValueError:
+        return []
+    rastros, canal = None, 0
+    if isinstance(dados, dict):
+        rastros, canal = dados.get('rastro'), dados.get('canal', 0)
+        dados = dados.get('dados')
+    if not isinstance(dados, list) or not dados:
+        return []
+    if not isinstance(dados[0], list):
+        dados = [dados]  # Registro único
+        rastros = [rastros]
+    elif not isinstance(rastros, list):
+        rastros = [None] * len(dados)
+    resultado = []
+    for item, rastro in zip(dados, rastros):
+        if not isinstance(item, list) or len(item) < 2:
+            continue
+        valores = item[1:len(Registro._fields) + 1]
+        if com_rastro:
+            resultado.append((Registro(*valores), item[0], rastro, canal))
+        else:
+            resultado.append((Registro(*valores), item[0]))
+    return resultado
+
+
+def latencias(registro, mqtt_receive_time):
+    """Latência MQTT e total (ms) do formato antigo: recepção - timestamp do Arduino."""
+    mqtt_latency = mqtt_receive_time - registro.timestamp
+    return int(mqtt_latency), int(mqtt_latency) + registro.radio_latency
+
+
+def publicar_campos(client, registro, mqtt_receive_time, topic_base=TOPIC_BASE):
+    """Publica um registro completo em um tópico por campo (formato antigo). Retorna a lista de (tópico, payload)."""
+    mqtt_latency, total_latency = latencias(registro, mqtt_receive_time)
+    mensagens = [
+        (f"{topic_base}/timestamp", str(registro.timestamp)),
+        (f"{topic_base}/radioLatency", str(registro.radio_latency)),
+        (f"{topic_base}/mqttLatency", str(mqtt_latency)),
+        (f"{topic_base}/totalLatency", str(total_latency)),
+        (f"{topic_base}/temperatura", formata_valor(registro.temperatura)),
+        (f"{topic_base}/pressao", formata_valor(registro.pressao)),
+        (f"{topic_base}/accelX", formata_valor(registro.accel_x)),
+        (f"{topic_base}/accelY", formata_valor(registro.accel_y)),
+        (f"{topic_base}/accelZ", formata_valor(registro.accel_z)),
+        (f"{topic_base}/gyroX", formata_valor(registro.gyro_x)),
+        (f"{topic_base}/gyroY", formata_valor(registro.gyro_y)),
+        (f"{topic_base}/gyroZ", formata_valor(registro.gyro_z)),
+    ]
+    for topico, payload in mensagens:
+        client.publish(topico, payload)
+    return mensagens
+
+
+def registro_completo(registro):
+    return registro is not None and registro.timestamp is not None and registro.radio_latency is not None
+
+
+class PublicadorMQTT:
+    """
+    Publica as amostras de um broker no modo escolhido e conta mensagens e bytes enviados.
+
+    No modo 'lote', as amostras são acumuladas até max_lote itens ou até a mais
+    antiga completar janela_lote segundos; descarregar() envia o lote pendente.
+    Com um limitador (limitador_taxa.LimitadorPorBroker), cada mensagem consome
+    um token do balde deste broker. Com um Rastreamento (rastreamento.py), os rastros
+    vão no payload de /registro e /lote e cada publish() é marcado no canal dado.
+    """
+
+    def __init__(self, client, broker_name, modo='registro', compatibilidade=False,
+                 janela_lote=0.2, max_lote=50, qos=1, topic_base=TOPIC_BASE, relogio=time.monotonic,
+                 limitador=None, rastreamento=None, canal=0):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de publicação inválido: {modo} (use um de {MODOS})")
+        self.client = client
+        self.broker_name = broker_name
+        self.modo = modo
+        self.compatibilidade = compatibilidade or modo == 'campos'
+        self.janela_lote = janela_lote
+        self.max_lote = max_lote
+        self.qos = qos
+        self.topic_base = topic_base
+        self.relogio = relogio
+        self.limitador = limitador
+        self.rastreamento = rastreamento
+        self.canal = canal
+        self.topico_raw = f"{topic_base}/raw"
+        self.topico_registro = f"{topic_base}/registro"
+        self.topico_lote = f"{topic_base}/lote"
+        self.topico_perda = f"{topic_base}/perdaRadio"
+        self._lote = []
+        self._rastros_lote = []
+        self._inicio_lote = None
+        self.mensagens = 0
+        self.bytes = 0
+        self.amostras = 0
+        self._ultimo_envio = None  # MQTTMessageInfo da última publicação
+
+    def _enviar(self, topico, payload, qos, rastros=None):
+        if self.limitador is not None:
+            self.limitador.aguardar(self.broker_name)
+        if rastros:
+            chamada = self.rastreamento.agora()
+        result = self.client.publish(topico, payload, qos=qos)
+        self._ultimo_envio = result
+        self.mensagens += 1
+        self.bytes += tamanho_pacote(topico, payload, qos)
+        if rastros:
+            self.rastreamento.publicado(self.canal, getattr(result, 'mid', None), rastros, chamada)
+        return result
+
+    def publicar(self, linha, registro, mqtt_receive_time, rastro=None):
+        """
+        Publica uma amostra. mqtt_receive_time é o instante de chegada na serial (ms);
+        rastro é o número de rastro da amostra (só usado com rastreamento).
+        """
+        if self.rastreamento is None:
+            rastro = None
+        self.amostras += 1
+        if self.compatibilidade:
+            self._enviar(self.topico_raw, linha, self.qos)
+            if registro_completo(registro):
+                publicar_campos(_ContadorCliente(self), registro, mqtt_receive_time, self.topic_base)
+        if registro is None or self.modo == 'campos':
+            return
+        if self.modo == 'registro':
+            self._enviar(self.topico_registro, codificar_registro(registro, mqtt_receive_time, rastro, self.canal),
+                         self.qos, [rastro] if rastro is not None else None)
+            return
+        if not self._lote:
+            self._inicio_lote = self.relogio()
+        self._lote.append(registro_para_lista(registro, mqtt_receive_time))
+        self._rastros_lote.append(rastro)
+        if len(self._lote) >= self.max_lote or self.tempo_para_vencer() <= 0:
+            self.descarregar()
+
+    def publicar_perda(self, perda):
+        """Publica a perda de pacotes (fração) em %, com QoS 0: o próximo valor substitui este."""
+        self._enviar(self.topico_perda, f"{perda * 100:.2f}", 0)
+
+    def tempo_para_vencer(self):
+        """Segundos até a janela do lote pendente vencer (None se não há lote pendente)."""
+        if not self._lote:
+            return None
+        return self.janela_lote - (self.relogio() - self._inicio_lote)
+
+    def descarregar(self):
+        """Envia o lote pendente, se houver."""
+        if not self._lote:
+            return
+        rastros = self._rastros_lote
+        dados = self._lote
+        if any(rastro is not None for rastro in rastros):
+            dados = {'rastro': rastros, 'canal': self.canal, 'dados': dados}
+        else:
+            rastros = None
+        payload = json.dumps(dados, separators=(',', ':'))
+        self._lote = []
+        self._rastros_lote = []
+        self._inicio_lote = None
+        self._enviar(self.topico_lote, payload, self.qos, rastros)
+
+    def aguardar_envios(self, timeout=None):
+        """
+        Espera a última publicação sair (QoS 0) ou ser confirmada (QoS 1/2); o paho envia
+        em ordem, então as anteriores já saíram. Retorna False se ainda havia pendências.
+        """
+        envio = self._ultimo_envio
+        if envio is None or not hasattr(envio, 'wait_for_publish'):
+            return True
+        try:
+            envio.wait_for_publish(timeout)
+        except (RuntimeError, ValueError):
+            return False
+        return envio.is_published()
+
+    def estatisticas(self):
+        stats = {'amostras': self.amostras, 'mensagens': self.mensagens, 'bytes': self.bytes}
+        if self.limitador is not None:
+            stats.update(self.limitador.balde(self.broker_name).estatisticas())
+        return stats
+
+
+class _ContadorCliente:
+    """Adaptador que faz publicar_campos passar pela contagem do PublicadorMQTT (QoS 0, como antes)."""
+
+    def __init__(self, publicador):
+        self.publicador = publicador
+
+    def publish(self, topico, payload, qos=0):
+        return self.publicador._enviar(topico, payload, qos)
@@ -0,0 +1,216 @@
+import collections
+
+# Perda de pacotes em tempo real, a partir do ID de cada mensagem recebida
+# (mqtt_sender.py na saída da serial e o bridge do dashboard depois do broker).
+#
+# A janela guarda um mapa de presença dos últimos JANELA_IDS IDs (um byte por ID,
+# em um buffer circular indexado por sequência % janela). Cada ID custa O(1):
+#   - ID novo (maior que todos): a janela desliza; os IDs que saem dela sem terem
+#     chegado são contados como perdidos e formam as lacunas
+#   - ID dentro da janela ainda não visto: chegou fora de ordem e é marcado
+#   - ID dentro da janela já visto: duplicado
+#   - ID anterior à janela: atrasado (já tinha sido contado como perdido)
+# Um salto grande para frente não percorre os IDs faltantes um a um: os que nunca
+# estiveram na janela são somados de uma vez.
+#
+# Os IDs são uint32 e dão a volta: a distância entre dois IDs é tomada módulo 2^32
+# (menos de 2^31 para frente é avanço, senão é recuo). O reinício do transmissor
+# (IDs voltando a 0) segue o mesmo critério de juncao_fontes.py: uma queda maior
+# que TOLERANCIA_REINICIO para um ID abaixo de TOLERANCIA_REINICIO só é aceita como
+# reinício se a mensagem seguinte continuar a partir dele; senão a mensagem era
+# uma atrasada. No reinício a janela é esvaziada e começa uma nova época a partir de 0.
+#
+# perda_janela() é a perda dos últimos JANELA_IDS IDs (o valor publicado ao vivo);
+# perda_total() inclui tudo desde o início. As últimas MAX_LACUNAS lacunas ficam
+# guardadas; a contagem de lacunas é de toda a captura.
+
+MODULO_ID = 1 << 32
+METADE_ID = MODULO_ID >> 1
+JANELA_IDS = 1024
+MAX_LACUNAS = 100
+TOLERANCIA_REINICIO = 100
+
+# Classificação de cada ID em registrar()
+NOVO, FORA_DE_ORDEM, DUPLICADO, ATRASADO, PENDENTE = 'novo', 'fora_de_ordem', 'duplicado', 'atrasado', 'pendente'
+
+# Sequência de IDs que não chegaram, fechada quando saiu da janela
+Lacuna = collections.namedtuple('Lacuna', ['epoca', 'primeiro_id', 'ultimo_id', 'tamanho'])
+
+
+class RastreadorPerdas:
+    """Perda de pacotes, fora de ordem, duplicados e lacunas de um fluxo de IDs, em memória constante."""
+
+    def __init__(self, janela=JANELA_IDS, max_lacunas=MAX_LACUNAS, tolerancia_reinicio=TOLERANCIA_REINICIO):
+        if janela < 1:
+            raise ValueError(f"Janela inválida: {janela}")
+        self.janela = janela
+        self.tolerancia_reinicio = tolerancia_reinicio
+        self._presenca = bytearray(janela)
+        self.lacunas = collections.deque(maxlen=max_lacunas)
+        self.epoca = 0
+        self.reinicios = 0
+        # Sequência (ID sem a volta do uint32) do início da época, do maior ID e do início da janela
+        self._primeiro = None
+        self._maior = None
+        self._base = None
+        self._presentes = 0  # IDs presentes na janela
+        self._inicio_lacuna = None
+        self._candidato = None  # ID que pode ser um reinício, esperando a mensagem seguinte
+        self.recebidos = 0
+        self.fora_de_ordem = 0
+        self.duplicados = 0
+        self.atrasados = 0
+        self.perdidos = 0  # IDs que saíram da janela sem chegar
+        self.finalizados = 0  # IDs que já saíram da janela
+        self.total_lacunas = 0
+
+    def registrar(self, id_msg):
+        """Registra o ID de uma mensagem recebida. Retorna a classificação (NOVO, FORA_DE_ORDEM, ...)."""
+        id_msg = int(id_msg) % MODULO_ID
+        if self._maior is None:
+            self._iniciar(id_msg)
+            return self._registrar_sequencia(id_msg)
+        if self._candidato is not None:
+            candidato, self._candidato = self._candidato, None
+            if 0 < (id_msg - candidato) % MODULO_ID <= self.tolerancia_reinicio:
+                self._reiniciar()
+                self._registrar_sequencia(candidato)
+            else:
+                self._registrar_sequencia(self._sequencia(candidato))
+        sequencia = self._sequencia(id_msg)
+        queda = self._maior - sequencia
+        if id_msg < self.tolerancia_reinicio and queda > self.tolerancia_reinicio:
+            self._candidato = id_msg
+            return PENDENTE
+        return self._registrar_sequencia(sequencia)
+
+    def _registrar_sequencia(self, sequencia):
+        if sequencia > self._maior:
+            self._avancar(sequencia)
+            self._marcar(sequencia)
+            return NOVO
+        if sequencia < self._base:
+            self.atrasados += 1
+            return ATRASADO
+        if self._presenca[sequencia % self.janela]:
+            self.duplicados += 1
+            return DUPLICADO
+        self._marcar(sequencia)
+        self.fora_de_ordem += 1
+        return FORA_DE_ORDEM
+
+    def _sequencia(self, id_msg):
+        """Sequência do ID, escolhendo a volta do uint32 mais próxima do maior ID visto."""
+        distancia = (id_msg - self._maior) % MODULO_ID
+        if distancia >= METADE_ID:
+            distancia -= MODULO_ID
+        return self._maior + distancia
+
+    def _iniciar(self, sequencia):
+        self._primeiro = self._base = sequencia
+        self._maior = sequencia - 1
+
+    def _marcar(self, sequencia):
+        self._presenca[sequencia % self.janela] = 1
+        self._presentes += 1
+        self.recebidos += 1
+
+    def _avancar(self, sequencia):
+        self._deslizar(max(self._base, sequencia - self.janela + 1))
+        self._maior = sequencia
+
+    def _deslizar(self, nova_base):
+        """Tira da janela os IDs antes de nova_base, contando os que não chegaram."""
+        # Só os IDs até o maior visto podem estar marcados; os seguintes são somados de uma vez
+        for sequencia in range(self._base, min(nova_base, self._maior + 1)):
+            posicao = sequencia % self.janela
+            if self._presenca[posicao]:
+                self._presenca[posicao] = 0
+                self._presentes -= 1
+                self._fechar_lacuna(sequencia)
+            else:
+                self.perdidos += 1
+                if self._inicio_lacuna is None:
+                    self._inicio_lacuna = sequencia
+        nunca_vistos = nova_base - max(self._base, self._maior + 1)
+        if nunca_vistos > 0:
+            self.perdidos += nunca_vistos
+            if self._inicio_lacuna is None:
+                self._inicio_lacuna = nova_base - nunca_vistos
+        self.finalizados += nova_base - self._base
+        self._base = nova_base
+
+    def _fechar_lacuna(self, fim):
+        if self._inicio_lacuna is None:
+            return
+        self.lacunas.append(Lacuna(self.epoca, self._inicio_lacuna % MODULO_ID, (fim - 1) % MODULO_ID,
+                                   fim - self._inicio_lacuna))
+        self.total_lacunas += 1
+        self._inicio_lacuna = None
+
+    def _reiniciar(self):
+        """Fecha a época atual e começa outra a partir do ID 0 (reinício do transmissor)."""
+        self.finalizar()
+        self.epoca += 1
+        self.reinicios += 1
+        self._iniciar(0)
+
+    def finalizar(self):
+        """Tira todos os IDs da janela, fechando as lacunas abertas (fim da captura)."""
+        if self._maior is None:
+            return
+        if self._candidato is not None:
+            candidato, self._candidato = self._candidato, None
+            self._registrar_sequencia(self._sequencia(candidato))
+        self._deslizar(self._maior + 1)
+        self._fechar_lacuna(self._base)
+
+    def esperados(self):
+        """IDs esperados desde o início (finalizados + os que estão na janela)."""
+        if self._maior is None:
+            return 0
+        return self.finalizados + max(self._maior - self._base + 1, 0)
+
+    def perda_janela(self):
+        """Fração dos IDs da janela atual que não chegaram (ainda)."""
+        if self._maior is None or self._maior < self._base:
+            return 0.0
+        return 1 - self._presentes / (self._maior - self._base + 1)
+
+    def perda_total(self):
+        """Fração dos IDs esperados desde o início que não chegaram."""
+        esperados = self.esperados()
+        if not esperados:
+            return 0.0
+        ausentes_janela = max(self._maior - self._base + 1, 0) - self._presentes
+        return (self.perdidos + ausentes_janela) / esperados
+
+    def resumo(self):
+        return {
+            'recebidos': self.recebidos,
+            'esperados': self.esperados(),
+            'perdidos': self.perdidos,
+            'perda_janela': self.perda_janela(),
+            'perda_total': self.perda_total(),
+            'fora_de_ordem': self.fora_de_ordem,
+            'duplicados': self.duplicados,
+            'atrasados': self.atrasados,
+            'lacunas': self.total_lacunas,
+            'reinicios': self.reinicios,
+        }
+
+
+def imprimir_perdas(rastreador, titulo='Perda de pacotes', max_lacunas=10):
+    resumo = rastreador.resumo()
+    print(f"--- {titulo} ---")
+    print(f"Recebidos: {resumo['recebidos']} de {resumo['esperados']} esperados "
+          f"(perdidos: {resumo['perdidos']}, reinícios do transmissor: {resumo['reinicios']})")
+    print(f"Perda na janela ({rastreador.janela} IDs): {resumo['perda_janela'] * 100:.2f}% | "
+          f"Perda total: {resumo['perda_total'] * 100:.2f}%")
+    print(f"Fora de ordem: {resumo['fora_de_ordem']} | Duplicados: {resumo['duplicados']} | "
+          f"Atrasados: {resumo['atrasados']}")
+    if resumo['lacunas']:
+        ultimas = list(rastreador.lacunas)[-max_lacunas:]
+        print(f"Lacunas: {resumo['lacunas']} (últimas {len(ultimas)}):")
+        for lacuna in ultimas:
+            print(f"  época {lacuna.epoca}: IDs {lacuna.primeiro_id}-{lacuna.ultimo_id} ({lacuna.tamanho})")
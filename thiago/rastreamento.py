@@ -0,0 +1,294 @@
+import argparse
+import itertools
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from relogio_arduino import EstimadorRelogio
+
+# Rastreamento por etapa do caminho de cada mensagem, do Arduino ao bridge do dashboard.
+#
+#   ORIGEM       timestamp do Arduino (relógio do Arduino)
+#   SERIAL       chegada do último byte da linha na serial (leitor_serial.py)
+#   PARSER       fim do parser (pipeline_mqtt.py)
+#   PUBLICACAO   chamada de publish() para um broker (publicacao_mqtt.py)
+#   CONFIRMACAO  on_publish do paho: o broker confirmou (QoS 1/2) ou o pacote saiu (QoS 0)
+#   ENTREGA      on_message no bridge (instante de chegada, antes da fila)
+#   PROCESSADO   fim do processamento da mensagem no bridge (latências, CSV)
+#
+# O mqtt_sender dá a cada amostra um número de rastro, que vai no payload de
+# /registro e /lote (publicacao_mqtt.py) junto com o canal (o número do broker,
+# a partir de 1), e o bridge marca ENTREGA e PROCESSADO com o rastro que recebeu.
+# O formato antigo (/raw e um tópico por campo) não leva rastro.
+#
+# Cada processo grava suas marcas em um arquivo próprio, append-only: cabeçalho de
+# 64 bytes (magic 'CANSATRT', versão, tamanho da marca) e marcas de tamanho fixo
+# (rastro, etapa, canal, instante em ms). As etapas até PARSER são do rastro (canal 0),
+# as seguintes de cada canal. O relatório junta os arquivos dos dois lados:
+#
+#   python rastreamento.py rastros_envio.trace mqtt_dashboard/backend/rastros_bridge.trace
+#
+# e calcula cada trecho entre uma etapa e a anterior no caminho (CONFIRMACAO é um
+# ramo paralelo a ENTREGA, os dois a partir de PUBLICACAO). O trecho Arduino -> serial
+# usa o offset e a deriva do relógio do Arduino estimados por relogio_arduino.py.
+# Os instantes de SERIAL a PROCESSADO são time.time() de cada processo: com o bridge
+# em outro computador, os trechos até o bridge incluem a diferença entre os relógios.
+
+ORIGEM, SERIAL, PARSER, PUBLICACAO, CONFIRMACAO, ENTREGA, PROCESSADO = range(7)
+NOMES_ETAPAS = ['origem', 'serial', 'parser', 'publicacao', 'confirmacao', 'entrega', 'processado']
+# Etapas que pertencem ao rastro e não a um broker
+ETAPAS_COMUNS = (ORIGEM, SERIAL, PARSER)
+
+# Trechos do relatório: (nome, etapa de início, etapa de fim, no caminho até o bridge)
+TRECHOS = [
+    ('Arduino -> serial (rádio)', ORIGEM, SERIAL, True),
+    ('serial -> parser', SERIAL, PARSER, True),
+    ('parser -> publish() (filas e lote)', PARSER, PUBLICACAO, True),
+    ('publish() -> confirmação do broker', PUBLICACAO, CONFIRMACAO, False),
+    ('publish() -> on_message no bridge', PUBLICACAO, ENTREGA, True),
+    ('on_message -> processado no bridge', ENTREGA, PROCESSADO, True),
+]
+
+MAGIC = b'CANSATRT'
+VERSAO = 1
+CABECALHO = struct.Struct('<8sII')
+TAMANHO_CABECALHO = 64
+MARCA = np.dtype([('rastro', '<u8'), ('etapa', 'u1'), ('canal', 'u1'), ('t', '<f8')])
+
+# Marcas acumuladas na memória antes de gravar no arquivo
+MARCAS_POR_DESCARGA = 1000
+# Confirmações guardadas à espera do publish() correspondente. O on_publish também
+# chega para mensagens sem rastro (/raw, tópicos por campo), que nunca são procuradas,
+# então só as mais recentes ficam
+MAX_CONFIRMACOES_PENDENTES = 1000
+
+
+class GravadorRastros:
+    """Acrescenta marcas a um arquivo de rastros. Pode ser usado de várias threads."""
+
+    def __init__(self, caminho, marcas_por_descarga=MARCAS_POR_DESCARGA):
+        self.caminho = caminho
+        self.marcas_por_descarga = marcas_por_descarga
+        novo = not os.path.exists(caminho) or os.path.getsize(caminho) == 0
+        self._arquivo = open(caminho, 'ab')
+        if novo:
+            self._arquivo.write(CABECALHO.pack(MAGIC, VERSAO, MARCA.itemsize).ljust(TAMANHO_CABECALHO, b'\0'))
+        else:
+            _verificar_cabecalho(caminho)
+        self._pendentes = []
+        self._lock = threading.Lock()
+        self.marcas = 0
+
+    def marcar(self, rastro, etapa, t_ms, canal=0):
+        with self._lock:
+            self._pendentes.append((rastro, etapa, canal, t_ms))
+            if len(self._pendentes) >= self.marcas_por_descarga:
+                self._descarregar()
+
+    def _descarregar(self):
+        if not self._pendentes:
+            return
+        np.array(self._pendentes, dtype=MARCA).tofile(self._arquivo)
+        self._arquivo.flush()
+        self.marcas += len(self._pendentes)
+        self._pendentes = []
+
+    def descarregar(self):
+        with self._lock:
+            self._descarregar()
+
+    def fechar(self):
+        with self._lock:
+            self._descarregar()
+            self._arquivo.close()
+
+
+def _verificar_cabecalho(caminho):
+    with open(caminho, 'rb') as arquivo:
+        magic, versao, tamanho = CABECALHO.unpack(arquivo.read(CABECALHO.size))
+    if magic != MAGIC or versao != VERSAO or tamanho != MARCA.itemsize:
+        raise ValueError(f"{caminho} não é um arquivo de rastros compatível")
+
+
+class Rastreamento:
+    """
+    Rastros de um processo: gera os números de rastro (1 a cada 'amostragem' amostras)
+    e liga cada publish() à sua confirmação pelo mid do paho.
+    """
+
+    def __init__(self, caminho, amostragem=1, relogio=time.time):
+        self.gravador = GravadorRastros(caminho)
+        self.amostragem = max(1, amostragem)
+        self.relogio = relogio
+        # Rastros únicos entre execuções: segundos do início nos 32 bits altos
+        self._base = int(relogio()) << 32
+        self._contador = itertools.count()
+        self._lock = threading.Lock()
+        # (canal, mid) -> rastros publicados ainda sem confirmação, e confirmações que
+        # chegaram antes de publish() retornar o mid
+        self._aguardando = {}
+        self._confirmados = {}
+
+    def agora(self):
+        return self.relogio() * 1000
+
+    def novo_rastro(self):
+        """Número de rastro para a próxima amostra, ou None se ela não for amostrada."""
+        numero = next(self._contador)
+        if numero % self.amostragem:
+            return None
+        return self._base | (numero & 0xFFFFFFFF)
+
+    def marcar(self, rastro, etapa, t_ms=None, canal=0):
+        if rastro is None:
+            return
+        self.gravador.marcar(rastro, etapa, self.agora() if t_ms is None else t_ms, canal)
+
+    def publicado(self, canal, mid, rastros, t_ms):
+        """Marca PUBLICACAO dos rastros de uma mensagem e espera a confirmação do mid."""
+        rastros = [rastro for rastro in rastros if rastro is not None]
+        for rastro in rastros:
+            self.gravador.marcar(rastro, PUBLICACAO, t_ms, canal)
+        if mid is None or not rastros:
+            return
+        with self._lock:
+            confirmacao = self._confirmados.pop((canal, mid), None)
+            if confirmacao is None:
+                self._aguardando[(canal, mid)] = rastros
+        if confirmacao is not None:
+            for rastro in rastros:
+                self.gravador.marcar(rastro, CONFIRMACAO, confirmacao, canal)
+
+    def callback_confirmacao(self, canal):
+        """Função para client.on_publish do cliente paho do canal."""
+        def on_publish(client, userdata, mid):
+            t_ms = self.agora()
+            with self._lock:
+                rastros = self._aguardando.pop((canal, mid), None)
+                if rastros is None:
+                    self._confirmados[(canal, mid)] = t_ms
+                    if len(self._confirmados) > MAX_CONFIRMACOES_PENDENTES:
+                        del self._confirmados[next(iter(self._confirmados))]
+            for rastro in rastros or ():
+                self.gravador.marcar(rastro, CONFIRMACAO, t_ms, canal)
+        return on_publish
+
+    def fechar(self):
+        self.gravador.fechar()
+
+
+def carregar_marcas(arquivos):
+    """Marcas de um ou mais arquivos de rastros, concatenadas."""
+    partes = []
+    for caminho in arquivos:
+        _verificar_cabecalho(caminho)
+        partes.append(np.fromfile(caminho, dtype=MARCA, offset=TAMANHO_CABECALHO))
+    return np.concatenate(partes) if partes else np.empty(0, dtype=MARCA)
+
+
+def tempos_por_caminho(marcas):
+    """
+    Um caminho por (rastro, canal) publicado. Retorna (rastros, canais, tempos), com
+    tempos[i, etapa] em ms (NaN se a etapa não foi marcada; a primeira marca vale).
+    """
+    publicacoes = marcas[marcas['etapa'] == PUBLICACAO]
+    rastros_unicos, indices = np.unique(marcas['rastro'], return_inverse=True)
+    # Chave densa (índice do rastro, canal) para busca binária
+    chaves = indices.astype(np.int64) * 256 + marcas['canal']
+    chaves_caminho = np.searchsorted(rastros_unicos, publicacoes['rastro']).astype(np.int64) * 256
+    chaves_caminho, primeiras = np.unique(chaves_caminho + publicacoes['canal'], return_index=True)
+    rastros = publicacoes['rastro'][primeiras]
+    canais = publicacoes['canal'][primeiras]
+    tempos = np.full((len(chaves_caminho), len(NOMES_ETAPAS)), np.nan)
+    for etapa in range(len(NOMES_ETAPAS)):
+        selecao = marcas['etapa'] == etapa
+        chaves_etapa, primeiras = np.unique(chaves[selecao], return_index=True)
+        if not len(chaves_etapa):
+            continue
+        t_etapa = marcas['t'][selecao][primeiras]
+        procuradas = chaves_caminho - canais if etapa in ETAPAS_COMUNS else chaves_caminho
+        posicoes = np.minimum(np.searchsorted(chaves_etapa, procuradas), len(chaves_etapa) - 1)
+        achadas = chaves_etapa[posicoes] == procuradas
+        tempos[achadas, etapa] = t_etapa[posicoes[achadas]]
+    return rastros, canais, tempos
+
+
+def duracoes_trechos(rastros, tempos):
+    """Duração (ms) de cada trecho de TRECHOS por caminho; o trecho do rádio corrige o relógio do Arduino."""
+    duracoes = np.full((len(tempos), len(TRECHOS)), np.nan)
+    for numero, (_, inicio, fim, _) in enumerate(TRECHOS):
+        duracoes[:, numero] = tempos[:, fim] - tempos[:, inicio]
+    # Arduino -> serial: uma vez por rastro, na ordem de chegada na serial
+    com_origem = np.flatnonzero(np.isfinite(tempos[:, ORIGEM]) & np.isfinite(tempos[:, SERIAL]))
+    _, unicos = np.unique(rastros[com_origem], return_index=True)
+    unicos = com_origem[unicos]
+    unicos = unicos[np.argsort(tempos[unicos, SERIAL], kind='stable')]
+    if len(unicos):
+        latencias = EstimadorRelogio().latencias(tempos[unicos, ORIGEM], tempos[unicos, SERIAL])
+        por_rastro = dict(zip(rastros[unicos].tolist(), latencias.tolist()))
+        duracoes[com_origem, 0] = [por_rastro[rastro] for rastro in rastros[com_origem].tolist()]
+    return duracoes
+
+
+def _linha_relatorio(nome, valores):
+    p50, p90, p99 = np.percentile(valores, [50, 90, 99])
+    return (f"{nome:<38}{len(valores):>8}{valores.mean():>10.2f}{p50:>10.2f}{p90:>10.2f}"
+            f"{p99:>10.2f}{valores.max():>10.2f}")
+
+
+def imprimir_relatorio(marcas, maiores=10):
+    """Latência por trecho (média, quantis, parcela do total) e as mensagens mais lentas."""
+    rastros, canais, tempos = tempos_por_caminho(marcas)
+    if not len(rastros):
+        print("Nenhuma publicação rastreada")
+        return
+    duracoes = duracoes_trechos(rastros, tempos)
+    no_caminho = np.array([caminho for *_, caminho in TRECHOS])
+    total = np.where(np.isfinite(duracoes[:, no_caminho]), duracoes[:, no_caminho], 0).sum(axis=1)
+    completos = np.isfinite(duracoes[:, no_caminho]).all(axis=1)
+
+    print(f"\nRastros: {len(np.unique(rastros))} mensagens, {len(rastros)} caminhos "
+          f"(canais: {', '.join(str(canal) for canal in np.unique(canais))}), "
+          f"{int(completos.sum())} completos até o bridge")
+    for canal in np.unique(canais):
+        do_canal = canais == canal
+        completos_canal = do_canal & completos
+        # Parcela de cada trecho do caminho na média do total, só com os caminhos completos
+        medias = np.full(len(TRECHOS), np.nan)
+        if completos_canal.any():
+            medias[no_caminho] = duracoes[completos_canal][:, no_caminho].mean(axis=0)
+        soma_medias = np.nansum(medias)
+        print(f"\n--- Canal {canal} ---")
+        print(f"{'Trecho':<38}{'n':>8}{'média':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'máx':>10}{'% total':>9}")
+        for numero, (nome, *_) in enumerate(TRECHOS):
+            valores = duracoes[do_canal, numero]
+            valores = valores[np.isfinite(valores)]
+            if not len(valores):
+                print(f"{nome:<38}{0:>8}")
+                continue
+            parcela = f"{medias[numero] / soma_medias * 100:>8.1f}%" if np.isfinite(medias[numero]) and soma_medias else ''
+            print(_linha_relatorio(nome, valores) + f"{parcela:>9}")
+        if completos_canal.any():
+            print(_linha_relatorio('Total até o bridge', total[completos_canal]))
+
+    # Mensagens mais lentas e o trecho que mais pesou em cada uma
+    indices = np.flatnonzero(completos)
+    if len(indices):
+        indices = indices[np.argsort(total[indices])[::-1][:maiores]]
+        print(f"\nMaiores latências ({len(indices)}):")
+        for indice in indices:
+            parcial = np.where(no_caminho, duracoes[indice], -np.inf)
+            pior = int(np.argmax(parcial))
+            print(f"  rastro {rastros[indice]:#x} canal {canais[indice]}: {total[indice]:.2f} ms, "
+                  f"maior trecho: {TRECHOS[pior][0]} ({duracoes[indice, pior]:.2f} ms)")
+
+
+if __name__ == '__main__':
+    argumentos = argparse.ArgumentParser(description='Latência por trecho a partir dos arquivos de rastros')
+    argumentos.add_argument('arquivos', nargs='+', help='arquivos .trace do mqtt_sender e do bridge')
+    argumentos.add_argument('--maiores', type=int, default=10, help='mensagens mais lentas a listar')
+    opcoes = argumentos.parse_args()
+    imprimir_relatorio(carregar_marcas(opcoes.arquivos), opcoes.maiores)
@@ -0,0 +1,211 @@
+import collections
+import math
+
+import numpy as np
+
+# Estimativa contínua do offset e da deriva entre o relógio do Arduino (millis(),
+# o timestamp de cada registro) e o relógio do computador que recebe a mensagem.
+#
+# Para cada mensagem, diferença = chegada no computador - timestamp do Arduino
+# = offset(t) + atraso, com atraso >= 0. O offset muda devagar com a deriva do
+# cristal do Arduino, então é modelado como uma reta offset(t) = a + b·t, e a reta
+# é o envelope inferior das diferenças: as mensagens mais rápidas ficam em cima
+# dela e a latência de cada mensagem é a distância até ela (atraso acima do menor
+# atraso observado; o atraso absoluto não é mensurável sem relógios sincronizados).
+#
+#   - as diferenças são agrupadas em baldes de LARGURA_BALDE_MS do relógio do Arduino,
+#     e de cada balde só fica o ponto de menor diferença
+#   - quando um balde fecha, a reta é reajustada com os mínimos dos últimos NUM_BALDES
+#     baldes: envelope convexo inferior e, dele, a aresta que cobre a média dos
+#     instantes, que é a reta abaixo de todos os pontos com a menor distância total
+#     a eles (estimador de deriva por programação linear de Moon et al.)
+#   - entre dois ajustes, uma mensagem abaixo da reta a desloca para baixo até o
+#     próximo ajuste, então a latência nunca fica negativa
+#
+# Cada mensagem custa O(1) (o ajuste, O(NUM_BALDES), só roda uma vez por balde),
+# sem fase de calibração: a primeira mensagem já define o offset, com deriva zero
+# até haver MIN_BALDES_DERIVA baldes (com poucos minutos, o jitter do atraso pesa
+# mais que a deriva na inclinação da reta; deriva_confiavel indica quando a
+# estimativa já pode ser reportada). Um recuo do timestamp maior que
+# TOLERANCIA_REINICIO_MS é um reinício do Arduino e recomeça a estimativa.
+#
+# latencias() aplica o mesmo estimador a arrays inteiros (análises em lote), com
+# exatamente o mesmo resultado de chamar registrar() mensagem por mensagem.
+
+LARGURA_BALDE_MS = 10000
+NUM_BALDES = 60  # 10 minutos de histórico para a reta
+MIN_BALDES_DERIVA = 30  # 5 minutos antes de estimar a deriva
+# Deriva máxima aceita (500 ppm, bem acima de um cristal, que fica em dezenas de ppm)
+LIMITE_DERIVA = 500e-6
+TOLERANCIA_REINICIO_MS = 10000
+
+
+def _envelope_inferior(pontos):
+    """Envelope convexo inferior (cadeia monótona) de pontos (x, y) ordenados por x."""
+    envelope = []
+    for ponto in pontos:
+        while len(envelope) >= 2:
+            (x1, y1), (x2, y2) = envelope[-2], envelope[-1]
+            # Remove o ponto do meio se ele não fica abaixo do segmento até o novo ponto
+            if (x2 - x1) * (ponto[1] - y1) - (y2 - y1) * (ponto[0] - x1) <= 0:
+                envelope.pop()
+            else:
+                break
+        envelope.append(ponto)
+    return envelope
+
+
+def ajustar_envelope(pontos, limite_deriva=LIMITE_DERIVA):
+    """
+    Reta (a, b) abaixo de todos os pontos (x, y) que minimiza a soma das distâncias
+    verticais até eles: a aresta do envelope inferior que contém a média dos x.
+    """
+    pontos = sorted(pontos)
+    if len(pontos) == 1 or pontos[0][0] == pontos[-1][0]:
+        return min(y for _, y in pontos), 0.0
+    envelope = _envelope_inferior(pontos)
+    media_x = sum(x for x, _ in pontos) / len(pontos)
+    for (x1, y1), (x2, y2) in zip(envelope, envelope[1:]):
+        if x2 >= media_x:
+            break
+    b = (y2 - y1) / (x2 - x1)
+    if abs(b) > limite_deriva:
+        b = math.copysign(limite_deriva, b)
+    # Com a inclinação limitada, a reta desce até tocar o ponto mais baixo
+    return min(y - b * x for x, y in pontos), b
+
+
+class EstimadorRelogio:
+    """Offset e deriva do relógio do Arduino em relação ao computador, atualizados a cada mensagem."""
+
+    def __init__(self, largura_balde_ms=LARGURA_BALDE_MS, num_baldes=NUM_BALDES,
+                 min_baldes_deriva=MIN_BALDES_DERIVA, limite_deriva=LIMITE_DERIVA,
+                 tolerancia_reinicio_ms=TOLERANCIA_REINICIO_MS):
+        self.largura_balde_ms = largura_balde_ms
+        self.min_baldes_deriva = min_baldes_deriva
+        self.limite_deriva = limite_deriva
+        self.tolerancia_reinicio_ms = tolerancia_reinicio_ms
+        self._minimos = collections.deque(maxlen=num_baldes)
+        self.reinicios = 0
+        self.amostras = 0
+        self._limpar()
+
+    def _limpar(self):
+        self._minimos.clear()
+        self._origem = None  # Timestamp da primeira mensagem; x da reta é relativo a ele
+        self._balde = None
+        self._minimo_balde = None  # (x, diferença) de menor diferença no balde atual
+        self._a = 0.0
+        self._b = 0.0
+        self._ajuste = 0.0  # Deslocamento para baixo desde o último ajuste da reta
+        self._ultimo_ts = None
+
+    def reiniciar(self):
+        """Descarta a estimativa (o Arduino reiniciou e o millis() voltou a zero)."""
+        self._limpar()
+        self.reinicios += 1
+
+    def _preparar(self, timestamp, diferenca):
+        """Reinício, primeira mensagem ou mudança de balde, antes de registrar a mensagem."""
+        if self._ultimo_ts is not None and timestamp < self._ultimo_ts - self.tolerancia_reinicio_ms:
+            self.reiniciar()
+        balde = timestamp // self.largura_balde_ms
+        if self._balde is None:
+            self._origem = timestamp
+            self._balde = balde
+            self._a = diferenca
+        elif balde > self._balde:
+            self._fechar_balde()
+            self._balde = balde
+
+    def _fechar_balde(self):
+        self._minimos.append(self._minimo_balde)
+        self._minimo_balde = None
+        if len(self._minimos) >= self.min_baldes_deriva:
+            self._a, self._b = ajustar_envelope(self._minimos, self.limite_deriva)
+        else:
+            self._a, self._b = min(y for _, y in self._minimos), 0.0
+        self._ajuste = 0.0
+
+    def _atualizar_minimo(self, x, diferenca):
+        if self._minimo_balde is None or diferenca < self._minimo_balde[1]:
+            self._minimo_balde = (x, diferenca)
+
+    def registrar(self, timestamp_arduino, recepcao_ms):
+        """
+        Registra uma mensagem (timestamp do Arduino e instante de chegada no computador,
+        ambos em ms) e retorna sua latência em ms, com o relógio do Arduino corrigido.
+        """
+        diferenca = recepcao_ms - timestamp_arduino
+        self._preparar(timestamp_arduino, diferenca)
+        x = timestamp_arduino - self._origem
+        self._atualizar_minimo(x, diferenca)
+        residuo = diferenca - (self._a + self._b * x)
+        if residuo < self._ajuste:
+            self._ajuste = residuo
+        self._ultimo_ts = timestamp_arduino
+        self.amostras += 1
+        return residuo - self._ajuste
+
+    def latencias(self, timestamps_arduino, recepcao_ms):
+        """registrar() aplicado a arrays inteiros, um trecho vetorizado por balde."""
+        timestamps = np.asarray(timestamps_arduino, dtype=np.float64)
+        diferencas = np.asarray(recepcao_ms, dtype=np.float64) - timestamps
+        resultado = np.empty(len(timestamps))
+        if not len(timestamps):
+            return resultado
+        for inicio, fim in self._trechos(timestamps):
+            trecho_ts, trecho_dif = timestamps[inicio:fim], diferencas[inicio:fim]
+            self._preparar(trecho_ts[0], trecho_dif[0])
+            x = trecho_ts - self._origem
+            menor = int(np.argmin(trecho_dif))
+            self._atualizar_minimo(float(x[menor]), float(trecho_dif[menor]))
+            residuos = trecho_dif - (self._a + self._b * x)
+            ajustes = np.minimum(np.minimum.accumulate(residuos), self._ajuste)
+            resultado[inicio:fim] = residuos - ajustes
+            self._ajuste = float(ajustes[-1])
+            self._ultimo_ts = float(trecho_ts[-1])
+        self.amostras += len(timestamps)
+        return resultado
+
+    def _trechos(self, timestamps):
+        """Intervalos [início, fim) em que não há reinício nem mudança de balde depois da primeira mensagem."""
+        anteriores = np.r_[self._ultimo_ts if self._ultimo_ts is not None else -np.inf, timestamps[:-1]]
+        reinicios = np.flatnonzero(timestamps < anteriores - self.tolerancia_reinicio_ms)
+        baldes = timestamps // self.largura_balde_ms
+        limites_epocas = np.r_[0, reinicios, len(timestamps)]
+        inicios = []
+        for numero, (inicio, fim) in enumerate(zip(limites_epocas[:-1], limites_epocas[1:])):
+            if inicio == fim:
+                continue
+            # Maior balde visto antes de cada mensagem, dentro da mesma época
+            inicial = self._balde if numero == 0 and self._balde is not None else -np.inf
+            maiores = np.maximum.accumulate(np.r_[inicial, baldes[inicio:fim - 1]])
+            inicios.append(inicio)
+            inicios.extend((np.flatnonzero(baldes[inicio:fim] > maiores) + inicio).tolist())
+        limites = np.r_[sorted(set(inicios)), len(timestamps)]
+        return zip(limites[:-1].tolist(), limites[1:].tolist())
+
+    def offset(self, timestamp_arduino=None):
+        """Offset estimado (ms) no instante dado do Arduino (padrão: a última mensagem)."""
+        if self._origem is None:
+            return None
+        timestamp = self._ultimo_ts if timestamp_arduino is None else timestamp_arduino
+        return self._a + self._b * (timestamp - self._origem) + self._ajuste
+
+    @property
+    def deriva(self):
+        """Deriva estimada do relógio do Arduino (ms por ms; multiplicar por 1e6 para ppm)."""
+        return self._b
+
+    @property
+    def deriva_confiavel(self):
+        """Se a deriva já foi ajustada com MIN_BALDES_DERIVA baldes (antes disso ela fica em zero)."""
+        return len(self._minimos) >= self.min_baldes_deriva
+
+    def descrever_deriva(self):
+        """Deriva em ppm para os relatórios, ou o aviso de que ainda não há dados para estimá-la."""
+        if self.deriva_confiavel:
+            return f"{self._b * 1e6:.1f} ppm"
+        minutos = self.min_baldes_deriva * self.largura_balde_ms / 60000
+        return f"não confiável (menos de {minutos:g} min de dados desde o último reinício)"
@@ -0,0 +1,222 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib import cbook
+
+# Camada de desenho dos gráficos das análises.
+#
+# Séries longas são reduzidas antes de desenhar: LTTB (Largest-Triangle-Three-Buckets,
+# que mantém os picos e a forma da curva) ou envelope mínimo/máximo por balde, com até
+# LIMITE_PONTOS pontos, e os marcadores só são desenhados em séries curtas. Histogramas
+# e boxplots são calculados antes (contagens e quartis) e só o resultado é desenhado.
+#
+# Cada script descreve suas figuras como tarefas (função que monta a figura, argumentos,
+# arquivo PNG) e chama renderizar():
+#   - com janela (backend interativo): desenha no processo e abre as janelas no final,
+#     como o plt.show() de antes
+#   - sem janela (--sem-janela, CANSAT_SEM_JANELA=1, MPLBACKEND=Agg ou sem display):
+#     backend Agg, cada figura desenhada e salva em um processo separado, sem bloquear
+#
+# Os argumentos das tarefas vão por pickle para os processos, então os scripts passam
+# objetos já reduzidos (Serie, Histograma, Caixas), não as capturas inteiras.
+
+# Pontos por série depois da redução
+LIMITE_PONTOS = 4000
+# Séries com mais amostras que isso são desenhadas sem marcadores
+LIMITE_MARCADORES = 500
+DPI = 100
+
+_BACKENDS_SEM_JANELA = {'agg', 'pdf', 'ps', 'svg', 'pgf', 'cairo', 'template'}
+
+SEM_JANELA = '--sem-janela' in sys.argv or os.environ.get('CANSAT_SEM_JANELA') == '1'
+if SEM_JANELA:
+    plt.switch_backend('Agg')
+
+
+def janela_disponivel():
+    """True se os gráficos podem ser mostrados em janela (backend interativo e sem --sem-janela)."""
+    return not SEM_JANELA and matplotlib.get_backend().lower() not in _BACKENDS_SEM_JANELA
+
+
+def lttb(x, y, n_pontos):
+    """
+    Índices dos pontos escolhidos pelo LTTB: o primeiro, o último e, em cada um dos
+    n_pontos - 2 baldes, o ponto que forma o maior triângulo com o ponto escolhido no
+    balde anterior e a média do balde seguinte.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_pontos >= n or n_pontos < 3:
+        return np.arange(n)
+    limites = np.linspace(1, n - 1, n_pontos - 1).astype(np.int64)
+    # Somas acumuladas para a média de qualquer balde em O(1)
+    soma_x = np.r_[0.0, np.cumsum(x)]
+    soma_y = np.r_[0.0, np.cumsum(y)]
+    indices = np.empty(n_pontos, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    anterior = 0
+    for i in range(n_pontos - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        if i + 2 < len(limites):
+            proximo_inicio, proximo_fim = limites[i + 1], limites[i + 2]
+            tamanho = proximo_fim - proximo_inicio
+            media_x = (soma_x[proximo_fim] - soma_x[proximo_inicio]) / tamanho
+            media_y = (soma_y[proximo_fim] - soma_y[proximo_inicio]) / tamanho
+        else:
+            media_x, media_y = x[-1], y[-1]
+        xa, ya = x[anterior], y[anterior]
+        areas = np.abs((xa - media_x) * (y[inicio:fim] - ya) - (xa - x[inicio:fim]) * (media_y - ya))
+        anterior = inicio + int(np.argmax(areas))
+        indices[i + 1] = anterior
+    return indices
+
+
+def envelope(y, n_baldes):
+    """Índices (ordenados) do mínimo e do máximo de cada balde, mais o primeiro e o último ponto."""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if 2 * n_baldes + 2 >= n:
+        return np.arange(n)
+    tamanho = n // n_baldes
+    completos = y[:tamanho * n_baldes].reshape(n_baldes, tamanho)
+    deslocamentos = np.arange(n_baldes) * tamanho
+    escolhidos = [deslocamentos + completos.argmin(axis=1), deslocamentos + completos.argmax(axis=1), [0, n - 1]]
+    if tamanho * n_baldes < n:
+        resto = y[tamanho * n_baldes:]
+        escolhidos.append([tamanho * n_baldes + int(resto.argmin()), tamanho * n_baldes + int(resto.argmax())])
+    return np.unique(np.concatenate(escolhidos).astype(np.int64))
+
+
+def reduzir(x, y, limite=LIMITE_PONTOS, metodo='lttb'):
+    """(x, y) com no máximo 'limite' pontos, sem NaN. metodo: 'lttb' ou 'envelope'."""
+    x = np.arange(len(y)) if x is None else np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    validos = np.isfinite(y)
+    if not validos.all():
+        x, y = x[validos], y[validos]
+    if len(y) <= limite:
+        return x, y
+    indices = lttb(x, y, limite) if metodo == 'lttb' else envelope(y, limite // 2 - 1)
+    return x[indices], y[indices]
+
+
+class Serie:
+    """Série pronta para desenhar: reduzida na criação, guarda quantas amostras tinha."""
+
+    def __init__(self, x, y, limite=LIMITE_PONTOS, metodo='lttb'):
+        self.n = len(y)
+        self.x, self.y = reduzir(x, y, limite, metodo)
+
+    def plotar(self, ax, fmt='-', marker=None, **kwargs):
+        """ax.plot da série; o marcador só aparece se a série original for curta."""
+        if marker is not None and self.n <= LIMITE_MARCADORES:
+            kwargs['marker'] = marker
+        return ax.plot(self.x, self.y, fmt, **kwargs)
+
+
+class Histograma:
+    """Contagens de um histograma (np.histogram), desenhadas sem precisar dos valores."""
+
+    def __init__(self, valores, bins=30, intervalo=None):
+        valores = np.asarray(valores, dtype=np.float64)
+        valores = valores[np.isfinite(valores)]
+        self.contagens, self.bordas = np.histogram(valores, bins=bins, range=intervalo)
+
+    def plotar(self, ax, **kwargs):
+        return ax.hist(self.bordas[:-1], bins=self.bordas, weights=self.contagens, **kwargs)
+
+
+class Caixas:
+    """Quartis e outliers de um ou mais boxplots (cbook.boxplot_stats), desenhados com ax.bxp."""
+
+    def __init__(self, series, rotulos=None, limite_outliers=LIMITE_PONTOS):
+        series = [np.asarray(serie, dtype=np.float64) for serie in series]
+        self.estatisticas = cbook.boxplot_stats([serie[np.isfinite(serie)] for serie in series], labels=rotulos)
+        for estatistica in self.estatisticas:
+            # Só os outliers extremos de cada lado quando há muitos
+            outliers = np.sort(estatistica['fliers'])
+            if len(outliers) > limite_outliers:
+                metade = limite_outliers // 2
+                estatistica['fliers'] = np.r_[outliers[:metade], outliers[-metade:]]
+
+    def plotar(self, ax, **kwargs):
+        return ax.bxp(self.estatisticas, **kwargs)
+
+
+def _iniciar_processo():
+    plt.switch_backend('Agg')
+
+
+def _desenhar(funcao, argumentos, arquivo_png, dpi):
+    figura = funcao(*argumentos)
+    figura.savefig(arquivo_png, dpi=dpi)
+    plt.close(figura)
+    return arquivo_png
+
+
+def renderizar(tarefas, processos=None, mostrar=None, dpi=DPI):
+    """
+    Desenha as figuras. tarefas: lista de (funcao, argumentos, arquivo_png), em que
+    funcao(*argumentos) monta e retorna uma Figure (funções de módulo, para o pickle).
+    Com janela, desenha tudo aqui e chama plt.show(); sem janela, salva os PNGs em
+    paralelo ('processos', padrão um por figura até o número de núcleos).
+    Retorna os arquivos gerados.
+    """
+    mostrar = janela_disponivel() if mostrar is None else mostrar
+    if mostrar:
+        arquivos = []
+        for funcao, argumentos, arquivo_png in tarefas:
+            figura = funcao(*argumentos)
+            figura.savefig(arquivo_png, dpi=dpi)
+            arquivos.append(arquivo_png)
+        plt.show()
+        return arquivos
+    processos = processos or min(len(tarefas), os.cpu_count() or 1)
+    if processos <= 1 or len(tarefas) <= 1:
+        return [_desenhar(funcao, argumentos, arquivo_png, dpi) for funcao, argumentos, arquivo_png in tarefas]
+    with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo) as executor:
+        futuros = [executor.submit(_desenhar, funcao, argumentos, arquivo_png, dpi)
+                   for funcao, argumentos, arquivo_png in tarefas]
+        return [futuro.result() for futuro in futuros]
+
+
+# Figuras usadas por mais de um script
+
+def figura_latencias(series, titulo='Comparação de Latências: Rádio vs MQTT'):
+    """Linhas de latência por amostra. series: lista de (Serie, formato, rótulo)."""
+    figura, ax = plt.subplots(figsize=(12, 8))
+    for serie, formato, rotulo in series:
+        serie.plotar(ax, formato, label=rotulo)
+    ax.set_title(titulo)
+    ax.set_xlabel('Número da amostra')
+    ax.set_ylabel('Latência (ms)')
+    ax.grid(True)
+    ax.legend()
+    return figura
+
+
+def desenhar_medias(ax, meios, medias, limite=None, cores=('blue', 'red', 'green')):
+    """Barras das latências médias com o valor escrito em cima de cada barra."""
+    barras = ax.bar(meios, medias, color=list(cores[:len(meios)]))
+    folga = limite * 0.02 if limite else 1
+    if limite:
+        ax.set_ylim(0, limite)
+    for barra in barras:
+        altura = barra.get_height()
+        ax.text(barra.get_x() + barra.get_width() / 2., altura + folga, f'{altura:.2f} ms',
+                ha='center', va='bottom')
+    ax.set_title('Latência Média por Meio de Transmissão')
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    return barras
+
+
+def figura_medias(meios, medias, limite=None):
+    figura, ax = plt.subplots(figsize=(10, 6))
+    desenhar_medias(ax, meios, medias, limite)
+    ax.set_ylabel('Latência Média (ms)')
+    return figura
@@ -1,6 +1,8 @@
 import paho.mqtt.client as mqtt
 import time
-import csv
+from gravador_csv import GravadorCSV
+from armazenamento_colunar import GravadorColunar, pasta_colunar
+from parser_telemetria import extrair_registro
 
 # Configurações do broker MQTT
 BROKER = 'localhost'
@@ -9,9 +11,13 @@ TOPIC = 'cansat/estacao/teste1/raw'  # Use o mesmo tópico do seu publisher
 
 destino_csv = 'dados_mqtt.csv'
 
-with open(destino_csv, 'w', newline='') as f:
-    writer = csv.writer(f)
-    writer.writerow(['timestamp', 'valor'])  # Cabeçalho
+# Descarrega a cada N linhas ou T ms (o que vier primeiro)
+LINHAS_POR_FLUSH = 50
+INTERVALO_FLUSH_MS = 1000
+
+# A pasta colunar fecha depois do CSV, para registrar o tamanho final dele
+with GravadorColunar(pasta_colunar(destino_csv), recriar=True, csv_origem=destino_csv) as colunar, \
+        GravadorCSV(destino_csv, ['timestamp', 'valor'], LINHAS_POR_FLUSH, INTERVALO_FLUSH_MS, modo='w') as gravador:
 
     def on_connect(client, userdata, flags, rc):
         print('Conectado ao broker MQTT')
@@ -21,15 +27,23 @@ with open(destino_csv, 'w', newline='') as f:
         t = time.time()
         valor = msg.payload.decode()
         print(f'{t:.3f}, {valor}')
-        writer.writerow([t, valor])
-        f.flush()
+        gravador.escrever([t, valor])
+        colunar.escrever(extrair_registro(valor), t)
 
     client = mqtt.Client()
     client.on_connect = on_connect
     client.on_message = on_message
     client.connect(BROKER, PORT, 60)
     print(f'Inscrito no tópico {TOPIC} e salvando em {destino_csv}...')
+    client.loop_start()
     try:
-        client.loop_forever()
+        # A rede roda na thread do paho; aqui só vence a janela de descarga quando não chegam mensagens
+        while True:
+            time.sleep(INTERVALO_FLUSH_MS / 1000)
+            gravador.verificar()
+            colunar.verificar()
     except KeyboardInterrupt:
         print('Encerrando...')
+    finally:
+        client.loop_stop()
+        client.disconnect()
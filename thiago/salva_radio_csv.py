@@ -1,29 +1,50 @@
+import os
 import serial
-import time
-import csv
+from leitor_serial import LeitorSerial
+from gravador_csv import GravadorCSV
+from armazenamento_colunar import GravadorColunar, pasta_colunar
+from parser_telemetria import extrair_registro
 
 # Configuração da porta serial (ajuste conforme necessário)
-SERIAL_PORT = 'COM3'  # Altere para a porta correta do seu receptor
+# CANSAT_PORTA_SERIAL substitui a porta (ex.: o pty do simulador_serial.py)
+SERIAL_PORT = os.environ.get('CANSAT_PORTA_SERIAL', 'COM3')  # Altere para a porta correta do seu receptor
 BAUDRATE = 9600
 
 # Nome do arquivo CSV de saída
 destino_csv = 'dados_radio.csv'
 
-with open(destino_csv, 'w', newline='') as f:
-    writer = csv.writer(f)
-    writer.writerow(['timestamp', 'valor'])  # Cabeçalho
+# Janela de gravação: descarrega a cada N linhas ou T ms (o que vier primeiro)
+LINHAS_POR_FLUSH = 50
+INTERVALO_FLUSH_MS = 1000
+FSYNC = 'nunca'  # 'nunca', 'descarga' ou 'rotacao'
+# Rotação opcional dos arquivos (None desativa)
+TAMANHO_MAX_BYTES = None
+INTERVALO_ROTACAO_S = None
+
+# A pasta colunar fecha depois do CSV, para registrar o tamanho final dele
+with GravadorColunar(pasta_colunar(destino_csv), recriar=True, csv_origem=destino_csv) as colunar, \
+        GravadorCSV(destino_csv, ['timestamp', 'valor'], LINHAS_POR_FLUSH, INTERVALO_FLUSH_MS, FSYNC,
+                    TAMANHO_MAX_BYTES, INTERVALO_ROTACAO_S, modo='w') as gravador:
     ser = serial.Serial(SERIAL_PORT, BAUDRATE, timeout=1)
+    # Aceita linhas de texto e frames binários; frames são salvos como a linha de texto equivalente
+    leitor = LeitorSerial(ser).iniciar()
     print(f'Lendo dados do receptor em {SERIAL_PORT} e salvando em {destino_csv}...')
     try:
         while True:
-            linha = ser.readline().decode(errors='ignore').strip()
-            if not linha:
+            espera = gravador.tempo_para_descarga()
+            chegada = leitor.ler_linha(timeout=1 if espera is None else espera)
+            if chegada is None:
+                if not leitor.ativo():
+                    break
+                gravador.verificar()
+                colunar.verificar()
                 continue
-            t = time.time()
+            t, linha, registro = chegada
             print(f'{t:.3f}, {linha}')
-            writer.writerow([t, linha])
-            f.flush()
+            gravador.escrever([t, linha])
+            colunar.escrever(registro or extrair_registro(linha), t)
     except KeyboardInterrupt:
         print('Encerrando...')
     finally:
+        leitor.parar()
         ser.close()
@@ -0,0 +1,375 @@
+import argparse
+import errno
+import os
+import random
+import select
+import threading
+import time
+
+from frame_binario import codificar_frame
+from parser_telemetria import SEPARADOR_CAMPOS, Registro, formatar_linha
+
+# Simulador do receptor sem hardware: cria um pseudo-terminal (pty) e escreve nele as
+# linhas no formato do receptor (receptor/receptor.ino), na taxa pedida. Os scripts de
+# captura abrem o lado escravo como se fosse a porta do Arduino:
+#   python simulador_serial.py --taxa 2000 --perda 0.01
+#   CANSAT_PORTA_SERIAL=/dev/pts/5 python mqtt_sender.py
+#
+# A mensagem k é enviada pelo transmissor no instante k/taxa, com Timestamp = millis()
+# do transmissor (com deriva opcional), e impressa pelo receptor depois da latência do
+# rádio: LATENCIA_BASE_MS + jitter uniforme até JITTER_MS + latência artificial. A ordem
+# de impressão é a de envio, a não ser pelas falhas simuladas:
+#   - perda: a mensagem não é impressa (o ID é consumido)
+#   - reordenação: a mensagem fica retida e sai depois de 1 a DISTANCIA_REORDENACAO seguintes
+#   - lixo: bytes aleatórios (sem '\n') antes da linha, que chega corrompida
+#   - binário: a mensagem sai como frame binário (frame_binario.py) em vez de texto
+#   - ausentes: cada leitura de sensor falta com essa probabilidade ("ovf" no texto,
+#     o valor reservado no frame binário)
+#
+# Todas as linhas vencidas saem em uma única escrita, então a taxa não depende da
+# resolução do sleep (milhares de linhas/s). Se ninguém lê a porta, a saída acumula até
+# LIMITE_SAIDA_BYTES e as linhas seguintes são descartadas, como no buffer de uma porta
+# USB. baud limita os bytes/s (10 bits por byte, como na serial 8N1 do Arduino).
+#
+# Comandos recebidos pela porta (os que validar_latencia.py envia ao receptor de teste):
+#   L1 / L0   liga/desliga o modo de teste (acrescenta LatTrad e CurrentTime à linha)
+#   A<ms>     latência artificial somada à do rádio
+#   O1 / O0   faz o millis() dar a volta (overflow de 32 bits) ANTECEDENCIA_OVERFLOW_MS à frente
+#   S         imprime a configuração atual
+#
+# Só funciona onde há pty (Linux, macOS). No Windows, usar um par de portas virtuais
+# (com0com) e o modo --porta com a outra ponta.
+
+TAXA_LINHAS = 10.0  # linhas/s (o transmissor real envia ~1 por segundo)
+LATENCIA_BASE_MS = 5
+JITTER_MS = 50
+DISTANCIA_REORDENACAO = 3
+TAMANHO_MAX_LIXO = 16
+LIMITE_SAIDA_BYTES = 65536
+MAX_LINHAS_POR_ESCRITA = 1000
+ANTECEDENCIA_OVERFLOW_MS = 5000
+MODULO_MILLIS = 1 << 32
+CAMPOS_SENSORES = ('temperatura', 'pressao', 'accel_x', 'accel_y', 'accel_z', 'gyro_x', 'gyro_y', 'gyro_z')
+
+
+class SimuladorSerial:
+    """Receptor simulado em um pty (ou em uma porta já aberta, com 'porta')."""
+
+    def __init__(self, taxa=TAXA_LINHAS, perda=0.0, reordenacao=0.0, jitter_ms=JITTER_MS, lixo=0.0,
+                 binario=0.0, latencia_base_ms=LATENCIA_BASE_MS, deriva_ppm=0.0, baud=None,
+                 quantidade=None, duracao=None, id_inicial=0, semente=None, porta=None, registrar_envios=False,
+                 ausentes=0.0):
+        self.taxa = taxa
+        self.perda = perda
+        self.reordenacao = reordenacao
+        self.jitter_ms = jitter_ms
+        self.lixo = lixo
+        self.binario = binario
+        self.ausentes = ausentes
+        self.latencia_base_ms = latencia_base_ms
+        self.deriva_ppm = deriva_ppm
+        self.baud = baud
+        self.quantidade = quantidade
+        self.duracao = duracao
+        self._aleatorio = random.Random(semente)
+        self._porta_externa = porta
+        # Estado do receptor de teste (comandos de validar_latencia.py)
+        self.modo_teste = False
+        self.latencia_artificial_ms = 0
+        self.overflow = False
+        self._deslocamento_ms = 0
+        self.estatisticas = {
+            'geradas': 0, 'impressas': 0, 'perdidas': 0, 'reordenadas': 0, 'lixo': 0,
+            'binarias': 0, 'descartadas': 0, 'bytes': 0, 'comandos': 0,
+        }
+        self._proximo_id = id_inicial
+        # ID -> time.time() em que a linha foi impressa (para medir a latência ponta a ponta)
+        self.envios = {} if registrar_envios else None
+        self._ultima_impressao = 0.0
+        self._retidas = []  # [mensagens que ainda precisam passar, ID, bytes]
+        self._saida = bytearray()
+        self._comando = bytearray()
+        self._thread = None
+        self._parar = threading.Event()
+        self.concluido = threading.Event()
+        self.porta = None
+        self._mestre = None
+
+    def abrir(self):
+        """Cria a porta sem começar a transmitir (para o leitor abri-la antes da primeira linha)."""
+        if self._mestre is not None:
+            return self
+        if self._porta_externa is None:
+            import pty
+            import tty
+            self._mestre, self._escravo = pty.openpty()
+            # Sem eco nem conversão de '\n': o que é escrito aqui chega igual no escravo
+            tty.setraw(self._escravo)
+            self.porta = os.ttyname(self._escravo)
+        else:
+            self._mestre = os.open(self._porta_externa, os.O_RDWR | os.O_NOCTTY)
+            self._escravo = None
+            self.porta = self._porta_externa
+        os.set_blocking(self._mestre, False)
+        return self
+
+    def iniciar(self):
+        self.abrir()
+        self.inicio = time.monotonic()
+        self._proxima = self._gerar_mensagem()
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._mestre is None:
+            return
+        os.close(self._mestre)
+        if self._escravo is not None:
+            os.close(self._escravo)
+        self._mestre = None
+
+    def pendentes(self):
+        """Bytes já escritos na porta que o leitor ainda não leu (só no pty; None se não der para saber)."""
+        if self._escravo is None:
+            return None
+        import fcntl
+        import termios
+        tamanho = bytearray(4)
+        fcntl.ioctl(self._escravo, termios.FIONREAD, tamanho)
+        return int.from_bytes(tamanho, 'little') + len(self._saida)
+
+    def esperar(self, timeout=None):
+        """Espera até todas as mensagens (quantidade/duracao) terem sido escritas."""
+        return self.concluido.wait(timeout)
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *excecao):
+        self.parar()
+
+    # --- Geração das mensagens ---
+
+    def millis(self, instante):
+        """millis() do transmissor no instante (s desde o início), com deriva e overflow simulado."""
+        ms = int(instante * 1000 * (1 + self.deriva_ppm * 1e-6)) + self._deslocamento_ms
+        return ms % MODULO_MILLIS
+
+    def _gerar_mensagem(self):
+        """Próxima mensagem do transmissor: (instante de impressão, ID, bytes), ou None no fim."""
+        numero = self.estatisticas['geradas']
+        envio = numero / self.taxa
+        if (self.quantidade is not None and numero >= self.quantidade) or \
+                (self.duracao is not None and envio >= self.duracao):
+            return None
+        aleatorio = self._aleatorio
+        latencia = self.latencia_base_ms + aleatorio.uniform(0, self.jitter_ms) + self.latencia_artificial_ms
+        timestamp = self.millis(envio)
+        id_msg = self._proximo_id % MODULO_MILLIS
+        registro = Registro(
+            id=id_msg, timestamp=timestamp, intervalo=round(1000 / self.taxa),
+            radio_latency=round(latencia),
+            temperatura=24.1 + aleatorio.gauss(0, 0.05), pressao=1023.2 + aleatorio.gauss(0, 0.05),
+            accel_x=1.015 + aleatorio.gauss(0, 0.005), accel_y=0.02 + aleatorio.gauss(0, 0.005),
+            accel_z=-0.07 + aleatorio.gauss(0, 0.005),
+            gyro_x=aleatorio.gauss(0, 0.5), gyro_y=aleatorio.gauss(0, 0.5), gyro_z=aleatorio.gauss(0, 0.5))
+        if self.ausentes:
+            registro = registro._replace(**{campo: None for campo in CAMPOS_SENSORES
+                                            if aleatorio.random() < self.ausentes})
+        self._proximo_id += 1
+        self.estatisticas['geradas'] += 1
+        if self.binario and aleatorio.random() < self.binario:
+            dados = codificar_frame(registro)
+            self.estatisticas['binarias'] += 1
+        else:
+            linha = formatar_linha(registro)
+            if self.modo_teste:
+                # CurrentTime é o millis() do receptor (mesmo relógio, sem deriva entre os dois);
+                # LatTrad é a subtração sem tratar a volta do millis()
+                atual = (timestamp + round(latencia)) % MODULO_MILLIS
+                linha += f"{SEPARADOR_CAMPOS}LatTrad: {abs(atual - timestamp)} ms{SEPARADOR_CAMPOS}CurrentTime: {atual}"
+            dados = (linha + '\n').encode('utf-8')
+        if self.lixo and aleatorio.random() < self.lixo:
+            ruido = bytes(aleatorio.randrange(256) for _ in range(aleatorio.randint(1, TAMANHO_MAX_LIXO)))
+            dados = ruido.replace(b'\n', b'\x00') + dados
+            self.estatisticas['lixo'] += 1
+        impressao = max(envio + latencia / 1000, self._ultima_impressao)
+        if self.baud:
+            impressao += len(dados) * 10 / self.baud
+        self._ultima_impressao = impressao
+        return impressao, id_msg, dados
+
+    def _imprimir_vencidas(self, agora):
+        """Move para a saída as mensagens cujo instante de impressão já passou."""
+        decorrido = agora - self.inicio
+        for _ in range(MAX_LINHAS_POR_ESCRITA):
+            if self._proxima is None or self._proxima[0] > decorrido:
+                break
+            _, id_msg, dados = self._proxima
+            self._proxima = self._gerar_mensagem()
+            if self.perda and self._aleatorio.random() < self.perda:
+                self.estatisticas['perdidas'] += 1
+                continue
+            if self.reordenacao and self._aleatorio.random() < self.reordenacao:
+                self._retidas.append([self._aleatorio.randint(1, DISTANCIA_REORDENACAO), id_msg, dados])
+                self.estatisticas['reordenadas'] += 1
+                continue
+            self._escrever(dados, id_msg)
+            for retida in self._retidas:
+                retida[0] -= 1
+            while self._retidas and min(r[0] for r in self._retidas) <= 0:
+                retida = min(self._retidas, key=lambda r: r[0])
+                self._retidas.remove(retida)
+                self._escrever(retida[2], retida[1])
+        if self._proxima is None and not self.concluido.is_set():
+            for _, id_msg, dados in self._retidas:
+                self._escrever(dados, id_msg)
+            self._retidas.clear()
+            if not self._saida:
+                self.concluido.set()
+
+    def _escrever(self, dados, id_msg):
+        if len(self._saida) + len(dados) > LIMITE_SAIDA_BYTES:
+            self.estatisticas['descartadas'] += 1
+            return
+        self._saida += dados
+        self.estatisticas['impressas'] += 1
+        if self.envios is not None:
+            self.envios[id_msg] = time.time()
+
+    def _descarregar(self):
+        try:
+            escritos = os.write(self._mestre, self._saida)
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EIO):
+                raise
+            return
+        del self._saida[:escritos]
+        self.estatisticas['bytes'] += escritos
+        if not self._saida and self._proxima is None and not self._retidas:
+            self.concluido.set()
+
+    # --- Comandos do receptor de teste ---
+
+    def _ler_comandos(self):
+        try:
+            dados = os.read(self._mestre, 1024)
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EIO):
+                raise
+            return
+        self._comando += dados
+        while b'\n' in self._comando:
+            linha, _, resto = bytes(self._comando).partition(b'\n')
+            self._comando[:] = resto
+            self.executar_comando(linha.decode('utf-8', errors='ignore').strip())
+
+    def executar_comando(self, comando):
+        if not comando:
+            return
+        self.estatisticas['comandos'] += 1
+        decorrido = time.monotonic() - self.inicio
+        if comando in ('L1', 'L0'):
+            self.modo_teste = comando == 'L1'
+        elif comando[0] == 'A' and comando[1:].isdigit():
+            self.latencia_artificial_ms = int(comando[1:])
+        elif comando in ('O1', 'O0'):
+            self.overflow = comando == 'O1'
+            self._deslocamento_ms = 0
+            if self.overflow:
+                # A volta acontece ANTECEDENCIA_OVERFLOW_MS depois do millis() atual
+                self._deslocamento_ms = MODULO_MILLIS - ANTECEDENCIA_OVERFLOW_MS - self.millis(decorrido)
+        elif comando == 'S':
+            self._escrever_texto(
+                f"Modo de teste: {'ativo' if self.modo_teste else 'inativo'}",
+                f"Latencia artificial: {self.latencia_artificial_ms} ms",
+                f"Simulacao de overflow: {'ativa' if self.overflow else 'inativa'}",
+                f"millis(): {self.millis(decorrido)}",
+                f"Taxa: {self.taxa:g} linhas/s")
+        else:
+            self._escrever_texto(f"Comando desconhecido: {comando}")
+            return
+        if comando != 'S':
+            self._escrever_texto(f"OK {comando}")
+
+    def _escrever_texto(self, *linhas):
+        # Respostas não contam como mensagens impressas
+        resposta = ''.join(linha + '\n' for linha in linhas).encode('utf-8')
+        if len(self._saida) + len(resposta) <= LIMITE_SAIDA_BYTES:
+            self._saida += resposta
+
+    def _executar(self):
+        while not self._parar.is_set():
+            agora = time.monotonic()
+            self._imprimir_vencidas(agora)
+            if self._proxima is None:
+                espera = 0.05
+            else:
+                espera = min(max(self._proxima[0] - (agora - self.inicio), 0), 0.05)
+            escrita = [self._mestre] if self._saida else []
+            try:
+                legiveis, gravaveis, _ = select.select([self._mestre], escrita, [], espera)
+            except (OSError, ValueError):
+                break
+            if legiveis:
+                self._ler_comandos()
+            if gravaveis:
+                self._descarregar()
+
+
+def imprimir_estatisticas(simulador):
+    decorrido = time.monotonic() - simulador.inicio
+    e = simulador.estatisticas
+    print(f"{decorrido:.1f}s: {e['geradas']} geradas, {e['impressas']} impressas "
+          f"({e['impressas'] / max(decorrido, 1e-9):.0f}/s), perdidas {e['perdidas']}, "
+          f"reordenadas {e['reordenadas']}, lixo {e['lixo']}, binárias {e['binarias']}, "
+          f"descartadas (buffer cheio) {e['descartadas']}, {e['bytes']} bytes")
+
+
+if __name__ == '__main__':
+    argumentos = argparse.ArgumentParser(description='Receptor simulado em um pseudo-terminal')
+    argumentos.add_argument('--taxa', type=float, default=TAXA_LINHAS, help='linhas por segundo')
+    argumentos.add_argument('--perda', type=float, default=0.0, help='probabilidade de perda (0-1)')
+    argumentos.add_argument('--reordenacao', type=float, default=0.0, help='probabilidade de reordenação (0-1)')
+    argumentos.add_argument('--jitter-ms', type=float, default=JITTER_MS)
+    argumentos.add_argument('--latencia-ms', type=float, default=LATENCIA_BASE_MS, help='latência base do rádio')
+    argumentos.add_argument('--lixo', type=float, default=0.0, help='probabilidade de bytes de lixo antes da linha')
+    argumentos.add_argument('--binario', type=float, default=0.0, help='fração de frames binários')
+    argumentos.add_argument('--ausentes', type=float, default=0.0,
+                            help='probabilidade de cada leitura de sensor faltar (ovf)')
+    argumentos.add_argument('--deriva-ppm', type=float, default=0.0, help='deriva do relógio do transmissor')
+    argumentos.add_argument('--baud', type=int, help='limita os bytes/s como uma serial com esse baud rate')
+    argumentos.add_argument('--quantidade', type=int, help='número de mensagens (padrão: sem fim)')
+    argumentos.add_argument('--duracao', type=float, help='segundos de transmissão (padrão: sem fim)')
+    argumentos.add_argument('--semente', type=int)
+    argumentos.add_argument('--link', help='cria um link simbólico com este nome para a porta')
+    argumentos.add_argument('--porta', help='escreve em uma porta existente em vez de criar um pty')
+    opcoes = argumentos.parse_args()
+
+    simulador = SimuladorSerial(
+        opcoes.taxa, opcoes.perda, opcoes.reordenacao, opcoes.jitter_ms, opcoes.lixo, opcoes.binario,
+        opcoes.latencia_ms, opcoes.deriva_ppm, opcoes.baud, opcoes.quantidade, opcoes.duracao,
+        semente=opcoes.semente, porta=opcoes.porta, ausentes=opcoes.ausentes).iniciar()
+    if opcoes.link:
+        if os.path.islink(opcoes.link):
+            os.remove(opcoes.link)
+        os.symlink(simulador.porta, opcoes.link)
+    print(f"Receptor simulado em {opcoes.link or simulador.porta} ({opcoes.taxa:g} linhas/s)")
+    print(f"Para capturar: CANSAT_PORTA_SERIAL={opcoes.link or simulador.porta} python mqtt_sender.py")
+    try:
+        while not simulador.esperar(5):
+            imprimir_estatisticas(simulador)
+        # Espera um pouco para quem está lendo consumir o que sobrou na porta
+        time.sleep(1)
+    except KeyboardInterrupt:
+        print('Encerrando...')
+    finally:
+        imprimir_estatisticas(simulador)
+        simulador.parar()
+        if opcoes.link and os.path.islink(opcoes.link):
+            os.remove(opcoes.link)
@@ -1,3 +1,4 @@
+import os
 import serial
 import time
 import re
@@ -5,7 +6,8 @@ import pandas as pd
 import matplotlib.pyplot as plt
 
 # Configuração da porta serial (ajuste conforme necessário)
-SERIAL_PORT = 'COM3'  # Altere para a porta correta do seu receptor
+# CANSAT_PORTA_SERIAL substitui a porta (ex.: o pty do simulador_serial.py)
+SERIAL_PORT = os.environ.get('CANSAT_PORTA_SERIAL', 'COM3')  # Altere para a porta correta do seu receptor
 BAUDRATE = 9600
 
 # Padrão para extrair latência da saída do Arduino